@@ -143,6 +143,16 @@ GET_PS_PHOTO () {
 
   $SHOWIMAGES || return 0
 
+  # photos_prefetch has already looked up the ICAOs of the CSV file
+  if [[ -n "${photo_link["$icao"]+x}" ]]; then
+    case "$returntype" in
+      image)     [[ -z "${photo_file["$icao"]}" ]] || printf '%s\n' "${photo_file["$icao"]}" ;;
+      link)      [[ -z "${photo_link["$icao"]}" ]] || printf '%s\n' "${photo_link["$icao"]}" ;;
+      thumblink) [[ -z "${photo_thumb["$icao"]}" ]] || printf '%s\n' "${photo_thumb["$icao"]}" ;;
+    esac
+    return 0
+  fi
+
   CACHETIME=$((3 * 24 * 3600))  # 3 days in seconds
 
   local dir="/usr/share/planefence/persist/planepix/cache"
@@ -220,6 +230,12 @@ mapfile -t pa_lines < <(
 filteredrecords=${#pa_lines[@]}
 log_print DEBUG "Retention filter kept $filteredrecords of $totalrecords rows (>= $retention_iso)."
 
+# look up the photos of all ICAOs in one go, rather than one by one in the loop below
+if chk_enabled "$SHOWIMAGES"; then
+  readarray -t photo_icaos < <(printf '%s\n' "${pa_lines[@]}" | awk -F',' '{gsub(/["[:space:]]/, "", $1); if ($1 ~ /^[0-9A-Fa-f]{6}$/) print $1}')
+  photos_prefetch "${photo_icaos[@]}" || log_print WARN "pflib.photos failed; looking up the photos one by one"
+fi
+
 for LINE in "${pa_lines[@]}"; do
   linesread=$((linesread + 1))
   # shellcheck disable=SC2034
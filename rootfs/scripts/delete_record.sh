@@ -99,6 +99,10 @@ refresh_index_maps() {
 backup_records_file() {
 	if [[ -f "$RECORDSFILE" ]]; then
 		local backup
+		# bring the .gz file up to date with the records store first (see pflib.records)
+		if [[ -f "${RECORDSFILE%.gz}.db" ]]; then
+			python3 -m pflib.records export --gz "$RECORDSFILE" >/dev/null 2>&1 || true
+		fi
 		backup="${RECORDSFILE}.bkup-$(date +%s)"
 		cp -p -- "$RECORDSFILE" "$backup"
 	else
@@ -21,22 +21,392 @@ where:
 --tls: Enable TLS encryption.
 --cafile: Path to a CA certificate file for self-signed broker certificates.
 --tls-insecure: Disable broker certificate verification (insecure, use only for testing).
+
+Publisher mode: mqtt.py --broker <broker_ip> [connection options] (--batch | --input <fifo>)
+Holds one MQTT session (keepalive, automatic reconnect) and publishes NDJSON messages, one per line:
+  {"id": "12", "topic": "host/planefence", "message": "...", "qos": 1, "retain": true}
+Only "message" is required; the other keys default to the command line options. A message that
+is a JSON object is published as its JSON text.
+--batch: Read the messages from stdin, wait for all of them to be delivered, then exit.
+--input: Read the messages from a FIFO (or file) and keep the session open, reopening it on EOF.
+--inflight: Maximum number of QoS 1/2 messages in flight at a time (default 20).
+For every message a JSON result line is written to stdout: {"id", "ok", "mid", "latency_ms"} or
+{"id", "ok": false, "error"}. Counters (published, failed, queue depth, latency) go to stderr at
+exit and, with --input, every --stats-interval seconds.
+
+Spool mode: mqtt.py [connection options] --spool <dir> (--message <message> | --batch | --drain)
+--spool with --message or --batch: append the message(s) to an on-disk spool and return right away,
+without touching the network. A result line {"id", "ok": true, "queued": true} is written per message.
+--spool with --drain: publish the spooled messages, retrying with exponential backoff (up to
+--max-backoff seconds) while the broker is unreachable, and exit once the spool is empty. Only one
+drainer runs per spool directory; a second one exits immediately.
+--coalesce: when draining, only publish the newest of several retained messages for the same topic.
+--spool-max-bytes: bound on the spool size; the oldest segments are dropped when it is exceeded.
 '''
 
 import argparse
+import fcntl
+import glob
+import json
+import os
 import socket
 import ssl
 import sys
-import paho.mqtt.publish as publish
+import threading
+import time
+
+
+class Publisher:
+    """One long-lived MQTT session that publishes messages through paho's network loop"""
+
+    def __init__(self, args, tls_context):
+        import paho.mqtt.client as mqtt
+        self.mqtt = mqtt
+        try:
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=args.client_id)
+        except AttributeError:
+            # paho-mqtt 1.x
+            self.client = mqtt.Client(client_id=args.client_id)
+        if args.username and args.password:
+            self.client.username_pw_set(args.username, args.password)
+        if tls_context:
+            self.client.tls_set_context(tls_context)
+        self.client.max_inflight_messages_set(args.inflight)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+        self.args = args
+        self.connected = threading.Event()
+        self.lock = threading.Lock()
+        self.drained = threading.Condition(self.lock)
+        self.pending = {}     # mid -> (id, start time)
+        self.early = set()    # mids whose on_publish arrived before publish() returned
+        self.offline = None   # reason to fail messages right away instead of queueing them
+        self.on_result = self._print_result
+        self.stats = {"published": 0, "failed": 0, "connects": 0, "queue_depth": 0, "max_queue_depth": 0,
+                      "latency_ms_avg": 0.0, "latency_ms_max": 0.0}
+        self._latency_total = 0.0
+
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        if reason_code == 0:
+            self.stats["connects"] += 1
+            self.connected.set()
+        else:
+            print(f"MQTT connection refused: {reason_code}", file=sys.stderr, flush=True)
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.connected.clear()
+
+    def _on_publish(self, client, userdata, mid, *args):
+        with self.lock:
+            if mid in self.pending:
+                self._done(mid)
+            else:
+                self.early.add(mid)
+
+    def _done(self, mid):
+        msg_id, started = self.pending.pop(mid)
+        latency = (time.monotonic() - started) * 1000
+        self.stats["published"] += 1
+        self._latency_total += latency
+        self.stats["latency_ms_avg"] = round(self._latency_total / self.stats["published"], 2)
+        self.stats["latency_ms_max"] = round(max(self.stats["latency_ms_max"], latency), 2)
+        self.stats["queue_depth"] = len(self.pending)
+        self._result({"id": msg_id, "ok": True, "mid": mid, "latency_ms": round(latency, 2)})
+        self.drained.notify_all()
+
+    def _result(self, result):
+        self.on_result(result)
+
+    def _print_result(self, result):
+        print(json.dumps(result), flush=True)
+
+    def _fail(self, msg_id, error):
+        self.stats["failed"] += 1
+        self._result({"id": msg_id, "ok": False, "error": error})
+
+    def start(self):
+        self.client.connect_async(self.args.broker, self.args.port, keepalive=self.args.keepalive)
+        self.client.loop_start()
+        return self.connected.wait(self.args.socket_timeout)
+
+    def publish(self, line):
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or "message" not in job:
+                raise ValueError("expected a JSON object with a 'message' key")
+        except ValueError as e:
+            self._fail(None, f"invalid message: {e}")
+            return
+        msg_id = job.get("id")
+        if self.offline:
+            self._fail(msg_id, self.offline)
+            return
+        topic = job.get("topic") or self.args.topic
+        if not topic:
+            self._fail(msg_id, "no topic")
+            return
+        payload = job["message"]
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+
+        # Back-pressure: don't let more than --max-queue messages pile up inside paho
+        with self.lock:
+            self.drained.wait_for(lambda: len(self.pending) < self.args.max_queue, timeout=self.args.socket_timeout)
+
+        qos = int(job.get("qos", self.args.qos))
+
+        started = time.monotonic()
+        info = self.client.publish(topic, payload, qos=qos, retain=bool(job.get("retain", True)))
+        if info.rc != self.mqtt.MQTT_ERR_SUCCESS and not (info.rc == self.mqtt.MQTT_ERR_NO_CONN and qos > 0):
+            # QoS 0 messages are dropped while disconnected; QoS 1/2 ones are resent after reconnecting
+            self._fail(msg_id, self.mqtt.error_string(info.rc))
+            return
+        with self.lock:
+            self.pending[info.mid] = (msg_id, started)
+            self.stats["queue_depth"] = len(self.pending)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self.pending))
+            if info.mid in self.early:
+                self.early.discard(info.mid)
+                self._done(info.mid)
+
+    def drain(self, timeout):
+        """Wait until every queued message is delivered; report the rest as failed"""
+        with self.lock:
+            self.drained.wait_for(lambda: not self.pending, timeout=timeout)
+            for mid in list(self.pending):
+                msg_id, _ = self.pending.pop(mid)
+                self._fail(msg_id, "not acknowledged before the timeout")
+            self.stats["queue_depth"] = 0
+
+    def print_stats(self):
+        print(json.dumps({"stats": self.stats}), file=sys.stderr, flush=True)
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class Spool:
+    """
+    Bounded, append-only on-disk message queue. Writers append NDJSON lines to the active segment
+    under an exclusive lock; the drainer rotates the active segment into a numbered one under that
+    same lock and only ever reads rotated segments, so it never sees a half-written line.
+    """
+
+    ACTIVE = "active.ndjson"
+
+    def __init__(self, directory, max_bytes):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _locked(self, name, blocking=True):
+        fd = os.open(os.path.join(self.dir, name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def enqueue(self, jobs):
+        lines = "".join(json.dumps(job, separators=(",", ":")) + "\n" for job in jobs)
+        fd = self._locked(".lock")
+        try:
+            with open(os.path.join(self.dir, self.ACTIVE), "a") as f:
+                f.write(lines)
+        finally:
+            os.close(fd)
+        self.trim()
+
+    def rotate(self):
+        """Move the active segment out of the writers' way; returns all segments, oldest first"""
+        fd = self._locked(".lock")
+        try:
+            active = os.path.join(self.dir, self.ACTIVE)
+            if os.path.exists(active) and os.path.getsize(active) > 0:
+                os.replace(active, os.path.join(self.dir, f"segment-{time.time_ns()}.ndjson"))
+        finally:
+            os.close(fd)
+        return self.segments()
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.dir, "segment-*.ndjson")))
+
+    def pending(self):
+        """Whether there are messages waiting to be drained"""
+        active = os.path.join(self.dir, self.ACTIVE)
+        return bool(self.segments()) or (os.path.exists(active) and os.path.getsize(active) > 0)
+
+    def trim(self):
+        """Drop the oldest segments while the spool is larger than max_bytes"""
+        paths = self.segments() + [os.path.join(self.dir, self.ACTIVE)]
+        sizes = {path: os.path.getsize(path) for path in paths if os.path.exists(path)}
+        total = sum(sizes.values())
+        for path in paths[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= sizes.get(path, 0)
+                print(f"MQTT spool over {self.max_bytes} bytes - dropped {os.path.basename(path)}", file=sys.stderr, flush=True)
+            except OSError:
+                pass
+
+    def drain_lock(self):
+        return self._locked(".drain.lock", blocking=False)
+
+
+def coalesce(jobs):
+    """Keep only the newest retained message per topic; everything else is kept in order"""
+    newest = {}
+    for n, job in enumerate(jobs):
+        if job.get("retain", True):
+            newest[job.get("topic")] = n
+    return [job for n, job in enumerate(jobs) if not job.get("retain", True) or newest[job.get("topic")] == n]
+
+
+def spool_enqueue(args, spool):
+    if args.batch:
+        lines = (line for line in sys.stdin if line.strip())
+    else:
+        lines = [json.dumps({"message": args.message})]
+    jobs = []
+    for line in lines:
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or "message" not in job:
+                raise ValueError("expected a JSON object with a 'message' key")
+        except ValueError as e:
+            print(json.dumps({"id": None, "ok": False, "error": f"invalid message: {e}"}), flush=True)
+            continue
+        # Resolve the defaults now, so the drainer doesn't depend on the options it is started with
+        job.setdefault("topic", args.topic)
+        job.setdefault("qos", args.qos)
+        job.setdefault("retain", True)
+        job["queued"] = time.time()
+        jobs.append(job)
+    if jobs:
+        spool.enqueue(jobs)
+    for job in jobs:
+        print(json.dumps({"id": job.get("id"), "ok": True, "queued": True}), flush=True)
+    return 0
+
+
+def spool_drain(args, tls_context, spool):
+    while True:
+        lock = spool.drain_lock()
+        if lock is None:
+            return 0   # another drainer is already at work
+        try:
+            _drain(args, tls_context, spool)
+        finally:
+            os.close(lock)
+        # A message spooled after the last rotate() but before the lock was released found this drainer
+        # still at work, so nobody else started one for it: go round again if there is one
+        if not spool.pending():
+            return 0
+
+
+def _drain(args, tls_context, spool):
+    """Publish the spooled messages until the spool is empty; the caller holds the drain lock"""
+    backoff = 1.0
+    publisher = None
+    try:
+        while True:
+            segments = spool.rotate()
+            if not segments:
+                return
+            jobs = []
+            for path in segments:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            jobs.append(json.loads(line))
+                        except ValueError:
+                            pass   # a torn line, e.g. after a power loss
+            if args.coalesce:
+                jobs = coalesce(jobs)
+
+            if publisher is None:
+                publisher = Publisher(args, tls_context)
+                publisher.start()
+            failed = []
+            if publisher.connected.wait(args.socket_timeout):
+                publisher.on_result = lambda result: None if result["ok"] else failed.append(result["id"])
+                for n, job in enumerate(jobs):
+                    publisher.publish(json.dumps(dict(job, id=n)))
+                publisher.drain(args.socket_timeout)
+            else:
+                failed = list(range(len(jobs)))
+
+            # Whatever wasn't delivered goes back in as a single segment, ahead of anything newer
+            retry = [jobs[n] for n in sorted(set(failed))]
+            if retry:
+                with open(segments[0] + ".tmp", "w") as f:
+                    f.writelines(json.dumps(job, separators=(",", ":")) + "\n" for job in retry)
+                os.replace(segments[0] + ".tmp", segments[0])
+                segments = segments[1:]
+            for path in segments:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass   # already dropped by trim()
+
+            if not retry:
+                backoff = 1.0
+                continue
+            print(f"MQTT broker {args.broker}:{args.port} unavailable - {len(retry)} spooled message(s) "
+                  f"remaining, retrying in {backoff:.0f}s", file=sys.stderr, flush=True)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, args.max_backoff)
+    finally:
+        if publisher is not None:
+            if publisher.stats["failed"]:
+                publisher.print_stats()
+            publisher.stop()
+
+
+def run_publisher(args, tls_context):
+    publisher = Publisher(args, tls_context)
+    connected = publisher.start()
+
+    if args.batch:
+        # Without a connection there's no point in queueing: report every message as failed
+        publisher.offline = None if connected else f"unable to connect to {args.broker}:{args.port}"
+        for line in sys.stdin:
+            if line.strip():
+                publisher.publish(line)
+        publisher.drain(args.socket_timeout)
+        publisher.print_stats()
+        publisher.stop()
+        return 0 if publisher.stats["failed"] == 0 else 1
+
+    # --input: keep the session open and reopen the FIFO whenever the writer closes it
+    last_stats = time.monotonic()
+    while True:
+        with open(args.input) as source:
+            for line in source:
+                if line.strip():
+                    publisher.publish(line)
+                if time.monotonic() - last_stats >= args.stats_interval:
+                    publisher.print_stats()
+                    last_stats = time.monotonic()
+        if time.monotonic() - last_stats >= args.stats_interval:
+            publisher.print_stats()
+            last_stats = time.monotonic()
 
 def main():
     # Set up command-line arguments
     parser = argparse.ArgumentParser(description="MQTT Publish Command Line Tool")
     parser.add_argument("--broker", required=True, help="MQTT broker address (e.g., 'localhost').")
     parser.add_argument("--port", type=int, default=1883, help="MQTT broker port (default: 1883, use 8883 for TLS).")
-    parser.add_argument("--topic", required=True, help="MQTT topic to publish to.")
+    parser.add_argument("--topic", help="MQTT topic to publish to (required unless every --batch/--input message has one).")
     parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=0, help="Quality of Service level (default: 0).")
-    parser.add_argument("--message", required=True, help="Message to publish.")
+    parser.add_argument("--message", help="Message to publish.")
     parser.add_argument("--client_id", default="mqtt_client", help="Client ID for MQTT connection (default: 'mqtt_client').")
     parser.add_argument("--username", help="Username for MQTT authentication.")
     parser.add_argument("--password", help="Password for MQTT authentication.")
@@ -44,8 +414,27 @@ def main():
     parser.add_argument("--cafile", default=None, help="Path to CA certificate file for self-signed broker certificates.")
     parser.add_argument("--tls-insecure", action="store_true", help="Disable broker certificate verification (insecure, use only for testing).")
     parser.add_argument("--socket-timeout", type=float, default=15.0, help="Socket timeout in seconds for network operations.")
+    parser.add_argument("--batch", action="store_true", help="Publish NDJSON messages read from stdin over a single session.")
+    parser.add_argument("--input", help="Publish NDJSON messages read from this FIFO, keeping the session open.")
+    parser.add_argument("--inflight", type=int, default=20, help="Maximum QoS 1/2 messages in flight (default: 20).")
+    parser.add_argument("--max-queue", type=int, default=1000, help="Maximum messages queued for delivery before reading more input (default: 1000).")
+    parser.add_argument("--keepalive", type=int, default=60, help="Keepalive interval in seconds (default: 60).")
+    parser.add_argument("--stats-interval", type=float, default=300.0, help="Seconds between counter reports with --input (default: 300).")
+    parser.add_argument("--spool", help="Spool directory: queue messages on disk instead of publishing them (see --drain).")
+    parser.add_argument("--drain", action="store_true", help="Publish the messages in the --spool directory, then exit.")
+    parser.add_argument("--coalesce", action="store_true", help="With --drain, only publish the newest retained message per topic.")
+    parser.add_argument("--max-backoff", type=float, default=300.0, help="Maximum seconds between --drain retries (default: 300).")
+    parser.add_argument("--spool-max-bytes", type=int, default=16 * 1024 * 1024, help="Maximum spool size in bytes (default: 16 MiB).")
 
     args = parser.parse_args()
+    if args.drain and not args.spool:
+        parser.error("--drain requires --spool")
+    if not (args.batch or args.input or args.drain) and (args.topic is None or args.message is None):
+        parser.error("--topic and --message are required unless --batch, --input or --drain is used")
+
+    if args.spool and not args.drain:
+        # Enqueueing never touches the network
+        sys.exit(spool_enqueue(args, Spool(args.spool, args.spool_max_bytes)))
 
     # Keep network operations bounded so callers do not hang indefinitely.
     socket.setdefaulttimeout(args.socket_timeout)
@@ -61,7 +450,13 @@ def main():
             tls_context.check_hostname = False
             tls_context.verify_mode = ssl.CERT_NONE
 
+    if args.drain:
+        sys.exit(spool_drain(args, tls_context, Spool(args.spool, args.spool_max_bytes)))
+    if args.batch or args.input:
+        sys.exit(run_publisher(args, tls_context))
+
     # Publish the message
+    import paho.mqtt.publish as publish
     try:
         publish.single(topic=args.topic, payload=args.message, qos=args.qos, retain=True, hostname=args.broker, port=args.port, client_id=args.client_id, **({"auth": {'username': args.username, 'password': args.password}} if args.username and args.password else {}), **({"tls": tls_context} if tls_context else {}))
         print(f"Message '{args.message}' published to topic '{args.topic}' with QoS {args.qos}.")
@@ -41,6 +41,12 @@ find_records_file() {
   return 1
 }
 
+records_text() {
+  # The records store next to the .gz file (see pflib.records) has the entries the notifiers set
+  # since the last full write; the .gz file is only read if there is no store
+  python3 -m pflib.records read --gz "$1" 2>/dev/null || gzip -cd "$1"
+}
+
 merge_pa_records() {
   local -n src=$1
   local -A idx_map=()
@@ -97,7 +103,7 @@ for (( offset=0; offset<DAYS; offset++ )); do
   file=$(find_records_file "$day") || { log_print WARN "Records file for ${day} not found; skipping"; continue; }
   [[ $offset -eq 0 ]] && todays_file="$file"
   # shellcheck disable=SC1090
-  if source <(gzip -cd "$file"); then
+  if source <(records_text "$file"); then
     ensure_assoc pa_records
     [[ -z ${pa_records[maxindex]+x} ]] && pa_records[maxindex]=-1
     merge_pa_records pa_records
@@ -112,7 +118,7 @@ merged_pa_records[maxindex]=$merged_max
 # Re-load today's records (or initialize) for non-PA structures
 if [[ -n $todays_file ]]; then
   # shellcheck disable=SC1090
-  if ! source <(gzip -cd "$todays_file"); then
+  if ! source <(records_text "$todays_file"); then
     log_print WARN "Failed to reload today's records; falling back to empty defaults"
     unset records heatmap last_idx_for_icao lastseen_for_icao pa_records pa_last_idx_for_icao LASTPROCESSEDLINE
   fi
@@ -90,6 +90,91 @@ EOF
 
 }
 
+# upload_images image...
+# Uploads the images (files or URLs) to Bluesky and adds their blob references to cid, size and mimetype
+function upload_images() {
+  local image image_to_use tmp_img mimetype_local imgsize_org modtime_org response cid_local size_local
+  for image in "$@"; do
+    # skip if the image is empty
+    if [[ -z "$image" ]]; then
+        continue
+    fi
+
+    # If image is a URL (not a local file), try to download it temporarily
+    image_to_use="$image"
+    if [[ "$image" =~ ^https?:// ]] && [[ ! -f "$image" ]]; then
+      tmp_img="/tmp/bsky_img_$$.jpg"
+      if curl -m 30 -fsSL --fail "$image" -o "$tmp_img" 2>/dev/null; then
+        image_to_use="$tmp_img"
+        log_print DEBUG "Downloaded external image $image to $tmp_img"
+      else
+        log_print WARN "Failed to download external image: $image"
+        continue
+      fi
+    fi
+
+    # skip if the image file doesn't exist or is greater than 1MB (max file size for BlueSky)
+    if [[ ! -f "$image_to_use" ]] || [[ ! -s "$image_to_use" ]]; then
+        if [[ -f "$image_to_use" ]] && [[ ! -s "$image_to_use" ]]; then
+          log_print WARN "Skipping empty image file: $image_to_use"
+        fi
+        continue
+    fi
+
+    # figure out what type the image is: jpeg, png, gif, and reduce size if necessary/possible.
+    mimetype_local="$(file --mime-type -b "$image_to_use")"
+    imgsize_org="$(stat -c%s "$image_to_use")"
+    modtime_org="$(stat -c "%y" "$image_to_use")"
+
+    if (( imgsize_org >= 950000 )); then
+      if [[ "$mimetype_local" == "image/jpeg" ]]; then
+        jpegoptim -q -S950 -s "$image_to_use"	# if it's JPG and > 1 MB, we can optimize for it
+        # try again if still too big
+        if (( $(stat -c%s "$image_to_use") >= 950000 )); then
+            jpegoptim -q -S850 -s "$image_to_use"
+        fi
+      elif [[ "$mimetype_local" == "image/png" ]]; then
+        pngquant -f -o "${image_to_use}.tmp" 64 "$image_to_use"	# if it's PNG and > 1 MB, we can optimize for it
+        mv -f "${image_to_use}.tmp" "$image_to_use"
+      else
+        log_print WARN "Omitting image $image as it is too big ($imgsize)"
+        continue # skip if it's not JPG or PNG
+      fi
+      touch -d "$modtime_org" "$image_to_use"    # restore original modification date of the image (for cache management purposes)
+      log_print DEBUG "Image size of $image reduced from $imgsize_org to $(stat -c%s "$image")"
+    fi
+    if (( $(stat -c%s "$image_to_use") >= 950000 )); then
+      log_print WARN "Omitting image $image as the size reduction was insufficient: before: $imgsize_org; now: $(stat -c%s "$image")"
+      continue;
+    fi # skip if it's still > 1MB
+
+    #Send the image to Bluesky
+    response="$(curl -v -sL -X POST "$BLUESKY_API/com.atproto.repo.uploadBlob" \
+      -H "Content-Type: $mimetype_local" \
+      -H "Authorization: Bearer $access_jwt" \
+      --data-binary "@$image_to_use" 2>/tmp/bsky.headers)"
+    #Get the CID, size, and official MIME type of the image. Need need this to correctly refer to it in the subsequent post
+    cid_local="$(jq -r '.blob.ref."$link"' <<< "$response")"
+    size_local="$(jq -r '.blob.size' <<< "$response")"
+    get_rate_str
+    if [[ -z "$cid_local" ]] || [[ "$cid_local" == "null" ]]; then
+      log_print ERR "Error uploading $image to BlueSky: $response. $ratelimit_str. Local size is $(stat -c%s "$image_to_use"); reported blob size is $size_local."
+      { echo "{ \"title\": \"BlueSky Image Upload Error\""
+        echo "  \"response\": $response ,"
+        echo "  \"ratelimit\": $ratelimit_str } ,"
+      } >> /tmp/bsky.json
+      [[ "$image_to_use" =~ /tmp/bsky_img ]] && rm -f "$image_to_use"  # cleanup temp file on error
+    else
+      cid+=("$cid_local")
+      size["$cid_local"]="$size_local"
+      mimetype["$cid_local"]="$mimetype_local"
+      log_print DEBUG "$image uploaded successfully to BlueSky. $ratelimit_str"
+      [[ "$image_to_use" =~ /tmp/bsky_img ]] && rm -f "$image_to_use"  # cleanup temp file on success
+    fi
+  done
+  return 0
+}
+
 # Extract info from the command line arguments
 args=("$@")
 mode="${args[0]}"
@@ -181,91 +266,29 @@ TEXT="${TEXT//$'\n'/\\n}"
 # Trim any spaces after a literal \n
 TEXT="$(sed -E 's/\\n[[:space:]]+/\\n/g' <<< "$TEXT")"
 
-# Authenticate with BlueSky
-bsky_auth
+# If the resident notification service is running, it uploads the images and posts the record for
+# us (see pflib.dispatch): it keeps the Bluesky session between posts instead of refreshing it for
+# every post. We then only build the record here, and only log in and upload the images ourselves if
+# the service doesn't take the post after all.
+use_notifyd=false
+notify_images=()
+if notifyd_running; then
+  use_notifyd=true
+  for image in "${IMAGES[@]}"; do
+    if [[ -n "$image" ]]; then notify_images+=("$image"); fi
+  done
+else
+  # Authenticate with BlueSky
+  bsky_auth
+fi
 
 # send pictures to Bluesky
 unset cid size mimetype tagstart tagend urlstart urlend urluri urllabel
 declare -A size mimetype tagstart tagend urlstart urlend urluri urllabel
 
-for image in "${IMAGES[@]}"; do
-  # skip if the image is empty
-  if [[ -z "$image" ]]; then
-      continue
-  fi
-
-  # If image is a URL (not a local file), try to download it temporarily
-  image_to_use="$image"
-  if [[ "$image" =~ ^https?:// ]] && [[ ! -f "$image" ]]; then
-    tmp_img="/tmp/bsky_img_$$.jpg"
-    if curl -m 30 -fsSL --fail "$image" -o "$tmp_img" 2>/dev/null; then
-      image_to_use="$tmp_img"
-      log_print DEBUG "Downloaded external image $image to $tmp_img"
-    else
-      log_print WARN "Failed to download external image: $image"
-      continue
-    fi
-  fi
-
-  # skip if the image file doesn't exist or is greater than 1MB (max file size for BlueSky)
-  if [[ ! -f "$image_to_use" ]] || [[ ! -s "$image_to_use" ]]; then
-      if [[ -f "$image_to_use" ]] && [[ ! -s "$image_to_use" ]]; then
-        log_print WARN "Skipping empty image file: $image_to_use"
-      fi
-      continue
-  fi
-
-  # figure out what type the image is: jpeg, png, gif, and reduce size if necessary/possible.
-  mimetype_local="$(file --mime-type -b "$image_to_use")"
-  imgsize_org="$(stat -c%s "$image_to_use")"
-  modtime_org="$(stat -c "%y" "$image_to_use")"
-
-  if (( imgsize_org >= 950000 )); then
-    if [[ "$mimetype_local" == "image/jpeg" ]]; then
-      jpegoptim -q -S950 -s "$image_to_use"	# if it's JPG and > 1 MB, we can optimize for it
-      # try again if still too big
-      if (( $(stat -c%s "$image_to_use") >= 950000 )); then
-          jpegoptim -q -S850 -s "$image_to_use"
-      fi
-    elif [[ "$mimetype_local" == "image/png" ]]; then
-      pngquant -f -o "${image_to_use}.tmp" 64 "$image_to_use"	# if it's PNG and > 1 MB, we can optimize for it
-      mv -f "${image_to_use}.tmp" "$image_to_use"
-    else
-      log_print WARN "Omitting image $image as it is too big ($imgsize)"
-      continue # skip if it's not JPG or PNG
-    fi
-    touch -d "$modtime_org" "$image_to_use"    # restore original modification date of the image (for cache management purposes)
-    log_print DEBUG "Image size of $image reduced from $imgsize_org to $(stat -c%s "$image")"
-  fi
-  if (( $(stat -c%s "$image_to_use") >= 950000 )); then
-    log_print WARN "Omitting image $image as the size reduction was insufficient: before: $imgsize_org; now: $(stat -c%s "$image")"
-    continue;
-  fi # skip if it's still > 1MB
-
-  #Send the image to Bluesky
-  response="$(curl -v -sL -X POST "$BLUESKY_API/com.atproto.repo.uploadBlob" \
-    -H "Content-Type: $mimetype_local" \
-    -H "Authorization: Bearer $access_jwt" \
-    --data-binary "@$image_to_use" 2>/tmp/bsky.headers)"
-  #Get the CID, size, and official MIME type of the image. Need need this to correctly refer to it in the subsequent post
-  cid_local="$(jq -r '.blob.ref."$link"' <<< "$response")"
-  size_local="$(jq -r '.blob.size' <<< "$response")"
-  get_rate_str
-  if [[ -z "$cid_local" ]] || [[ "$cid_local" == "null" ]]; then
-    log_print ERR "Error uploading $image to BlueSky: $response. $ratelimit_str. Local size is $(stat -c%s "$image_to_use"); reported blob size is $size_local."
-    { echo "{ \"title\": \"BlueSky Image Upload Error\""
-      echo "  \"response\": $response ,"
-      echo "  \"ratelimit\": $ratelimit_str } ,"
-    } >> /tmp/bsky.json
-    [[ "$image_to_use" =~ /tmp/bsky_img ]] && rm -f "$image_to_use"  # cleanup temp file on error
-  else
-    cid+=("$cid_local")
-    size["$cid_local"]="$size_local"
-    mimetype["$cid_local"]="$mimetype_local"
-    log_print DEBUG "$image uploaded successfully to BlueSky. $ratelimit_str"
-    [[ "$image_to_use" =~ /tmp/bsky_img ]] && rm -f "$image_to_use"  # cleanup temp file on success
-  fi
-done
+if ! $use_notifyd; then
+  upload_images "${IMAGES[@]}"
+fi
 
 log_print DEBUG "TEXT before cleanup: $TEXT"
 
@@ -406,8 +429,8 @@ if chk_enabled "$DEBUG"; then
   } >> /tmp/bsky.debug
 fi
 
-# Prepare the post data
-if (( ${#cid[@]} == 0 )); then
+# Prepare the post data. If the notification service posts it, it fills in the (empty) images embed
+if (( ${#cid[@]} == 0 )) && ! { $use_notifyd && (( ${#notify_images[@]} )); }; then
     # no images
     post_data="{
         \"repo\": \"$did\",
@@ -541,6 +564,45 @@ else
     }"
 fi
 
+# Hand the post to the notification service if it's running
+if $use_notifyd; then
+  posts="$(jq -c \
+    --arg api "$BLUESKY_API" \
+    --arg handle "$BLUESKY_HANDLE" \
+    --arg password "$BLUESKY_APP_PASSWORD" \
+    '{bluesky: {api: $api, handle: $handle, password: $password, record: .record}}' <<< "$post_data")" || true
+  if [[ -z "$posts" ]]; then
+    log_print ERR "BlueSky Posting Error: unable to build the post; original had http instead of hxttp:\n${post_data//http/hxttp}"
+    exit 1
+  fi
+  if results="$(notifyd_post "$posts" "${notify_images[@]}")" && [[ -n "$results" ]]; then
+    IFS=$'\t' read -r _ ok detail <<< "$results"
+    if [[ "$ok" == "queued" ]]; then
+      echo "queued"   # pf-run.sh sends it, together with this record's other channels
+      exit 0
+    fi
+    if [[ "$ok" == "true" ]]; then
+      echo "$detail"
+      exit 0
+    fi
+    log_print ERR "BlueSky Posting Error (via notifyd); response was (original had http instead of hxttp):\n${detail//http/hxttp}"
+    exit 1
+  fi
+
+  # The service didn't take the post (its socket was left behind, or it doesn't know "post" jobs),
+  # so nothing was posted: log in, upload the images and post the record ourselves
+  log_print WARN "The notification service didn't take the BlueSky post; posting it directly"
+  bsky_auth
+  upload_images "${notify_images[@]}"
+  embed="$(for img in "${cid[@]}"; do
+    jq -cn --arg cid "$img" --arg mimetype "${mimetype["$img"]}" --argjson size "${size["$img"]}" \
+      '{image: {"$type": "blob", ref: {"$link": $cid}, mimeType: $mimetype, size: $size}, alt: ""}'
+  done | jq -cs .)" || true
+  post_data="$(jq --arg did "$did" --argjson images "${embed:-[]}" \
+    '.repo = $did | if ($images | length) > 0 then .record.embed.images = $images else del(.record.embed) end' \
+    <<< "$post_data")" || true
+fi
+
 # Send the post to Bluesky
 response=$(curl -sSL -X POST "$BLUESKY_API/com.atproto.repo.createRecord" \
   -H "Content-Type: application/json" \
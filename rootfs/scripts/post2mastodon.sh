@@ -68,6 +68,33 @@ if (( toot_length >= 500 )); then
    log_print WARNING "Mastodon Notification Truncated: it was $(( toot_length - 499)) characters too long"
 fi
 
+notif_lang="$(pf_notification_init_language)"
+mastodon_lang="$(pf_notification_mastodon_lang "$notif_lang")"
+
+# Hand the post to the resident notification service if it's running (see pflib.dispatch). Under
+# pf-run.sh it is sent together with the other channels' posts of the same record, so the images are
+# read once, and the service keeps to Mastodon's rate limits between posts.
+posts="$(jq -cn \
+  --arg server "$MASTODON_SERVER" \
+  --arg token "$MASTODON_ACCESS_TOKEN" \
+  --arg text "$TEXT" \
+  --arg language "$mastodon_lang" \
+  --arg visibility "$MASTODON_POST_VISIBILITY" \
+  '{mastodon: {server: $server, token: $token, text: $text, language: $language, visibility: $visibility}}')"
+if results="$(notifyd_post "$posts" "${IMAGES[@]}")" && [[ -n "$results" ]]; then
+  IFS=$'\t' read -r _ ok detail <<< "$results"
+  if [[ "$ok" == "queued" ]]; then
+    echo "queued"   # pf-run.sh sends it, together with this record's other channels
+    exit 0
+  fi
+  if [[ "$ok" == "true" ]]; then
+    echo "$detail"
+    exit 0
+  fi
+  log_print ERR "Mastodon post error (via notifyd): ${detail//http/hxttp}"
+  exit 1
+fi
+
 # send pictures to Mastodon
 for image in "${IMAGES[@]}"; do
   if [[ -z "$image" ]]; then continue; fi
@@ -106,8 +133,6 @@ for image in "${IMAGES[@]}"; do
 done
 
 # shellcheck disable=SC2086
-notif_lang="$(pf_notification_init_language)"
-mastodon_lang="$(pf_notification_mastodon_lang "$notif_lang")"
 response="$(curl --max-time 30 -H "Authorization: Bearer ${MASTODON_ACCESS_TOKEN}" -sS "${MASTODON_SERVER}/api/v1/statuses" -X POST "${media_id}" -F "status=${TEXT}" -F "language=${mastodon_lang}" -F "visibility=${MASTODON_POST_VISIBILITY}")"
 # check if there was an error
 if [[ "$(jq '.error' <<< "${response}"|xargs)" == "null" ]]; then
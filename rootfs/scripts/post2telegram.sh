@@ -100,6 +100,30 @@ fi
 TEXT="${TEXT:0:$TELEGRAM_MAX_LENGTH}"      # limit to max characters
 TEXT="${TEXT//[[:cntrl:]]/$'\n'}"            # Replace control characters with newlines
 
+# Hand the message to the resident notification service if it's running (see pflib.dispatch). Under
+# pf-run.sh it is sent together with the other channels' posts of the same record, so the images are
+# read once, and the service spaces the messages out within Telegram's rate limit.
+posts="$(jq -cn \
+  --arg api "$TELEGRAM_API" \
+  --arg token "$TELEGRAM_BOT_TOKEN" \
+  --arg chat_id "$TELEGRAM_CHAT_ID" \
+  --argjson private "$IS_PRIVATE_CHAT" \
+  --arg text "$TEXT" \
+  '{telegram: {api: $api, token: $token, chat_id: $chat_id, private: $private, text: $text}}')"
+if results="$(notifyd_post "$posts" "${IMAGES[@]}")" && [[ -n "$results" ]]; then
+  IFS=$'\t' read -r _ ok detail <<< "$results"
+  if [[ "$ok" == "queued" ]]; then
+    echo "queued"   # pf-run.sh sends it, together with this record's other channels
+    exit 0
+  fi
+  if [[ "$ok" == "true" ]]; then
+    echo "${detail:-private}"
+    exit 0
+  fi
+  log_print ERR "Error sending message to Telegram (via notifyd): ${detail//http/hxttp}"
+  exit 1
+fi
+
 # Send images to Telegram if available
 declare -a valid_images=()
 for image in "${IMAGES[@]}"; do
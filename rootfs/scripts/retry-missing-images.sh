@@ -69,6 +69,16 @@ GET_PS_PHOTO() {
 
   chk_enabled "$SHOWIMAGES" || return 0
 
+  # photos_prefetch has already looked up the ICAOs that are missing images
+  if [[ -n "${photo_link["$icao"]+x}" ]]; then
+    case "$returntype" in
+      image)     [[ -z "${photo_file["$icao"]}" ]] || printf '%s\n' "${photo_file["$icao"]}" ;;
+      link)      [[ -z "${photo_link["$icao"]}" ]] || printf '%s\n' "${photo_link["$icao"]}" ;;
+      thumblink) [[ -z "${photo_thumb["$icao"]}" ]] || printf '%s\n' "${photo_thumb["$icao"]}" ;;
+    esac
+    return 0
+  fi
+
   CACHETIME=$((3 * 24 * 3600))
 
   local dir="/usr/share/planefence/persist/planepix/cache"
@@ -143,6 +153,25 @@ is_missing_image() {
   [[ -z "${prefix:image:thumblink}" && -z "${prefix:image:link}" && -z "${prefix:image:file}" ]]
 }
 
+missing_image_icaos() {
+  # Prints the ICAOs of today's records that process_pf and process_pa will look up an image for
+  local idx
+  for (( idx=0; idx<=records[maxindex]; idx++ )); do
+    (( ${records["$idx":time:lastseen]:-0} >= TODAY_EPOCH )) 2>/dev/null || continue
+    if [[ -z "${records["$idx":image:thumblink]:-}" && -z "${records["$idx":image:link]:-}" && -z "${records["$idx":image:file]:-}" ]] || \
+       { [[ -n "${records["$idx":image:link]:-}" ]] && ! has_valid_image_ext "${records["$idx":image:link]}"; }; then
+      printf '%s\n' "${records["$idx":icao]:-}"
+    fi
+  done
+  for (( idx=0; idx<=pa_records[maxindex]; idx++ )); do
+    (( ${pa_records["$idx":time:lastseen]:-0} >= TODAY_EPOCH )) 2>/dev/null || continue
+    if [[ -z "${pa_records["$idx":image:thumblink]:-}" && -z "${pa_records["$idx":image:link]:-}" && -z "${pa_records["$idx":image:file]:-}" ]] || \
+       { [[ -n "${pa_records["$idx":image:link]:-}" ]] && ! has_valid_image_ext "${pa_records["$idx":image:link]}"; }; then
+      printf '%s\n' "${pa_records["$idx":icao]:-}"
+    fi
+  done
+}
+
 has_valid_image_ext() {
   # Returns 0 (true) if the URL ends with a known image extension (case-insensitive).
   local url="${1,,}"    # lowercase
@@ -239,6 +268,7 @@ process_pa() {
 }
 
 main() {
+  local -a icaos=()
   PF_NEW_IMAGES=0
   PA_NEW_IMAGES=0
   TODAY_EPOCH="$(date -d "$(date +%F) 00:00:00" +%s)"
@@ -247,6 +277,11 @@ main() {
 
   READ_RECORDS ignore-lock
 
+  if chk_enabled "$SHOWIMAGES"; then
+    readarray -t icaos < <(missing_image_icaos | grep -v '^$' | sort -u || true)
+    photos_prefetch "${icaos[@]}" || true
+  fi
+
   process_pf
   process_pa
 
@@ -22,13 +22,10 @@
 # If not, see https://www.gnu.org/licenses/.
 
 import os
-import csv
 from datetime import datetime
 from os.path import exists
 from random import choice
-import tzlocal
 
-from pflib import discord
 from .us_states import get_us_state_abbrev
 
 
@@ -39,6 +36,15 @@ class InvalidConfigException(Exception):
     pass
 
 
+def __getattr__(name):
+    # pflib.discord pulls in discord_webhook (and with it, requests). Only import it when it is
+    # actually used, so command-line helpers like pflib.notifyd start quickly.
+    if name == "discord":
+        import importlib
+        return importlib.import_module("pflib.discord")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def testmsg(msg):
     if os.getenv("TESTING") == "true":
         print(msg)
@@ -49,7 +55,7 @@ def init_log(system):
 
     def systemlog(msg):
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{timestamp}    ][{system}] {msg}")
+        print(f"[{timestamp}    ][{system}] {msg}", flush=True)
     log = systemlog
 
 
@@ -100,54 +106,21 @@ def load_config():
 
 def load_planefile(config):
     global planedb
+    from .planedb import PlaneDB, open_index
 
-    planedb = {}
-    with open(config['PLANEFILE']) as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            #  $ICAO,$Registration,$Operator,$Type,$ICAO Type,#CMPG,$Tag 1,$#Tag 2,$#Tag 3,Category,$#Link,#Image Link,#Image Link 2,#Image Link 3
-            # Example line:
-            #  A51316,N426NA,NASA,Lockheed P-3B Orion,P3,Gov,Sce To Aux,Airborne Science,Wallops Flight Facility,Distinctive,https://www.nasa.gov
-            # Skip header and invalid/empty lines
-            if row[0].startswith("#") or not row:
-                continue
-
-            plane = {
-                "icao": row[0],
-                "tail_num": row[1],
-                "owner": row[2],
-                "type": row[3],
-                "icao_type": row[4] if len(row) > 4 else "",
-                "authority": row[5] if len(row) > 5 else "",
-                "tag1": row[6] if len(row) > 6 else "",
-                "tag2": row[7] if len(row) > 7 else "",
-                "tag3": row[8] if len(row) > 8 else "",
-                "category": row[9] if len(row) > 9 else "" ,
-                "link": row[10] if len(row) > 10 else "",
-            }
-            if len(row) > 11:
-                plane['photos'] = [
-                    link for link in
-                    [
-                        _try_get_photo(row, 11),
-                        _try_get_photo(row, 12),
-                        _try_get_photo(row, 13)
-                    ]
-                    if link != ""
-                ]
-
-            planedb[plane["icao"]] = plane
+    # The CSV is compiled into an mmapped index (see pflib.planedb), so this is cheap to repeat;
+    # an index that is still current is simply reused.
+    if isinstance(planedb, PlaneDB) and planedb.is_current(config['PLANEFILE']):
+        return
+    if isinstance(planedb, PlaneDB):
+        planedb.close()
 
-    log(f"Loaded {len(planedb)} entries into plane-db")
+    planedb = open_index(config['PLANEFILE'])
 
-def _try_get_photo(row, index):
-    try:
-        return row[index]
-    except:
-        return ""
+    log(f"Loaded {len(planedb)} entries into plane-db")
 
 def get_plane_info(icao):
-    return planedb.get(icao, { 'icao': icao })
+    return planedb.get(icao) or { 'icao': icao }
 
 def altitude_str(config, alt):
     alt_actual = alt
@@ -180,6 +153,7 @@ def distance_unit(config):
     return "mi"
 
 def get_timezone_str():
+    import tzlocal
     return datetime.now(tzlocal.get_localzone()).strftime('%Z')
 
 def flightaware_link(icao, tail_num):
@@ -249,24 +223,15 @@ def get_screenshot_url(webhooks, subsystem):
     snapshot_path = f"/tmp/{snapshot_prefix}snapshot.png"
     testmsg(f"snapshot_path: {snapshot_path}")
     if exists(snapshot_path):
-        with open(snapshot_path, "rb") as f:
-            file_data = f.read()
-            for webhook in webhooks:
-                webhook.add_file(file=file_data, filename='snapshot.png')
+        from . import media
+        # Read once and share the same read-only buffer between all webhooks (see pflib.media)
+        file_data = media.load(snapshot_path)
+        if file_data is None:
+            log(f"[error] Snapshot {snapshot_path} is too large to attach")
+            return ""
+        for webhook in webhooks:
+            webhook.add_file(file=file_data, filename='snapshot.png')
         return "attachment://snapshot.png"
     else:
         log("[error] Snapshot file doesn't exist during Discord run")
     return ""
-
-def send(webhooks, config):
-    fails = 0
-    for webhook in webhooks:
-        try:
-            webhook.execute()
-        except Exception as e:
-            fails = fails + 1
-            log("[error] Exception during send, printing config...")
-            from pprint import pprint
-            pprint(config)
-            raise e
-    log(f"Sent {len(webhooks) - fails} Discord messages, {fails} failed")
@@ -0,0 +1,466 @@
+# Asyncio BaseStation (SBS, port 30003) collector that writes the socket30003 day files
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# A drop-in for Ted Sluis' socket30003.pl. It reads the SBS messages of readsb/dump1090 (or a
+# recorded file of them), keeps the state of every aircraft it hears in a small __slots__ object and
+# writes the same position lines, with the same filters, units and rounding, to the same
+# dump1090-<host>-YYMMDD.txt files. socket30003.cfg is read for the units, the station and the peer,
+# so the files stay exactly what pf-process_sbs.sh and pflib.sbs expect.
+#
+# What's different:
+#   - lines are written in batches (every --flush seconds, or as soon as --batch lines are waiting),
+#     and the reader stops reading the socket while a full batch is being written, so memory stays
+#     bounded no matter how far behind the disk is
+#   - the header line is only written to a new file, not every time the file is opened
+#   - the collector keeps a live view of the day in a small SQLite database next to the day files
+#     (see pflib.liveview): one row per ICAO with the last callsign, the closest distance (and when),
+#     the last position and the squawk runs, so other stages (pflib.sbs) can ask for the current state
+#     without re-reading the log
+#
+# Usage:
+#   python3 -m pflib.basestation collect [--config socket30003.cfg] [--host H] [--port P] [--replay FILE]
+#                                        [--datadir DIR] [--db FILE] [--batch N] [--flush S]
+#       --replay reads the SBS messages of FILE (the time of each message is its "generated" time) and
+#       exits at its end
+#   python3 -m pflib.basestation query [--db FILE] [--since SECONDS] [ICAO ...]
+#       writes the aircraft rows as TSV, in the column order of pflib.liveview, most recently seen first
+
+import argparse
+import asyncio
+import math
+import os
+import re
+import signal
+import sqlite3
+import sys
+import time
+
+from .liveview import VIEW_FILE, VIEW_RETENTION, LiveView, add_squawk
+
+CONFIG_FILE = "/usr/share/socket30003/socket30003.cfg"
+DATA_DIR = "/run/socket30003"
+BATCH_LINES = 500
+FLUSH_INTERVAL = 1.0
+READ_SIZE = 65536
+
+TIME_MESSAGE_MARGIN = 10    # ms between the position and altitude messages of one position
+POSITION_INTERVAL = 1000    # ms between two positions of an aircraft in the log
+RETIRE_AFTER = 120          # s an aircraft is kept after its last message
+MAX_INCOMPLETE = 10000      # incomplete messages in a row before the feed is given up on
+
+# socket30003.pl's units: distance factor per degree of arc and the digits it keeps
+DISTANCE_UNITS = {"kilometer": (111.18957696, 100), "mile": (69.09, 100), "nauticalmile": (59.997756, 100),
+                  "meter": (111189.57696, 1)}
+SPEED_UNITS = {"knotph": 1.0, "kilometerph": 1.852, "mileph": 1.150779}
+ALTITUDE_UNITS = ("feet", "meter")
+
+HEADER = ("hex_ident,altitude({altitude}),latitude,longitude,date,time,angle,distance({distance}),squawk,"
+          "ground_speed({speed}),track,callsign\n")
+
+# SBS columns
+HEX_IDENT, GENERATED_DATE, GENERATED_TIME, CALLSIGN, ALTITUDE, GROUND_SPEED, TRACK, LAT, LON, SQUAWK = \
+    4, 6, 7, 10, 11, 12, 13, 14, 15, 17
+
+_HEX = re.compile(r"[0-9A-Fa-f]+")
+_NONZERO = re.compile(r"\d*[1-9]\d*\.?\d*")
+_TRACK = re.compile(r"\d+\.?\d*")
+_DIGITS = re.compile(r"\d+")
+_ALNUM = re.compile(r"[A-Za-z0-9]")
+
+
+# --- socket30003.pl arithmetic -------------------------------------------------------------------
+
+def perl_number(value):
+    """A number the way Perl prints it: no trailing ".0" on whole numbers"""
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def angle(lat1, lon1, lat2, lon2):
+    """socket30003.pl's angle(): degrees are divided by 180 instead of converted to radians"""
+    dlon = lon2 - lon1
+    y = math.sin(dlon / 180) * math.cos(lat2 / 180)
+    x = math.cos(lat1 / 180) * math.sin(lat2 / 180) - math.sin(lat1 / 180) * math.cos(lat2 / 180) * math.cos(dlon / 180)
+    return int(math.atan2(y, x) * 57.2957795 * 100) / 100
+
+
+def distance(lat1, lon1, lat2, lon2, unit):
+    """socket30003.pl's distance(): great circle degrees, converted to unit and truncated"""
+    theta = math.radians(lon1 - lon2)
+    cos_d = (math.sin(math.radians(lat1)) * math.sin(math.radians(lat2))
+             + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.cos(theta))
+    degrees = math.degrees(math.acos(max(-1.0, min(1.0, cos_d))))
+    factor, scale = DISTANCE_UNITS[unit]
+    return int(degrees * factor * scale) / scale if scale > 1 else int(degrees * factor)
+
+
+def _or_empty(value):
+    """Perl's ($value || ""): undef, "" and "0" print as nothing"""
+    return "" if value is None or value == "" or value == "0" or value == 0 else str(value)
+
+
+# --- configuration -------------------------------------------------------------------------------
+
+def read_config(path=CONFIG_FILE):
+    """The [common] settings of socket30003.cfg overridden by the non-empty [socket30003] ones"""
+    sections = {}
+    section = None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line.startswith("[") and line.endswith("]"):
+                    section = sections.setdefault(line[1:-1].strip(), {})
+                elif "=" in line and section is not None:
+                    key, _, value = line.partition("=")
+                    if value.strip():
+                        section[key.strip()] = value.strip()
+    except OSError:
+        pass
+    config = dict(sections.get("common", {}))
+    config.update(sections.get("socket30003", {}))
+    return config
+
+
+def hostalias(host):
+    """socket30003.pl's file name part for the peer: dots become underscores in IPv4 addresses"""
+    return host.replace(".", "_") if re.fullmatch(r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}", host) else host
+
+
+# --- state ---------------------------------------------------------------------------------------
+
+class Aircraft:
+    """What socket30003.pl keeps in %flight for one hex_ident, plus the live view summary"""
+    __slots__ = ("icao", "first_seen", "last_seen", "messages", "positions", "callsign", "lat", "lon",
+                 "altitude", "lat_time", "lon_time", "altitude_time", "squawk", "squawk_unfiltered", "track",
+                 "speed", "prev_lat", "prev_lon", "prev_altitude", "prev_lat_time", "prev_lon_time",
+                 "prev_altitude_time", "logged", "min_distance", "min_distance_time", "squawks")
+
+    def __init__(self, icao, now):
+        self.icao = icao
+        self.first_seen = self.last_seen = now
+        self.messages = self.positions = self.logged = 0
+        self.callsign = self.squawk = self.squawk_unfiltered = self.track = self.speed = None
+        self.lat = self.lon = self.altitude = None
+        self.lat_time = self.lon_time = self.altitude_time = None
+        self.prev_lat = self.prev_lon = self.prev_altitude = None
+        self.prev_lat_time = self.prev_lon_time = self.prev_altitude_time = None
+        self.min_distance = self.min_distance_time = None
+        self.squawks = []
+
+
+class Collector:
+    """Turns SBS messages into socket30003 lines and keeps the live view"""
+
+    def __init__(self, datadir=DATA_DIR, host="127.0.0.1", station=(0.0, 0.0), distanceunit="kilometer",
+                 altitudeunit="meter", speedunit="kilometerph", margin=TIME_MESSAGE_MARGIN, view=None,
+                 batch=BATCH_LINES):
+        self.datadir = datadir
+        self.alias = hostalias(host)
+        self.lat, self.lon = station
+        self.distanceunit, self.altitudeunit, self.speedunit = distanceunit, altitudeunit, speedunit
+        self.speed_factor = SPEED_UNITS[speedunit]
+        self.margin = margin
+        self.view = view
+        self.batch = batch
+        self.flights = {}
+        self.dirty = set()
+        self.pending = []
+        self.path = None
+        self.fd = None
+        self.minute = None
+        self.incomplete = 0
+        self.counters = {"messages": 0, "incomplete": 0, "positions": 0, "lines": 0, "flushes": 0}
+
+    def close(self):
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _open(self, path):
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.path = path
+        if os.fstat(self.fd).st_size == 0:
+            os.write(self.fd, HEADER.format(altitude=self.altitudeunit, distance=self.distanceunit,
+                                            speed=self.speedunit).encode("ascii"))
+
+    def flush(self):
+        """Write the waiting lines and update the live view of the aircraft they belong to"""
+        if self.pending:
+            data = "".join(self.pending).encode("utf-8", errors="replace")
+            self.pending = []
+            while data:
+                data = data[os.write(self.fd, data):]
+            self.counters["flushes"] += 1
+        if self.dirty and self.view is not None:
+            self.view.save(self.flights[icao] for icao in self.dirty if icao in self.flights)
+        self.dirty.clear()
+
+    def retire(self, now):
+        """Forget the aircraft that weren't heard for RETIRE_AFTER seconds (once a minute)"""
+        for icao in [icao for icao, ac in self.flights.items() if ac.last_seen + RETIRE_AFTER < now]:
+            del self.flights[icao]
+            self.dirty.discard(icao)
+        if self.view is not None:
+            self.view.prune(now - VIEW_RETENTION)
+
+    def message(self, line, now):
+        """Handle one SBS message received at now (epoch seconds). Returns False when the feed looks broken"""
+        self.counters["messages"] += 1
+        col = line.rstrip(",").split(",")     # Perl's split drops the trailing empty fields
+        icao = col[HEX_IDENT] if len(col) > 20 else ""
+        if not icao or not _HEX.fullmatch(icao):
+            self.counters["incomplete"] += 1
+            self.incomplete += 1
+            return self.incomplete <= MAX_INCOMPLETE
+        self.incomplete = 0
+
+        ac = self.flights.get(icao)
+        if ac is None:
+            ac = self.flights[icao] = Aircraft(icao, now)
+            if self.view is not None:
+                self.view.restore(ac)
+        ac.last_seen = now
+        ac.messages += 1
+
+        local = time.localtime(now)
+        path = os.path.join(self.datadir, time.strftime(f"dump1090-{self.alias}-%y%m%d.txt", local))
+        if path != self.path:
+            self._open(path)
+        if local.tm_min != self.minute:
+            if self.minute is not None:
+                self.retire(now)
+            self.minute = local.tm_min
+        logged = int(now * 1000)
+
+        callsign = col[CALLSIGN]
+        if _ALNUM.search(callsign):
+            ac.callsign = callsign
+        if "." in col[LON]:
+            ac.lon, ac.lon_time = col[LON], logged
+        if "." in col[LAT]:
+            ac.lat, ac.lat_time = col[LAT], logged
+        if _NONZERO.fullmatch(col[ALTITUDE]):
+            altitude = float(col[ALTITUDE])
+            ac.altitude = int(altitude / 3.2828) if self.altitudeunit == "meter" else int(altitude)
+            ac.altitude_time = logged
+        squawk = col[SQUAWK] if len(col) > SQUAWK else ""
+        if _DIGITS.fullmatch(squawk):
+            # a squawk only counts once two messages in a row agree on it
+            if ac.squawk_unfiltered is not None and int(ac.squawk_unfiltered) == int(squawk):
+                ac.squawk = squawk
+                add_squawk(ac.squawks, squawk, now)
+            ac.squawk_unfiltered = squawk
+        if _TRACK.fullmatch(col[TRACK]):
+            ac.track = col[TRACK]
+        if _NONZERO.fullmatch(col[GROUND_SPEED]):
+            ac.speed = int(float(col[GROUND_SPEED]) * self.speed_factor)
+        self.dirty.add(icao)
+
+        if ac.lon is None or ac.lat is None or ac.altitude is None:
+            return True
+        if (abs(ac.lon_time - ac.lat_time) >= self.margin or abs(ac.lon_time - ac.altitude_time) >= self.margin
+                or abs(ac.lat_time - ac.altitude_time) >= self.margin):
+            return True
+        # Like socket30003.pl, skip a position that is the same as the last one written, or was put together
+        # from the same messages. The Perl logger keeps the latitude under 'Prev_lat' (capital P) but sets
+        # and tests that same key, so these skips are in effect there too: an aircraft that doesn't move
+        # (a hovering helicopter, or one parked on the ground) gets no new lines from either logger.
+        if ac.lon == ac.prev_lon and ac.lat == ac.prev_lat and ac.altitude == ac.prev_altitude:
+            return True
+        if (ac.prev_lon_time is not None and ac.lon_time == ac.prev_lon_time and ac.lat_time == ac.prev_lat_time
+                and ac.altitude_time == ac.prev_altitude_time):
+            return True
+        ac.positions += 1
+        self.counters["positions"] += 1
+        if ac.prev_lon_time is not None and abs(ac.lon_time - ac.prev_lon_time) < POSITION_INTERVAL:
+            return True
+
+        lat, lon = float(ac.lat), float(ac.lon)
+        dist = distance(self.lat, self.lon, lat, lon, self.distanceunit)
+        self.pending.append(
+            f"{icao},{ac.altitude},{ac.lat},{ac.lon},{time.strftime('%Y/%m/%d,%H:%M:%S', local)}.{logged % 1000:03d},"
+            f"{perl_number(angle(self.lat, self.lon, lat, lon))},{perl_number(dist)},{_or_empty(ac.squawk)},"
+            f"{_or_empty(ac.speed)},{_or_empty(ac.track)},{_or_empty(ac.callsign)}\n")
+        self.counters["lines"] += 1
+        ac.logged += 1
+        if ac.min_distance is None or dist < ac.min_distance:
+            ac.min_distance, ac.min_distance_time = dist, now
+        ac.prev_lon, ac.prev_lat, ac.prev_altitude = ac.lon, ac.lat, ac.altitude
+        ac.prev_lon_time, ac.prev_lat_time, ac.prev_altitude_time = ac.lon_time, ac.lat_time, ac.altitude_time
+        if len(self.pending) >= self.batch:
+            self.flush()
+        return True
+
+
+# --- input ---------------------------------------------------------------------------------------
+
+async def _lines(read):
+    """The lines of what read() returns, until it returns nothing"""
+    rest = b""
+    while True:
+        chunk = await read()
+        if not chunk:
+            return
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for raw in lines:
+            yield raw.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+class _GeneratedTime:
+    """The "generated" date and time of a message as epoch seconds (the last second is remembered)"""
+
+    def __init__(self):
+        self.second, self.epoch = None, None
+
+    def __call__(self, line, fallback):
+        col = line.split(",", 8)
+        try:
+            stamp, _, fraction = col[GENERATED_TIME].partition(".")
+            second = col[GENERATED_DATE] + " " + stamp
+            if second != self.second:
+                self.epoch = time.mktime(time.strptime(second, "%Y/%m/%d %H:%M:%S"))
+                self.second = second
+            return self.epoch + (int(fraction[:3].ljust(3, "0")) / 1000 if fraction.isdigit() else 0)
+        except (IndexError, ValueError, OverflowError):
+            return fallback
+
+
+async def _flusher(collector, interval):
+    while True:
+        await asyncio.sleep(interval)
+        collector.flush()
+
+
+async def collect(collector, host=None, port=30003, replay=None, interval=FLUSH_INTERVAL):
+    """Feed collector from host:port (reconnecting when the feed drops) or from a replay file"""
+    flusher = asyncio.create_task(_flusher(collector, interval))
+    try:
+        if replay:
+            with open(replay, "rb") as f:
+                async def read():
+                    await asyncio.sleep(0)      # let the flusher in between chunks
+                    return f.read(READ_SIZE)
+                now, generated = time.time(), _GeneratedTime()
+                async for line in _lines(read):
+                    now = generated(line, now)
+                    if not collector.message(line, now):
+                        print("Too many incomplete messages in a row in the replay file", file=sys.stderr)
+                        return 1
+            return 0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as e:
+                print(f"Unable to connect to {host}:{port}: {e}", file=sys.stderr)
+                return 1
+            try:
+                async for line in _lines(lambda: reader.read(READ_SIZE)):
+                    if not collector.message(line, time.time()):
+                        print(f"Not able to read proper data from {host}:{port}. Is readsb/dump1090 producing "
+                              "SBS data there?", file=sys.stderr)
+                        return 1
+            except OSError as e:
+                print(f"Lost the connection to {host}:{port}: {e}", file=sys.stderr)
+            finally:
+                writer.close()
+    finally:
+        flusher.cancel()
+        collector.close()
+
+
+def _run(collector, host, port, replay, interval):
+    async def main():
+        task = asyncio.create_task(collect(collector, host, port, replay, interval))
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return 0
+    return asyncio.run(main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect BaseStation (SBS) messages into socket30003 day files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    collect_cmd = sub.add_parser("collect", help="read port 30003 (or a replay file) and write the day files")
+    collect_cmd.add_argument("--config", default=CONFIG_FILE, help="socket30003.cfg to take the defaults from")
+    collect_cmd.add_argument("--host", help="SBS host (default: PEER_HOST)")
+    collect_cmd.add_argument("--port", type=int, help="SBS port (default: PEER_PORT)")
+    collect_cmd.add_argument("--replay", help="read the SBS messages from this file instead")
+    collect_cmd.add_argument("--datadir", help=f"directory of the day files (default: {DATA_DIR})")
+    collect_cmd.add_argument("--db", help=f"live view database (default: <datadir>/{VIEW_FILE}); 'none' to skip it")
+    collect_cmd.add_argument("--lat", type=float)
+    collect_cmd.add_argument("--lon", type=float)
+    collect_cmd.add_argument("--distanceunit", choices=sorted(DISTANCE_UNITS))
+    collect_cmd.add_argument("--altitudeunit", choices=ALTITUDE_UNITS)
+    collect_cmd.add_argument("--speedunit", choices=sorted(SPEED_UNITS))
+    collect_cmd.add_argument("--batch", type=int, default=BATCH_LINES, help="write as soon as this many lines wait")
+    collect_cmd.add_argument("--flush", type=float, default=FLUSH_INTERVAL, help="seconds between writes")
+    collect_cmd.add_argument("--stats", action="store_true", help="print the counters when done")
+    query_cmd = sub.add_parser("query", help="print the live view as TSV")
+    query_cmd.add_argument("--db", default=os.path.join(DATA_DIR, VIEW_FILE))
+    query_cmd.add_argument("--since", type=float, help="only aircraft seen in the last SECONDS")
+    query_cmd.add_argument("icao", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        try:
+            view = LiveView(args.db, readonly=True)
+            since = time.time() - args.since if args.since is not None else None
+            for row in view.rows(since, [icao.upper() for icao in args.icao]):
+                sys.stdout.write("\t".join("" if value is None else str(value) for value in row) + "\n")
+            view.close()
+        except sqlite3.Error as e:
+            print(f"Unable to read the live view {args.db}: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    config = read_config(args.config)
+    datadir = args.datadir or config.get("datadirectory", DATA_DIR)
+    try:
+        station = (args.lat if args.lat is not None else float(config.get("latitude", "").replace(",", ".")),
+                   args.lon if args.lon is not None else float(config.get("longitude", "").replace(",", ".")))
+    except ValueError:
+        print("The antenna latitude and longitude are not set", file=sys.stderr)
+        return 1
+    units = (args.distanceunit or config.get("distanceunit", "kilometer").lower(),
+             args.altitudeunit or config.get("altitudeunit", "meter").lower(),
+             args.speedunit or config.get("speedunit", "kilometerph").lower())
+    if units[0] not in DISTANCE_UNITS or units[1] not in ALTITUDE_UNITS or units[2] not in SPEED_UNITS:
+        print(f"Invalid units in {args.config}: {', '.join(units)}", file=sys.stderr)
+        return 1
+    host = args.host or config.get("PEER_HOST", "127.0.0.1")
+    port = args.port or int(config.get("PEER_PORT", 30003))
+    margin = int(config.get("TIME_MESSAGE_MARGIN", TIME_MESSAGE_MARGIN))
+
+    os.makedirs(datadir, exist_ok=True)
+    view = None
+    if args.db != "none":
+        try:
+            view = LiveView(args.db or os.path.join(datadir, VIEW_FILE))
+        except sqlite3.Error as e:
+            print(f"Unable to open the live view, continuing without it: {e}", file=sys.stderr)
+    collector = Collector(datadir, host, station, *units, margin=margin, view=view, batch=max(args.batch, 1))
+    try:
+        result = _run(collector, host, port, args.replay, max(args.flush, 0.05))
+    finally:
+        if view is not None:
+            view.close()
+    if args.stats:
+        print(" ".join(f"{key}={value}" for key, value in collector.counters.items()), file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+# Performance benchmarks for Planefence and Plane-Alert
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# pflib.bench.traffic    writes deterministic socket30003 traffic and matching database fixtures
+# pflib.bench.standins   local stand-ins for the route API, Discord webhooks and an MQTT broker
+# pflib.bench.run        runs the benchmark stages and reports wall time, peak RSS and forks as JSON
+#
+# Usage:
+#   python3 -m pflib.bench.run --aircraft 400 --minutes 60 --output results.json
@@ -0,0 +1,339 @@
+# Run the Planefence / Plane-Alert benchmark stages and report what they cost
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The runner writes the synthetic traffic and fixtures (pflib.bench.traffic) to a work directory,
+# starts the stand-ins (pflib.bench.standins), and then runs every stage as a subprocess, --repeat
+# times. For each stage it reports:
+#   wall_s     wall clock time (min, median, max over the repeats)
+#   cpu_s      user + system CPU time of the stage and everything it waited for
+#   max_rss_kb the peak resident set size of the largest process of the stage (never below the resident
+#              size of the runner itself)
+#   forks      processes and threads created while the stage ran. This is the "processes" counter of
+#              /proc/stat, so it counts the whole system: run it on a quiet machine (or container).
+# A stage is a dict:
+#   {"name": ..., "cmd": [...], "stdin": file, "clean": [paths], "requires": ["path:P", "cmd:C", "module:M"]}
+# with str.format placeholders ({work}, {traffic}, {sbs}, {lat}, {lon}, {date}, {yesterday}, {planefile},
+# {opensky}, {icaos}, {routes}, {route_requests}, {mqtt_batch}, {route_url}, {photo_url}, {snapshot_url},
+# {channel_url}, {discord_url}, {mqtt_host}, {mqtt_port}, {planefence_dir}, {mqtt_cmd}, {python}). Stages whose
+# requirements are missing are skipped.
+# The stages that only make sense inside the container (pf-process_sbs.sh, stream.sh) run with --container.
+#
+# Usage:
+#   python3 -m pflib.bench.run [--aircraft 400] [--minutes 60] [--seed 1] [--repeat 3] [--workdir DIR]
+#                              [--stages a,b] [--suite stages.json] [--container] [--output results.json]
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date as Date, timedelta
+
+from pflib.bench import standins
+
+PLANEFENCE_DIR = "/usr/share/planefence"
+MQTT_CMD = "/usr/local/bin/mqtt"
+SNAPSHOT_DELAY = 0.05   # seconds the screenshot stand-in takes per screenshot
+
+STAGES = [
+    {"name": "sbs_collect",
+     "cmd": ["{python}", "-m", "pflib.sbs", "collect", "--today", "{traffic}", "--today-date", "{date}",
+             "--yesterday-date", "{yesterday}", "--outdir", "{work}/sbs", "--state", "{work}/sbs.state",
+             "--index", "{work}/sbs.index", "--planefence", "--dist", "10", "--maxalt", "10000", "--planealert",
+             "--pa-file", "{planefile}", "--squawks", "7500,7600,7700"],
+     "clean": ["{work}/sbs", "{work}/sbs.state", "{work}/sbs.index"]},
+    {"name": "basestation",
+     "cmd": ["{python}", "-m", "pflib.basestation", "collect", "--config", "/dev/null", "--replay", "{sbs}",
+             "--datadir", "{work}/basestation", "--lat", "{lat}", "--lon", "{lon}", "--distanceunit", "nauticalmile",
+             "--altitudeunit", "feet", "--speedunit", "kilometerph"],
+     "clean": ["{work}/basestation"]},
+    {"name": "planedb_build",
+     "cmd": ["{python}", "-m", "pflib.planedb", "build", "{planefile}", "{work}/plane-alert-db.idx"],
+     "clean": ["{work}/plane-alert-db.idx"]},
+    {"name": "lookup_build",
+     "cmd": ["{python}", "-m", "pflib.lookup", "build", "{opensky}"],
+     "clean": ["{opensky}.idx"]},
+    {"name": "icao_to_n",
+     "cmd": ["{python}", "{planefence_dir}/icao2tail.py", "--batch", "{icaos}"],
+     "requires": ["path:{planefence_dir}/icao2tail.py"]},
+    {"name": "routes",
+     "cmd": ["{python}", "-m", "pflib.routes", "resolve", "--api-url", "{route_url}", "--cache", "{work}/routes.sqlite"],
+     "stdin": "{route_requests}",
+     "clean": ["{work}/routes.sqlite"]},
+    {"name": "photos",
+     "cmd": ["{python}", "-m", "pflib.photos", "download", "--api-url", "{photo_url}", "--cache", "{work}/photos.sqlite",
+             "--image-dir", "{work}/planepix", "--pa-file", "{planefile}", "--rate", "1000"],
+     "stdin": "{icaos}",
+     "clean": ["{work}/photos.sqlite", "{work}/planepix"],
+     "requires": ["module:requests"]},
+    {"name": "screenshots",
+     "cmd": ["{python}", "-m", "pflib.screenshots", "run", "--url", "{snapshot_url}", "--queue", "{work}/screenshots.sqlite",
+             "--cache-dir", "{work}/screenshots", "--workers", "4", "--max-jobs", "1000"],
+     "stdin": "{icaos}",
+     "clean": ["{work}/screenshots.sqlite", "{work}/screenshots"]},
+    {"name": "channels",
+     "cmd": ["{python}", "-m", "pflib.bench.run", "--post-channels", "{channel_url}", "--workdir", "{work}",
+             "--messages", "3"],
+     "clean": ["{work}/bluesky-sessions.json"],
+     "requires": ["module:requests"]},
+    {"name": "discord",
+     "cmd": ["{python}", "-m", "pflib.bench.run", "--post-webhooks", "{discord_url}", "--webhooks", "3",
+             "--messages", "8"],
+     "requires": ["module:requests"]},
+    {"name": "mqtt",
+     "cmd": ["{mqtt_cmd}", "--broker", "{mqtt_host}", "--port", "{mqtt_port}", "--topic", "bench/planefence",
+             "--qos", "1", "--batch"],
+     "stdin": "{mqtt_batch}",
+     "requires": ["cmd:{mqtt_cmd}"]},
+]
+
+CONTAINER_STAGES = [
+    {"name": "pf_process_sbs",
+     "cmd": ["bash", "{planefence_dir}/pf-process_sbs.sh"],
+     "requires": ["path:{planefence_dir}/pf-process_sbs.sh", "path:/scripts/pf-common"]},
+    {"name": "stream_all",
+     "cmd": ["bash", "{planefence_dir}/stream.sh", "mode=planefence", "date=all"],
+     "requires": ["path:{planefence_dir}/stream.sh", "path:/scripts/pf-common"]},
+]
+
+
+def process_count():
+    """The number of processes created since boot, or None if /proc/stat can't tell"""
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("processes "):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def missing(stage, values):
+    """The first requirement of stage that isn't met, or None"""
+    for requirement in stage.get("requires", []):
+        kind, _, what = requirement.partition(":")
+        what = what.format(**values)
+        if kind == "path" and not os.path.exists(what):
+            return requirement.format(**values)
+        if kind == "cmd" and not shutil.which(what):
+            return requirement.format(**values)
+        if kind == "module" and importlib.util.find_spec(what) is None:
+            return requirement
+    return None
+
+
+def reset_peak_rss():
+    """
+    Linux hands the peak RSS of the process that spawns a stage down to the stage (exec keeps the
+    high water mark of the memory it replaces), so bring the runner's own peak down to what it uses now
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _clean(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_once(stage, values, logdir, env):
+    """Run stage once; returns (measurement dict, returncode)"""
+    for path in stage.get("clean", []):
+        _clean(path.format(**values))
+    cmd = [arg.format(**values) for arg in stage["cmd"]]
+    stdin = stage["stdin"].format(**values) if stage.get("stdin") else os.devnull
+    actions = [(os.POSIX_SPAWN_OPEN, 0, stdin, os.O_RDONLY, 0),
+               (os.POSIX_SPAWN_OPEN, 1, os.path.join(logdir, f"{stage['name']}.out"),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644),
+               (os.POSIX_SPAWN_OPEN, 2, os.path.join(logdir, f"{stage['name']}.err"),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)]
+    reset_peak_rss()
+    forks = process_count()
+    start = time.perf_counter()
+    pid = os.posix_spawnp(cmd[0], cmd, env, file_actions=actions)
+    _, status, usage = os.wait4(pid, 0)
+    wall = time.perf_counter() - start
+    after = process_count()
+    return {"wall_s": wall, "cpu_s": usage.ru_utime + usage.ru_stime, "max_rss_kb": usage.ru_maxrss,
+            "forks": after - forks if forks is not None and after is not None else None}, \
+        os.waitstatus_to_exitcode(status)
+
+
+def _spread(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"min": round(min(values), 4), "median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+
+
+def run_stage(stage, values, logdir, env, repeat):
+    reason = missing(stage, values)
+    if reason:
+        return {"skipped": f"missing {reason}"}
+    runs = []
+    for _ in range(repeat):
+        measurement, returncode = run_once(stage, values, logdir, env)
+        if returncode:
+            return {"ok": False, "returncode": returncode, "log": os.path.join(logdir, f"{stage['name']}.err")}
+        runs.append(measurement)
+    return {"ok": True, "runs": len(runs),
+            **{key: _spread([run[key] for run in runs]) for key in ("wall_s", "cpu_s", "max_rss_kb", "forks")}}
+
+
+def install_traffic(manifest):
+    """Put the traffic where pf-process_sbs.sh looks for it (container stages only)"""
+    os.makedirs("/run/socket30003", exist_ok=True)
+    shutil.copy(manifest["traffic"], os.path.join("/run/socket30003", os.path.basename(manifest["traffic"])))
+
+
+def photo_icaos(path):
+    """Every other ICAO of the traffic has a photo on the planespotters stand-in"""
+    return set(sorted(standins.planespotters.read_icaos_file(path))[::2])
+
+
+def post_webhooks(url, webhooks, messages):
+    """Post messages to each of webhooks stand-in webhooks the way the notifiers do"""
+    from pflib import webhooks as discord_webhooks
+
+    urls = [f"{url}/{1000 + n}/token{n}" for n in range(webhooks)]
+    failed = 0
+    for n in range(messages):
+        payload = {"username": "Planefence", "content": f"Benchmark message {n}",
+                   "embeds": [{"title": f"Aircraft {n}", "description": "Synthetic benchmark traffic"}]}
+        failed += sum(not result["ok"] for result in discord_webhooks.post_all(urls, payload))
+    print(f"{webhooks * messages - failed} posted, {failed} failed")
+    return 1 if failed else 0
+
+
+def post_channels(url, messages, workdir):
+    """Post messages with two images to the Bluesky, Mastodon and Telegram stand-ins the way pf-run.sh does"""
+    from pflib import dispatch
+
+    dispatch.SESSION_FILE = os.path.join(workdir, "bluesky-sessions.json")
+    failed = 0
+    for n in range(messages):
+        text = f"Benchmark message {n}\nSynthetic benchmark traffic"
+        posts = {"bluesky": {"api": f"{url}/xrpc", "handle": "bench.bsky.social", "password": "bench",
+                             "record": {"text": text}},
+                 "mastodon": {"server": url, "token": "bench", "text": text},
+                 "telegram": {"api": f"{url}/bot", "token": "bench", "chat_id": "-1001000", "text": text}}
+        results = dispatch.dispatch(posts, [f"{url}/image/photo{n}", f"{url}/image/screenshot{n}"])
+        failed += sum(not result["ok"] for result in results)
+    print(f"{3 * messages - failed} posted, {failed} failed")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Planefence / Plane-Alert stages")
+    parser.add_argument("--aircraft", type=int, default=400)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", help="keep the fixtures and logs here (default: a temporary directory)")
+    parser.add_argument("--stages", help="comma separated names of the stages to run (default: all)")
+    parser.add_argument("--suite", help="JSON file with a list of stages to run instead of the built-in ones")
+    parser.add_argument("--container", action="store_true",
+                        help="also run pf-process_sbs.sh and stream.sh; copies the traffic to /run/socket30003")
+    parser.add_argument("--planefence-dir", default=PLANEFENCE_DIR)
+    parser.add_argument("--mqtt-cmd", default=MQTT_CMD)
+    parser.add_argument("--output", help="write the results here instead of stdout")
+    parser.add_argument("--post-webhooks", metavar="URL", help=argparse.SUPPRESS)
+    parser.add_argument("--post-channels", metavar="URL", help=argparse.SUPPRESS)
+    parser.add_argument("--webhooks", type=int, default=3, help=argparse.SUPPRESS)
+    parser.add_argument("--messages", type=int, default=8, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.post_webhooks:
+        return post_webhooks(args.post_webhooks, args.webhooks, args.messages)
+    if args.post_channels:
+        return post_channels(args.post_channels, args.messages, args.workdir or tempfile.gettempdir())
+
+    if args.suite:
+        with open(args.suite, encoding="utf-8") as f:
+            stages = json.load(f)
+    else:
+        stages = STAGES + (CONTAINER_STAGES if args.container else [])
+    if args.stages:
+        wanted = set(args.stages.split(","))
+        stages = [stage for stage in stages if stage["name"] in wanted]
+
+    work = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="pf-bench-"))
+    logdir = os.path.join(work, "logs")
+    os.makedirs(logdir, exist_ok=True)
+
+    # the stages import pflib from wherever this copy of it lives
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+
+    # generate in a child process, so the fixtures never inflate the runner (see reset_peak_rss)
+    today = Date.today()
+    started = time.perf_counter()
+    generated = subprocess.run([sys.executable, "-m", "pflib.bench.traffic", "--out", work,
+                                "--aircraft", str(args.aircraft), "--minutes", str(args.minutes),
+                                "--seed", str(args.seed), "--date", today.strftime("%y%m%d")],
+                               stdout=subprocess.PIPE, env=env, check=True)
+    manifest = json.loads(generated.stdout)
+    generate_s = time.perf_counter() - started
+    if args.container:
+        install_traffic(manifest)
+
+    discord = standins.DiscordStandIn().start()
+    broker = standins.MqttBroker().start()
+    values = {"work": work, "traffic": manifest["traffic"], "sbs": manifest["sbs"], "date": manifest["date"],
+              "lat": manifest["station"][0], "lon": manifest["station"][1],
+              "yesterday": (today - timedelta(days=1)).strftime("%y%m%d"),
+              "planefile": os.path.join(work, "plane-alert-db.txt"), "opensky": os.path.join(work, "OpenSkyDB.csv"),
+              "icaos": os.path.join(work, "icaos.txt"), "routes": os.path.join(work, "routes.csv"),
+              "route_requests": os.path.join(work, "route-requests.tsv"),
+              "mqtt_batch": os.path.join(work, "mqtt-batch.ndjson"),
+              "route_url": standins.start_routes(standins.routeset.read_routes_file(os.path.join(work, "routes.csv"))),
+              "photo_url": standins.start_photos(photo_icaos(os.path.join(work, "icaos.txt"))),
+              "snapshot_url": standins.start_snapshots(SNAPSHOT_DELAY),
+              "channel_url": standins.start_channels(),
+              "discord_url": discord.url, "mqtt_host": broker.host, "mqtt_port": broker.port,
+              "planefence_dir": args.planefence_dir, "mqtt_cmd": args.mqtt_cmd, "python": sys.executable}
+
+    results = {}
+    try:
+        for stage in stages:
+            print(f"Running {stage['name']}...", file=sys.stderr)
+            results[stage["name"]] = run_stage(stage, values, logdir, env, max(args.repeat, 1))
+    finally:
+        discord.shutdown()
+        broker.shutdown()
+
+    report = {"host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+              "workload": dict(manifest, generate_s=round(generate_s, 4)), "repeat": max(args.repeat, 1),
+              "workdir": work, "stages": results,
+              "standins": {"discord": discord.counters, "mqtt": broker.counters}}
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 1 if any(result.get("ok") is False for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+# Local stand-ins for the network services Planefence and Plane-Alert talk to
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# So the benchmarks never depend on (or load) adsb.im, Discord or a real broker:
+#   routes    the adsb.im routeset API, answered from a routes.csv (pflib.routes' own stand-in)
+#   photos    the planespotters photo API and thumbnails, for a set of ICAOs (pflib.photos' own stand-in)
+#   snapshots the screenshot container, rendering a small PNG per ICAO (pflib.screenshots' own stand-in)
+#   channels  the Bluesky, Mastodon and Telegram APIs the notifiers post to (pflib.dispatch's own stand-in)
+#   discord   webhooks that answer ?wait=true posts with a message id and enforce Discord's
+#             5 messages per 2 seconds per webhook with X-RateLimit-* headers and 429s
+#   mqtt      a minimal MQTT 3.1.1 broker: CONNECT, PUBLISH at QoS 0/1/2, SUBSCRIBE, UNSUBSCRIBE,
+#             PINGREQ and DISCONNECT, forwarding publishes to subscribers at QoS 0
+# All of them listen on 127.0.0.1 and count what they received.
+#
+# Usage:
+#   python3 -m pflib.bench.standins [--routes routes.csv] [--photos icaos.txt] [--snapshot-delay S]
+#                                   [--channels-port 0] [--discord-port 0] [--mqtt-port 0]
+#       prints the URLs as JSON, serves until interrupted, then prints the counters
+
+import argparse
+import json
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pflib import dispatch as channels
+from pflib import photos as planespotters
+from pflib import routes as routeset
+from pflib import screenshots as snapshots
+
+WEBHOOK_LIMIT = 5
+WEBHOOK_PERIOD = 2.0
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(server):
+    thread = threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True)
+    thread.start()
+    return server
+
+
+def _wait_for(port):
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+
+def start_routes(routes, port=0, delay=0.0):
+    """Serve routes ({callsign: (route, plausible)}) with pflib.routes.serve; returns the API URL"""
+    port = port or free_port()
+    threading.Thread(target=routeset.serve, args=(port, routes, routeset.BATCH_SIZE, delay), name="routeset",
+                     daemon=True).start()
+    _wait_for(port)
+    return f"http://127.0.0.1:{port}/api/0/routeset"
+
+
+def start_photos(icaos, port=0):
+    """Serve photos of icaos (a set) with pflib.photos.serve; returns the API URL the ICAO is appended to"""
+    port = port or free_port()
+    threading.Thread(target=planespotters.serve, args=(port, icaos), name="planespotters", daemon=True).start()
+    _wait_for(port)
+    return f"http://127.0.0.1:{port}/pub/photos/hex/"
+
+
+def start_snapshots(delay=0.0, port=0, fail=()):
+    """Serve screenshots that take delay seconds (and fail for the ICAOs in fail) with pflib.screenshots.serve;
+    returns the base URL"""
+    port = port or free_port()
+    threading.Thread(target=snapshots.serve, args=(port, delay, set(fail)), name="snapshots", daemon=True).start()
+    _wait_for(port)
+    return f"http://127.0.0.1:{port}"
+
+
+def start_channels(port=0):
+    """Serve the Bluesky, Mastodon and Telegram APIs with pflib.dispatch.serve; returns the base URL"""
+    port = port or free_port()
+    threading.Thread(target=channels.serve, args=(port,), name="channels", daemon=True).start()
+    _wait_for(port)
+    return f"http://127.0.0.1:{port}"
+
+
+# --- Discord webhooks -----------------------------------------------------------------------------
+
+class DiscordStandIn(ThreadingHTTPServer):
+    """Discord webhooks at http://127.0.0.1:<port>/api/webhooks/<id>/<token>"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, limit=WEBHOOK_LIMIT, period=WEBHOOK_PERIOD):
+        super().__init__(("127.0.0.1", port), _WebhookHandler)
+        self.limit, self.period = limit, period
+        self.lock = threading.Lock()
+        self.windows = {}       # webhook path: (window start, posts in window)
+        self.counters = {"posts": 0, "rate_limited": 0, "bytes": 0}
+        self.next_id = 1
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/api/webhooks"
+
+    def start(self):
+        return _start(self)
+
+    def take(self, path):
+        """(allowed, remaining, reset after) for one post to path"""
+        with self.lock:
+            now = time.monotonic()
+            start, used = self.windows.get(path, (now, 0))
+            if now - start >= self.period:
+                start, used = now, 0
+            reset_after = self.period - (now - start)
+            if used >= self.limit:
+                self.counters["rate_limited"] += 1
+                return False, 0, reset_after
+            self.windows[path] = (start, used + 1)
+            self.counters["posts"] += 1
+            return True, self.limit - used - 1, reset_after
+
+    def message_id(self):
+        with self.lock:
+            self.next_id += 1
+            return str(1000000000000000000 + self.next_id)
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?", 1)[0]
+        if not path.startswith("/api/webhooks/"):
+            self.send_error(404)
+            return
+        self.server.counters["bytes"] += len(body)
+        allowed, remaining, reset_after = self.server.take(path)
+        if allowed:
+            status = 200 if "wait=true" in self.path else 204
+            answer = {"id": self.server.message_id(), "channel_id": "100000000000000001"} if status == 200 else None
+        else:
+            status = 429
+            answer = {"message": "You are being rate limited.", "retry_after": round(reset_after, 3), "global": False}
+        data = json.dumps(answer).encode("utf-8") if answer else b""
+        self.send_response(status)
+        self.send_header("X-RateLimit-Limit", str(self.server.limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset-After", f"{reset_after:.3f}")
+        self.send_header("X-RateLimit-Bucket", path.rsplit("/", 1)[-1][:16])
+        if status == 429:
+            self.send_header("Retry-After", f"{reset_after:.3f}")
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --- MQTT broker ----------------------------------------------------------------------------------
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    pattern_levels, topic_levels = pattern.split("/"), topic.split("/")
+    for n, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if n >= len(topic_levels) or (level != "+" and level != topic_levels[n]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+def _packet(kind, flags, body=b""):
+    header = bytearray([kind << 4 | flags])
+    length = len(body)
+    while True:
+        length, digit = divmod(length, 128)
+        header.append(digit | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + body
+
+
+def _string(data, offset):
+    (length,) = struct.unpack_from(">H", data, offset)
+    return data[offset + 2:offset + 2 + length].decode("utf-8", "replace"), offset + 2 + length
+
+
+class MqttBroker(socketserver.ThreadingTCPServer):
+    """Just enough of an MQTT 3.1.1 broker for mqtt.py and paho clients"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _MqttHandler)
+        self.lock = threading.Lock()
+        self.subscriptions = {}     # handler: set of topic filters
+        self.counters = {"connections": 0, "published": 0, "qos0": 0, "qos1": 0, "qos2": 0, "bytes": 0,
+                         "delivered": 0}
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        return _start(self)
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def deliver(self, topic, payload):
+        with self.lock:
+            targets = [h for h, filters in self.subscriptions.items() if any(topic_matches(f, topic) for f in filters)]
+        encoded = topic.encode("utf-8")
+        packet = _packet(PUBLISH, 0, struct.pack(">H", len(encoded)) + encoded + payload)
+        for handler in targets:
+            if handler.send(packet):
+                self.count(delivered=1)
+
+
+class _MqttHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.write_lock = threading.Lock()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.request.makefile("rb")
+
+    def send(self, data):
+        try:
+            with self.write_lock:
+                self.request.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    def read_packet(self):
+        first = self.stream.read(1)
+        if not first:
+            return None, 0, b""
+        length, shift = 0, 0
+        while True:
+            byte = self.stream.read(1)
+            if not byte:
+                return None, 0, b""
+            length |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if not byte[0] & 0x80:
+                break
+        body = self.stream.read(length)
+        if len(body) != length:
+            return None, 0, b""
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    def handle(self):
+        broker = self.server
+        try:
+            while True:
+                kind, flags, body = self.read_packet()
+                if kind is None or kind == DISCONNECT:
+                    return
+                if kind == CONNECT:
+                    broker.count(connections=1)
+                    self.send(_packet(CONNACK, 0, b"\x00\x00"))
+                elif kind == PUBLISH:
+                    qos = (flags >> 1) & 3
+                    topic, offset = _string(body, 0)
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        self.send(_packet(PUBACK if qos == 1 else PUBREC, 0, packet_id))
+                    broker.count(published=1, bytes=len(body) - offset, **{f"qos{qos}": 1})
+                    broker.deliver(topic, body[offset:])
+                elif kind == PUBREL:
+                    self.send(_packet(PUBCOMP, 0, body[:2]))
+                elif kind == SUBSCRIBE:
+                    offset, granted, filters = 2, bytearray(), set()
+                    while offset < len(body):
+                        topic_filter, offset = _string(body, offset)
+                        offset += 1
+                        filters.add(topic_filter)
+                        granted.append(0)
+                    with broker.lock:
+                        broker.subscriptions.setdefault(self, set()).update(filters)
+                    self.send(_packet(SUBACK, 0, body[:2] + bytes(granted)))
+                elif kind == UNSUBSCRIBE:
+                    offset = 2
+                    with broker.lock:
+                        while offset < len(body):
+                            topic_filter, offset = _string(body, offset)
+                            broker.subscriptions.get(self, set()).discard(topic_filter)
+                    self.send(_packet(UNSUBACK, 0, body[:2]))
+                elif kind == PINGREQ:
+                    self.send(_packet(PINGRESP, 0))
+        except (OSError, struct.error):
+            return
+
+    def finish(self):
+        with self.server.lock:
+            self.server.subscriptions.pop(self, None)
+        self.stream.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-ins for the route and photo APIs, screenshots, "
+                                                 "the social channels, Discord and MQTT")
+    parser.add_argument("--routes", help="CALLSIGN,ROUTE[,plausible] file for the route API stand-in")
+    parser.add_argument("--routes-port", type=int, default=0)
+    parser.add_argument("--photos", help="the ICAOs the planespotters stand-in has a photo of, one per line")
+    parser.add_argument("--photos-port", type=int, default=0)
+    parser.add_argument("--snapshot-delay", type=float, default=0.0, help="seconds each screenshot takes")
+    parser.add_argument("--snapshots-port", type=int, default=0)
+    parser.add_argument("--channels-port", type=int, default=0)
+    parser.add_argument("--discord-port", type=int, default=0)
+    parser.add_argument("--mqtt-port", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    discord = DiscordStandIn(args.discord_port).start()
+    broker = MqttBroker(args.mqtt_port).start()
+    urls = {"routes": start_routes(routeset.read_routes_file(args.routes), args.routes_port),
+            "photos": start_photos(planespotters.read_icaos_file(args.photos), args.photos_port),
+            "snapshots": start_snapshots(args.snapshot_delay, args.snapshots_port),
+            "channels": start_channels(args.channels_port),
+            "discord": discord.url, "mqtt": f"{broker.host}:{broker.port}"}
+    print(json.dumps(urls), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        discord.shutdown()
+        broker.shutdown()
+        print(json.dumps({"discord": discord.counters, "mqtt": broker.counters}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+# Deterministic socket30003 traffic and database fixtures for the benchmarks
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# Aircraft fly straight tracks through the area around the station: airliners climbing out,
+# descending in or cruising over, and GA traffic low and slow. Every aircraft gets a position line
+# every few seconds while it is within range, written the way socket30003.pl writes them (same
+# header, field order, units and rounding), sorted by time. The same seed, date and options always
+# give the same files.
+#
+# Next to the traffic, the output directory gets:
+#   plane-alert-db.txt    Plane-Alert database with --pa-fraction of the aircraft plus filler rows
+#   OpenSkyDB.csv         OpenSky aircraft database (quoted, 32 columns) with all aircraft plus filler rows
+#   icaos.txt             the ICAOs of the traffic, one per line
+#   routes.csv            CALLSIGN,ROUTE,plausible for the route API stand-in
+#   route-requests.tsv    <key> TAB <callsign> TAB <lat> TAB <lon> lines for pflib.routes resolve
+#   mqtt-batch.ndjson     one MQTT message per aircraft, for mqtt.py --batch
+#   sbs-replay.txt        the same flights as the BaseStation messages of a receiver, for pflib.basestation
+#   manifest.json         the options and the number of aircraft and lines
+#
+# Usage:
+#   python3 -m pflib.bench.traffic --out DIR [--aircraft 400] [--minutes 60] [--seed 1] [--date yyMMdd]
+#                                  [--start HH:MM] [--lat 42.3656 --lon -71.0096] [--distanceunit nauticalmile]
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from datetime import date as Date, datetime, timedelta
+
+STATION = (42.3656, -71.0096)
+HOSTALIAS = "127_0_0_1"
+HEADER = ("hex_ident,altitude({altitude}),latitude,longitude,date,time,angle,distance({distance}),squawk,"
+          "ground_speed({speed}),track,callsign")
+
+AIRLINES = [("AAL", "American Airlines", "AA"), ("DAL", "Delta Air Lines", "DL"), ("UAL", "United Airlines", "UA"),
+            ("JBU", "JetBlue Airways", "B6"), ("SWA", "Southwest Airlines", "WN"), ("ASA", "Alaska Airlines", "AS"),
+            ("NKS", "Spirit Airlines", "NK"), ("ACA", "Air Canada", "AC"), ("BAW", "British Airways", "BA"),
+            ("DLH", "Lufthansa", "LH"), ("AFR", "Air France", "AF"), ("KLM", "KLM", "KL"),
+            ("UPS", "UPS Airlines", "5X"), ("FDX", "FedEx", "FX"), ("EDV", "Endeavor Air", "9E"),
+            ("RPA", "Republic Airways", "YX")]
+AIRLINER_TYPES = [("B738", "Boeing 737-800"), ("A320", "Airbus A320"), ("A321", "Airbus A321"), ("E75L", "Embraer 175"),
+                  ("B739", "Boeing 737-900"), ("A21N", "Airbus A321neo"), ("B763", "Boeing 767-300"),
+                  ("A333", "Airbus A330-300"), ("B789", "Boeing 787-9"), ("CRJ9", "Bombardier CRJ-900")]
+GA_TYPES = [("C172", "Cessna 172"), ("PA28", "Piper Cherokee"), ("SR22", "Cirrus SR22"), ("BE36", "Beech Bonanza"),
+            ("C208", "Cessna Caravan"), ("PC12", "Pilatus PC-12"), ("EC35", "Eurocopter EC135")]
+AIRPORTS = ["BOS", "JFK", "LGA", "EWR", "ORD", "ATL", "DFW", "DEN", "LAX", "SFO", "MIA", "CLT", "DCA", "PHL",
+            "YUL", "YYZ", "LHR", "FRA", "CDG", "AMS"]
+PA_CATEGORIES = [("Gov", "Government"), ("Mil", "Military"), ("Pol", "Police Forces"), ("Hel", "Helicopter"),
+                 ("Cel", "Celebrity")]
+OPENSKY_COLUMNS = ["icao24", "timestamp", "acars", "adsb", "built", "categoryDescription", "country", "engines",
+                   "firstFlightDate", "firstSeen", "icaoAircraftClass", "lineNumber", "manufacturerIcao",
+                   "manufacturerName", "model", "modes", "nextReg", "notes", "operator", "operatorCallsign",
+                   "operatorIata", "operatorIcao", "owner", "prevReg", "regUntil", "registered", "registration",
+                   "selCal", "serialNumber", "status", "typecode", "vdl"]
+
+# socket30003.pl output units and how it rounds them
+DISTANCE_UNITS = {"kilometer": (111.18957696, 100), "mile": (69.09, 100), "nauticalmile": (59.997756, 100),
+                  "meter": (111189.57696, 1)}
+ALTITUDE_UNITS = {"feet": 1.0, "meter": 0.3048}
+SPEED_UNITS = {"knotph": 1.0, "kilometerph": 1.852, "mileph": 1.150779}
+
+US_ICAO_FIRST, US_ICAO_LAST = 0xA00001, 0xADF7C7   # the N-number block icao2tail.py converts
+EARTH_KM = 6371.0
+
+
+def _truncate(value, scale):
+    return int(value * scale) / scale
+
+
+def perl_number(value):
+    """A number the way Perl prints it: no trailing ".0" on whole numbers"""
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def perl_angle(lat1, lon1, lat2, lon2):
+    """socket30003.pl's angle(): degrees are divided by 180 instead of converted to radians"""
+    dlon = lon2 - lon1
+    y = math.sin(dlon / 180) * math.cos(lat2 / 180)
+    x = math.cos(lat1 / 180) * math.sin(lat2 / 180) - math.sin(lat1 / 180) * math.cos(lat2 / 180) * math.cos(dlon / 180)
+    return int(math.atan2(y, x) * 57.2957795 * 100) / 100
+
+
+def perl_distance(lat1, lon1, lat2, lon2, unit):
+    """socket30003.pl's distance(): great circle degrees, converted to unit and truncated"""
+    theta = math.radians(lon1 - lon2)
+    cos_d = (math.sin(math.radians(lat1)) * math.sin(math.radians(lat2))
+             + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.cos(theta))
+    degrees = math.degrees(math.acos(max(-1.0, min(1.0, cos_d))))
+    factor, scale = DISTANCE_UNITS[unit]
+    return _truncate(degrees * factor, scale) if scale > 1 else int(degrees * factor)
+
+
+def destination(lat, lon, bearing, km):
+    """The point km away from lat/lon in direction bearing (degrees)"""
+    lat1, lon1, b, d = math.radians(lat), math.radians(lon), math.radians(bearing), km / EARTH_KM
+    lat2 = math.asin(math.sin(lat1) * math.cos(d) + math.cos(lat1) * math.sin(d) * math.cos(b))
+    lon2 = lon1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(lat1), math.cos(d) - math.sin(lat1) * math.sin(lat2))
+    return math.degrees(lat2), (math.degrees(lon2) + 540) % 360 - 180
+
+
+class Aircraft:
+    __slots__ = ("icao", "callsign", "squawk", "airline", "type", "owner", "tail", "route", "ga")
+
+    def __init__(self, icao, callsign, squawk, airline, actype, owner, tail, route, ga):
+        self.icao, self.callsign, self.squawk, self.airline = icao, callsign, squawk, airline
+        self.type, self.owner, self.tail, self.route, self.ga = actype, owner, tail, route, ga
+
+
+def make_fleet(rng, count):
+    """count aircraft with unique ICAOs and callsigns"""
+    fleet = []
+    icaos, callsigns = set(), set()
+    while len(fleet) < count:
+        ga = rng.random() < 0.25
+        if ga or rng.random() < 0.6:
+            icao = f"{rng.randint(US_ICAO_FIRST, US_ICAO_LAST):06X}"
+        else:
+            icao = f"{rng.choice([0x3C0000, 0x400000, 0x480000, 0xC00000]) + rng.randint(0, 0x3FFFF):06X}"
+        if icao in icaos:
+            continue
+        if ga:
+            airline = None
+            actype = rng.choice(GA_TYPES)
+            tail = "N" + str(rng.randint(1, 99999)) + rng.choice(["", "A", "B", "G", "X"])
+            callsign = tail if rng.random() < 0.7 else ""
+            owner = rng.choice(["Private", "Flight School LLC", "Aero Club", "Charter Inc"])
+            route = ""
+        else:
+            airline = rng.choice(AIRLINES)
+            actype = rng.choice(AIRLINER_TYPES)
+            callsign = f"{airline[0]}{rng.randint(1, 2999)}"
+            tail = "N" + str(rng.randint(100, 999)) + rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ") * 2
+            owner = airline[1]
+            route = "-".join(rng.sample(AIRPORTS, 2))
+        if callsign and callsign in callsigns:
+            continue
+        icaos.add(icao)
+        callsigns.add(callsign)
+        squawk = "7700" if rng.random() < 0.002 else f"{rng.randint(0, 0o7777):04o}"
+        fleet.append(Aircraft(icao, callsign, squawk, airline, actype, owner, tail, route, ga))
+    return fleet
+
+
+def fly(rng, aircraft, station, start, duration, interval):
+    """Yield (seconds, lat, lon, altitude ft, speed kt, track) for one pass of aircraft through the area"""
+    range_km = rng.uniform(15, 60)
+    entry_bearing = rng.uniform(0, 360)
+    lat, lon = destination(station[0], station[1], entry_bearing, range_km)
+    track = (entry_bearing + 180 + rng.gauss(0, 25)) % 360
+    if aircraft.ga:
+        speed = rng.uniform(80, 160)
+        altitude, climb = rng.uniform(800, 6000), 0.0
+    else:
+        speed = rng.uniform(220, 480)
+        phase = rng.random()
+        if phase < 0.35:
+            altitude, climb = rng.uniform(1000, 3000), rng.uniform(15, 40)       # departing, ft/s
+        elif phase < 0.7:
+            altitude, climb = rng.uniform(8000, 14000), -rng.uniform(10, 25)     # arriving
+        else:
+            altitude, climb = rng.uniform(28000, 39000), 0.0                     # overflight
+
+    t = start
+    end = min(duration, start + 2 * range_km / (speed * 1.852) * 3600 + 60)
+    while t < end:
+        yield t, lat, lon, max(0.0, altitude), speed, track
+        step = max(1, int(rng.gauss(interval, interval / 3)))
+        km = speed * 1.852 * step / 3600
+        lat, lon = destination(lat, lon, track, km)
+        altitude += climb * step
+        track = (track + rng.gauss(0, 0.5)) % 360
+        t += step
+
+
+def flights(fleet, rng, station, duration, interval):
+    """(seconds, aircraft number, lat, lon, altitude, speed, track) of the whole fleet, sorted by time"""
+    rows = []
+    for n, aircraft in enumerate(fleet):
+        first = rng.uniform(0, max(duration - 120, 1))
+        for t, lat, lon, alt, speed, track in fly(rng, aircraft, station, first, duration, interval):
+            rows.append((t, n, lat, lon, alt, speed, track))
+    rows.sort(key=lambda row: (row[0], row[1]))
+    return rows
+
+
+def traffic_lines(fleet, rows, station, midnight, units):
+    """The socket30003 lines of the flights"""
+    distance_unit, altitude_unit, speed_unit = units
+    for t, n, lat, lon, alt, speed, track in rows:
+        aircraft = fleet[n]
+        when = midnight + timedelta(seconds=t)
+        yield ",".join((
+            aircraft.icao,
+            str(int(alt * ALTITUDE_UNITS[altitude_unit])),
+            f"{lat:.5f}", f"{lon:.5f}",
+            when.strftime("%Y/%m/%d"), when.strftime("%H:%M:%S.") + f"{when.microsecond // 1000:03d}",
+            perl_number(perl_angle(station[0], station[1], lat, lon)),
+            perl_number(perl_distance(station[0], station[1], lat, lon, distance_unit)),
+            aircraft.squawk,
+            str(int(speed * SPEED_UNITS[speed_unit])),
+            str(int(track)),
+            aircraft.callsign,
+        ))
+
+
+def sbs_lines(fleet, rows, midnight):
+    """The BaseStation messages a receiver would have sent for the flights: identity, squawk, velocity, position"""
+    for t, n, lat, lon, alt, speed, track in rows:
+        aircraft = fleet[n]
+        when = midnight + timedelta(seconds=t)
+        stamp = when.strftime("%Y/%m/%d,%H:%M:%S.") + f"{when.microsecond // 1000:03d}"
+        head = f"MSG,{{}},1,1,{aircraft.icao},1,{stamp},{stamp},"
+        if aircraft.callsign:
+            yield head.format(1) + f"{aircraft.callsign},,,,,,,,,,,0"
+        yield head.format(6) + f",,,,,,,{aircraft.squawk},0,0,0,0"
+        yield head.format(4) + f",,{int(speed)},{int(track)},,,0,,,,,0"
+        yield head.format(3) + f",{int(alt)},,,{lat:.5f},{lon:.5f},,,0,0,0,0"
+
+
+def _random_icao(rng, taken):
+    while True:
+        icao = f"{rng.randint(0x000001, 0xFFFFFE):06X}"
+        if icao not in taken:
+            taken.add(icao)
+            return icao
+
+
+def write_plane_alert_db(path, fleet, rng, fraction, filler):
+    taken = {a.icao for a in fleet}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("$ICAO,$Registration,$Operator,$Type,$ICAO Type,#CMPG,$Tag 1,$#Tag 2,$#Tag 3,Category,$#Link\n")
+        rows = []
+        for aircraft in fleet:
+            if rng.random() < fraction:
+                rows.append((aircraft.icao, aircraft.tail, aircraft.owner, aircraft.type[1], aircraft.type[0]))
+        for _ in range(filler):
+            actype = rng.choice(AIRLINER_TYPES + GA_TYPES)
+            rows.append((_random_icao(rng, taken), f"N{rng.randint(1, 99999)}", rng.choice(["US Air Force", "State Police",
+                         "Coast Guard", "Private Owner", "Medical Flight"]), actype[1], actype[0]))
+        for icao, tail, owner, type_name, type_code in sorted(rows):
+            tag, category = rng.choice(PA_CATEGORIES)
+            f.write(f"{icao},{tail},{owner},{type_name},{type_code},{tag},{category},,,{category},\n")
+    return len(rows)
+
+
+def write_opensky_db(path, fleet, rng, filler):
+    taken = {a.icao for a in fleet}
+    registration, typecode = OPENSKY_COLUMNS.index("registration"), OPENSKY_COLUMNS.index("typecode")
+    operator, owner, model = OPENSKY_COLUMNS.index("operator"), OPENSKY_COLUMNS.index("owner"), OPENSKY_COLUMNS.index("model")
+    rows = []
+    for aircraft in fleet:
+        rows.append((aircraft.icao.lower(), aircraft.tail, aircraft.type[0], aircraft.owner, aircraft.type[1]))
+    for _ in range(filler):
+        actype = rng.choice(AIRLINER_TYPES + GA_TYPES)
+        rows.append((_random_icao(rng, taken).lower(), f"N{rng.randint(1, 99999)}", actype[0], "", actype[1]))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(f"'{c}'" for c in OPENSKY_COLUMNS) + "\n")
+        for icao, tail, code, who, name in sorted(rows):
+            fields = [""] * len(OPENSKY_COLUMNS)
+            fields[0], fields[registration], fields[typecode] = icao, tail, code
+            fields[operator], fields[owner], fields[model] = who, who, name
+            f.write(",".join(f"'{v}'" for v in fields) + "\n")
+    return len(rows)
+
+
+def generate(out, aircraft=400, minutes=60, seed=1, day=None, start="00:00", station=STATION, interval=5,
+             distanceunit="nauticalmile", altitudeunit="feet", speedunit="kilometerph", pa_fraction=0.05,
+             pa_filler=15000, opensky_filler=50000):
+    """Write the traffic and fixtures to out; returns the manifest"""
+    rng = random.Random(seed)
+    day = day or Date.today()
+    hours, mins = (int(v) for v in start.split(":"))
+    os.makedirs(os.path.join(out, "socket30003"), exist_ok=True)
+
+    fleet = make_fleet(rng, aircraft)
+    traffic = os.path.join(out, "socket30003", f"dump1090-{HOSTALIAS}-{day.strftime('%y%m%d')}.txt")
+    midnight = datetime(day.year, day.month, day.day) + timedelta(hours=hours, minutes=mins)
+    rows = flights(fleet, rng, station, minutes * 60, interval)
+    lines = 0
+    positions = {}
+    with open(traffic, "w", encoding="ascii") as f:
+        f.write(HEADER.format(altitude=altitudeunit, distance=distanceunit, speed=speedunit) + "\n")
+        for line in traffic_lines(fleet, rows, station, midnight, (distanceunit, altitudeunit, speedunit)):
+            f.write(line + "\n")
+            lines += 1
+            fields = line.split(",")
+            positions.setdefault(fields[0], (fields[2], fields[3]))
+    with open(os.path.join(out, "sbs-replay.txt"), "w", encoding="ascii") as f:
+        f.writelines(line + "\r\n" for line in sbs_lines(fleet, rows, midnight))
+    del rows
+
+    pa_rows = write_plane_alert_db(os.path.join(out, "plane-alert-db.txt"), fleet, rng, pa_fraction, pa_filler)
+    opensky_rows = write_opensky_db(os.path.join(out, "OpenSkyDB.csv"), fleet, rng, opensky_filler)
+
+    with open(os.path.join(out, "icaos.txt"), "w") as f:
+        f.writelines(f"{a.icao}\n" for a in fleet)
+    with open(os.path.join(out, "routes.csv"), "w") as f:
+        f.writelines(f"{a.callsign},{a.route},{'false' if rng.random() < 0.05 else 'true'}\n"
+                     for a in fleet if a.route and rng.random() < 0.8)
+    with open(os.path.join(out, "route-requests.tsv"), "w") as f:
+        for n, a in enumerate(fleet):
+            if a.callsign and a.icao in positions:
+                f.write(f"pf:{n}\t{a.callsign}\t{positions[a.icao][0]}\t{positions[a.icao][1]}\n")
+    with open(os.path.join(out, "mqtt-batch.ndjson"), "w") as f:
+        for n, a in enumerate(fleet):
+            message = {"icao": a.icao, "callsign": a.callsign, "tail": a.tail, "type": a.type[0], "owner": a.owner,
+                       "squawk": a.squawk, "route": a.route}
+            f.write(json.dumps({"id": str(n), "message": message}) + "\n")
+
+    manifest = {"seed": seed, "date": day.strftime("%y%m%d"), "start": start, "minutes": minutes,
+                "aircraft": aircraft, "interval": interval, "station": list(station), "lines": lines,
+                "units": {"distance": distanceunit, "altitude": altitudeunit, "speed": speedunit},
+                "traffic": traffic, "sbs": os.path.join(out, "sbs-replay.txt"), "plane_alert_rows": pa_rows, "opensky_rows": opensky_rows}
+    with open(os.path.join(out, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write deterministic socket30003 traffic and fixtures")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--aircraft", type=int, default=400)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--date", help="yyMMdd (default: today)")
+    parser.add_argument("--start", default="00:00", help="HH:MM the traffic starts")
+    parser.add_argument("--lat", type=float, default=STATION[0])
+    parser.add_argument("--lon", type=float, default=STATION[1])
+    parser.add_argument("--interval", type=int, default=5, help="average seconds between positions of an aircraft")
+    parser.add_argument("--distanceunit", choices=sorted(DISTANCE_UNITS), default="nauticalmile")
+    parser.add_argument("--altitudeunit", choices=sorted(ALTITUDE_UNITS), default="feet")
+    parser.add_argument("--speedunit", choices=sorted(SPEED_UNITS), default="kilometerph")
+    parser.add_argument("--pa-fraction", type=float, default=0.05, help="share of the aircraft in plane-alert-db.txt")
+    parser.add_argument("--pa-filler", type=int, default=15000, help="other plane-alert-db.txt rows")
+    parser.add_argument("--opensky-filler", type=int, default=50000, help="other OpenSkyDB.csv rows")
+    args = parser.parse_args(argv)
+
+    day = datetime.strptime(args.date, "%y%m%d").date() if args.date else None
+    manifest = generate(args.out, args.aircraft, args.minutes, args.seed, day, args.start, (args.lat, args.lon),
+                        max(args.interval, 1), args.distanceunit, args.altitudeunit, args.speedunit,
+                        args.pa_fraction, args.pa_filler, args.opensky_filler)
+    json.dump(manifest, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+# Candidate filter engine for pa-collect-candidates.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# pa-collect-candidates.sh used to match every candidate against every pa-candidates-filter.txt
+# pattern in a bash loop, and ran the DATABASE filters over a full scan of the OpenSky DB on every
+# run. Here the filter file is read once into compiled matchers: the (extglob) patterns of each
+# field become one combined regex in which the first pattern that matches wins, the same order the
+# bash loops used. The DATABASE filters read only the rows of the candidates, through the
+# pflib.lookup index of the OpenSky DB (built by get-openskydb when it refreshes the CSV).
+#
+# The results mirror MATCH_CANDIDATE_FILTER and EVALUATE_DATABASE_MATCHES, except that an ICAO that
+# is in the OpenSky DB more than once is judged by its first row, as in the other pflib.lookup users.
+# Output fields are separated by 0x1F, so empty fields survive `IFS=... read`:
+#   F  <icao> <callsign> <database> <!icao> <!callsign> <!database>   number of filters loaded
+#   W  <message>                                                       a warning to log
+#   C  <icao> <1|0> <reason> <owner> <match|exclude|> <db tail> <db owner> <db type> <db icao type> <opensky registration>
+#
+# Usage (candidates on stdin, one <icao> TAB <callsign> per line):
+#   python3 -m pflib.candidates evaluate --filter <pa-candidates-filter.txt> [--opensky /run/OpenSkyDB.csv]
+
+import argparse
+import os
+import re
+import sys
+
+from . import lookup
+
+SEP = "\x1f"
+OPENSKY = "/run/OpenSkyDB.csv"
+DB_COLUMNS = ("registration", "owner", "model", "icaoaircraftclass")
+
+_SPACE = " \t\n\v\f\r"
+_ASCII_UPPER = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+_CLASSES = {"alpha": "a-zA-Z", "digit": "0-9", "alnum": "a-zA-Z0-9", "upper": "A-Z", "lower": "a-z",
+            "space": r"\s", "blank": r" \t", "xdigit": "0-9A-Fa-f", "punct": r"!-/:-@\[-`{-~",
+            "word": r"\w", "print": r" -~", "graph": r"!-~", "cntrl": r"\x00-\x1f\x7f",
+            "ascii": r"\x00-\x7f"}
+
+
+def upper(s):
+    """${s^^} under LC_ALL=C"""
+    return s.translate(_ASCII_UPPER)
+
+
+def csv_clean(s):
+    """CSV_CLEAN: trim, then drop one pair of surrounding single and double quotes"""
+    s = s[:-1] if s.endswith("\r") else s
+    s = s.strip(_SPACE)
+    s = s[1:] if s.startswith("'") else s
+    s = s[:-1] if s.endswith("'") else s
+    s = s[1:] if s.startswith('"') else s
+    s = s[:-1] if s.endswith('"') else s
+    return s
+
+
+# --- bash extglob patterns --------------------------------------------------------------------------
+
+class _Unsupported(Exception):
+    """The pattern uses !(...), which has no regex equivalent"""
+
+
+def _parse(pattern, i=0, depth=0):
+    """Parse an extglob pattern into nodes; inside (...), stops at | or ). Returns (alternatives, index)"""
+    alts, nodes = [], []
+    while i < len(pattern):
+        c = pattern[i]
+        if depth and c in "|)":
+            alts.append(nodes)
+            if c == ")":
+                return alts, i + 1
+            nodes = []
+            i += 1
+        elif c in "?*+@!" and pattern[i + 1:i + 2] == "(":
+            sub, end = _parse(pattern, i + 2, depth + 1)
+            if end is None:   # no closing ), so not an extglob: the characters are literal
+                nodes.append(("lit", c))
+                i += 1
+            else:
+                nodes.append(("ext", c, sub))
+                i = end
+        elif c == "*":
+            nodes.append(("star",))
+            i += 1
+        elif c == "?":
+            nodes.append(("any",))
+            i += 1
+        elif c == "[":
+            cls, end = _bracket(pattern, i)
+            if cls is None:
+                nodes.append(("lit", "["))
+                i += 1
+            else:
+                nodes.append(("class", cls))
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            nodes.append(("lit", pattern[i + 1]))
+            i += 2
+        else:
+            nodes.append(("lit", c))
+            i += 1
+    if depth:
+        return None, None
+    alts.append(nodes)
+    return alts, i
+
+
+def _bracket(pattern, i):
+    """A [...] expression at pattern[i] as a compiled regex character class, or (None, i)"""
+    j = i + 1
+    negate = pattern[j:j + 1] in ("!", "^")
+    if negate:
+        j += 1
+    out = []
+    first = True
+    valid = True
+    while j < len(pattern):
+        c = pattern[j]
+        if c == "]" and not first:
+            if not valid:   # bash: a bracket with an unknown [:class:] matches nothing
+                return re.compile("(?!)"), j + 1
+            try:
+                return re.compile(("[^" if negate else "[") + "".join(out) + "]", re.DOTALL), j + 1
+            except re.error:
+                return None, i
+        first = False
+        if c == "[" and pattern[j + 1:j + 2] == ":":
+            end = pattern.find(":]", j + 2)
+            if end != -1:
+                name = pattern[j + 2:end]
+                valid = valid and name in _CLASSES
+                out.append(_CLASSES.get(name, ""))
+                j = end + 2
+                continue
+        if c == "\\" and j + 1 < len(pattern):
+            out.append(re.escape(pattern[j + 1]))
+            j += 2
+            continue
+        out.append(c if c == "-" else re.escape(c))
+        j += 1
+    return None, i
+
+
+def _regex(alts):
+    def seq(nodes):
+        out = []
+        for node in nodes:
+            kind = node[0]
+            if kind == "lit":
+                out.append(re.escape(node[1]))
+            elif kind == "any":
+                out.append(".")
+            elif kind == "star":
+                out.append(".*")
+            elif kind == "class":
+                out.append(node[1].pattern)
+            else:
+                op, sub = node[1], node[2]
+                if op == "!":
+                    raise _Unsupported()
+                out.append("(?:" + "|".join(seq(a) for a in sub) + ")" + {"?": "?", "*": "*", "+": "+", "@": ""}[op])
+        return "".join(out)
+    return "|".join(seq(a) for a in alts)
+
+
+def _ends(alts, s, i):
+    """All end positions of matches of alts starting at s[i] (a backtracking matcher, for !(...))"""
+    found = set()
+    for nodes in alts:
+        starts = {i}
+        for node in nodes:
+            starts = set().union(*(_node_ends(node, s, st) for st in starts)) if starts else starts
+        found |= starts
+    return found
+
+
+def _node_ends(node, s, i):
+    kind = node[0]
+    if kind == "lit":
+        return {i + 1} if s.startswith(node[1], i) else set()
+    if kind == "any":
+        return {i + 1} if i < len(s) else set()
+    if kind == "star":
+        return set(range(i, len(s) + 1))
+    if kind == "class":
+        return {i + 1} if i < len(s) and node[1].fullmatch(s[i]) else set()
+    op, sub = node[1], node[2]
+    if op == "@":
+        return _ends(sub, s, i)
+    if op == "!":
+        return {j for j in range(i, len(s) + 1) if (j - i) not in _ends(sub, s[i:j], 0)}
+    found = {i} if op in "?*" else set()
+    if op == "?":
+        return found | _ends(sub, s, i)
+    frontier, seen = {i}, set()
+    while frontier:
+        frontier = set().union(*(_ends(sub, s, st) for st in frontier)) - seen
+        seen |= frontier
+        found |= frontier
+    return found
+
+
+class PatternList:
+    """Glob patterns in file order; first(value) returns the first one that matches, like the bash loops"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._slow = []   # (position, parsed) of the patterns that need the backtracking matcher
+        parts = []
+        for n, pattern in enumerate(self.patterns):
+            alts, _ = _parse(pattern)
+            try:
+                parts.append(f"(?P<p{n}>{_regex(alts)})")
+            except _Unsupported:
+                self._slow.append((n, alts))
+        self._regex = re.compile("|".join(parts), re.DOTALL) if parts else None
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def first(self, value):
+        found = None
+        if self._regex is not None:
+            m = self._regex.fullmatch(value)
+            if m:
+                found = int(m.lastgroup[1:])
+        for n, alts in self._slow:
+            if found is not None and n > found:
+                break
+            if len(value) in _ends(alts, value, 0):
+                found = n
+                break
+        return None if found is None else self.patterns[found]
+
+
+# --- filter file ------------------------------------------------------------------------------------
+
+class Filters:
+    """pa-candidates-filter.txt, read the way LOAD_CANDIDATE_FILTERS reads it"""
+
+    def __init__(self, path):
+        self.warnings = []
+        icao, callsign, icao_ex, callsign_ex = [], [], [], []
+        self.icao_owner, self.callsign_owner = {}, {}
+        self.database, self.database_exclude = [], []   # (spec, [(field, PatternList)])
+
+        if not os.path.isfile(path):
+            self.warnings.append(f"Filter file {path} not found; processing without pattern filtering")
+        else:
+            with open(path, encoding="utf-8", errors="replace", newline="") as f:
+                for line in f.read().split("\n"):
+                    self._parse_line(line, icao, callsign, icao_ex, callsign_ex)
+
+        self.icao, self.callsign = PatternList(icao), PatternList(callsign)
+        self.icao_exclude, self.callsign_exclude = PatternList(icao_ex), PatternList(callsign_ex)
+
+    def _parse_line(self, line, icao, callsign, icao_ex, callsign_ex):
+        line = (line[:-1] if line.endswith("\r") else line).strip(_SPACE)
+        if not line or line.startswith("#"):
+            return
+        rest = ""
+        if ":" in line:
+            key, rest = line.split(":", 1)
+            pattern, _, owner = rest.partition(":")
+        else:
+            key, pattern, owner = "ICAO", line, ""
+        key = upper(key)
+
+        if key == "DATABASE":
+            parts = rest.split(":")
+            if parts and parts[-1] == "":
+                parts.pop()
+            if len(parts) < 2 or len(parts) % 2:
+                self.warnings.append(f"Invalid DATABASE filter (requires field:pattern pairs): {line}")
+                return
+            exclude = parts[0].startswith("!")
+            if exclude:
+                parts[0] = parts[0][1:]
+            pairs = []
+            for field, pat in zip(parts[0::2], parts[1::2]):
+                field, pat = csv_clean(field).translate(_ASCII_LOWER), upper(csv_clean(pat))
+                if not field or not pat:
+                    return
+                pairs.append((field, pat))
+            spec = ":".join(f"{field}:{pat}" for field, pat in pairs)
+            compiled = (spec, [(field, PatternList([pat])) for field, pat in pairs])
+            (self.database_exclude if exclude else self.database).append(compiled)
+            return
+
+        pattern = upper(pattern).strip(_SPACE)
+        owner = owner.strip(_SPACE)
+        if not pattern:
+            return
+        exclude = pattern.startswith("!")
+        if exclude:
+            pattern = pattern[1:]
+            if not pattern:
+                return
+        if key == "ICAO":
+            if exclude:
+                icao_ex.append(pattern)
+            else:
+                icao.append(pattern)
+                self.icao_owner[pattern] = owner
+        elif key in ("CALLSIGN", "CS"):
+            if exclude:
+                callsign_ex.append(pattern)
+            else:
+                callsign.append(pattern)
+                self.callsign_owner[pattern] = owner
+
+    def counts(self):
+        return (len(self.icao), len(self.callsign), len(self.database),
+                len(self.icao_exclude), len(self.callsign_exclude), len(self.database_exclude))
+
+    def has_inclusive(self):
+        return bool(len(self.icao) or len(self.callsign) or self.database)
+
+
+# --- evaluation -------------------------------------------------------------------------------------
+
+def _spec_matches(pairs, columns, cols):
+    for field, patterns in pairs:
+        idx = columns.get(field)
+        if idx is None:
+            return False
+        value = upper(csv_clean(cols[idx] if idx < len(cols) else ""))
+        if patterns.first(value) is None:
+            return False
+    return True
+
+
+def database_matches(filters, icaos, opensky=OPENSKY):
+    """
+    EVALUATE_DATABASE_MATCHES: {icao: dict} with "state" (match, exclude or ""), "reason", the
+    registration and, for matches, the tail, owner, type and icao type from the OpenSky DB
+    """
+    results = {}
+    if not (filters.database or filters.database_exclude) or not icaos:
+        return results
+    try:
+        db = lookup.open_source(opensky)
+    except (OSError, lookup.LookupIndexError):
+        db = None
+    columns = {}
+    if db is not None:
+        for n, col in enumerate(db.header()):
+            name = csv_clean(col).translate(_ASCII_LOWER)
+            if name:
+                columns[name] = n
+    if db is None or "icao24" not in columns:
+        filters.warnings.append(f"DATABASE filter(s) configured but {opensky} is unavailable or invalid")
+        if db is not None:
+            db.close()
+        return results
+
+    def column(cols, name):
+        idx = columns.get(name)
+        return csv_clean(cols[idx] if idx < len(cols) else "") if idx is not None else ""
+
+    try:
+        for icao in icaos:
+            cols = db.get(icao)
+            if cols is None:
+                continue
+            result = {"state": "", "reason": "", "registration": column(cols, "registration")}
+            results[icao] = result
+            for spec, pairs in filters.database_exclude:
+                if _spec_matches(pairs, columns, cols):
+                    result.update(state="exclude", reason=f"DATABASE:!{spec}")
+                    break
+            if result["state"]:
+                continue
+            for spec, pairs in filters.database:
+                if _spec_matches(pairs, columns, cols):
+                    result.update(state="match", reason=f"DATABASE:{spec}",
+                                  **{name: column(cols, name) for name in DB_COLUMNS})
+                    break
+    finally:
+        db.close()
+    return results
+
+
+def match(filters, db_results, icao, callsign):
+    """MATCH_CANDIDATE_FILTER: (passes, reason, owner)"""
+    icao, callsign = upper(icao), upper(callsign)
+    db = db_results.get(icao, {})
+    if db.get("state") == "exclude":
+        return False, db["reason"], ""
+
+    p = filters.icao_exclude.first(icao)
+    if p is not None:
+        return False, f"ICAO:!{p}", ""
+    if callsign:
+        p = filters.callsign_exclude.first(callsign)
+        if p is not None:
+            return False, f"CALLSIGN:!{p}", ""
+
+    if not filters.has_inclusive():
+        return True, "no-inclusive-filters", ""
+    if db.get("state") == "match":
+        return True, db["reason"], db.get("owner", "")
+
+    p = filters.icao.first(icao)
+    if p is not None:
+        return True, f"ICAO:{p}", filters.icao_owner.get(p, "")
+    if callsign:
+        p = filters.callsign.first(callsign)
+        if p is not None:
+            return True, f"CALLSIGN:{p}", filters.callsign_owner.get(p, "")
+    return False, "", ""
+
+
+def _field(value):
+    return value.replace(SEP, " ").replace("\n", " ")
+
+
+def evaluate(filter_file, candidates, opensky=OPENSKY, out=sys.stdout):
+    """Evaluate [(icao, callsign)] and write the F, W and C lines"""
+    filters = Filters(filter_file)
+    db_results = database_matches(filters, [icao for icao, _ in candidates], opensky)
+    out.write(SEP.join(["F", *map(str, filters.counts())]) + "\n")
+    for warning in filters.warnings:
+        out.write(SEP.join(["W", _field(warning)]) + "\n")
+    for icao, callsign in candidates:
+        passes, reason, owner = match(filters, db_results, icao, callsign)
+        db = db_results.get(icao, {})
+        out.write(SEP.join(_field(v) for v in (
+            "C", icao, "1" if passes else "0", reason, owner, db.get("state", ""),
+            db.get("registration", "") if db.get("state") == "match" else "", db.get("owner", ""),
+            db.get("model", ""), db.get("icaoaircraftclass", ""), db.get("registration", ""))) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate Plane-Alert candidates against the candidate filters")
+    parser.add_argument("command", choices=["evaluate"])
+    parser.add_argument("--filter", required=True, help="pa-candidates-filter.txt")
+    parser.add_argument("--opensky", default=OPENSKY)
+    args = parser.parse_args(argv)
+
+    candidates = []
+    for line in sys.stdin:
+        icao, _, callsign = line.rstrip("\n").partition("\t")
+        icao = upper(icao.strip())
+        if icao:
+            candidates.append((icao, callsign.strip()))
+    evaluate(args.filter, candidates, args.opensky)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,637 @@
+# Concurrent delivery of one notification to Bluesky, Mastodon and Telegram
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# post2bsky.sh, post2mastodon.sh and post2telegram.sh render their post, and pf-run.sh hands the posts
+# of every record, together with the images to attach, to pflib.notifyd as one job (see
+# notifyd_send_queue in pf-common), which passes it on to dispatch(). The job's images are read or
+# downloaded once and shared by all its channels, and the channels are posted to at the same time,
+# so a notification costs about the same for one channel as for three. Because notifyd is resident,
+# it keeps state between the jobs and between runs:
+#  - downloaded images are cached for a few minutes, so the notifiers of one event share one download;
+#  - a Bluesky session is created once and only refreshed when its access token is about to expire,
+#    instead of a createSession or refreshSession call for every post. The sessions are also saved
+#    to SESSION_FILE, so a restart of the service doesn't need new ones;
+#  - every account has its own token bucket (see pflib.webhooks), which follows the rate-limit
+#    headers Bluesky and Mastodon send back and the retry_after of a Telegram 429.
+# Failures never raise: every channel gets a result dict:
+#   {"channel": <name>, "ok": bool, "status": int|None, "attempts": int, "elapsed": seconds,
+#    "link": <link to the post> | "error": <reason>}
+#
+# A job:
+#   {"posts": {"bluesky":  {"api": ..., "handle": ..., "password": ..., "record": {app.bsky.feed.post}},
+#              "mastodon": {"server": ..., "token": ..., "text": ..., "language": ..., "visibility": ...},
+#              "telegram": {"api": ..., "token": ..., "chat_id": ..., "private": bool, "text": ...}},
+#    "files": [<local file or URL>, ...], "timeout": seconds}
+# The images are attached to the Bluesky record as an app.bsky.embed.images embed.
+#
+# Usage:
+#   python3 -m pflib.dispatch post    (jobs on stdin, one JSON object per line; results on stdout)
+#   python3 -m pflib.dispatch serve [--port 8025]
+#       a stand-in for the Bluesky, Mastodon and Telegram APIs, for testing: the Bluesky API is at
+#       /xrpc, Mastodon at /, Telegram at /bot, and /image/<name> serves a small PNG
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pflib import media
+from pflib import webhooks as delivery
+
+DEFAULT_TIMEOUT = 30
+MAX_ATTEMPTS = 3
+MAX_RETRY_WAIT = 60        # don't wait longer than this for a rate limit to clear; report a failure instead
+SESSION_FILE = "/run/planefence/bluesky-sessions.json"
+SESSION_MARGIN = 300       # renew a Bluesky access token that expires within this many seconds
+
+BLUESKY_MAX_IMAGE = 950000                 # Bluesky's blob limit is 1,000,000 bytes
+MASTODON_MAX_IMAGE = 16 * 1024 * 1024
+TELEGRAM_MAX_IMAGE = 10 * 1024 * 1024
+DOWNLOAD_CACHE_BYTES = 16 * 1024 * 1024
+DOWNLOAD_TTL = 600         # seconds a downloaded image is reused
+
+# (capacity, period) every account's token bucket starts with, until the service's headers say otherwise.
+# Telegram allows about 20 messages per minute in a group or channel
+BUCKETS = {"bluesky": (10, 10.0), "mastodon": (10, 10.0), "telegram": (20, 60.0)}
+
+
+class ChannelError(Exception):
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# --- images ---------------------------------------------------------------------------------------
+
+def mimetype(data):
+    head = bytes(data[:12])
+    if head.startswith(media.PNG_SIGNATURE):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _optimize(cmd, data):
+    """data run through an external optimizer (if it's installed), or data itself if that doesn't make it smaller"""
+    if not shutil.which(cmd[0]):
+        return data
+    try:
+        result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                timeout=60, check=False)
+    except (OSError, subprocess.SubprocessError):
+        return data
+    return result.stdout if result.returncode == 0 and 0 < len(result.stdout) < len(data) else data
+
+
+class Image:
+
+    def __init__(self, source, data):
+        self.source = source
+        self.data = data
+        self.mimetype = mimetype(data)
+        self.name = os.path.basename(source.split("?", 1)[0]) or "image"
+        self._fitted = {}
+        self._lock = threading.Lock()
+
+    def fit(self, limit):
+        """The image in at most limit bytes, recompressed if need be, or None if it can't be made that small"""
+        with self._lock:
+            if limit not in self._fitted:
+                data = self.data
+                if len(data) > limit and self.mimetype == "image/png":
+                    data = media.shrink_png(data)
+                    if len(data) > limit:
+                        data = _optimize(["pngquant", "64", "-"], data)
+                elif len(data) > limit and self.mimetype == "image/jpeg":
+                    data = _optimize(["jpegoptim", "-q", f"-S{limit // 1000}", "--stdin", "--stdout"], data)
+                self._fitted[limit] = data if len(data) <= limit else None
+            return self._fitted[limit]
+
+
+_downloads = OrderedDict()   # url -> (fetched, bytes)
+_downloads_bytes = 0
+_downloads_lock = threading.Lock()
+
+
+def download(url, timeout=DEFAULT_TIMEOUT):
+    """The contents of url, from the download cache if it was fetched in the last DOWNLOAD_TTL seconds"""
+    global _downloads_bytes
+    with _downloads_lock:
+        entry = _downloads.get(url)
+        if entry and time.time() - entry[0] < DOWNLOAD_TTL:
+            _downloads.move_to_end(url)
+            return entry[1]
+
+    response = delivery.session().get(url, timeout=timeout)
+    if not response.ok or not response.content:
+        raise OSError(f"HTTP {response.status_code}")
+    data = response.content
+
+    with _downloads_lock:
+        old = _downloads.pop(url, None)
+        if old:
+            _downloads_bytes -= len(old[1])
+        _downloads[url] = (time.time(), data)
+        _downloads_bytes += len(data)
+        while _downloads_bytes > DOWNLOAD_CACHE_BYTES and len(_downloads) > 1:
+            _downloads_bytes -= len(_downloads.popitem(last=False)[1][1])
+    return data
+
+
+def load_images(sources, timeout=DEFAULT_TIMEOUT):
+    """Read or download every image of a job once. Images that can't be had are logged and left out"""
+    images = []
+    for source in sources:
+        source = str(source).strip()
+        if not source:
+            continue
+        try:
+            if source.startswith(("http://", "https://")) and not os.path.isfile(source):
+                data = download(source, timeout)
+            else:
+                data = media.load(source)
+                if data is None:
+                    raise OSError("file is too large")
+                data = bytes(data)
+        except Exception as e:
+            print(f"Unable to get image {source}: {str(e).splitlines()[0] if str(e) else e}", file=sys.stderr)
+            continue
+        if not data:
+            print(f"Skipping empty image {source}", file=sys.stderr)
+            continue
+        images.append(Image(source, data))
+    return images
+
+
+# --- channels -------------------------------------------------------------------------------------
+
+def _http_date_after(value):
+    """Seconds until the ISO 8601 time in value (Mastodon's X-RateLimit-Reset), or None"""
+    try:
+        reset = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+class Channel:
+
+    name = ""
+
+    def __init__(self):
+        self.bucket = delivery.TokenBucket(*BUCKETS[self.name])
+
+    def limits(self, response):
+        """The rate-limit state of a response, in the X-RateLimit-* terms of TokenBucket.update"""
+        return {"X-RateLimit-Limit": response.headers.get("X-RateLimit-Limit"),
+                "X-RateLimit-Remaining": response.headers.get("X-RateLimit-Remaining"),
+                "Retry-After": response.headers.get("Retry-After")}
+
+    def request(self, result, method, url, timeout, **kwargs):
+        """One API call within the account's rate limit (a 429 is retried); returns the decoded JSON body"""
+        for _ in range(MAX_ATTEMPTS):
+            wait = self.bucket.reserve()
+            if wait > MAX_RETRY_WAIT:
+                raise ChannelError(f"rate limited for another {wait:.0f}s", result["status"])
+            if wait > 0:
+                time.sleep(wait)
+            result["attempts"] += 1
+            try:
+                response = delivery.session().request(method, url, timeout=timeout, **kwargs)
+            except Exception as e:
+                raise ChannelError(str(e).replace("\n", " "))
+            result["status"] = response.status_code
+            self.bucket.update(self.limits(response), response.status_code)
+            if response.status_code == 429:
+                continue
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if not response.ok or not isinstance(body, dict):
+                raise ChannelError(response.text.replace("\n", " ") or f"HTTP {response.status_code}",
+                                   response.status_code)
+            return body
+        raise ChannelError("rate limited", result["status"])
+
+    def post(self, post, images, result, timeout):
+        raise NotImplementedError
+
+
+class Bluesky(Channel):
+
+    name = "bluesky"
+
+    def __init__(self, api, handle, password):
+        super().__init__()
+        self.api = api.rstrip("/")
+        self.handle = handle
+        self.password = password
+        self.key = f"{self.api}|{handle}"
+        self.session = _saved_sessions().get(self.key)
+        self._auth_lock = threading.Lock()
+
+    def limits(self, response):
+        reset = delivery._float(response.headers.get("ratelimit-reset"))
+        return {"X-RateLimit-Limit": response.headers.get("ratelimit-limit"),
+                "X-RateLimit-Remaining": response.headers.get("ratelimit-remaining"),
+                "X-RateLimit-Reset-After": max(0.0, reset - time.time()) if reset else None,
+                "Retry-After": response.headers.get("Retry-After")}
+
+    def auth(self, result, timeout, expired=None):
+        """The access token to use, refreshing or creating the session only when that's needed"""
+        with self._auth_lock:
+            session = self.session
+            if session and session.get("accessJwt") != expired and \
+                    _jwt_expiry(session.get("accessJwt")) > time.time() + SESSION_MARGIN:
+                return session
+            self.session = None
+            if session and _jwt_expiry(session.get("refreshJwt")) > time.time():
+                try:
+                    self.session = self.request(result, "POST", f"{self.api}/com.atproto.server.refreshSession",
+                                                timeout, headers={"Authorization": f"Bearer {session['refreshJwt']}"})
+                except ChannelError as e:
+                    print(f"Bluesky session refresh failed, creating a new session: {e}", file=sys.stderr)
+            if not self.session or not self.session.get("accessJwt"):
+                self.session = self.request(result, "POST", f"{self.api}/com.atproto.server.createSession", timeout,
+                                            json={"identifier": self.handle, "password": self.password})
+            if not self.session.get("accessJwt") or not self.session.get("did"):
+                self.session = None
+                raise ChannelError("Bluesky didn't return a session", result["status"])
+            _save_session(self.key, self.session)
+            return self.session
+
+    def call(self, result, path, timeout, **kwargs):
+        """An authenticated XRPC call; a token the server says has expired is renewed once"""
+        session = self.auth(result, timeout)
+        headers = dict(kwargs.pop("headers", {}), Authorization=f"Bearer {session['accessJwt']}")
+        try:
+            return self.request(result, "POST", f"{self.api}/{path}", timeout, headers=headers, **kwargs)
+        except ChannelError as e:
+            if e.status not in (400, 401) or "Token" not in str(e):
+                raise
+        session = self.auth(result, timeout, expired=session["accessJwt"])
+        headers["Authorization"] = f"Bearer {session['accessJwt']}"
+        return self.request(result, "POST", f"{self.api}/{path}", timeout, headers=headers, **kwargs)
+
+    def post(self, post, images, result, timeout):
+        record = dict(post.get("record") or {})
+        if not record.get("text"):
+            raise ChannelError("the post has no record text")
+        record.setdefault("$type", "app.bsky.feed.post")
+        record.setdefault("createdAt", datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+
+        embedded = []
+        for image in images[:4]:
+            data = image.fit(BLUESKY_MAX_IMAGE)
+            if data is None:
+                print(f"Omitting image {image.source} from the Bluesky post: it is too large", file=sys.stderr)
+                continue
+            try:
+                blob = self.call(result, "com.atproto.repo.uploadBlob", timeout, data=data,
+                                 headers={"Content-Type": image.mimetype}).get("blob")
+            except ChannelError as e:
+                print(f"Error uploading {image.source} to Bluesky: {e}", file=sys.stderr)
+                continue
+            if blob:
+                embedded.append({"image": blob, "alt": ""})
+        if embedded:
+            record["embed"] = {"$type": "app.bsky.embed.images", "images": embedded}
+        else:
+            record.pop("embed", None)
+
+        session = self.auth(result, timeout)
+        body = self.call(result, "com.atproto.repo.createRecord", timeout,
+                         json={"repo": session["did"], "collection": "app.bsky.feed.post", "record": record})
+        if not body.get("uri"):
+            raise ChannelError(json.dumps(body), result["status"])
+        return f"https://bsky.app/profile/{session.get('handle') or self.handle}/post/{body['uri'].rsplit('/', 1)[-1]}"
+
+
+def _jwt_expiry(token):
+    """The exp claim of a JWT, or 0 if it can't be read"""
+    try:
+        claims = token.split(".")[1]
+        return float(json.loads(base64.urlsafe_b64decode(claims + "=" * (-len(claims) % 4))).get("exp", 0))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return 0
+
+
+_sessions_lock = threading.Lock()
+
+
+def _saved_sessions():
+    try:
+        with open(SESSION_FILE, encoding="utf-8") as f:
+            sessions = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return sessions if isinstance(sessions, dict) else {}
+
+
+def _save_session(key, session):
+    with _sessions_lock:
+        sessions = _saved_sessions()
+        sessions[key] = {k: session.get(k) for k in ("accessJwt", "refreshJwt", "did", "handle")}
+        try:
+            os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(prefix=".bluesky-", dir=os.path.dirname(SESSION_FILE))
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                json.dump(sessions, out)
+            os.replace(tmpname, SESSION_FILE)   # mkstemp already made it readable by us only
+        except OSError as e:
+            print(f"Unable to save the Bluesky session: {e}", file=sys.stderr)
+
+
+class Mastodon(Channel):
+
+    name = "mastodon"
+
+    def __init__(self, server, token):
+        super().__init__()
+        self.server = server.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def limits(self, response):
+        limits = super().limits(response)
+        if response.headers.get("X-RateLimit-Reset"):
+            limits["X-RateLimit-Reset-After"] = _http_date_after(response.headers["X-RateLimit-Reset"])
+        return limits
+
+    def post(self, post, images, result, timeout):
+        if not post.get("text"):
+            raise ChannelError("the post has no text")
+        media_ids = []
+        for image in images[:4]:
+            data = image.fit(MASTODON_MAX_IMAGE)
+            if data is None:
+                print(f"Omitting image {image.source} from the Mastodon post: it is too large", file=sys.stderr)
+                continue
+            try:
+                body = self.request(result, "POST", f"{self.server}/api/v1/media", timeout, headers=self.headers,
+                                    files={"file": (image.name, data, image.mimetype)})
+            except ChannelError as e:
+                print(f"Failed to upload image {image.source} to Mastodon: {e}", file=sys.stderr)
+                continue
+            if body.get("id"):
+                media_ids.append(str(body["id"]))
+
+        fields = [("status", post["text"]), ("visibility", post.get("visibility") or "unlisted")]
+        if post.get("language"):
+            fields.append(("language", post["language"]))
+        fields += [("media_ids[]", media_id) for media_id in media_ids]
+        body = self.request(result, "POST", f"{self.server}/api/v1/statuses", timeout, headers=self.headers,
+                            data=fields)
+        if body.get("error") or not body.get("url"):
+            raise ChannelError(json.dumps(body), result["status"])
+        return body["url"]
+
+
+class Telegram(Channel):
+
+    name = "telegram"
+
+    def __init__(self, api, token, chat_id, private=False):
+        super().__init__()
+        self.base = f"{api}{token}"
+        self.chat_id = str(chat_id)
+        self.private = private
+
+    def limits(self, response):
+        limits = super().limits(response)
+        if response.status_code == 429:
+            try:
+                limits["Retry-After"] = response.json()["parameters"]["retry_after"]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return limits
+
+    def post(self, post, images, result, timeout):
+        text = post.get("text", "")
+        if not text:
+            raise ChannelError("the post has no text")
+        title = text.split("\n", 1)[0]
+        message_id = None
+        images = [image for image in images if image.fit(TELEGRAM_MAX_IMAGE) is not None][:4]
+        for n, image in enumerate(images):
+            # the first photo carries the message, the others its title line
+            caption = text if n == 0 else title
+            try:
+                body = self.request(result, "POST", f"{self.base}/sendPhoto", timeout,
+                                    data={"chat_id": self.chat_id, "caption": caption, "parse_mode": "HTML"},
+                                    files={"photo": (image.name, image.fit(TELEGRAM_MAX_IMAGE), image.mimetype)})
+            except ChannelError as e:
+                print(f"Error sending photo {image.source} to Telegram: {e}", file=sys.stderr)
+                if n == 0:
+                    break
+                continue
+            if n == 0:
+                message_id = (body.get("result") or {}).get("message_id")
+
+        if message_id is None:
+            body = self.request(result, "POST", f"{self.base}/sendMessage", timeout,
+                                data={"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"})
+            message_id = (body.get("result") or {}).get("message_id")
+        if message_id is None:
+            raise ChannelError(json.dumps(body), result["status"])
+        if self.private:
+            return ""   # messages in a private chat have no public link
+        chat = (self.chat_id[4:] if self.chat_id.startswith("-100") else self.chat_id).lstrip("-")
+        return f"https://t.me/c/{chat}/{message_id}"
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def channel(name, post):
+    """The client for the account post is for, kept so its session and rate limit carry over to the next post"""
+    required = {"bluesky": ("handle", "password"), "mastodon": ("server", "token"),
+                "telegram": ("token", "chat_id")}.get(name)
+    if required is None:
+        raise ChannelError(f"unknown channel '{name}'")
+    if not all(post.get(field) for field in required):
+        raise ChannelError(f"the {name} post is missing its {' or '.join(required)}")
+    if name == "bluesky":
+        key = (name, post.get("api") or "https://bsky.social/xrpc", post["handle"], post["password"])
+        make = lambda: Bluesky(*key[1:])  # noqa: E731
+    elif name == "mastodon":
+        server = post["server"] if post["server"].startswith(("http://", "https://")) else f"https://{post['server']}"
+        key = (name, server, post["token"])
+        make = lambda: Mastodon(*key[1:])  # noqa: E731
+    else:
+        key = (name, post.get("api") or "https://api.telegram.org/bot", post["token"], str(post["chat_id"]),
+               bool(post.get("private")))
+        make = lambda: Telegram(*key[1:])  # noqa: E731
+    with _channels_lock:
+        if key not in _channels:
+            _channels[key] = make()
+        return _channels[key]
+
+
+def deliver(name, post, images, timeout=DEFAULT_TIMEOUT):
+    """Post to one channel; never raises"""
+    result = {"channel": name, "ok": False, "status": None, "attempts": 0}
+    started = time.monotonic()
+    try:
+        result["link"] = channel(name, post).post(post, images, result, timeout)
+        result["ok"] = True
+    except ChannelError as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def max_duration(files=(), timeout=DEFAULT_TIMEOUT):
+    """
+    The longest dispatch can take: every download times out, and so does every attempt of every call
+    a channel makes (a session and its renewal, the image uploads and the post) after a full rate-limit wait
+    """
+    images = min(len(files), 4)
+    return len(files) * timeout + (images + 4) * MAX_ATTEMPTS * (timeout + MAX_RETRY_WAIT)
+
+
+def dispatch(posts, files=(), timeout=DEFAULT_TIMEOUT):
+    """
+    Post a notification to every channel in posts ({channel: post}) at the same time, with the images
+    in files. Results come back in the order of posts.
+    """
+    posts = [(name, post) for name, post in (posts or {}).items() if isinstance(post, dict)]
+    if not posts:
+        return []
+    images = load_images(files, timeout)
+    if len(posts) == 1:
+        return [deliver(*posts[0], images, timeout)]
+    with ThreadPoolExecutor(max_workers=len(posts)) as pool:
+        return list(pool.map(lambda p: deliver(*p, images, timeout), posts))
+
+
+# --- stand-in APIs --------------------------------------------------------------------------------
+
+def _standin_jwt(lifetime):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": int(time.time() + lifetime)}).encode()).rstrip(b"=")
+    return f"e30.{claims.decode()}.standin"
+
+
+def serve(port, token_lifetime=7200):
+    """Answer the Bluesky, Mastodon and Telegram calls the notifiers make, until interrupted"""
+    from pflib.screenshots import _png
+
+    counters = {"sessions": 0, "refreshes": 0, "uploads": 0, "posts": 0, "downloads": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def count(self, counter):
+            with lock:
+                counters[counter] += 1
+                return counters[counter]
+
+        def answer(self, body, status=200, content_type="application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.startswith("/image/"):
+                self.count("downloads")
+                self.answer(_png(self.path.rsplit("/", 1)[-1]), content_type="image/png")
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?", 1)[0]
+            if path.endswith(("/com.atproto.server.createSession", "/com.atproto.server.refreshSession")):
+                self.count("sessions" if path.endswith("createSession") else "refreshes")
+                self.answer({"accessJwt": _standin_jwt(token_lifetime), "refreshJwt": _standin_jwt(86400),
+                             "did": "did:plc:standin", "handle": "standin.bsky.social", "active": True})
+            elif path.endswith("/com.atproto.repo.uploadBlob"):
+                self.count("uploads")
+                self.answer({"blob": {"$type": "blob", "ref": {"$link": hashlib.sha256(data).hexdigest()},
+                                      "mimeType": self.headers.get("Content-Type"), "size": len(data)}})
+            elif path.endswith("/com.atproto.repo.createRecord"):
+                self.answer({"uri": f"at://did:plc:standin/app.bsky.feed.post/{self.count('posts')}", "cid": "standin"})
+            elif path == "/api/v1/media":
+                self.answer({"id": str(self.count("uploads"))})
+            elif path == "/api/v1/statuses":
+                number = self.count("posts")
+                self.answer({"id": str(number), "url": f"http://127.0.0.1:{self.server.server_port}/@standin/{number}"})
+            elif path.endswith(("/sendPhoto", "/sendMessage")) and path.startswith("/bot"):
+                self.answer({"ok": True, "result": {"message_id": self.count("posts")}})
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            print(f"dispatch: {format % args} ({', '.join(f'{k}={v}' for k, v in counters.items())})", file=sys.stderr)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving Bluesky on http://127.0.0.1:{server.server_port}/xrpc, Mastodon on "
+          f"http://127.0.0.1:{server.server_port} and Telegram on http://127.0.0.1:{server.server_port}/bot",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post Planefence notifications to Bluesky, Mastodon and Telegram")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("post", help="dispatch the jobs on stdin and print one line of results per job")
+    serve_cmd = sub.add_parser("serve", help="run stand-in Bluesky, Mastodon and Telegram APIs")
+    serve_cmd.add_argument("--port", type=int, default=8025)
+    serve_cmd.add_argument("--token-lifetime", type=int, default=7200, help="seconds a Bluesky access token lasts")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, args.token_lifetime)
+        return 0
+
+    failed = False
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("a job must be a JSON object")
+        except ValueError as e:
+            print(f"Invalid job: {e}", file=sys.stderr)
+            failed = True
+            continue
+        results = dispatch(job.get("posts"), job.get("files", []), float(job.get("timeout", DEFAULT_TIMEOUT)))
+        failed |= not any(result["ok"] for result in results)
+        print(json.dumps({"ok": any(result["ok"] for result in results), "results": results}), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
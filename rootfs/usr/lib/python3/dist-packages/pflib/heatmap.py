@@ -0,0 +1,263 @@
+# Heatmap of the Planefence positions of a day, and its exports for the web page
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The positions are counted in a grid of 0.001 degrees (the "%.3f,%.3f" cells pf-process_sbs.sh has
+# always used), kept as a sparse dict of packed cell numbers. The counts of a day live in a small
+# binary store (integers little endian):
+#
+#   header   MAGIC, version, count, batch count, batch mark (20 bytes)
+#   cells    count x (int32 lat, int32 lon, uint32 hits), lat/lon in thousandths of a degree
+#   batch    batch count x the same: the cells the last update added (they are also in "cells")
+#
+# Every run only adds its own new positions to the store, as a batch marked with the
+# LASTPROCESSEDLINE its positions were read after (--since). If the next update has the same mark,
+# the run that made the last batch didn't get to write its records, so its lines were read again:
+# the last batch is then taken out before the new one is added, and no position is counted twice.
+# Version 1 stores (without a batch) are still read. Every update writes two exports:
+#
+#   planeheatdata.js    the "var addressPoints = [ [lat,lon,hits], ... ];" array the page has always used
+#   planeheatdata.bin   the same cells as a pyramid of coarser and coarser grids, so the page can draw a
+#                       zoomed-out map from a few hundred points. Layout (little endian):
+#                         header   PYRAMID_MAGIC, PYRAMID_VERSION, levels, origin lat, origin lon (thousandths)
+#                         levels   levels x (uint32 cell size in thousandths, uint32 count), then
+#                                  count x uint16 lat, count x uint16 lon (cells from the origin) and
+#                                  count x uint16 weight (occupied 0.001 cells, saturated), padded to 4 bytes
+#
+# Usage:
+#   python3 -m pflib.heatmap update --store FILE [--since LINE] [--js FILE] [--pyramid FILE] < positions
+#       positions are "lat,lon" (one sighting) or "lat,lon,hits" lines
+#   python3 -m pflib.heatmap export --store FILE [--js FILE] [--pyramid FILE]
+
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+
+STORE = "/run/planefence/heatmap.bin"
+SCALE = 1000                    # cells per degree
+LAT_SPAN = 180 * SCALE + 1
+MAX_LEVELS = 8
+MIN_POINTS = 500                # stop making coarser levels once a level has no more points than this
+
+MAGIC = b"PFHEATM\0"
+PYRAMID_MAGIC = b"PFHEATP\0"
+VERSION = 2
+PYRAMID_VERSION = 1
+HEADER_FORMAT = "<8sIII20s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+V1_HEADER_FORMAT = "<8sII"
+V1_HEADER_SIZE = struct.calcsize(V1_HEADER_FORMAT)
+NO_MARK = bytes(20)
+CELL_FORMAT = "<iiI"
+CELL_SIZE = struct.calcsize(CELL_FORMAT)
+PYRAMID_HEADER_FORMAT = "<8sIIii"
+LEVEL_FORMAT = "<II"
+UINT16_MAX = 0xFFFF
+
+
+def pack(lat, lon):
+    return (lat + 90 * SCALE) + (lon + 180 * SCALE) * LAT_SPAN
+
+
+def unpack(key):
+    lon, lat = divmod(key, LAT_SPAN)
+    return lat - 90 * SCALE, lon - 180 * SCALE
+
+
+def cell(value):
+    """The grid cell of a coordinate, rounded the way printf "%.3f" rounds it"""
+    return int(f"{float(value):.3f}".replace(".", ""))
+
+
+def mark(line):
+    """The batch mark of the positions read after line"""
+    return hashlib.sha1(line.encode("utf-8", errors="surrogateescape")).digest()
+
+
+def _cells(data):
+    return {pack(lat, lon): hits for lat, lon, hits in struct.iter_unpack(CELL_FORMAT, data)}
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmpname = tempfile.mkstemp(prefix=".heatmap-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, path)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+class Heatmap:
+    """Hits per 0.001 degree cell, by packed cell number"""
+
+    def __init__(self, cells=None, batch=None, batch_mark=NO_MARK):
+        self.cells = cells or {}
+        self.batch = batch or {}          # the cells the last update added
+        self.batch_mark = batch_mark
+
+    def __len__(self):
+        return len(self.cells)
+
+    @classmethod
+    def load(cls, path):
+        """The heatmap in path; an empty one if there is no (usable) store yet"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return cls()
+        if len(data) >= V1_HEADER_SIZE:
+            magic, version, count = struct.unpack_from(V1_HEADER_FORMAT, data)
+            if magic == MAGIC and version == 1 and len(data) == V1_HEADER_SIZE + count * CELL_SIZE:
+                return cls(_cells(data[V1_HEADER_SIZE:]))
+        if len(data) >= HEADER_SIZE:
+            magic, version, count, batch, batch_mark = struct.unpack_from(HEADER_FORMAT, data)
+            end = HEADER_SIZE + count * CELL_SIZE
+            if magic == MAGIC and version == VERSION and len(data) == end + batch * CELL_SIZE:
+                return cls(_cells(data[HEADER_SIZE:end]), _cells(data[end:]), batch_mark)
+        print(f"Ignoring heatmap store {path}: not a version 1 or {VERSION} store", file=sys.stderr)
+        return cls()
+
+    def save(self, path):
+        def body(cells):
+            return b"".join(struct.pack(CELL_FORMAT, *unpack(key), min(hits, 0xFFFFFFFF))
+                            for key, hits in sorted(cells.items()))
+        _write_atomic(path, struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(self.cells), len(self.batch),
+                                        self.batch_mark) + body(self.cells) + body(self.batch))
+
+    def add(self, lat, lon, hits=1):
+        key = pack(lat, lon)
+        self.cells[key] = self.cells.get(key, 0) + hits
+
+    def merge(self, lines):
+        """Add "lat,lon[,hits]" lines; returns the number of lines that were used"""
+        used = 0
+        for line in lines:
+            fields = line.strip().split(",")
+            if len(fields) < 2:
+                continue
+            try:
+                lat, lon = cell(fields[0]), cell(fields[1])
+                hits = int(fields[2]) if len(fields) > 2 and fields[2].strip() else 1
+            except ValueError:
+                continue
+            if -90 * SCALE <= lat <= 90 * SCALE and -180 * SCALE <= lon <= 180 * SCALE and hits > 0:
+                self.add(lat, lon, hits)
+                used += 1
+        return used
+
+    def update(self, lines, since=None):
+        """
+        Add "lat,lon[,hits]" lines as a new batch, read after the line since (None: not tracked).
+        If the last batch was read after the same line, it is replaced. Returns whether anything changed
+        """
+        batch_mark = NO_MARK if since is None else mark(since)
+        replaced = batch_mark != NO_MARK and batch_mark == self.batch_mark and bool(self.batch)
+        if replaced:
+            for key, hits in self.batch.items():
+                left = self.cells.get(key, 0) - hits
+                if left > 0:
+                    self.cells[key] = left
+                else:
+                    self.cells.pop(key, None)
+        batch = Heatmap()
+        used = batch.merge(lines)
+        for key, hits in batch.cells.items():
+            self.cells[key] = self.cells.get(key, 0) + hits
+        changed = replaced or used > 0 or batch_mark != self.batch_mark
+        self.batch, self.batch_mark = batch.cells, batch_mark
+        return changed
+
+    # --- exports ----------------------------------------------------------------------------------
+
+    def to_js(self):
+        lines = ["var addressPoints = [\n"]
+        for key, hits in sorted(self.cells.items()):
+            lat, lon = unpack(key)
+            lines.append(f"[ {lat / SCALE:.3f},{lon / SCALE:.3f},{hits} ],\n")
+        lines.append("];\n")
+        return "".join(lines)
+
+    def levels(self):
+        """[(cell size, {(lat cell, lon cell): occupied 0.001 cells})], finest first"""
+        level = {}
+        for key in self.cells:
+            lat, lon = unpack(key)
+            level[(lat, lon)] = 1
+        levels = [(1, level)]
+        size = 1
+        while len(levels) < MAX_LEVELS and len(level) > MIN_POINTS:
+            size *= 2
+            coarser = {}
+            for (lat, lon), weight in level.items():
+                parent = (lat // 2, lon // 2)
+                coarser[parent] = coarser.get(parent, 0) + weight
+            if len(coarser) == len(level):
+                break
+            level = coarser
+            levels.append((size, level))
+        return levels
+
+    def to_pyramid(self):
+        levels = self.levels()
+        if not self.cells:
+            return struct.pack(PYRAMID_HEADER_FORMAT, PYRAMID_MAGIC, PYRAMID_VERSION, 0, 0, 0)
+        origin_lat = min(lat for lat, _ in levels[0][1])
+        origin_lon = min(lon for _, lon in levels[0][1])
+        out = [struct.pack(PYRAMID_HEADER_FORMAT, PYRAMID_MAGIC, PYRAMID_VERSION, len(levels), origin_lat, origin_lon)]
+        for size, level in levels:
+            base_lat, base_lon = origin_lat // size, origin_lon // size
+            # cells more than 65535 cells away from the origin don't fit; they are far outside any fence
+            points = sorted((lat - base_lat, lon - base_lon, weight) for (lat, lon), weight in level.items()
+                            if lat - base_lat <= UINT16_MAX and lon - base_lon <= UINT16_MAX)
+            count = len(points)
+            out.append(struct.pack(LEVEL_FORMAT, size, count))
+            out.append(struct.pack(f"<{count}H", *(p[0] for p in points)))
+            out.append(struct.pack(f"<{count}H", *(p[1] for p in points)))
+            out.append(struct.pack(f"<{count}H", *(min(p[2], UINT16_MAX) for p in points)))
+            if (3 * count) % 2:
+                out.append(b"\0\0")
+        return b"".join(out)
+
+    def export(self, js=None, pyramid=None):
+        if js:
+            _write_atomic(js, self.to_js().encode("ascii"))
+        if pyramid:
+            _write_atomic(pyramid, self.to_pyramid())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Heatmap of the Planefence positions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update_cmd = sub.add_parser("update", help="add the positions on stdin to the store, then export it")
+    export_cmd = sub.add_parser("export", help="export the store")
+    update_cmd.add_argument("--since", help="the LASTPROCESSEDLINE the positions were read after")
+    for cmd in (update_cmd, export_cmd):
+        cmd.add_argument("--store", default=STORE)
+        cmd.add_argument("--js", help="write the addressPoints JS here")
+        cmd.add_argument("--pyramid", help="write the binary pyramid here")
+    args = parser.parse_args(argv)
+
+    try:
+        heatmap = Heatmap.load(args.store)
+        if args.command == "update" and heatmap.update(sys.stdin, args.since):
+            heatmap.save(args.store)
+        heatmap.export(args.js, args.pyramid)
+    except OSError as e:
+        print(f"Unable to update the heatmap: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
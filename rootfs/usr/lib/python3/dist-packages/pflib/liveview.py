@@ -0,0 +1,141 @@
+# Live per-ICAO view of the day, kept by the BaseStation collector
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# pflib.basestation keeps a small SQLite database next to the day files (live.db) with one row per
+# ICAO it heard in the last day: the last callsign, the closest distance (and when), the last position
+# and the squawk history, so other stages can ask for the current state without re-reading the log:
+#   aircraft(icao, callsign, first_seen, last_seen, positions, lat, lon, altitude,
+#            min_distance, min_distance_time, squawk, squawks)
+# Times are epoch seconds, distances and altitudes are in the units of the day files. squawks is the
+# space separated list of the squawk runs of the aircraft, oldest first, each as squawk:first:last. A
+# run ends when the squawk changes or wasn't heard for SQUAWK_GAP seconds.
+#
+# This module only needs sqlite3, so readers (pflib.sbs) don't pay for the collector's asyncio.
+# socket30003.pl doesn't keep a live view; the socket30003 service removes it when that logger runs.
+
+import os
+import sqlite3
+
+VIEW_FILE = "live.db"
+VIEW_RETENTION = 86400      # s an aircraft is kept in the live view after its last message
+SQUAWK_GAP = 600            # s without the squawk that end a squawk run
+SQUAWK_HISTORY = 8          # squawk runs kept per aircraft
+BUSY_TIMEOUT_MS = 30000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aircraft (
+    icao TEXT PRIMARY KEY,
+    callsign TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    positions INTEGER NOT NULL,
+    lat TEXT NOT NULL,
+    lon TEXT NOT NULL,
+    altitude INTEGER,
+    min_distance REAL,
+    min_distance_time REAL,
+    squawk TEXT NOT NULL,
+    squawks TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aircraft_last_seen ON aircraft (last_seen);
+"""
+COLUMNS = ("icao", "callsign", "first_seen", "last_seen", "positions", "lat", "lon", "altitude",
+           "min_distance", "min_distance_time", "squawk", "squawks")
+
+
+def add_squawk(runs, squawk, now, keep=SQUAWK_HISTORY):
+    """Extend the last [squawk, first, last] run in runs with squawk heard at now, or start a new one"""
+    if runs and runs[-1][0] == squawk and now - runs[-1][2] <= SQUAWK_GAP:
+        runs[-1][2] = now
+    else:
+        runs.append([squawk, now, now])
+        del runs[:-keep]
+
+
+def latest_runs(runs, squawks):
+    """{squawk: (first, last)} of the latest run of each of squawks"""
+    latest = {}
+    for squawk, first, last in runs:
+        if squawk in squawks:
+            latest[squawk] = (first, last)
+    return latest
+
+
+def format_runs(runs):
+    return " ".join(f"{squawk}:{first:.0f}:{last:.0f}" for squawk, first, last in runs)
+
+
+def parse_runs(text):
+    runs = []
+    for run in text.split():
+        try:
+            squawk, first, last = run.split(":")
+            runs.append([squawk, float(first), float(last)])
+        except ValueError:
+            continue
+    return runs
+
+
+class LiveView:
+    """The per-ICAO summaries in SQLite; written by the collector, read by anyone"""
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+            return
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.executescript(SCHEMA)
+        try:
+            os.chmod(path, 0o644)
+        except OSError:
+            pass
+
+    def close(self):
+        self.db.close()
+
+    def restore(self, ac):
+        """Carry the summary of an aircraft that was retired (or heard before a restart) over"""
+        row = self.db.execute("SELECT first_seen, positions, min_distance, min_distance_time, squawks "
+                              "FROM aircraft WHERE icao = ?", (ac.icao,)).fetchone()
+        if row is None or ac.first_seen - row[0] > VIEW_RETENTION:
+            return
+        ac.first_seen, ac.logged, ac.min_distance, ac.min_distance_time, squawks = row
+        ac.squawks = parse_runs(squawks)
+
+    def save(self, aircraft):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO aircraft VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (icao) DO UPDATE SET "
+                "callsign = CASE WHEN excluded.callsign != '' THEN excluded.callsign ELSE callsign END, "
+                "first_seen = excluded.first_seen, last_seen = excluded.last_seen, positions = excluded.positions, "
+                "lat = excluded.lat, lon = excluded.lon, altitude = excluded.altitude, "
+                "min_distance = excluded.min_distance, min_distance_time = excluded.min_distance_time, "
+                "squawk = CASE WHEN excluded.squawk != '' THEN excluded.squawk ELSE squawk END, "
+                "squawks = excluded.squawks",
+                ((ac.icao, ac.callsign or "", ac.first_seen, ac.last_seen, ac.logged, ac.lat or "", ac.lon or "",
+                  ac.altitude, ac.min_distance, ac.min_distance_time, ac.squawk or "", format_runs(ac.squawks))
+                 for ac in aircraft))
+
+    def prune(self, before):
+        with self.db:
+            self.db.execute("DELETE FROM aircraft WHERE last_seen < ?", (before,))
+
+    def rows(self, since=None, icaos=None, columns=COLUMNS):
+        query, args = f"SELECT {', '.join(columns)} FROM aircraft", []
+        where = []
+        if since is not None:
+            where.append("last_seen >= ?")
+            args.append(since)
+        if icaos:
+            where.append(f"icao IN ({','.join('?' * len(icaos))})")
+            args.extend(icaos)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return self.db.execute(query + " ORDER BY last_seen DESC", args)
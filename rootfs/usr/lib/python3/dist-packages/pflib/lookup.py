@@ -0,0 +1,355 @@
+# Indexed tail and type lookups for pf-process_sbs.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The Mictronics icao2plane.txt and the (several hundred MB) OpenSky database are CSV files keyed
+# by ICAO in the first column. Instead of grepping them once per aircraft, each gets a small
+# binary index next to it that maps every ICAO to the byte offset of its line. It is built when
+# the file is refreshed (and again whenever it is found to be stale), and both files are mmapped,
+# so a lookup is a binary search plus reading one line. Layout (integers little endian):
+#
+#   header   MAGIC, version, count, source mtime_ns, source size
+#   keys     count x 3 bytes - 24-bit ICAO, big endian, sorted ascending
+#   offsets  count x uint64  - offset of the line in the source file
+#
+# As with grep -m1, the first line of an ICAO wins. The icao2tail.cache file is small and only ever
+# appended to, so it is kept as a dict and only the appended part is read again. Results are kept
+# in an in-process LRU.
+#
+# Usage:
+#   python3 -m pflib.lookup build <icao2plane.txt|OpenSkyDB.csv>
+#   python3 -m pflib.lookup planes [<icao> ...]                     (or ICAOs on stdin)
+#       prints icao,tail,tail_source,type,type_source per ICAO
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+MAGIC = b"PFLKIDX\0"
+VERSION = 1
+HEADER_FORMAT = "<8sIIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+KEY_SIZE = 3
+OFFSET_FORMAT = "<Q"
+OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+
+INTERNAL_DIR = "/usr/share/planefence/persist/.internal"
+TAILCACHE = f"{INTERNAL_DIR}/icao2tail.cache"
+ICAO2PLANE = "/run/planefence/icao2plane.txt"
+OPENSKYDB = "/run/OpenSkyDB.csv"
+LRU_SIZE = 4096
+
+# Columns of the OpenSky database, used if its header can't be read
+OPENSKY_REGISTRATION_COL = 26
+OPENSKY_TYPECODE_COL = 30
+
+
+class LookupIndexError(Exception):
+    pass
+
+
+def index_path(source):
+    # The OpenSky DB is a symlink into the persist directory; keep the index with the real file
+    return f"{os.path.realpath(source)}.idx"
+
+
+def _icao(field):
+    field = field.strip().strip("\"'")
+    if len(field) != 6:
+        return None
+    try:
+        return int(field, 16)
+    except ValueError:
+        return None
+
+
+def build_index(source, idxfile=None):
+    """Index the first-column ICAOs of source and atomically move the index in place"""
+    idxfile = idxfile or index_path(source)
+    st = os.stat(source)
+
+    seen = {}
+    at = 0
+    with open(source, "rb") as f:
+        for raw in f:
+            key = _icao(raw.split(b",", 1)[0].decode("ascii", errors="replace"))
+            if key is not None and key not in seen:
+                seen[key] = at
+            at += len(raw)
+
+    return write_index(idxfile, seen, st)
+
+
+def write_index(idxfile, offsets, st):
+    """Write an index for the {icao: line offset} dict offsets of a source with os.stat result st"""
+    keys = sorted(offsets)
+    return write_packed_index(idxfile, b"".join(key.to_bytes(KEY_SIZE, "big") for key in keys),
+                              array("Q", (offsets[key] for key in keys)), st)
+
+
+def write_packed_index(idxfile, keys, offsets, st):
+    """Write an index from keys, the sorted ICAOs already packed as in the file, and the array("Q")
+    offsets of their lines"""
+    count = len(keys) // KEY_SIZE
+    if sys.byteorder != "little":
+        offsets = array("Q", offsets)
+        offsets.byteswap()
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, count, st.st_mtime_ns, st.st_size)
+    directory = os.path.dirname(os.path.abspath(idxfile))
+    fd, tmpname = tempfile.mkstemp(prefix=".lookup-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(header)
+            out.write(keys)
+            out.write(offsets.tobytes())
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, idxfile)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    return count
+
+
+class SourceIndex:
+    """A source CSV and its index, both mmapped. get(icao) returns the split fields of its line"""
+
+    def __init__(self, source, idxfile):
+        self.source = source
+        with open(idxfile, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER_SIZE:
+            self._mm.close()
+            raise LookupIndexError(f"{idxfile} is truncated")
+        magic, version, self._count, self.source_mtime_ns, self.source_size = \
+            struct.unpack_from(HEADER_FORMAT, self._mm)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise LookupIndexError(f"{idxfile} is not a lookup index")
+        self._offsets_at = HEADER_SIZE + self._count * KEY_SIZE
+        self._src = None
+        if self.source_size:
+            with open(source, "rb") as f:
+                self._src = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._mm.close()
+        if self._src is not None:
+            self._src.close()
+
+    def is_current(self):
+        try:
+            src = os.stat(self.source)
+        except OSError:
+            return False
+        return src.st_mtime_ns == self.source_mtime_ns and src.st_size == self.source_size
+
+    def _key(self, i):
+        at = HEADER_SIZE + i * KEY_SIZE
+        return int.from_bytes(self._mm[at:at + KEY_SIZE], "big")
+
+    def get(self, icao):
+        key = _icao(icao)
+        if key is None or self._src is None:
+            return None
+        i = bisect_left(range(self._count), key, key=self._key)
+        if i >= self._count or self._key(i) != key:
+            return None
+        (offset,) = struct.unpack_from(OFFSET_FORMAT, self._mm, self._offsets_at + i * OFFSET_SIZE)
+        end = self._src.find(b"\n", offset)
+        line = self._src[offset:end if end >= 0 else len(self._src)]
+        return line.decode("utf-8", errors="replace").rstrip("\r").split(",")
+
+    def header(self):
+        if self._src is None:
+            return []
+        end = self._src.find(b"\n")
+        return self._src[:end if end >= 0 else len(self._src)].decode("utf-8", errors="replace").split(",")
+
+
+def open_source(source):
+    """
+    Open source with its index, (re)building the index first if it is missing or stale.
+    If it can't be written next to the source, it goes to /tmp instead. Returns None if there is
+    no source file.
+    """
+    if not os.path.isfile(source):
+        return None
+    idxfile = index_path(source)
+    for candidate in (idxfile, os.path.join(tempfile.gettempdir(), os.path.basename(idxfile))):
+        try:
+            db = SourceIndex(source, candidate)
+            if db.is_current():
+                return db
+            db.close()
+        except (OSError, LookupIndexError):
+            pass
+        try:
+            build_index(source, candidate)
+            return SourceIndex(source, candidate)
+        except OSError:
+            continue
+    raise LookupIndexError(f"Unable to build an index for {source}")
+
+
+class AppendOnlyCache:
+    """A key,value file that is only appended to. The first value of a key wins"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._ino = None
+        self._offset = 0
+
+    def refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.entries, self._ino, self._offset = {}, None, 0
+            return
+        if st.st_ino != self._ino or st.st_size < self._offset:
+            self.entries, self._ino, self._offset = {}, st.st_ino, 0
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            key, _, value = line.partition(",")
+            key = key.strip().upper()
+            if key and value and key not in self.entries:
+                self.entries[key] = value
+        self._offset += end
+
+    def get(self, key):
+        self.refresh()
+        return self.entries.get(key.upper())
+
+
+def _clean(value):
+    return value.strip().strip("\"'").strip() if value else ""
+
+
+class PlaneLookup:
+    """
+    Tail and type of an ICAO, from (in this order) icao2tail.cache, icao2plane.txt and the OpenSky
+    DB, the same order the shell functions used. The sources are reopened when they change.
+    """
+
+    def __init__(self, tailcache=TAILCACHE, icao2plane=ICAO2PLANE, opensky=OPENSKYDB, size=LRU_SIZE):
+        self.tailcache = AppendOnlyCache(tailcache)
+        self.paths = {"mictronics": icao2plane, "OpenSkyDB": opensky}
+        self.sources = {}
+        self.size = size
+        self._lru = OrderedDict()
+        self._opensky_cols = (OPENSKY_REGISTRATION_COL, OPENSKY_TYPECODE_COL)
+        self._lock = threading.Lock()
+
+    def _source(self, name):
+        db = self.sources.get(name)
+        if db is not None and db.is_current():
+            return db
+        if db is not None:
+            db.close()
+            self._lru.clear()
+        try:
+            db = open_source(self.paths[name])
+        except (OSError, LookupIndexError):
+            db = None
+        self.sources[name] = db
+        if db is not None and name == "OpenSkyDB":
+            header = [_clean(col).lower() for col in db.header()]
+            self._opensky_cols = (header.index("registration") if "registration" in header else OPENSKY_REGISTRATION_COL,
+                                  header.index("typecode") if "typecode" in header else OPENSKY_TYPECODE_COL)
+        return db
+
+    def _resolve(self, icao):
+        plane = {"tail": "", "tail_source": "", "type": "", "type_source": ""}
+        mictronics = self._source("mictronics")
+        fields = mictronics.get(icao) if mictronics else None
+        if fields:
+            if len(fields) > 1 and fields[1].strip():
+                plane["tail"], plane["tail_source"] = fields[1].replace(" ", ""), "mictronics"
+            if len(fields) > 2 and fields[2].strip():
+                plane["type"], plane["type_source"] = fields[2].strip(), "mictronics"
+
+        if not plane["tail"] or not plane["type"]:
+            opensky = self._source("OpenSkyDB")
+            fields = opensky.get(icao) if opensky else None
+            if fields:
+                reg_col, type_col = self._opensky_cols
+                tail = _clean(fields[reg_col]).replace(" ", "") if reg_col < len(fields) else ""
+                kind = _clean(fields[type_col]) if type_col < len(fields) else ""
+                if not plane["tail"] and tail:
+                    plane["tail"], plane["tail_source"] = tail, "OpenSkyDB"
+                if not plane["type"] and kind:
+                    plane["type"], plane["type_source"] = kind, "OpenSkyDB"
+        return plane
+
+    def get(self, icao):
+        """A dict with the icao, tail, tail_source, type and type_source; empty strings if unknown"""
+        icao = icao.strip().upper()
+        with self._lock:
+            found = self._lru.get(icao)
+            if found is None:
+                found = self._resolve(icao)
+                self._lru[icao] = found
+                while len(self._lru) > self.size:
+                    self._lru.popitem(last=False)
+            else:
+                self._lru.move_to_end(icao)
+            plane = dict(found, icao=icao)
+            cached = self.tailcache.get(icao)
+        if cached:
+            plane["tail"], plane["tail_source"] = cached.replace(" ", ""), "cache"
+        return plane
+
+    def get_many(self, icaos):
+        return [self.get(icao) for icao in icaos]
+
+
+_planes = None
+
+
+def planes(icaos):
+    """Tail and type dicts of all icaos, using the shared PlaneLookup"""
+    global _planes
+    if _planes is None:
+        _planes = PlaneLookup()
+    return _planes.get_many(icaos)
+
+
+def _args_or_stdin(values):
+    return values if values else [line.strip() for line in sys.stdin if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexed tail and type lookups for Planefence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="(re)build the index of icao2plane.txt or the OpenSky DB")
+    build.add_argument("source")
+    plane = sub.add_parser("planes", help="look up the tail and type of ICAOs")
+    plane.add_argument("icaos", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_index(args.source)
+        print(f"Indexed {count} entries from {args.source}")
+    else:
+        for p in planes(_args_or_stdin(args.icaos)):
+            print(f"{p['icao']},{p['tail']},{p['tail_source']},{p['type']},{p['type_source']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
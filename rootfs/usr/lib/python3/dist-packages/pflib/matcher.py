@@ -0,0 +1,305 @@
+# Compiled matchers for the Planefence ignore list and the Plane-Alert keys
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# Filtering used to turn every plane-alert-db row into a `^ICAO,` regex for grep -E -f, and ran the
+# ignore list through a separate grep -v -i -f; both get slower with every entry. Instead:
+#  - plane-alert keys are a set of 24-bit ICAO integers (read from the mmapped pflib.planedb
+#    index), so checking a record is one hash lookup;
+#  - literal ignore patterns (ICAOs, callsigns, tails) go into one Aho-Corasick automaton, so a
+#    line is scanned once no matter how long the list is. ICAO entries are also kept in an integer
+#    set as a shortcut for the hex_ident column;
+#  - only patterns that really use regex syntax are compiled into a case-insensitive regex.
+# The filter runs as a new process every cycle, so a compiled matcher is also saved (pickled) to
+# /tmp, keyed on the file's path, mtime and size, and the next process loads it instead of building
+# it again. Matchers are rebuilt when the file's mtime or size changes.
+#
+# Usage (socket30003 lines on stdin, the lines that pass on stdout):
+#   python3 -m pflib.matcher ignore --ignorelist <file>     (like grep -v -i -f <file>)
+#   python3 -m pflib.matcher planealert --pa-file <file> [--squawks 7500,7600,7700]
+
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+from collections import deque
+
+from .planedb import open_index, parse_icao
+
+# Below this many literal patterns, a regex alternation (which runs in C) beats the automaton
+AC_MIN_PATTERNS = 16
+BRE_META = set("\\.[]*^$")
+CACHE_VERSION = 1     # bump when the matcher classes change, so older cache files are rebuilt
+
+_BRE_SPECIAL = {"(": "(", ")": ")", "{": "{", "}": "}", "|": "|", "+": "+", "?": "?"}
+# GNU extensions; \< and \> are the start and the end of a word
+_GNU_ESCAPES = {"<": r"\b(?=\w)", ">": r"\b(?<=\w)", "b": r"\b", "B": r"\B", "w": r"\w", "W": r"\W",
+                "s": r"\s", "S": r"\S", "`": r"\A", "'": r"\Z"}
+_POSIX_CLASSES = {"[:alpha:]": "a-zA-Z", "[:digit:]": "0-9", "[:alnum:]": "a-zA-Z0-9", "[:upper:]": "A-Z",
+                  "[:lower:]": "a-z", "[:space:]": r"\s", "[:xdigit:]": "0-9A-Fa-f", "[:punct:]": r"!-/:-@\[-`{-~"}
+
+
+def bre_to_python(pattern):
+    """Translate a GNU grep basic regular expression into Python re syntax"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt in _BRE_SPECIAL:
+                out.append(_BRE_SPECIAL[nxt])
+            elif nxt in _GNU_ESCAPES:
+                out.append(_GNU_ESCAPES[nxt])
+            elif nxt.isalpha():
+                out.append(nxt)   # other escaped letters match themselves
+            else:
+                out.append("\\" + nxt)
+            i += 2
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("]", "^") else i + 1)
+            while end != -1 and pattern[end - 1] == ":" and "[:" in pattern[i + 1:end]:
+                end = pattern.find("]", end + 1)   # skip the ] of a [:class:]
+            if end == -1:
+                out.append(re.escape(pattern[i:]))
+                break
+            bracket = pattern[i + 1:end]
+            for name, chars in _POSIX_CLASSES.items():
+                bracket = bracket.replace(name, chars)
+            out.append("[" + bracket.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c in "(){}|+?":
+            out.append("\\" + c)
+            i += 1
+        elif c == "*" and (not out or out[-1] in ("^", "(", "|")):
+            out.append("\\*")   # a leading * is literal in a BRE
+            i += 1
+        elif c == "^" and out and out[-1] not in ("(", "|"):
+            out.append("\\^")   # ^ only anchors at the start of the pattern or of a group or alternative
+            i += 1
+        elif c == "$" and i + 1 < len(pattern) and pattern[i + 1:i + 3] not in ("\\)", "\\|"):
+            out.append("\\$")   # and $ only at the end of one
+            i += 1
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+class AhoCorasick:
+    """Multi-pattern substring search; answers whether any of the patterns occurs in a text"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._hit = [False]
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._hit.append(False)
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._hit[state] = True
+
+        queue = deque(self._goto[0].values())   # states one deep fail back to the root
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._hit[nxt] = self._hit[nxt] or self._hit[self._fail[nxt]]
+
+    def search(self, text):
+        goto, fail, hit = self._goto, self._fail, self._hit
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if hit[state]:
+                return True
+        return False
+
+
+class IgnoreMatcher:
+    """The Planefence ignore list, with the semantics of grep -i -f <file>"""
+
+    def __init__(self, patterns):
+        self.icaos = set()
+        literals, regexes = [], []
+        for pattern in patterns:
+            if not pattern:
+                continue
+            if BRE_META.isdisjoint(pattern):
+                literals.append(pattern.lower())
+                key = parse_icao(pattern)
+                if key is not None:
+                    self.icaos.add(key)
+                continue
+            try:
+                regexes.append(re.compile(bre_to_python(pattern)).pattern)
+            except re.error:
+                literals.append(pattern.lower())
+
+        self.automaton = None
+        if len(literals) >= AC_MIN_PATTERNS:
+            self.automaton = AhoCorasick(literals)
+        else:
+            regexes.extend(re.escape(literal) for literal in literals)
+        self.regex = re.compile("|".join(f"(?:{p})" for p in regexes), re.IGNORECASE) if regexes else None
+
+    def __bool__(self):
+        return bool(self.automaton or self.regex)
+
+    def match(self, line, icao=None):
+        """True if the line matches any pattern; icao is the line's hex_ident, if already split out"""
+        if icao is None:
+            icao = line.split(",", 1)[0]
+        key = parse_icao(icao) if self.icaos else None
+        if key is not None and key in self.icaos:
+            return True
+        if self.automaton and self.automaton.search(line.lower()):
+            return True
+        return bool(self.regex and self.regex.search(line))
+
+
+class PlaneAlertMatcher:
+    """Plane-Alert keys: the ICAOs in the plane-alert-db plus a set of alert squawks"""
+
+    def __init__(self, icaos=(), squawks=()):
+        self.icaos = set(icaos)
+        self.squawks = {squawk for squawk in squawks if squawk}
+
+    def __bool__(self):
+        return bool(self.icaos or self.squawks)
+
+    def match(self, icao, squawk=""):
+        key = parse_icao(icao)
+        return (key is not None and key in self.icaos) or squawk in self.squawks
+
+    def match_line(self, line):
+        fields = line.split(",", 9)
+        return len(fields) > 1 and self.match(fields[0], fields[8] if len(fields) > 8 else "")
+
+
+_cache = {}
+
+
+def _cache_file(kind, path):
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f".pflib-matcher-{kind}-{name}.pickle")
+
+
+def _load(cachefile, stamp):
+    """The matcher saved in cachefile if it was built from the file described by stamp, else None"""
+    try:
+        with open(cachefile, "rb") as f:
+            if os.fstat(f.fileno()).st_uid != os.getuid():
+                return None   # only trust cache files this user wrote
+            version, saved, matcher = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+    return matcher if version == CACHE_VERSION and saved == stamp else None
+
+
+def _save(cachefile, stamp, matcher):
+    try:
+        fd, tmpname = tempfile.mkstemp(prefix=".pflib-matcher-", dir=os.path.dirname(cachefile))
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as out:
+            pickle.dump((CACHE_VERSION, stamp, matcher), out, pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, cachefile)
+    except (OSError, pickle.PicklingError, RecursionError):
+        os.unlink(tmpname)
+
+
+def _cached(kind, path, build):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    entry = _cache.get((kind, path))
+    if entry is None or entry[0] != stamp:
+        cachefile = _cache_file(kind, path)
+        matcher = _load(cachefile, stamp)
+        if matcher is None:
+            matcher = build(path)
+            _save(cachefile, stamp, matcher)
+        entry = (stamp, matcher)
+        _cache[(kind, path)] = entry
+    return entry[1]
+
+
+def _build_ignore(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return IgnoreMatcher(line.rstrip("\r\n") for line in f)
+
+
+def ignore_matcher(path):
+    """The compiled ignore list at path, or None if there isn't one or it is empty"""
+    matcher = _cached("ignore", path, _build_ignore) if path else None
+    return matcher if matcher else None
+
+
+def _build_planealert(path):
+    db = open_index(path)
+    try:
+        return db.key_set()
+    finally:
+        db.close()
+
+
+def planealert_icaos(path):
+    """The ICAOs of the plane-alert-db at path as a set of 24-bit integers"""
+    return _cached("planealert", path, _build_planealert) or set()
+
+
+def planealert_matcher(path, squawks=()):
+    return PlaneAlertMatcher(planealert_icaos(path) if path else (), squawks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filter socket30003 lines on the ignore list or plane-alert keys")
+    parser.add_argument("mode", choices=["ignore", "planealert"])
+    parser.add_argument("--ignorelist", help="ignore list, one grep pattern per line (ignore mode)")
+    parser.add_argument("--pa-file", help="plane-alert-db file (planealert mode)")
+    parser.add_argument("--squawks", default="", help="comma separated squawk codes (planealert mode)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    if args.mode == "ignore":
+        matcher = ignore_matcher(args.ignorelist)
+        for line in sys.stdin:
+            if not (matcher and matcher.match(line.rstrip("\n"))):
+                out.write(line)
+    else:
+        matcher = planealert_matcher(args.pa_file, [s.strip() for s in args.squawks.split(",")])
+        if matcher:
+            for line in sys.stdin:
+                if matcher.match_line(line.rstrip("\n")):
+                    out.write(line)
+    return 0
+
+
+if __name__ == "__main__":
+    # Run the pflib.matcher module rather than __main__, so the saved matchers can be loaded by both
+    from pflib import matcher
+    sys.exit(matcher.main())
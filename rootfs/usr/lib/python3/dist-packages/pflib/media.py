@@ -0,0 +1,106 @@
+# Shared, size-bounded cache of media files attached to notifications
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# A screenshot is read from disk once per version of the file (keyed by mtime and size) and
+# handed out as a read-only memoryview, so every webhook of an alert shares the same buffer.
+# PNGs larger than MAX_ATTACHMENT are re-encoded once (ancillary chunks dropped, image data
+# recompressed at the highest zlib level); the container has no imaging library to downscale
+# them, so a file that is still too large afterwards is not attached at all.
+
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+MAX_ATTACHMENT = 10 * 1024 * 1024   # Discord's upload limit for webhooks
+CACHE_BYTES = 32 * 1024 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_KEEP_CHUNKS = (b"IHDR", b"PLTE", b"tRNS", b"IDAT", b"IEND")
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def shrink_png(data):
+    """
+    Losslessly re-encode a PNG: keep only the chunks needed to render it and recompress the image
+    data. Returns the original bytes if that doesn't make it smaller or if it isn't a valid PNG.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    chunks, idat = [], []
+    at = len(PNG_SIGNATURE)
+    try:
+        while at < len(data):
+            length, kind = struct.unpack_from(">I4s", data, at)
+            body = data[at + 8:at + 8 + length]
+            at += 12 + length
+            if kind == b"IDAT":
+                if not idat:
+                    chunks.append((b"IDAT", None))
+                idat.append(body)
+            elif kind in PNG_KEEP_CHUNKS:
+                chunks.append((kind, body))
+            if kind == b"IEND":
+                break
+        pixels = zlib.decompress(b"".join(idat))
+    except (struct.error, zlib.error):
+        return data
+
+    compressed = zlib.compress(pixels, 9)
+    out = bytearray(PNG_SIGNATURE)
+    for kind, body in chunks:
+        out += _png_chunk(kind, compressed if body is None else body)
+    return bytes(out) if len(out) < len(data) else data
+
+
+class MediaCache:
+
+    def __init__(self, max_bytes=CACHE_BYTES, max_file=MAX_ATTACHMENT):
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self._entries = OrderedDict()   # path -> (mtime_ns, size, memoryview)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """Return the (possibly re-encoded) contents of path as a read-only memoryview, or None"""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(path)
+                return entry[2]
+
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) > self.max_file:
+                data = shrink_png(data)
+            view = memoryview(data).toreadonly() if len(data) <= self.max_file else None
+
+            self._forget(path)
+            if view is not None:
+                self._entries[path] = (st.st_mtime_ns, st.st_size, view)
+                self._bytes += len(view)
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    self._forget(next(iter(self._entries)))
+            return view
+
+    def _forget(self, path):
+        entry = self._entries.pop(path, None)
+        if entry:
+            self._bytes -= len(entry[2])
+
+
+cache = MediaCache()
+
+
+def load(path):
+    return cache.load(path)
@@ -0,0 +1,309 @@
+# Per-stage timings and counters of the Planefence cycle, exported for Prometheus
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# A cycle collects its events in a plain text file, one per line, so that timing a stage never
+# costs a fork (the METRICS_* functions in pf-common only use bash builtins):
+#   stage <script> <stage> <start epoch> <end epoch>     or   stage <script> <stage> <seconds>
+#   call <script> <command> [<count>]                        an external command was run
+#   cache <script> <cache> hit|miss [<count>]                a cache lookup
+# At the end of the cycle "record" adds them to the aggregate state (a JSON file, updated under a
+# lock so concurrent scripts don't lose each other's updates) and rewrites the Prometheus text file
+# that lighttpd serves as /metrics:
+#   planefence_stage_duration_seconds          histogram per script and stage
+#   planefence_stage_last_duration_seconds     gauge, the most recent duration per script and stage
+#   planefence_stage_last_run_timestamp_seconds
+#   planefence_external_calls_total            counter per script and command
+#   planefence_cache_requests_total            counter per script, cache and result
+#   planefence_cache_hit_ratio                 gauge per script and cache
+#
+# Python code times its stages with timer() (a context manager and decorator) and counts with
+# count_call() and cache_result(); the events go to the file named by $PF_METRICS_EVENTS when the
+# process exits, and are dropped when the caller isn't collecting them.
+#
+# Usage:
+#   python3 -m pflib.metrics record [--state FILE] [--output FILE] < events
+#   python3 -m pflib.metrics start <stage> [--script NAME]
+#   python3 -m pflib.metrics stop <stage> [--script NAME] [--state FILE] [--output FILE]
+#   python3 -m pflib.metrics export [--state FILE] [--output FILE]
+
+import argparse
+import atexit
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+
+STATE_FILE = "/run/planefence/metrics.json"
+OUTPUT_FILE = "/run/planefence/metrics.prom"
+STARTS_DIR = "/run/planefence/metrics.d"
+EVENTS_ENV = "PF_METRICS_EVENTS"
+VERSION = 1
+
+# seconds; a cycle normally takes a few seconds, a slow one minutes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _script():
+    name = os.path.basename(sys.argv[0] if sys.argv and sys.argv[0] else "python3")
+    return os.path.splitext(name)[0] or "python3"
+
+
+# --- recording from Python ------------------------------------------------------------------------
+
+_pending = []
+
+
+def _event(*fields):
+    if not _pending:
+        atexit.register(flush)
+    _pending.append(" ".join(str(field) for field in fields))
+
+
+def flush():
+    """Append the pending events to $PF_METRICS_EVENTS, if the caller collects them"""
+    global _pending
+    events, _pending = _pending, []
+    path = os.environ.get(EVENTS_ENV)
+    if not events or not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{event}\n" for event in events))
+    except OSError:
+        pass
+
+
+def observe(stage, seconds, script=None):
+    _event("stage", script or _script(), stage, f"{seconds:.6f}")
+
+
+def count_call(command, count=1, script=None):
+    _event("call", script or _script(), command, count)
+
+
+def cache_result(cache, hits=0, misses=0, script=None):
+    if hits:
+        _event("cache", script or _script(), cache, "hit", hits)
+    if misses:
+        _event("cache", script or _script(), cache, "miss", misses)
+
+
+class timer(contextlib.ContextDecorator):
+    """Time a block (with timer("stage"):) or every call of a function (@timer("stage"))"""
+
+    def __init__(self, stage, script=None):
+        self.stage, self.script = stage, script
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self._start, self.script)
+        return False
+
+
+# --- aggregate state ------------------------------------------------------------------------------
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmpname = tempfile.mkstemp(prefix=".metrics-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            out.write(text)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, path)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+class Metrics:
+    """The aggregated histograms and counters; keys are "script<TAB>name" """
+
+    def __init__(self, stages=None, calls=None, caches=None):
+        self.stages = stages or {}      # key: {"buckets": [count per bucket], "sum", "count", "last", "at"}
+        self.calls = calls or {}        # key: count
+        self.caches = caches or {}      # key: [hits, misses]
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except ValueError:
+            print(f"Ignoring unreadable metrics state {path}", file=sys.stderr)
+            return cls()
+        if state.get("version") != VERSION or state.get("buckets") != list(BUCKETS):
+            return cls()
+        return cls(state.get("stages"), state.get("calls"), state.get("caches"))
+
+    def save(self, path):
+        _write_atomic(path, json.dumps({"version": VERSION, "buckets": list(BUCKETS), "stages": self.stages,
+                                        "calls": self.calls, "caches": self.caches}))
+
+    def observe(self, script, stage, seconds, at=None):
+        seconds = max(float(seconds), 0.0)
+        entry = self.stages.setdefault(f"{script}\t{stage}", {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for n, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry["buckets"][n] += 1
+        entry["sum"] += seconds
+        entry["count"] += 1
+        entry["last"] = seconds
+        entry["at"] = at if at is not None else time.time()
+
+    def count_call(self, script, command, count=1):
+        key = f"{script}\t{command}"
+        self.calls[key] = self.calls.get(key, 0) + count
+
+    def cache_result(self, script, cache, hit, count=1):
+        counts = self.caches.setdefault(f"{script}\t{cache}", [0, 0])
+        counts[0 if hit else 1] += count
+
+    def merge(self, lines):
+        """Add the event lines; returns the number of events that were used"""
+        used = 0
+        for line in lines:
+            fields = line.split()
+            try:
+                if fields[0] == "stage" and len(fields) == 5:
+                    self.observe(fields[1], fields[2], float(fields[4]) - float(fields[3]), float(fields[4]))
+                elif fields[0] == "stage" and len(fields) == 4:
+                    self.observe(fields[1], fields[2], float(fields[3]))
+                elif fields[0] == "call" and len(fields) in (3, 4):
+                    self.count_call(fields[1], fields[2], int(fields[3]) if len(fields) == 4 else 1)
+                elif fields[0] == "cache" and len(fields) in (4, 5) and fields[3] in ("hit", "miss"):
+                    self.cache_result(fields[1], fields[2], fields[3] == "hit", int(fields[4]) if len(fields) == 5 else 1)
+                else:
+                    continue
+            except (IndexError, ValueError):
+                continue
+            used += 1
+        return used
+
+    def to_prometheus(self):
+        out = []
+
+        def header(name, kind, text):
+            out.append(f"# HELP {name} {text}\n# TYPE {name} {kind}\n")
+
+        stages = sorted((key.split("\t", 1), entry) for key, entry in self.stages.items())
+        header("planefence_stage_duration_seconds", "histogram", "Wall time of a stage of the Planefence cycle")
+        for (script, stage), entry in stages:
+            labels = f'script="{_label(script)}",stage="{_label(stage)}"'
+            for bound, count in zip(BUCKETS, entry["buckets"]):
+                out.append(f'planefence_stage_duration_seconds_bucket{{{labels},le="{bound:g}"}} {count}\n')
+            out.append(f'planefence_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}\n')
+            out.append(f"planefence_stage_duration_seconds_sum{{{labels}}} {entry['sum']:.6f}\n")
+            out.append(f"planefence_stage_duration_seconds_count{{{labels}}} {entry['count']}\n")
+        header("planefence_stage_last_duration_seconds", "gauge", "Wall time of the most recent run of a stage")
+        for (script, stage), entry in stages:
+            out.append(f'planefence_stage_last_duration_seconds{{script="{_label(script)}",stage="{_label(stage)}"}} '
+                       f"{entry.get('last', 0):.6f}\n")
+        header("planefence_stage_last_run_timestamp_seconds", "gauge", "When a stage last finished")
+        for (script, stage), entry in stages:
+            out.append(f'planefence_stage_last_run_timestamp_seconds{{script="{_label(script)}",stage="{_label(stage)}"}} '
+                       f"{entry.get('at', 0):.3f}\n")
+
+        header("planefence_external_calls_total", "counter", "External commands (curl, jq, awk, ...) that were run")
+        for key, count in sorted(self.calls.items()):
+            script, command = key.split("\t", 1)
+            out.append(f'planefence_external_calls_total{{script="{_label(script)}",command="{_label(command)}"}} {count}\n')
+
+        caches = sorted((key.split("\t", 1), counts) for key, counts in self.caches.items())
+        header("planefence_cache_requests_total", "counter", "Cache lookups by result")
+        for (script, cache), (hits, misses) in caches:
+            labels = f'script="{_label(script)}",cache="{_label(cache)}"'
+            out.append(f'planefence_cache_requests_total{{{labels},result="hit"}} {hits}\n')
+            out.append(f'planefence_cache_requests_total{{{labels},result="miss"}} {misses}\n')
+        header("planefence_cache_hit_ratio", "gauge", "Share of the cache lookups that were hits")
+        for (script, cache), (hits, misses) in caches:
+            ratio = hits / (hits + misses) if hits + misses else 0.0
+            out.append(f'planefence_cache_hit_ratio{{script="{_label(script)}",cache="{_label(cache)}"}} {ratio:.4f}\n')
+        return "".join(out)
+
+
+@contextlib.contextmanager
+def locked(state):
+    """Hold the lock of the state file"""
+    with open(f"{state}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def update(lines, state=STATE_FILE, output=OUTPUT_FILE):
+    """Add the event lines to the state and rewrite the Prometheus file; returns the number of events used"""
+    with locked(state):
+        metrics = Metrics.load(state)
+        used = metrics.merge(lines)
+        if used:
+            metrics.save(state)
+        if output and (used or not os.path.exists(output)):
+            _write_atomic(output, metrics.to_prometheus())
+    return used
+
+
+def _start_file(script, stage):
+    return os.path.join(STARTS_DIR, f"{script}-{stage}".replace("/", "_"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage timings and counters of the Planefence cycle")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record_cmd = sub.add_parser("record", help="add the events on stdin")
+    start_cmd = sub.add_parser("start", help="mark the start of a stage")
+    stop_cmd = sub.add_parser("stop", help="record the time since the start of a stage")
+    export_cmd = sub.add_parser("export", help="rewrite the Prometheus file")
+    for cmd in (start_cmd, stop_cmd):
+        cmd.add_argument("stage")
+        cmd.add_argument("--script", default="shell")
+    for cmd in (record_cmd, stop_cmd, export_cmd):
+        cmd.add_argument("--state", default=STATE_FILE)
+        cmd.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "start":
+            os.makedirs(STARTS_DIR, exist_ok=True)
+            with open(_start_file(args.script, args.stage), "w") as f:
+                f.write(f"{time.time():.6f}\n")
+        elif args.command == "stop":
+            path = _start_file(args.script, args.stage)
+            try:
+                with open(path) as f:
+                    start = f.read().strip()
+                os.unlink(path)
+            except FileNotFoundError:
+                print(f"No start recorded for stage {args.stage}", file=sys.stderr)
+                return 1
+            update([f"stage {args.script} {args.stage} {start} {time.time():.6f}"], args.state, args.output)
+        elif args.command == "record":
+            update(sys.stdin, args.state, args.output)
+        else:
+            with locked(args.state):
+                _write_atomic(args.output, Metrics.load(args.state).to_prometheus())
+    except OSError as e:
+        print(f"Unable to update the metrics: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# Converter for the Mictronics aircraft database (aircraft_db.zip) into icao2plane.txt
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The database is a zip of JSON shards. Each shard is named after an ICAO hex prefix and maps the
+# rest of the ICAO to a record with "r" (registration), "t" (type designator) and "desc". A shard
+# like A0.json can hold ICAOs that also fall under A.json, so the shards are grouped by their
+# shortest prefix; the groups don't overlap and follow each other in ICAO order. A group that is
+# larger than GROUP_BYTES (the US A block is most of the database) is split by the next ICAO digit:
+# A0 with A0*.json, A1 with A1*.json, ... each also reading the rows of A.json that fall under it.
+# The shards are read straight from the zip (nothing is extracted to /tmp) and converted in a process
+# pool. Only a few groups per worker are handed to the pool at a time, and every group is written to
+# the output as soon as it (and the ones before it) is done, so there is never more than that window
+# of groups in memory and no global sort.
+#
+# The output has one line per aircraft: hexid,tail,type_designator,description (sorted). Each group
+# comes with the packed ICAOs and offsets of its first lines, which are appended to the pflib.lookup
+# index (a fixed-width array of 24-bit ICAOs and offsets, binary searchable) as it is written.
+#
+# Usage:
+#   python3 -m pflib.mictronics convert <aircraft_db.zip> <icao2plane.txt> [--jobs N]
+# exits with NO_ROWS if the zip holds no usable records, in which case the output isn't touched.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import lookup
+
+NO_ROWS = 3
+HEX_CHARS = set("0123456789ABCDEF")
+GROUP_BYTES = 4 << 20     # of JSON; larger groups are split by the next ICAO digit
+WINDOW_PER_WORKER = 2     # groups handed to the pool (or done but not written yet) per worker
+
+_zip = None   # the open zip of a worker process
+
+
+def shard_prefix(member):
+    """The ICAO prefix of a zip member like 'A0.json', or None if it isn't a shard"""
+    name = os.path.basename(member)
+    if not name.lower().endswith(".json"):
+        return None
+    prefix = name[:-5].strip().upper()
+    if not prefix or not HEX_CHARS.issuperset(prefix):
+        return None
+    return prefix
+
+
+def _field(rec, key):
+    return str(rec.get(key, "")).strip().replace(",", " ").replace("\n", " ")
+
+
+def shard_rows(prefix, data):
+    """The CSV lines of one shard, unsorted"""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return []
+    if not isinstance(payload, dict):
+        return []
+    rows = []
+    for suffix, rec in payload.items():
+        if not isinstance(rec, dict):
+            continue
+        hexid = prefix + str(suffix).strip().upper()
+        if len(hexid) != 6 or not HEX_CHARS.issuperset(hexid):
+            continue
+        rows.append(f"{hexid},{_field(rec, 'r')},{_field(rec, 't')},{_field(rec, 'desc')}\n")
+    return rows
+
+
+def shard_groups(members):
+    """The shard members grouped by their shortest prefix (A.json with A0.json, A00.json, ...), in ICAO order"""
+    groups = []
+    root = None
+    for prefix, member in sorted((shard_prefix(m), m) for m in members):
+        if root is None or not prefix.startswith(root):
+            root = prefix
+            groups.append([])
+        groups[-1].append(member)
+    return groups
+
+
+def split_group(group, sizes, limit=GROUP_BYTES):
+    """
+    Split a group from shard_groups into (prefix, members) parts of at most about limit bytes, in ICAO
+    order. A part only keeps the rows under its prefix; the shards with a shorter prefix than the part
+    (A.json in part A0) are read by every part they cover.
+    """
+    def split(prefix, members):
+        parents = [m for m in members if len(shard_prefix(m)) <= len(prefix)]
+        if (len(prefix) >= 5 or len(parents) == len(members)
+                or sum(sizes[m] for m in members) <= limit):
+            return [(prefix, members)]
+        parts = []
+        for digit in "0123456789ABCDEF":
+            children = [m for m in members if shard_prefix(m).startswith(prefix + digit)]
+            parts.extend(split(prefix + digit, parents + children))
+        return parts
+
+    return split(shard_prefix(group[0]), group)
+
+
+def convert_group(shards, prefix=""):
+    """Convert the (prefix, data) shards of a group (only the rows under prefix). Returns its sorted CSV
+    lines as one bytes block, the packed lookup keys of its ICAOs and the array("Q") offsets of their
+    first lines in the block"""
+    block = bytearray()
+    keys = bytearray()
+    offsets = array("Q")
+    last = None
+    rows = (row for shard, data in shards for row in shard_rows(shard, data))
+    for row in sorted(row for row in rows if row.startswith(prefix)):
+        if row[:6] != last:
+            last = row[:6]
+            keys += bytes.fromhex(last)
+            offsets.append(len(block))
+        block += row.encode("utf-8")
+    return bytes(block), bytes(keys), offsets
+
+
+def _init_worker(zip_path):
+    global _zip
+    _zip = zipfile.ZipFile(zip_path)
+
+
+def _worker(part):
+    prefix, members = part
+    return convert_group([(shard_prefix(m), _zip.read(m)) for m in members], prefix)
+
+
+def read_groups(zip_path, jobs=None):
+    """The converted shard groups of zip_path (see convert_group) in ICAO order, as they are done"""
+    with zipfile.ZipFile(zip_path) as zf:
+        infos = [m for m in zf.infolist() if not m.is_dir() and shard_prefix(m.filename)]
+        sizes = {m.filename: m.file_size for m in infos}
+        parts = [part for group in shard_groups(list(sizes)) for part in split_group(group, sizes)]
+        if jobs == 1 or len(parts) < 2:
+            for prefix, members in parts:
+                yield convert_group([(shard_prefix(m), zf.read(m)) for m in members], prefix)
+            return
+    workers = jobs or os.cpu_count() or 1
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(zip_path,))
+    except (OSError, NotImplementedError):
+        # No working multiprocessing (e.g. no /dev/shm in the container): do it in this process
+        yield from read_groups(zip_path, jobs=1)
+        return
+    with pool:
+        yield from _in_order(pool, parts, workers * WINDOW_PER_WORKER)
+
+
+def _in_order(pool, parts, window):
+    """Convert parts in the pool with at most window of them submitted or waiting to be written"""
+    todo = iter(enumerate(parts))
+    running = {}
+    done = {}
+    at = 0
+    while True:
+        while len(running) + len(done) < window:
+            n, part = next(todo, (None, None))
+            if part is None:
+                break
+            running[pool.submit(_worker, part)] = n
+        if at in done:
+            yield done.pop(at)
+            at += 1
+            continue
+        if not running:
+            return
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            done[running.pop(future)] = future.result()
+
+
+def convert(zip_path, out_file, jobs=None):
+    """Convert zip_path into out_file and its lookup index. Returns the number of lines written"""
+    directory = os.path.dirname(os.path.abspath(out_file))
+    fd, tmpname = tempfile.mkstemp(prefix=".icao2plane-", dir=directory)
+    keys = bytearray()
+    offsets = array("Q")
+    count = at = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block, block_keys, block_offsets in read_groups(zip_path, jobs):
+                out.write(block)
+                keys += block_keys
+                offsets.extend(at + offset for offset in block_offsets)
+                at += len(block)
+                count += block.count(b"\n")
+        if count:
+            os.chmod(tmpname, 0o644)
+            os.replace(tmpname, out_file)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    if not count:
+        os.unlink(tmpname)
+        return 0
+
+    lookup.write_packed_index(lookup.index_path(out_file), keys, offsets, os.stat(out_file))
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the Mictronics aircraft database for Planefence")
+    parser.add_argument("command", choices=["convert"])
+    parser.add_argument("zip", help="aircraft_db.zip")
+    parser.add_argument("out", help="output file, e.g. /run/planefence/icao2plane.txt")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    try:
+        count = convert(args.zip, args.out, args.jobs)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Unable to convert {args.zip}: {e}", file=sys.stderr)
+        return 1
+    if not count:
+        print(f"{args.zip} holds no aircraft records", file=sys.stderr)
+        return NO_ROWS
+    print(count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+# Time-indexed noisecapt data for pf-process_sbs.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The noisecapt container writes one log per day (noisecapt-yyMMdd.log, "epoch,level,1min,5min,10min,1hr"
+# lines, one per sample) and a listing of its files (noisecapt-dir.gz). Instead of downloading the logs
+# again and running awk over them for every record, the logs are mirrored in CACHE_DIR and only the
+# bytes that were added since the last run are downloaded (an HTTP Range request). The new lines are
+# parsed and appended to a binary index next to the mirror (.<name>.idx), so a run only parses what is
+# new. Layout (integers little endian):
+#
+#   header   MAGIC, version, count, mirror bytes parsed
+#   samples  count x 6 int64 (epoch, level, 1min, 5min, 10min, 1hr)
+#
+# The listing is kept in CACHE_DIR too and is only downloaded again when it has changed (a conditional
+# GET with the ETag / Last-Modified of the copy we have).
+#
+# "query" reads the records of a run on stdin, one per line: <key> TAB <firstseen> TAB <lastseen> TAB
+# <time_at_mindist>, and answers all of them from the same sorted arrays with binary searches. For
+# every record it writes one line with these fields, separated by 0x1F (fields can be empty):
+#
+#   key, "avglevel avg1min avg5min avg10min avg1hr loudness" (empty without samples), the number of
+#   samples for the noise plot, the nearest spectrogram, the recording of the loudest sample
+#
+# with exactly the windows and rounding GET_NOISEDATA, CREATE_NOISEPLOT, CREATE_SPECTROGRAM and
+# CREATE_MP3 use.
+#
+# Usage:
+#   python3 -m pflib.noise listing --remote URL                 prints the (cached) file listing
+#   python3 -m pflib.noise log --remote URL --date yyMMdd       prints the (mirrored) log of a day
+#   python3 -m pflib.noise query --remote URL --dates yyMMdd[,yyMMdd...] [--listing FILE] [--maxspread 15]
+
+import argparse
+import gzip
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+from bisect import bisect_left, bisect_right
+
+CACHE_DIR = "/tmp/.pf-noiseindex"
+TIMEOUT = 30
+MAXSPREAD = 15      # seconds a spectrogram may be away from the closest approach
+NOISE_WINDOW = 15   # minimum length of the averaging window (GET_NOISEDATA)
+PLOT_MARGIN = 15    # seconds the noise plot starts before firstseen (CREATE_NOISEPLOT)
+MP3_WINDOW = 30     # minimum length of the window the recording is picked from (CREATE_MP3)
+NO_LEVEL = -999
+
+MAGIC = b"PFNOISE\0"
+VERSION = 1
+HEADER_FORMAT = "<8sIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SAMPLE_FORMAT = "<6q"
+SAMPLE_SIZE = struct.calcsize(SAMPLE_FORMAT)
+
+LISTING = "noisecapt-dir.gz"
+SEPARATOR = "\x1f"
+
+_SPECTRO = re.compile(r"noisecapt-spectro-([0-9]+)\.png")
+
+
+def log_name(date):
+    return f"noisecapt-{date}.log"
+
+
+def _index_path(mirror):
+    directory, name = os.path.split(mirror)
+    return os.path.join(directory, f".{name}.idx")
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(path, data):
+    fd, tmpname = tempfile.mkstemp(prefix=".noise-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, path)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+# --- mirroring ------------------------------------------------------------------------------------
+
+def sync_log(remote, date, cache_dir=CACHE_DIR, timeout=TIMEOUT):
+    """
+    Bring the mirror of the log of date up to date with the bytes the remote log got since the last
+    time. Returns the path of the mirror, or None if there is none. A failed download leaves the
+    mirror as it was.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    mirror = os.path.join(cache_dir, log_name(date))
+    try:
+        size = os.path.getsize(mirror)
+    except OSError:
+        size = 0
+    url = f"{remote.rstrip('/')}/{log_name(date)}"
+    request = urllib.request.Request(url, headers={"Range": f"bytes={size}-"} if size else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content_range = response.headers.get("Content-Range", "")
+            body = response.read()
+        if response.status == 206 and content_range.startswith(f"bytes {size}-"):
+            with open(mirror, "ab") as f:
+                f.write(body)
+        else:
+            # The server sent the whole file (no Range support, or a different file). If it isn't the
+            # file we had plus new lines, the index of the mirror has to be started over.
+            if size:
+                with open(mirror, "rb") as f:
+                    if body[:size] != f.read():
+                        _remove(_index_path(mirror))
+            _write_atomic(mirror, body)
+    except urllib.error.HTTPError as e:
+        if e.code == 416:
+            # Nothing new - unless the remote log got shorter, then it was replaced
+            m = re.fullmatch(r"bytes \*/(\d+)", e.headers.get("Content-Range", ""))
+            if m and int(m.group(1)) < size:
+                _remove(mirror)
+                _remove(_index_path(mirror))
+                return sync_log(remote, date, cache_dir, timeout)
+        elif e.code == 404 and not size:
+            return None
+        else:
+            print(f"Unable to update {url}: {e}", file=sys.stderr)
+    except OSError as e:
+        print(f"Unable to update {url}: {e}", file=sys.stderr)
+    return mirror if os.path.exists(mirror) else None
+
+
+def sync_listing(remote, cache_dir=CACHE_DIR, timeout=TIMEOUT):
+    """The lines of the remote file listing, downloaded only if it changed since our copy"""
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, LISTING)
+    metafile = cached + ".json"
+    meta = {}
+    if os.path.exists(cached):
+        try:
+            with open(metafile) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    url = f"{remote.rstrip('/')}/{LISTING}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+            body = response.read()
+            meta = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        gzip.decompress(body)   # don't replace a good copy with a broken download
+        _write_atomic(cached, body)
+        _write_atomic(metafile, json.dumps(meta).encode("utf-8"))
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            print(f"Unable to update {url}: {e}", file=sys.stderr)
+    except (OSError, EOFError) as e:
+        print(f"Unable to update {url}: {e}", file=sys.stderr)
+
+    try:
+        with gzip.open(cached, "rt", encoding="utf-8", errors="replace") as f:
+            return f.read().splitlines()
+    except (OSError, EOFError):
+        return []
+
+
+# --- sample index ---------------------------------------------------------------------------------
+
+def _parse(data):
+    """The samples in data (complete lines only); lines that aren't six integers are skipped"""
+    samples = []
+    for line in data.decode("ascii", "replace").splitlines():
+        try:
+            sample = tuple(int(field) for field in line.strip().split(","))
+        except ValueError:
+            continue
+        if len(sample) == 6:
+            samples.append(sample)
+    return samples
+
+
+def _read_index(idxfile):
+    """(samples bytes, mirror bytes parsed) of an index, or (b"", 0) if there is no usable one"""
+    try:
+        with open(idxfile, "rb") as f:
+            data = f.read()
+    except OSError:
+        return b"", 0
+    if len(data) < HEADER_SIZE:
+        return b"", 0
+    magic, version, count, parsed = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION or len(data) < HEADER_SIZE + count * SAMPLE_SIZE:
+        return b"", 0
+    # Samples past count were written by a run that died before it updated the header
+    return data[HEADER_SIZE:HEADER_SIZE + count * SAMPLE_SIZE], parsed
+
+
+def update_index(mirror):
+    """Parse what was added to mirror since the last time into its index; returns all its samples"""
+    idxfile = _index_path(mirror)
+    packed, parsed = _read_index(idxfile)
+    with open(mirror, "rb") as f:
+        if parsed > os.fstat(f.fileno()).st_size:
+            packed, parsed = b"", 0   # the mirror was replaced
+        f.seek(parsed)
+        new = f.read()
+    end = new.rfind(b"\n") + 1    # a line that isn't complete yet is parsed next time
+    added = _parse(new[:end])
+    samples = list(struct.iter_unpack(SAMPLE_FORMAT, packed)) + added
+    if end or not parsed:
+        count = len(samples)
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, count, parsed + end)
+        body = b"".join(struct.pack(SAMPLE_FORMAT, *sample) for sample in added)
+        try:
+            if packed or parsed:
+                with open(idxfile, "r+b") as f:
+                    f.seek(HEADER_SIZE + len(packed))
+                    f.write(body)
+                    f.truncate()
+                    f.seek(0)
+                    f.write(header)
+            else:
+                _write_atomic(idxfile, header + body)
+        except OSError as e:
+            print(f"Unable to update {idxfile}: {e}", file=sys.stderr)
+    return samples
+
+
+class NoiseIndex:
+    """Noise samples sorted by time, with running sums for the averages"""
+
+    def __init__(self, samples):
+        samples = sorted(samples, key=lambda sample: sample[0])   # stable: keeps log order per second
+        self.times = [sample[0] for sample in samples]
+        self.levels = [sample[1] for sample in samples]
+        self.sums = [[0] * (len(samples) + 1) for _ in range(5)]
+        for n, sample in enumerate(samples):
+            for column in range(5):
+                self.sums[column][n + 1] = self.sums[column][n] + sample[column + 1]
+
+    def __len__(self):
+        return len(self.times)
+
+    def span(self, start, end):
+        """Positions of the samples from start through end"""
+        return bisect_left(self.times, start), bisect_right(self.times, end)
+
+    def count(self, start, end):
+        lo, hi = self.span(start, end)
+        return hi - lo
+
+    def averages(self, start, end):
+        """The averages of the five columns from start through end, rounded like bash does; None without samples"""
+        lo, hi = self.span(start, end)
+        if hi <= lo:
+            return None
+        return [_div(column[hi] - column[lo], hi - lo) for column in self.sums]
+
+    def loudest(self, start, end):
+        """Time of the first loudest sample from start through end, 0 if there is none"""
+        lo, hi = self.span(start, end)
+        best_level, best_time = NO_LEVEL, 0
+        for n in range(lo, hi):
+            if self.levels[n] > best_level:
+                best_level, best_time = self.levels[n], self.times[n]
+        return best_time
+
+
+def _div(a, b):
+    """Integer division that truncates toward zero, like $(( a / b ))"""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def load(remote, dates, cache_dir=CACHE_DIR):
+    samples = []
+    for date in dates:
+        mirror = sync_log(remote, date, cache_dir)
+        if mirror:
+            try:
+                samples.extend(update_index(mirror))
+            except OSError as e:
+                print(f"Unable to read {mirror}: {e}", file=sys.stderr)
+    return NoiseIndex(samples)
+
+
+class Spectrograms:
+    """The spectrograms of a file listing, by time"""
+
+    def __init__(self, listing):
+        found = {}
+        for name in listing:
+            m = _SPECTRO.fullmatch(name)
+            if m:
+                found.setdefault(int(m.group(1)), name)   # the first of names with the same time
+        self.times = sorted(found)
+        self.names = [found[t] for t in self.times]
+
+    def nearest(self, when, maxspread=MAXSPREAD):
+        """The latest spectrogram at or before when, else the first one after it, within maxspread seconds"""
+        pos = bisect_right(self.times, when)
+        if pos and when - self.times[pos - 1] <= maxspread:
+            return self.names[pos - 1]
+        if pos < len(self.times) and self.times[pos] - when <= maxspread:
+            return self.names[pos]
+        return ""
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def query(lines, index, spectrograms, maxspread=MAXSPREAD):
+    """Yield (key, noise, plot samples, spectrogram, recording) for <key> TAB <firstseen> TAB <lastseen> TAB <mindist> lines"""
+    for line in lines:
+        fields = line.rstrip("\n").split("\t") + [""] * 3
+        key, firstseen, lastseen, mindist = fields[0], _int(fields[1]), _int(fields[2]), _int(fields[3])
+        if not key or firstseen is None:
+            continue
+
+        end = lastseen if lastseen is not None and lastseen - firstseen >= NOISE_WINDOW else firstseen + NOISE_WINDOW
+        averages = index.averages(firstseen, end)
+        noise = ""
+        if averages:
+            noise = " ".join(str(value) for value in averages + [averages[0] - averages[4]])
+        plot = index.count(firstseen - PLOT_MARGIN, end)
+
+        end = lastseen if lastseen is not None and lastseen - firstseen >= MP3_WINDOW else firstseen + MP3_WINDOW
+        recording = f"noisecapt-recording-{index.loudest(firstseen, end + 1)}.mp3"
+
+        spectrogram = spectrograms.nearest(mindist, maxspread) if mindist is not None else ""
+        yield key, noise, plot, spectrogram, recording
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time-indexed noisecapt data for Planefence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing_cmd = sub.add_parser("listing", help="print the file listing of the noisecapt server")
+    log_cmd = sub.add_parser("log", help="print the log of a day")
+    log_cmd.add_argument("--date", required=True, help="yyMMdd")
+    query_cmd = sub.add_parser("query", help="look up the noise data of the records on stdin")
+    query_cmd.add_argument("--dates", required=True, help="comma separated yyMMdd dates of the logs to use")
+    query_cmd.add_argument("--listing", help="file listing to use instead of fetching it")
+    query_cmd.add_argument("--maxspread", type=int, default=MAXSPREAD)
+    for cmd in (listing_cmd, log_cmd, query_cmd):
+        cmd.add_argument("--remote", required=True, help="URL of the noisecapt server")
+        cmd.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "listing":
+        listing = sync_listing(args.remote, args.cache_dir)
+        if not listing:
+            return 1
+        sys.stdout.write("\n".join(listing) + "\n")
+        return 0
+
+    if args.command == "log":
+        mirror = sync_log(args.remote, args.date, args.cache_dir)
+        if not mirror:
+            return 1
+        with open(mirror, "rb") as f:
+            sys.stdout.buffer.write(f.read())
+        return 0
+
+    if args.listing:
+        try:
+            with open(args.listing, encoding="utf-8", errors="replace") as f:
+                listing = f.read().splitlines()
+        except OSError as e:
+            print(f"Unable to read {args.listing}: {e}", file=sys.stderr)
+            listing = []
+    else:
+        listing = sync_listing(args.remote, args.cache_dir)
+    index = load(args.remote, [d for d in args.dates.split(",") if d], args.cache_dir)
+    for fields in query(sys.stdin, index, Spectrograms(listing), args.maxspread):
+        sys.stdout.write(SEPARATOR.join(str(field) for field in fields) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# Resident notification service for Planefence and Plane-Alert
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The service listens on a local Unix socket and accepts NDJSON jobs, one JSON object per line.
+# Every job gets exactly one JSON line back. The config and the plane-alert-db are kept loaded
+# and are reloaded when their files change. All Discord posts go through the pooled,
+# rate-limited fan-out in pflib.webhooks, and Bluesky, Mastodon and Telegram posts through
+# pflib.dispatch, which keeps their sessions and rate limits between posts, so the notifier
+# scripts only hand over the rendered post.
+#
+# Jobs:
+#   {"type": "ping"}
+#   {"type": "reload"}
+#   {"type": "plane", "icao": "A51316"}
+#   {"type": "discord", "subsystem": "PA", "payload": {...}, "webhooks": [...], "files": [...]}
+#       "webhooks" defaults to PA_DISCORD_WEBHOOKS/PF_DISCORD_WEBHOOKS for the subsystem
+#   {"type": "post", "posts": {"bluesky": {...}, "mastodon": {...}, "telegram": {...}}, "files": [...]}
+#       one notification, posted to every channel in "posts" at the same time (see pflib.dispatch)
+# A job with "ack": true is first acknowledged with {"ack": true, "timeout": <seconds>}, the time it may
+# take to answer it, so the client (/usr/share/planefence/notifyd-client.py) knows how long to wait
+# without importing the delivery code itself.
+#
+# Usage:
+#   python3 -m pflib.notifyd serve [--socket <path>]
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+import pflib
+from pflib import dispatch
+from pflib import media
+from pflib import webhooks as delivery
+from pflib.planedb import PlaneDBIndexError
+
+SOCKET_PATH = os.getenv("PF_NOTIFYD_SOCKET", "/run/planefence/notifyd.sock")
+REPLY_TIMEOUT = 30       # for jobs that don't talk to the outside world
+
+
+class NotifyService:
+
+    def __init__(self):
+        self.config = {}
+        self.started = time.time()
+        self.jobs = 0
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _files_stamp(self):
+        pfdir = os.getenv("PLANEFENCEDIR", "/usr/share/planefence/persist")
+        stamp = []
+        for path in (f"{pfdir}/planefence.config", self.config.get("PLANEFILE", pflib.DEFAULT_PLANEFILE)):
+            try:
+                st = os.stat(path)
+                stamp.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append((path, None, None))
+        return stamp
+
+    def refresh(self, force=False):
+        """Reload the config (and with it the plane-db) if any of the underlying files changed"""
+        with self._lock:
+            stamp = self._files_stamp()
+            if force or stamp != self._stamp:
+                try:
+                    self.config = pflib.load_config()
+                except (OSError, PlaneDBIndexError) as e:
+                    # A missing plane-alert-db shouldn't take the service down; retry on the next job
+                    pflib.log(f"[error] Unable to load the configuration: {e}")
+                    return
+                self._stamp = self._files_stamp()
+
+    def handle(self, job):
+        self.jobs += 1
+        kind = job.get("type", "")
+        if kind == "ping":
+            return {"ok": True, "uptime": int(time.time() - self.started), "jobs": self.jobs,
+                    "planes": len(pflib.planedb)}
+        self.refresh(force=(kind == "reload"))
+        if kind == "reload":
+            return {"ok": True, "planes": len(pflib.planedb)}
+        if kind == "plane":
+            return {"ok": True, "plane": pflib.get_plane_info(str(job.get("icao", "")).upper())}
+        if kind == "discord":
+            return self.discord(job)
+        if kind == "post":
+            return self.post(job)
+        return {"ok": False, "error": f"unknown job type '{kind}'"}
+
+    def discord(self, job):
+        subsystem = str(job.get("subsystem", "PA")).upper()
+        webhooks = job.get("webhooks") or self.config.get(f"{subsystem}_DISCORD_WEBHOOKS", [])
+        webhooks = [url.strip() for url in webhooks if url.strip()]
+        payload = job.get("payload", {})
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        timeout = float(job.get("timeout", delivery.DEFAULT_TIMEOUT))
+
+        attachments = []
+        for n, path in enumerate(job.get("files", [])):
+            try:
+                data = media.load(path)
+            except OSError as e:
+                pflib.log(f"[error] Unable to attach {path}: {e}")
+                continue
+            if data is None:
+                pflib.log(f"[error] Unable to attach {path}: file is too large")
+                continue
+            attachments.append((f"file{n + 1}", (os.path.basename(path), data)))
+
+        results = delivery.post_all(webhooks, payload, attachments, timeout=timeout)
+        sent = sum(1 for r in results if r["ok"])
+        pflib.log(f"Sent {sent} Discord messages, {len(results) - sent} failed")
+        return {"ok": sent > 0, "results": results}
+
+    def post(self, job):
+        results = dispatch.dispatch(job.get("posts"), job.get("files", []),
+                                    float(job.get("timeout", dispatch.DEFAULT_TIMEOUT)))
+        for result in results:
+            if result["ok"]:
+                pflib.log(f"Posted to {result['channel']}: {result['link'] or '(private chat)'}")
+            else:
+                pflib.log(f"[error] Posting to {result['channel']} failed: {result['error']}")
+        return {"ok": any(result["ok"] for result in results), "results": results}
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            job = None
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError("a job must be a JSON object")
+                if job.get("ack"):
+                    ack = {"ack": True, "timeout": job_timeout(job)}
+                    if "id" in job:
+                        ack["id"] = job["id"]
+                    self.wfile.write(json.dumps(ack).encode() + b"\n")
+                    self.wfile.flush()
+                reply = self.server.service.handle(job)
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            if isinstance(job, dict) and "id" in job:
+                reply["id"] = job["id"]
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=SOCKET_PATH):
+    pflib.init_log("notifyd")
+    service = NotifyService()
+    service.refresh(force=True)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _Server(path, _JobHandler) as server:
+        server.service = service
+        os.chmod(path, 0o660)
+        pflib.log(f"Listening for notification jobs on {path}")
+        server.serve_forever()
+
+
+def job_timeout(job):
+    """How long the service may take to answer job (a decoded job)"""
+    if job.get("type") == "discord":
+        webhooks = job.get("webhooks") or []
+        return REPLY_TIMEOUT + delivery.max_duration(len(webhooks),
+                                                     float(job.get("timeout", delivery.DEFAULT_TIMEOUT)))
+    if job.get("type") == "post":
+        return REPLY_TIMEOUT + dispatch.max_duration(job.get("files") or [],
+                                                     float(job.get("timeout", dispatch.DEFAULT_TIMEOUT)))
+    return REPLY_TIMEOUT
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Planefence notification service")
+    parser.add_argument("mode", choices=["serve"])
+    parser.add_argument("--socket", default=SOCKET_PATH, help=f"Unix socket path (default: {SOCKET_PATH})")
+    args = parser.parse_args(argv)
+
+    serve(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
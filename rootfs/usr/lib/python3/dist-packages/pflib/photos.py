@@ -0,0 +1,418 @@
+# Batched, cached aircraft photo lookups for Planefence and Plane-Alert
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# Photos are looked up by ICAO with the planespotters.net API, or taken from the image links in the
+# Plane-Alert DB (first or as a fallback, depending on PREFER_PA_DB_FOR_PHOTOS). The planespotters
+# answers are kept in one persistent cache (a small SQLite database in persist/.internal) instead of
+# a .link, .thumb.link and .notavailable file per ICAO; "no photo" answers are cached too, so those
+# ICAOs aren't asked for again on every run. Answers that failed (the API is down or rate limited us)
+# aren't cached, so they are tried again on the next run.
+#
+# All subsystems (pf-process_sbs.sh, pa-collect-candidates.sh, retry-missing-images.sh, convert_pa.sh)
+# read the ICAOs they need on stdin, one per line. Every ICAO is looked up once no matter how often it
+# is listed, the Plane-Alert DB is read in a single pass, and the ICAOs that aren't in the cache are
+# fetched by a small pool of workers over pooled keep-alive connections, rate limited per host. The
+# answers are written as <icao> TAB <link> TAB <thumbnail link> lines, with empty links for ICAOs
+# without a photo. "download" also stores the thumbnails as planepix/cache/<ICAO>.jpg (keeping the
+# ones that are still fresh) and adds TAB <file>, empty when there is no thumbnail.
+#
+# Usage:
+#   python3 -m pflib.photos resolve|download [--api-url URL] [--cache FILE] [--image-dir DIR] [--pa-file FILE]
+#                                             [--prefer-pa] [--ttl S] [--negative-ttl S] [--workers N] [--rate N]
+#   python3 -m pflib.photos serve [--port 8090] [--photos icaos.txt]
+#       a stand-in for the planespotters API and its thumbnail host, for testing: answers with a photo
+#       for the ICAOs in the file (one per line) and with no photos for everything else
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from pflib import metrics
+from pflib.ttlcache import TTLCache
+from pflib.webhooks import TokenBucket
+
+API_URL = "https://api.planespotters.net/pub/photos/hex/"
+CACHE_FILE = "/usr/share/planefence/persist/.internal/photos.db"
+IMAGE_DIR = "/usr/share/planefence/persist/planepix/cache"
+PA_FILE = "/usr/share/planefence/persist/.internal/plane-alert-db.txt"
+CONFIG_FILE = "/usr/share/planefence/planefence.conf"
+TTL = 3 * 86400            # seconds a photo link (and its thumbnail file) is kept
+NEGATIVE_TTL = 3 * 86400   # seconds a "no photo" answer is kept
+TIMEOUT = 30
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 3
+HOST_RATE = 4              # requests per second, per host
+
+IMAGE_EXTENSIONS = re.compile(r"\.(jpg|jpeg|png|gif|bmp|webp|tiff?|heic|heif|avif|svg|ico)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    icao TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    thumb TEXT NOT NULL,
+    fetched REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize_icao(icao):
+    return str(icao).strip().upper()
+
+
+def user_agent(config=CONFIG_FILE):
+    """The user agent the bash scripts use: Planefence/<major.minor> (+https://sdr-e.com/docker-planefence)"""
+    version = "0.0"
+    try:
+        with open(config, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = re.match(r"\s*VERSION=(\d+\.\d+)", line)
+                if match:
+                    version = match.group(1)
+                    break
+    except OSError:
+        pass
+    return f"Planefence/{version} (+https://sdr-e.com/docker-planefence)"
+
+
+class PhotoCache(TTLCache):
+    """Persistent icao -> (link, thumbnail link) cache with a TTL for photos and for "no photo" answers"""
+
+    def __init__(self, path=CACHE_FILE, ttl=TTL, negative_ttl=NEGATIVE_TTL):
+        super().__init__(path, SCHEMA, "photos", "icao", ("link", "thumb"), ttl, negative_ttl,
+                         lambda link, thumb: not link)
+
+
+def error_message(payload):
+    """The first error message in a planespotters answer, like planespotters_json_error_message in pf-common"""
+    if payload is None:
+        return None
+    if isinstance(payload, str):
+        return payload or None
+    if isinstance(payload, list):
+        for item in payload:
+            message = error_message(item)
+            if message:
+                return message
+        return None
+    if isinstance(payload, dict):
+        for key in ("error", "message", "detail", "errors"):
+            message = error_message(payload.get(key))
+            if message:
+                return message
+    return None
+
+
+def parse_photo(payload):
+    """(link, thumbnail link) of the first photo in a planespotters answer; empty links if there is none"""
+    photos = payload.get("photos") if isinstance(payload, dict) else None
+    links, thumbs = [], []
+    for photo in photos if isinstance(photos, list) else []:
+        if not isinstance(photo, dict):
+            continue
+        if photo.get("link"):
+            links.append(str(photo["link"]))
+        thumb = photo.get("thumbnail_large")
+        if isinstance(thumb, dict) and thumb.get("src"):
+            thumbs.append(str(thumb["src"]))
+    if links and thumbs:
+        return links[0], thumbs[0]
+    return "", ""
+
+
+def pa_image_links(path, icaos):
+    """
+    {icao: link} with the first image-looking http(s) URL in the Plane-Alert DB row of each of icaos,
+    read in one pass (the same rules as GET_PA_IMAGE_LINK: the first row of an ICAO counts)
+    """
+    links, seen = {}, set()
+    if not path or not icaos or not os.path.isfile(path):
+        return links
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            next(f, None)
+            for line in f:
+                fields = [field.strip().strip('"').strip() for field in line.rstrip("\r\n").split(",")]
+                icao = fields[0].upper()
+                if icao not in icaos or icao in seen:
+                    continue
+                seen.add(icao)
+                for value in fields[1:]:
+                    if not re.match(r"https?://", value, re.IGNORECASE):
+                        continue
+                    if IMAGE_EXTENSIONS.search(re.sub(r"[?#].*$", "", value.lower())):
+                        links[icao] = value
+                        break
+    except OSError as e:
+        print(f"Unable to read the Plane-Alert DB {path}: {e}", file=sys.stderr)
+    return links
+
+
+class Fetcher:
+    """A pooled HTTP session with a token bucket per host; requests is imported on first use"""
+
+    def __init__(self, api_url=API_URL, timeout=TIMEOUT, workers=MAX_WORKERS, rate=HOST_RATE, agent=None):
+        self.api_url = api_url
+        self.rate = rate
+        self.timeout = timeout
+        self.workers = workers
+        self.agent = agent or user_agent()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                self._session.headers["User-Agent"] = self.agent
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers * 2)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    def bucket(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, 1.0)
+            return self._buckets[host]
+
+    def get(self, url):
+        """GET url within its host's rate limit, waiting out 429s; returns the response or raises OSError"""
+        import requests
+        bucket = self.bucket(url)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.session().get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise OSError(str(e)) from e
+            bucket.update(response.headers, response.status_code)
+            if response.status_code != 429 or attempt == MAX_ATTEMPTS:
+                return response
+        return response
+
+    def photo(self, icao):
+        """(link, thumbnail link) of icao, empty links if it has no photo, None if the lookup failed"""
+        url = self.api_url + icao
+        try:
+            response = self.get(url)
+            if response.status_code == 404:
+                return "", ""
+            payload = response.json()
+        except (OSError, ValueError) as e:
+            print(f"Planespotters API request failed for ICAO {icao} while requesting {url}: {e}", file=sys.stderr)
+            return None
+        message = error_message(payload) if isinstance(payload, dict) else None
+        if message or response.status_code >= 400:
+            message = message or f"HTTP {response.status_code}"
+            print(f"Planespotters API returned an error for ICAO {icao} while requesting {url}: {message}",
+                  file=sys.stderr)
+            return None
+        return parse_photo(payload)
+
+    def download(self, url, path):
+        """Store url as path (atomically); False if it couldn't be downloaded"""
+        try:
+            response = self.get(url)
+            if response.status_code != 200 or not response.content:
+                return False
+            fd, tmpname = tempfile.mkstemp(prefix=".photo-", dir=os.path.dirname(path) or ".")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    out.write(response.content)
+                os.chmod(tmpname, 0o644)
+                os.replace(tmpname, path)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except OSError as e:
+            print(f"Unable to download {url}: {e}", file=sys.stderr)
+            return False
+        return True
+
+    def map(self, function, items):
+        items = list(items)
+        if len(items) <= 1 or self.workers <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as pool:
+            return list(pool.map(function, items))
+
+
+def resolve(icaos, cache, fetcher, pa_file=None, prefer_pa=False):
+    """{icao: (link, thumbnail link)} for every ICAO, with empty links for the ones without a photo"""
+    wanted = list(dict.fromkeys(icao for icao in map(normalize_icao, icaos) if icao))
+    pa_links = pa_image_links(pa_file, set(wanted))
+    photos = {icao: (pa_links[icao], pa_links[icao]) for icao in wanted if prefer_pa and icao in pa_links}
+
+    asked = [icao for icao in wanted if icao not in photos]
+    found = cache.get_many(asked)
+    missing = [icao for icao in asked if icao not in found]
+    metrics.cache_result("photo", hits=len(found), misses=len(missing))
+    if missing:
+        with metrics.timer("photo_api"):
+            answers = fetcher.map(fetcher.photo, missing)
+        fetched = {icao: answer for icao, answer in zip(missing, answers) if answer is not None}
+        if fetched:
+            try:
+                cache.put_many(fetched)
+            except sqlite3.Error as e:
+                print(f"Unable to update the photo cache: {e}", file=sys.stderr)
+        found.update(fetched)
+
+    for icao in asked:
+        link, thumb = found.get(icao, ("", ""))
+        if not (link and thumb) and icao in pa_links:
+            link = thumb = pa_links[icao]
+        photos[icao] = (link, thumb) if link and thumb else ("", "")
+    return {icao: photos[icao] for icao in wanted}
+
+
+def download_thumbnails(photos, fetcher, image_dir=IMAGE_DIR, ttl=TTL, now=None):
+    """
+    {icao: file} with the thumbnails of photos ({icao: (link, thumbnail link)}) stored as <image_dir>/<ICAO>.jpg;
+    files that are younger than ttl are kept, and the file is empty when there's no thumbnail
+    """
+    now = now or time.time()
+    files, missing = {}, []
+    for icao, (_link, thumb) in photos.items():
+        path = os.path.join(image_dir, f"{icao}.jpg")
+        files[icao] = ""
+        if not re.match(r"https?://", thumb or "", re.IGNORECASE):
+            continue
+        try:
+            st = os.stat(path)
+            if st.st_size > 0 and now - st.st_mtime < ttl:
+                files[icao] = path
+                continue
+        except OSError:
+            pass
+        missing.append((icao, thumb, path))
+    metrics.cache_result("photo_file", hits=sum(1 for file in files.values() if file), misses=len(missing))
+    if missing:
+        os.makedirs(image_dir, exist_ok=True)
+        with metrics.timer("photo_download"):
+            stored = fetcher.map(lambda item: fetcher.download(item[1], item[2]), missing)
+        for (icao, _thumb, path), ok in zip(missing, stored):
+            if ok:
+                files[icao] = path
+    return files
+
+
+# --- stand-in API ---------------------------------------------------------------------------------
+
+def serve(port, icaos):
+    """Answer planespotters photo requests, and serve their thumbnails, for icaos until interrupted"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            host = self.headers.get("Host") or f"127.0.0.1:{port}"
+            if path.startswith("/pub/photos/hex/"):
+                icao = normalize_icao(path.rsplit("/", 1)[-1])
+                photos = []
+                if icao in icaos:
+                    photos.append({"id": icao, "link": f"https://www.planespotters.net/photo/{icao}",
+                                   "thumbnail_large": {"src": f"http://{host}/thumbnail/{icao}.jpg"}})
+                self._send(200, "application/json", json.dumps({"photos": photos}).encode("utf-8"))
+            elif path.startswith("/thumbnail/") and normalize_icao(path.rsplit("/", 1)[-1][:-4]) in icaos:
+                self._send(200, "image/jpeg", b"\xff\xd8\xff\xe0" + path.encode("utf-8") + b"\xff\xd9")
+            else:
+                self.send_error(404)
+
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            print(f"planespotters: {format % args}", file=sys.stderr)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving planespotters on http://127.0.0.1:{server.server_port}/pub/photos/hex/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def read_icaos_file(path):
+    icaos = set()
+    if not path:
+        return icaos
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            icao = normalize_icao(line.split(",")[0])
+            if icao and not icao.startswith("#"):
+                icaos.add(icao)
+    return icaos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched, cached aircraft photo lookups for Planefence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("resolve", "look up the photo links of the ICAOs on stdin"),
+                            ("download", "look up the photo links of the ICAOs on stdin and store their thumbnails")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--api-url", default=API_URL, help="the ICAO is appended to it")
+        cmd.add_argument("--cache", default=CACHE_FILE)
+        cmd.add_argument("--image-dir", default=IMAGE_DIR)
+        cmd.add_argument("--pa-file", default=PA_FILE, help="Plane-Alert DB with image links; empty to not use it")
+        cmd.add_argument("--prefer-pa", action="store_true", help="use the Plane-Alert DB image before planespotters")
+        cmd.add_argument("--ttl", type=int, default=TTL, help="seconds a photo is cached")
+        cmd.add_argument("--negative-ttl", type=int, default=NEGATIVE_TTL, help="seconds a \"no photo\" is cached")
+        cmd.add_argument("--timeout", type=int, default=TIMEOUT)
+        cmd.add_argument("--workers", type=int, default=MAX_WORKERS)
+        cmd.add_argument("--rate", type=int, default=HOST_RATE, help="requests per second per host")
+    serve_cmd = sub.add_parser("serve", help="run a stand-in planespotters API")
+    serve_cmd.add_argument("--port", type=int, default=8090)
+    serve_cmd.add_argument("--photos", help="the ICAOs that have a photo, one per line")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, read_icaos_file(args.photos))
+        return 0
+
+    try:
+        cache = PhotoCache(args.cache, args.ttl, args.negative_ttl)
+    except sqlite3.Error as e:
+        print(f"Unable to open photo cache {args.cache}: {e}", file=sys.stderr)
+        return 1
+    fetcher = Fetcher(args.api_url, args.timeout, max(args.workers, 1), max(args.rate, 1))
+    try:
+        photos = resolve(sys.stdin, cache, fetcher, args.pa_file, args.prefer_pa)
+    finally:
+        cache.close()
+    if args.command == "download":
+        files = download_thumbnails(photos, fetcher, args.image_dir, args.ttl)
+        for icao, (link, thumb) in photos.items():
+            sys.stdout.write(f"{icao}\t{link}\t{thumb}\t{files[icao]}\n")
+    else:
+        for icao, (link, thumb) in photos.items():
+            sys.stdout.write(f"{icao}\t{link}\t{thumb}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# Compiled, memory-mapped index of the Plane-Alert database
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The plane-alert-db.txt CSV is compiled once (whenever its mtime or size changes) into a
+# binary file next to it. Processes then mmap that file, so startup costs nothing and the
+# pages are shared between concurrent notifier runs. Layout (all integers little endian):
+#
+#   header   MAGIC, version, count, source mtime_ns, source size
+#   keys     count x 3 bytes - 24-bit ICAO, big endian, sorted ascending
+#   rows     count x ROW_FORMAT - number of CSV columns + one string offset per field
+#   strings  interned string table; each entry is a uint16 length followed by UTF-8 bytes.
+#            Offset 0 is always the empty string.
+
+import csv
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_left
+from collections.abc import Mapping
+
+MAGIC = b"PFPADB\0\0"
+VERSION = 1
+HEADER_FORMAT = "<8sIIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+KEY_SIZE = 3
+
+# Field order matches the columns of plane-alert-db.txt. Columns 11-13 are the image links:
+#  $ICAO,$Registration,$Operator,$Type,$ICAO Type,#CMPG,$Tag 1,$#Tag 2,$#Tag 3,Category,$#Link,#Image Link,#Image Link 2,#Image Link 3
+# Example line:
+#  A51316,N426NA,NASA,Lockheed P-3B Orion,P3,Gov,Sce To Aux,Airborne Science,Wallops Flight Facility,Distinctive,https://www.nasa.gov
+FIELDS = ("icao", "tail_num", "owner", "type", "icao_type", "authority",
+          "tag1", "tag2", "tag3", "category", "link")
+PHOTO_COLUMNS = 3
+ROW_FORMAT = "<I" + "I" * (len(FIELDS) + PHOTO_COLUMNS)
+ROW_SIZE = struct.calcsize(ROW_FORMAT)
+MAX_STRING = 0xFFFF
+
+
+class PlaneDBIndexError(Exception):
+    pass
+
+
+def index_path(planefile):
+    return f"{planefile}.idx"
+
+
+def parse_icao(icao):
+    """Return the 24-bit integer for a hex ICAO string, or None if it isn't one"""
+    icao = icao.strip().strip('"')
+    if len(icao) != 6:
+        return None
+    try:
+        return int(icao, 16)
+    except ValueError:
+        return None
+
+
+def build_index(planefile, idxfile=None):
+    """
+    Compile planefile into a binary index and atomically move it in place.
+    Rows with an ICAO that isn't a 6-digit hex address are skipped; duplicates keep the first row,
+    the same way get-pa-alertlist.sh de-duplicates the list.
+    Returns the number of indexed planes.
+    """
+    idxfile = idxfile or index_path(planefile)
+    st = os.stat(planefile)
+
+    strings = bytearray(b"\0\0")   # offset 0 -> ""
+    interned = {"": 0}
+
+    def intern(value):
+        offset = interned.get(value)
+        if offset is None:
+            data = value.encode("utf-8")[:MAX_STRING]
+            offset = len(strings)
+            strings.extend(struct.pack("<H", len(data)))
+            strings.extend(data)
+            interned[value] = offset
+        return offset
+
+    rows = {}
+    with open(planefile, newline="", encoding="utf-8", errors="replace") as csvfile:
+        for row in csv.reader(csvfile):
+            # Skip header and invalid/empty lines
+            if not row or row[0].startswith("#"):
+                continue
+            key = parse_icao(row[0])
+            if key is None or key in rows:
+                continue
+            cells = [row[i] if i < len(row) else "" for i in range(len(FIELDS) + PHOTO_COLUMNS)]
+            rows[key] = struct.pack(ROW_FORMAT, len(row), *(intern(cell) for cell in cells))
+
+    keys = sorted(rows)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(keys), st.st_mtime_ns, st.st_size)
+
+    directory = os.path.dirname(os.path.abspath(idxfile))
+    fd, tmpname = tempfile.mkstemp(prefix=".planedb-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(header)
+            out.write(b"".join(key.to_bytes(KEY_SIZE, "big") for key in keys))
+            out.write(b"".join(rows[key] for key in keys))
+            out.write(strings)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, idxfile)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    return len(keys)
+
+
+class PlaneDB(Mapping):
+    """
+    Read-only mapping of ICAO -> plane dict backed by an mmapped index.
+    Lookups are a binary search over the key block; rows are decoded only when asked for.
+    """
+
+    def __init__(self, idxfile):
+        self.path = idxfile
+        with open(idxfile, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            if self._stat.st_size < HEADER_SIZE:
+                raise PlaneDBIndexError(f"{idxfile} is truncated")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self.source_mtime_ns, self.source_size = \
+            struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise PlaneDBIndexError(f"{idxfile} is not a version {VERSION} plane-alert index")
+        self._keys_at = HEADER_SIZE
+        self._rows_at = self._keys_at + self._count * KEY_SIZE
+        self._strings_at = self._rows_at + self._count * ROW_SIZE
+
+    def close(self):
+        self._mm.close()
+
+    def is_current(self, planefile):
+        """True if this index still describes planefile and hasn't been replaced on disk"""
+        try:
+            src = os.stat(planefile)
+            idx = os.stat(self.path)
+        except OSError:
+            return False
+        return (src.st_mtime_ns == self.source_mtime_ns and src.st_size == self.source_size
+                and idx.st_ino == self._stat.st_ino and idx.st_mtime_ns == self._stat.st_mtime_ns)
+
+    def _key(self, i):
+        at = self._keys_at + i * KEY_SIZE
+        return int.from_bytes(self._mm[at:at + KEY_SIZE], "big")
+
+    def _find(self, icao):
+        key = parse_icao(icao) if isinstance(icao, str) else None
+        if key is None:
+            return -1
+        i = bisect_left(range(self._count), key, key=self._key)
+        if i < self._count and self._key(i) == key:
+            return i
+        return -1
+
+    def _string(self, offset):
+        at = self._strings_at + offset
+        (length,) = struct.unpack_from("<H", self._mm, at)
+        return self._mm[at + 2:at + 2 + length].decode("utf-8", errors="replace")
+
+    def _decode(self, i):
+        ncols, *offsets = struct.unpack_from(ROW_FORMAT, self._mm, self._rows_at + i * ROW_SIZE)
+        plane = {name: self._string(offsets[n]) for n, name in enumerate(FIELDS)}
+        if ncols > len(FIELDS):
+            photos = (self._string(offset) for offset in offsets[len(FIELDS):])
+            plane["photos"] = [link for link in photos if link != ""]
+        return plane
+
+    def __getitem__(self, icao):
+        i = self._find(icao)
+        if i < 0:
+            raise KeyError(icao)
+        return self._decode(i)
+
+    def __contains__(self, icao):
+        return self._find(icao) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield f"{self._key(i):06X}"
+
+    def key_set(self):
+        """All ICAOs in the index as a set of 24-bit integers"""
+        keys = self._mm[self._keys_at:self._keys_at + self._count * KEY_SIZE]
+        return {int.from_bytes(keys[i:i + KEY_SIZE], "big") for i in range(0, len(keys), KEY_SIZE)}
+
+
+def open_index(planefile, idxfile=None):
+    """
+    Open the index for planefile, (re)building it first if it is missing or stale.
+    If the index can't be written next to planefile (read-only mount), it goes to /tmp instead.
+    """
+    idxfile = idxfile or index_path(planefile)
+    for candidate in (idxfile, os.path.join(tempfile.gettempdir(), os.path.basename(idxfile))):
+        try:
+            db = PlaneDB(candidate)
+            if db.is_current(planefile):
+                return db
+            db.close()
+        except (OSError, PlaneDBIndexError):
+            pass
+        try:
+            build_index(planefile, candidate)
+            return PlaneDB(candidate)
+        except OSError:
+            continue
+    raise PlaneDBIndexError(f"Unable to build an index for {planefile}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] not in ("build", "lookup"):
+        print(f"Usage: python3 -m pflib.planedb build <plane-alert-db.txt> [<index>]\n"
+              f"       python3 -m pflib.planedb lookup <plane-alert-db.txt> <icao> [<icao>...]")
+        return 1
+    if argv[0] == "build":
+        count = build_index(argv[1], argv[2] if len(argv) > 2 else None)
+        print(f"Indexed {count} entries from {argv[1]}")
+        return 0
+    db = open_index(argv[1])
+    for icao in argv[2:]:
+        plane = db.get(icao)
+        if plane is None:
+            print(f"{icao}: not found")
+        else:
+            print(",".join([plane[name] for name in FIELDS] + plane.get("photos", [])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
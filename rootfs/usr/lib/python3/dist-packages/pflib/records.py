@@ -0,0 +1,397 @@
+# SQLite-backed store for the Planefence / Plane-Alert records
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The records of a day (the records, pa_records, heatmap, ... associative arrays and
+# LASTPROCESSEDLINE) used to exist only as a gzipped `declare -p` dump that every script
+# un-gzipped and eval'ed in full, and rewrote in full to change a single key. They now live in a
+# SQLite database in WAL mode next to that file (planefence-records-YYMMDD.db), with one row per
+# array entry:
+#  - readers get a consistent snapshot without waiting for writers;
+#  - a full write (WRITE_RECORDS) only inserts, updates or deletes the entries that changed;
+#  - single entries can be read or set without touching the rest (RECORD_SET / COMMIT_RECORDS).
+# The .gz file is only written by export, which the backups (pf-run.sh, delete_record.sh) and the
+# shutdown (planefence-finish) run first, so everything else reads through the store. If the .gz turns
+# out to be newer than what the database last wrote or read (it was restored or written by something
+# else), it is imported first.
+#
+# Usage (the database path is derived from the .gz path):
+#   python3 -m pflib.records read   --gz <file.gz> [--array <name> ... [--prefix <key prefix>]]
+#   python3 -m pflib.records write  --gz <file.gz>    (declare -p text on stdin)
+#   python3 -m pflib.records set    --gz <file.gz> [--clear <name> ...]
+#                                     (NUL separated array, key, value triples on stdin; an empty key
+#                                      sets a scalar, --clear first removes all entries of an array)
+#   python3 -m pflib.records get    --gz <file.gz> <array> <key> [<key> ...]
+#   python3 -m pflib.records export --gz <file.gz>    (rewrite the .gz from the database)
+# read and get don't create a database: they exit with NO_STORE if there only is a .gz file (a
+# write or set creates it) and with NOT_FOUND if there are no records at all.
+
+import argparse
+import gzip
+import os
+import sqlite3
+import sys
+import tempfile
+
+NOT_FOUND = 3   # there are no records at all
+NO_STORE = 4    # there is only the .gz file; read it the old way
+SCALAR = "--"
+BUSY_TIMEOUT_MS = 30000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS arrays (name TEXT PRIMARY KEY, kind TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    array TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (array, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+# --- declare -p text ------------------------------------------------------------------------------
+
+_ANSI_ESCAPES = {"a": "\a", "b": "\b", "e": "\x1b", "E": "\x1b", "f": "\f", "n": "\n", "r": "\r",
+                 "t": "\t", "v": "\v", "\\": "\\", "'": "'", '"': '"', "?": "?"}
+
+
+def _double_quoted(text, i):
+    """Parse a "..." word starting at text[i]; returns (value, index after the closing quote)"""
+    out = []
+    i += 1
+    while text[i] != '"':
+        if text[i] == "\\" and text[i + 1] in '"\\$`\n':
+            if text[i + 1] != "\n":
+                out.append(text[i + 1])
+            i += 2
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out), i + 1
+
+
+def _ansi_quoted(text, i):
+    """Parse a $'...' word starting at text[i]. Its octal and hex escapes are (UTF-8) bytes"""
+    out = bytearray()
+    i += 2
+    while text[i] != "'":
+        c = text[i]
+        if c != "\\":
+            out += c.encode("utf-8", errors="surrogateescape")
+            i += 1
+            continue
+        nxt = text[i + 1]
+        if nxt in _ANSI_ESCAPES:
+            out += _ANSI_ESCAPES[nxt].encode()
+            i += 2
+        elif nxt in "01234567":
+            j = i + 1
+            while j < i + 4 and text[j] in "01234567":
+                j += 1
+            out.append(int(text[i + 1:j], 8) & 0xFF)
+            i = j
+        elif nxt == "x":
+            j = i + 2
+            while j < i + 4 and text[j] in "0123456789abcdefABCDEF":
+                j += 1
+            out.append(int(text[i + 2:j], 16))
+            i = j
+        elif nxt == "c":
+            out.append(ord(text[i + 2]) & 0x1F)
+            i += 3
+        else:
+            out += (c + nxt).encode("utf-8", errors="surrogateescape")
+            i += 2
+    return out.decode("utf-8", errors="surrogateescape"), i + 1
+
+
+def _word(text, i):
+    """Parse one (possibly quoted) shell word ending at whitespace, ] or ) and return (value, end)"""
+    if text.startswith("$'", i):
+        return _ansi_quoted(text, i)
+    if text[i] == '"':
+        return _double_quoted(text, i)
+    j = i
+    while j < len(text) and text[j] not in " \t\n])":
+        j += 1
+    return text[i:j], j
+
+
+def parse_declarations(text):
+    """
+    Parse the output of `declare -p` (and plain NAME="value" lines) into {name: (kind, value)}:
+    kind is the declare flag of the array (-A, -a, ...) or SCALAR, value a dict or a string.
+    """
+    result = {}
+    i, n = 0, len(text)
+    while i < n:
+        while i < n and text[i] in " \t\n;":
+            i += 1
+        if i >= n:
+            break
+        kind = SCALAR
+        if text.startswith("declare ", i):
+            i += len("declare ")
+            flags, i = _word(text, i)
+            kind = "-A" if "A" in flags else "-a" if "a" in flags else SCALAR
+            i += 1
+        eq = text.index("=", i)
+        name = text[i:eq]
+        i = eq + 1
+        if text.startswith("(", i):
+            entries = {}
+            i += 1
+            while True:
+                while text[i] in " \t\n":
+                    i += 1
+                if text[i] == ")":
+                    i += 1
+                    break
+                key, i = _word(text, i + 1)   # skip [
+                i += 2                          # skip ]=
+                value, i = _word(text, i) if i < n and text[i] not in " \t\n)" else ("", i)
+                entries[key] = value
+            result[name] = (kind if kind != SCALAR else "-a", entries)
+        elif i < n and text[i] not in "\n;":
+            value, i = _word(text, i)
+            result[name] = (SCALAR, value)
+        else:
+            result[name] = (SCALAR, "")
+    return result
+
+
+def _quote(value):
+    if any(ord(c) < 32 or ord(c) == 127 for c in value):
+        # Like declare -p: control characters only survive being sourced inside $'...'
+        data = value.encode("utf-8", errors="surrogateescape")
+        return "$'" + "".join(chr(b) if 32 <= b < 127 and b not in (39, 92) else f"\\{b:03o}" for b in data) + "'"
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$").replace("`", "\\`") + '"'
+
+
+def format_declarations(arrays):
+    """The inverse of parse_declarations, as global declarations that can be sourced from a function"""
+    lines = []
+    for name, (kind, value) in arrays.items():
+        if kind == SCALAR:
+            lines.append(f"{name}={_quote(value)}")
+        else:
+            body = " ".join(f"[{_quote(key)}]={_quote(val)}" for key, val in value.items())
+            lines.append(f"declare {kind}g {name}=({body} )")
+    return "\n".join(lines) + "\n"
+
+
+# --- the store ------------------------------------------------------------------------------------
+
+def store_path(gzfile):
+    return (gzfile[:-3] if gzfile.endswith(".gz") else gzfile) + ".db"
+
+
+class RecordStore:
+
+    def __init__(self, gzfile):
+        self.gzfile = gzfile
+        self.path = store_path(gzfile)
+        self.db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        try:
+            os.chmod(self.path, 0o644)
+        except OSError:
+            pass
+
+    def close(self):
+        self.db.close()
+
+    def _gz_stamp(self):
+        try:
+            st = os.stat(self.gzfile)
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _meta(self, name):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def is_empty(self):
+        return self.db.execute("SELECT 1 FROM arrays LIMIT 1").fetchone() is None
+
+    def sync(self):
+        """Import the .gz file if it was written by something other than this store"""
+        stamp = self._gz_stamp()
+        if stamp is None or stamp == self._meta("gz_stamp"):
+            return False
+        try:
+            with gzip.open(self.gzfile, "rt", encoding="utf-8", errors="surrogateescape") as f:
+                arrays = parse_declarations(f.read())
+        except (OSError, EOFError, ValueError, IndexError):
+            return False
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("DELETE FROM arrays")
+            self._replace(arrays)
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('gz_stamp', ?)", (stamp,))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return True
+
+    def _replace(self, arrays):
+        for name, (kind, value) in arrays.items():
+            self.db.execute("INSERT OR REPLACE INTO arrays VALUES (?, ?)", (name, kind))
+            entries = {"": value} if kind == SCALAR else value
+            self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                                ((name, key, val) for key, val in entries.items()))
+
+    def read(self, names=None, prefix=""):
+        """{name: (kind, value)} for all arrays, or for the arrays in names (entries starting with prefix)"""
+        self.db.execute("BEGIN")
+        try:
+            kinds = dict(self.db.execute("SELECT name, kind FROM arrays"))
+            arrays = {}
+            for name, kind in kinds.items():
+                if names and name not in names:
+                    continue
+                if kind == SCALAR:
+                    row = self.db.execute("SELECT value FROM entries WHERE array = ? AND key = ''", (name,)).fetchone()
+                    arrays[name] = (kind, row[0] if row else "")
+                else:
+                    rows = self.db.execute("SELECT key, value FROM entries WHERE array = ? AND key >= ? AND key < ?",
+                                           (name, prefix, prefix + "\U0010ffff"))
+                    arrays[name] = (kind, dict(rows))
+        finally:
+            self.db.execute("COMMIT")
+        return arrays
+
+    def write(self, arrays):
+        """
+        Store a full snapshot: entries that didn't change are left alone, arrays and entries that
+        aren't in the snapshot anymore are removed. Returns the number of changed entries.
+        """
+        changed = 0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            kinds = dict(self.db.execute("SELECT name, kind FROM arrays"))
+            for name in set(kinds) - set(arrays):
+                changed += self.db.execute("DELETE FROM entries WHERE array = ?", (name,)).rowcount
+                self.db.execute("DELETE FROM arrays WHERE name = ?", (name,))
+            for name, (kind, value) in arrays.items():
+                if kinds.get(name) != kind:
+                    self.db.execute("INSERT OR REPLACE INTO arrays VALUES (?, ?)", (name, kind))
+                entries = {"": value} if kind == SCALAR else value
+                current = dict(self.db.execute("SELECT key, value FROM entries WHERE array = ?", (name,)))
+                upserts = [(name, key, val) for key, val in entries.items() if current.get(key) != val]
+                removed = [(name, key) for key in current.keys() - entries.keys()]
+                self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", upserts)
+                self.db.executemany("DELETE FROM entries WHERE array = ? AND key = ?", removed)
+                changed += len(upserts) + len(removed)
+            # The snapshot is newer than the .gz file, so don't import that again
+            stamp = self._gz_stamp()
+            if stamp is not None:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('gz_stamp', ?)", (stamp,))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return changed
+
+    def set(self, triples, clear=()):
+        """
+        Upsert (array, key, value) entries, after removing all entries of the arrays in clear. New
+        arrays are created as associative arrays, or as scalars if the key is empty.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for name in clear:
+                self.db.execute("DELETE FROM entries WHERE array = ?", (name,))
+            for name, scalar in {(name, key == "") for name, key, _ in triples}:
+                self.db.execute("INSERT OR IGNORE INTO arrays VALUES (?, ?)", (name, SCALAR if scalar else "-A"))
+            self.db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", triples)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def get(self, name, keys):
+        values = []
+        for key in keys:
+            row = self.db.execute("SELECT value FROM entries WHERE array = ? AND key = ?", (name, key)).fetchone()
+            values.append(row[0] if row else "")
+        return values
+
+    def export(self):
+        """Atomically rewrite the .gz file from the database"""
+        text = format_declarations(self.read())
+        directory = os.path.dirname(os.path.abspath(self.gzfile))
+        fd, tmpname = tempfile.mkstemp(prefix=".records-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                out.write(text.encode("utf-8", errors="surrogateescape"))
+            os.chmod(tmpname, 0o644)
+            os.replace(tmpname, self.gzfile)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('gz_stamp', ?)", (self._gz_stamp(),))
+
+
+def _triples(data):
+    fields = data.split("\0")
+    if fields and fields[-1] == "":
+        fields.pop()
+    return [tuple(fields[i:i + 3]) for i in range(0, len(fields) - 2, 3)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Planefence records store")
+    parser.add_argument("command", choices=["read", "write", "set", "get", "export"])
+    parser.add_argument("--gz", required=True, help="the planefence-records-YYMMDD.gz file")
+    parser.add_argument("--array", action="append", help="read: only this array (can be repeated)")
+    parser.add_argument("--prefix", default="", help="read: only the keys starting with this prefix")
+    parser.add_argument("--clear", action="append", default=[], help="set: remove all entries of this array first")
+    parser.add_argument("args", nargs="*", help="get: <array> <key> [<key> ...]")
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command in ("read", "get") and not os.path.exists(store_path(args.gz)):
+        return NO_STORE if os.path.exists(args.gz) else NOT_FOUND
+    store = RecordStore(args.gz)
+    try:
+        if args.command != "write":
+            store.sync()
+        if args.command == "read":
+            if store.is_empty():
+                return NOT_FOUND
+            arrays = store.read(set(args.array) if args.array else None, args.prefix)
+            if args.array and args.prefix:
+                # Only some entries: assign them into the existing array instead of replacing it
+                for name, (kind, entries) in arrays.items():
+                    for key, value in entries.items():
+                        sys.stdout.write(f"{name}[{_quote(key)}]={_quote(value)}\n")
+            else:
+                sys.stdout.write(format_declarations(arrays))
+        elif args.command == "write":
+            text = sys.stdin.buffer.read().decode("utf-8", errors="surrogateescape")
+            store.write(parse_declarations(text))
+        elif args.command == "set":
+            store.set(_triples(sys.stdin.buffer.read().decode("utf-8", errors="surrogateescape")), args.clear)
+        elif args.command == "get":
+            if len(args.args) < 2:
+                parser.error("get needs an array name and at least one key")
+            for value in store.get(args.args[0], args.args[1:]):
+                print(value)
+        else:
+            store.export()
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
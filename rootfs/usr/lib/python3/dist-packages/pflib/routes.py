@@ -0,0 +1,281 @@
+# Batched, cached route lookups for pf-process_sbs.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# Routes are looked up by callsign with the adsb.im / adsb.lol "routeset" API. The answers are kept
+# in a persistent cache (a small SQLite database in persist/.internal) for days rather than until
+# midnight, because the route of an airline callsign rarely changes. "unknown" answers are cached
+# too, for a shorter time, so callsigns without a route (GA tails, military) aren't asked for again
+# on every run.
+#
+# A run reads the records that need a route on stdin, one per line: <key> TAB <callsign> TAB <lat>
+# TAB <lon>, where <key> is whatever the caller needs to find the record back (e.g. "pa:12"). Every
+# callsign is looked up once no matter how many records have it, and the ones that aren't in the
+# cache are sent to the API in batches of at most --batch-size planes, all of them within --deadline
+# seconds (a slow API can't hold up the cycle for a timeout per batch). The answers are written as
+# <key> TAB <route> lines, with "n/a" for unknown routes and " (?)" after implausible ones. Records
+# whose callsign got no answer at all (the API is down) aren't written, so they are tried again
+# on the next run.
+#
+# Usage:
+#   python3 -m pflib.routes resolve [--api-url URL] [--cache FILE] [--ttl S] [--negative-ttl S] [--batch-size N]
+#                                   [--deadline S]
+#   python3 -m pflib.routes serve [--port 8089] [--routes routes.csv] [--batch-size N] [--delay S]
+#       a stand-in for the routeset API, for testing: answers from a CALLSIGN,ROUTE[,plausible] file
+#       and "unknown" for everything else, after --delay seconds; rejects batches that are too large
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pflib import metrics
+from pflib.ttlcache import TTLCache
+
+API_URL = "https://adsb.im/api/0/routeset"
+CACHE_FILE = "/usr/share/planefence/persist/.internal/routes.db"
+BATCH_SIZE = 100
+TTL = 3 * 86400            # seconds a known route is kept
+NEGATIVE_TTL = 6 * 3600    # seconds an unknown route is kept
+TIMEOUT = 30               # seconds per batch
+DEADLINE = 90              # seconds for all batches of a run together
+
+UNKNOWN = "unknown"
+NOT_AVAILABLE = "n/a"
+IMPLAUSIBLE = " (?)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS routes (
+    callsign TEXT PRIMARY KEY,
+    route TEXT NOT NULL,
+    plausible INTEGER NOT NULL,
+    fetched REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize_callsign(callsign):
+    return "".join(str(callsign).split()).upper()
+
+
+def is_unknown(route):
+    return not route or route.lower() in (UNKNOWN, "null")
+
+
+def _plausible(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "off", "false", "no", "disabled")
+
+
+def display(route, plausible):
+    """The route the way it is shown in the records"""
+    if is_unknown(route):
+        return NOT_AVAILABLE
+    return route if plausible else route + IMPLAUSIBLE
+
+
+class RouteCache(TTLCache):
+    """Persistent callsign -> (route, plausible) cache with a TTL for known and unknown routes"""
+
+    def __init__(self, path=CACHE_FILE, ttl=TTL, negative_ttl=NEGATIVE_TTL):
+        super().__init__(path, SCHEMA, "routes", "callsign", ("route", "plausible"), ttl, negative_ttl,
+                         lambda route, plausible: route == UNKNOWN)
+
+    def get_many(self, callsigns, now=None):
+        return {callsign: (route, bool(plausible))
+                for callsign, (route, plausible) in super().get_many(callsigns, now).items()}
+
+    def put_many(self, results, now=None):
+        super().put_many({callsign: (route, int(plausible)) for callsign, (route, plausible) in results.items()}, now)
+
+
+def parse_response(payload):
+    """(callsign, route, plausible) for every plane in a routeset answer"""
+    if not isinstance(payload, list):
+        return
+    for item in payload:
+        if isinstance(item, dict):
+            callsign, route, plausible = item.get("callsign"), item.get("_airport_codes_iata"), item.get("plausible")
+        elif isinstance(item, list):
+            callsign, route, plausible = (item + [None] * 3)[:3]
+        else:
+            continue
+        if not callsign:
+            continue
+        route = "" if route is None else str(route).strip()
+        yield (normalize_callsign(callsign), UNKNOWN if is_unknown(route) else route,
+               True if plausible is None else _plausible(plausible))
+
+
+def fetch_routes(planes, api_url=API_URL, batch_size=BATCH_SIZE, timeout=TIMEOUT, deadline=DEADLINE):
+    """
+    Look up planes ({callsign: (lat, lon)}) in batches. Returns {callsign: (route, plausible)} for
+    the callsigns the API answered; a batch that fails is left out, to be tried again next time.
+    All batches together take at most about deadline seconds; the ones that don't get their turn
+    before then are left out as well.
+    """
+    results = {}
+    callsigns = list(planes)
+    end = time.monotonic() + deadline
+    for i in range(0, len(callsigns), batch_size):
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            print(f"Route lookup ran out of time, {len(callsigns) - i} callsigns left for the next run", file=sys.stderr)
+            break
+        batch = [{"callsign": c, "lat": planes[c][0], "lng": planes[c][1]} for c in callsigns[i:i + batch_size]]
+        request = urllib.request.Request(
+            api_url, data=json.dumps({"planes": batch}).encode("utf-8"), method="POST",
+            headers={"accept": "application/json", "Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=min(timeout, remaining)) as response:
+                payload = json.loads(response.read())
+        except (OSError, ValueError) as e:
+            print(f"Route lookup of {len(batch)} callsigns failed: {e}", file=sys.stderr)
+            continue
+        asked = {plane["callsign"] for plane in batch}
+        for callsign, route, plausible in parse_response(payload):
+            if callsign in asked:
+                results[callsign] = (route, plausible)
+    return results
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def resolve(lines, cache, api_url=API_URL, batch_size=BATCH_SIZE, fetch=fetch_routes, deadline=DEADLINE):
+    """Yield (key, route) for the <key> TAB <callsign> TAB <lat> TAB <lon> lines that got an answer"""
+    wanted = []    # (key, callsign)
+    planes = {}    # callsign -> (lat, lon) of the first record that has it
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 2:
+            continue
+        key, callsign = fields[0], normalize_callsign(fields[1])
+        if not key or not callsign:
+            continue
+        wanted.append((key, callsign))
+        if callsign not in planes:
+            planes[callsign] = (_coordinate(fields[2] if len(fields) > 2 else None),
+                                _coordinate(fields[3] if len(fields) > 3 else None))
+
+    routes = cache.get_many(planes)
+    missing = {callsign: pos for callsign, pos in planes.items() if callsign not in routes}
+    metrics.cache_result("route", hits=len(routes), misses=len(missing))
+    if missing:
+        with metrics.timer("route_api"):
+            fetched = fetch(missing, api_url, batch_size, deadline=deadline)
+        if fetched:
+            try:
+                cache.put_many(fetched)
+            except sqlite3.Error as e:
+                print(f"Unable to update the route cache: {e}", file=sys.stderr)
+        routes.update(fetched)
+
+    for key, callsign in wanted:
+        if callsign in routes:
+            yield key, display(*routes[callsign])
+
+
+# --- stand-in API ---------------------------------------------------------------------------------
+
+def serve(port, routes, batch_size=BATCH_SIZE, delay=0.0):
+    """Answer routeset requests from routes ({callsign: (route, plausible)}), after delay seconds, until interrupted"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            time.sleep(delay)
+            try:
+                planes = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["planes"]
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400, "expected {\"planes\": [...]}")
+                return
+            if len(planes) > batch_size:
+                self.send_error(400, f"at most {batch_size} planes per request")
+                return
+            answer = []
+            for plane in planes:
+                callsign = normalize_callsign(plane.get("callsign", ""))
+                route, plausible = routes.get(callsign, (UNKNOWN, None))
+                answer.append({"callsign": callsign, "_airport_codes_iata": route, "plausible": plausible})
+            body = json.dumps(answer).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            print(f"routeset: {format % args}", file=sys.stderr)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving routeset on http://127.0.0.1:{server.server_port}/api/0/routeset", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def read_routes_file(path):
+    routes = {}
+    if not path:
+        return routes
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = [field.strip() for field in line.strip().split(",")]
+            if len(fields) < 2 or not fields[0] or fields[0].startswith("#"):
+                continue
+            routes[normalize_callsign(fields[0])] = (fields[1], _plausible(fields[2]) if len(fields) > 2 else True)
+    return routes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched, cached route lookups for Planefence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    resolve_cmd = sub.add_parser("resolve", help="look up the routes of the records on stdin")
+    resolve_cmd.add_argument("--api-url", default=API_URL)
+    resolve_cmd.add_argument("--cache", default=CACHE_FILE)
+    resolve_cmd.add_argument("--ttl", type=int, default=TTL, help="seconds a known route is cached")
+    resolve_cmd.add_argument("--negative-ttl", type=int, default=NEGATIVE_TTL,
+                             help="seconds an unknown route is cached")
+    resolve_cmd.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    resolve_cmd.add_argument("--deadline", type=float, default=DEADLINE,
+                             help="seconds all route requests of the run may take together")
+    serve_cmd = sub.add_parser("serve", help="run a stand-in routeset API")
+    serve_cmd.add_argument("--port", type=int, default=8089)
+    serve_cmd.add_argument("--routes", help="CALLSIGN,ROUTE[,plausible] lines")
+    serve_cmd.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    serve_cmd.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, read_routes_file(args.routes), max(args.batch_size, 1), args.delay)
+        return 0
+
+    try:
+        cache = RouteCache(args.cache, args.ttl, args.negative_ttl)
+    except sqlite3.Error as e:
+        print(f"Unable to open route cache {args.cache}: {e}", file=sys.stderr)
+        return 1
+    try:
+        for key, route in resolve(sys.stdin, cache, args.api_url, max(args.batch_size, 1), deadline=args.deadline):
+            sys.stdout.write(f"{key}\t{route}\n")
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
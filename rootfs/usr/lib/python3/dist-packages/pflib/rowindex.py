@@ -0,0 +1,327 @@
+# Row index for the daily planefence/plane-alert JSON files, and the paged history for stream.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# A daily JSON file is an array of a globals object followed by the rows, newest first. When the file
+# is written, a small binary index is written next to it (.<name>.rows) with the byte offset, length
+# and "index" of every row, so the number of rows of a day is known without parsing the file, and any
+# slice of rows can be read without parsing the others. Layout (integers little endian):
+#
+#   header   MAGIC, version, count, source mtime_ns, source size, globals offset, globals length
+#   rows     count x (uint64 offset, uint32 length, uint32 index)
+#
+# An index that doesn't match its file's mtime and size is rebuilt when it is used.
+#
+# The history ("date=all") is the newest rows of the last HISTTIME days, at most --max-rows of them,
+# renumbered 0 (oldest) .. n-1. With --limit, only one page of it is returned; the cursor of the next
+# page is put in the globals ("page:next"). A cursor remembers the newest row of the first page, so the
+# rows and numbers of later pages don't shift when new rows come in.
+#
+# Usage:
+#   python3 -m pflib.rowindex build <json> [<json> ...]
+#   python3 -m pflib.rowindex all --mode plane-alert --hist-days 14 [--max-rows 500] [--limit N] [--cursor C]
+#       prints the history as one JSON array (globals first), like the daily files
+
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+MAGIC = b"PFROWIX\0"
+VERSION = 1
+HEADER_FORMAT = "<8sIIQQQI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ROW_FORMAT = "<QII"
+ROW_SIZE = struct.calcsize(ROW_FORMAT)
+NO_INDEX = 0xFFFFFFFF
+
+DOCROOT = "/usr/share/planefence/html"
+RUNROOT = "/run/planefence"
+MAX_ROWS = 500
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def index_path(source):
+    directory, name = os.path.split(source)
+    return os.path.join(directory, f".{name}.rows")
+
+
+class RowIndex:
+    """The rows of one daily JSON file: (offset, length, index) tuples, newest first"""
+
+    def __init__(self, source, rows, globals_span, mtime_ns, size):
+        self.source = source
+        self.rows = rows
+        self.globals_span = globals_span
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def __len__(self):
+        return len(self.rows)
+
+    def read_globals(self, f):
+        offset, length = self.globals_span
+        if not length:
+            return {}
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def read_rows(self, f, start, stop):
+        out = []
+        for offset, length, _ in self.rows[start:stop]:
+            f.seek(offset)
+            out.append(f.read(length))
+        return out
+
+    def position_after(self, index):
+        """Position of the first row whose index is at most index (rows are newest first)"""
+        for pos, (_, _, row_index) in enumerate(self.rows):
+            if row_index == NO_INDEX or row_index <= index:
+                return pos
+        return len(self.rows)
+
+
+def scan(source):
+    """Parse source once and return a RowIndex for it"""
+    st = os.stat(source)
+    with open(source, "rb") as f:
+        data = f.read()
+    # Decoded as latin-1, every character is one byte, so string offsets are file offsets
+    text = data.decode("latin-1")
+    pos = _WHITESPACE.match(text, 0).end()
+    if text[pos:pos + 1] != "[":
+        raise ValueError(f"{source} is not a JSON array")
+    pos = _WHITESPACE.match(text, pos + 1).end()
+
+    rows = []
+    globals_span = (0, 0)
+    first = True
+    while pos < len(text) and text[pos] != "]":
+        value, end = _decoder.raw_decode(text, pos)
+        if first and isinstance(value, dict) and "index" not in value:
+            globals_span = (pos, end - pos)
+        else:
+            index = value.get("index") if isinstance(value, dict) else None
+            try:
+                index = int(index)
+            except (TypeError, ValueError):
+                index = NO_INDEX
+            rows.append((pos, end - pos, index if 0 <= index < NO_INDEX else NO_INDEX))
+        first = False
+        pos = _WHITESPACE.match(text, end).end()
+        if text[pos:pos + 1] == ",":
+            pos = _WHITESPACE.match(text, pos + 1).end()
+    return RowIndex(source, rows, globals_span, st.st_mtime_ns, st.st_size)
+
+
+def write_index(index, idxfile=None):
+    idxfile = idxfile or index_path(index.source)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(index.rows), index.mtime_ns, index.size,
+                         *index.globals_span)
+    directory = os.path.dirname(os.path.abspath(idxfile))
+    fd, tmpname = tempfile.mkstemp(prefix=".rowindex-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(header)
+            out.write(b"".join(struct.pack(ROW_FORMAT, *row) for row in index.rows))
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, idxfile)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+
+
+def build(source):
+    index = scan(source)
+    write_index(index)
+    return index
+
+
+def _read_index(source, st):
+    try:
+        with open(index_path(source), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, count, mtime_ns, size, g_offset, g_length = struct.unpack_from(HEADER_FORMAT, data)
+    if (magic != MAGIC or version != VERSION or mtime_ns != st.st_mtime_ns or size != st.st_size
+            or len(data) != HEADER_SIZE + count * ROW_SIZE):
+        return None
+    rows = list(struct.iter_unpack(ROW_FORMAT, data[HEADER_SIZE:]))
+    return RowIndex(source, rows, (g_offset, g_length), mtime_ns, size)
+
+
+def load(source):
+    """The RowIndex of source, rebuilt (and saved, if possible) if it is missing or stale"""
+    index = _read_index(source, os.stat(source))
+    if index is None:
+        index = scan(source)
+        try:
+            write_index(index)
+        except OSError:
+            pass
+    return index
+
+
+# --- history ("date=all") ------------------------------------------------------------------------
+
+def choose_json_for_date(mode, date, runroot=RUNROOT, docroot=DOCROOT):
+    for candidate in (f"{runroot}/{mode}-{date}.json", f"{docroot}/{mode}-{date}.json",
+                      f"{docroot}/{mode}/{mode}-{date}.json"):
+        try:
+            if os.path.getsize(candidate) > 0 and os.access(candidate, os.R_OK):
+                return candidate
+        except OSError:
+            continue
+    return None
+
+
+def parse_cursor(cursor):
+    """A cursor is <yyMMdd>.<index>.<position>: the newest row of the first page, and where to go on"""
+    m = re.fullmatch(r"(\d{6})\.(\d+)\.(\d+)", cursor or "")
+    if not m:
+        return None
+    return m.group(1), int(m.group(2)), int(m.group(3))
+
+
+def _raw(value):
+    """A value as `jq -r` prints it"""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def merge_globals(chunks_globals, today_globals, nrows):
+    """Combine the globals of the files of the history the way stream.sh always has"""
+    merged = None
+    for g in chunks_globals:
+        if isinstance(g, dict) and g:
+            merged = g
+    merged = dict(merged) if isinstance(merged, dict) else {}
+    for key, alt in (("station:motd", "station.motd"), ("station.motd", "station:motd")):
+        if key in today_globals:
+            merged[key] = today_globals[key]
+        elif alt in today_globals:
+            merged[key] = today_globals[alt]
+        else:
+            merged[key] = merged.get(key)
+    merged["maxindex"] = nrows - 1
+    if "totallines" in today_globals:
+        merged["totallines"] = today_globals["totallines"]
+    elif "totallines" not in merged:
+        merged["totallines"] = nrows
+    today_lastupdate = _raw(today_globals["LASTUPDATE"]) if today_globals.get("LASTUPDATE") is not None else ""
+    if today_lastupdate:
+        merged["LASTUPDATE"] = today_lastupdate
+    elif "LASTUPDATE" in today_globals:
+        merged["LASTUPDATE"] = today_globals["LASTUPDATE"]
+    elif "LASTUPDATE" not in merged:
+        merged["LASTUPDATE"] = 0
+    return merged
+
+
+def history(mode, hist_days, max_rows=MAX_ROWS, limit=None, cursor=None, now=None,
+            runroot=RUNROOT, docroot=DOCROOT):
+    """The history as a list: the combined globals followed by the rows of the (page of the) window"""
+    now = now or datetime.now(timezone.utc)
+    anchor = parse_cursor(cursor) if limit else None
+
+    # Walk the days from today backwards (UTC), newest files first, until there are max_rows rows
+    chunks = []   # (date, RowIndex, first position)
+    total = 0
+    for day in range(hist_days):
+        date = (now - timedelta(days=day)).strftime("%y%m%d")
+        if anchor and date > anchor[0]:
+            continue
+        path = choose_json_for_date(mode, date, runroot, docroot)
+        if not path:
+            continue
+        try:
+            index = load(path)
+        except (OSError, ValueError):
+            continue
+        first = index.position_after(anchor[1]) if anchor and date == anchor[0] else 0
+        chunks.append((date, index, first))
+        total += len(index) - first
+        if total >= max_rows:
+            break
+    if not chunks:
+        return []
+
+    nrows = min(total, max_rows)
+    start, stop = 0, nrows
+    if limit:
+        start = anchor[2] if anchor else 0
+        stop = min(start + limit, nrows)
+
+    files_globals = []
+    rows = []
+    pos = 0   # position in the window of the first row of the current chunk
+    for date, index, first in chunks:
+        with open(index.source, "rb") as f:
+            files_globals.append(index.read_globals(f))
+            count = len(index) - first
+            lo, hi = max(start - pos, 0), min(stop - pos, count)
+            if lo < hi:
+                for n, raw in enumerate(index.read_rows(f, first + lo, first + hi)):
+                    row = json.loads(raw)
+                    row = row if isinstance(row, dict) else {}
+                    row["index"] = nrows - 1 - (pos + lo + n)
+                    rows.append(row)
+        pos += count
+
+    merged = merge_globals(files_globals, files_globals[0] if isinstance(files_globals[0], dict) else {}, nrows)
+    if limit:
+        if anchor:
+            anchor_date, anchor_index = anchor[0], anchor[1]
+        else:
+            date, index, _ = chunks[0]
+            anchor_date, anchor_index = date, index.rows[0][2] if len(index) else 0
+        merged["page:total"] = nrows
+        merged["page:next"] = f"{anchor_date}.{anchor_index}.{stop}" if stop < nrows else ""
+    return [merged] + rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Row index of the Planefence daily JSON files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="(re)build the row index of daily JSON files")
+    build_cmd.add_argument("files", nargs="+")
+    all_cmd = sub.add_parser("all", help="print the (paged) history of a mode")
+    all_cmd.add_argument("--mode", default="plane-alert")
+    all_cmd.add_argument("--hist-days", type=int, default=14)
+    all_cmd.add_argument("--max-rows", type=int, default=MAX_ROWS)
+    all_cmd.add_argument("--limit", type=int, help="rows per page")
+    all_cmd.add_argument("--cursor", help="page:next of the previous page")
+    all_cmd.add_argument("--runroot", default=RUNROOT)
+    all_cmd.add_argument("--docroot", default=DOCROOT)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        rc = 0
+        for path in args.files:
+            try:
+                build(path)
+            except (OSError, ValueError) as e:
+                print(f"Unable to index {path}: {e}", file=sys.stderr)
+                rc = 1
+        return rc
+
+    limit = args.limit if args.limit and args.limit > 0 else None
+    json.dump(history(args.mode, args.hist_days, args.max_rows, limit, args.cursor,
+                      runroot=args.runroot, docroot=args.docroot), sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
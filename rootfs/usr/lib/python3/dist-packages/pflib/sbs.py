@@ -0,0 +1,382 @@
+# Incremental ingestion of the socket30003 SBS log files for pf-process_sbs.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# socket30003 appends lines to one dump1090-*-YYMMDD.txt file per day. Rather than finding the last
+# processed line again with grep and reversing the file with tac on every cycle, this module keeps
+# the byte offset just past the last processed line for each day file, reads only the bytes that
+# were appended since, and applies the Planefence fence + ignore list and the Plane-Alert key,
+# squawk and range filters to every new line in a single pass.
+#
+# The offsets are kept in a small JSON state file together with the line they were taken at. They
+# are only trusted if that line is the LASTPROCESSEDLINE pf-process_sbs.sh saved with its records;
+# otherwise the line is searched for the old way, so a crashed or skipped cycle never loses data.
+#
+# GET_CALLSIGN and the SQUAWKTIME check used to scan the day file for the last callsign and the
+# squawk runs (squawk, first seen, last seen) of an aircraft. The BaseStation collector
+# (pflib.basestation) already keeps both for every aircraft it heard in the last day in its live view
+# (pflib.liveview), so they're read from there. When socket30003.pl writes the day files there is no
+# live view, and every new line goes into a per-ICAO index that is kept across cycles
+# (sbs-index.json) instead.
+#
+# Usage:
+#   python3 -m pflib.sbs collect --today <file> [--yesterday <file>] --outdir <dir> [options]
+# writes pf.txt, pa.txt (matching lines, newest first, like `tac`), pf_icaos.txt and pa_icaos.txt
+# (sorted, unique) to <dir>, and prints key=value lines: mode, newlines, lastline.
+# From the live view or the index it writes callsigns.tsv (icao TAB callsign) and squawks.tsv (icao TAB squawk TAB
+# first TAB last, epoch seconds, the latest run of every --squawks code) for the ICAOs of the new lines; the
+# records of this cycle are the only ones that need them.
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from . import liveview, matcher
+
+STATE_FILE = "/run/planefence/sbs-ingest.json"
+INDEX_FILE = "/run/planefence/sbs-index.json"
+NFIELDS = 12
+SQUAWK_RUNS = 4         # squawk runs kept per ICAO
+INDEX_RETENTION = 86400
+
+
+class SBSRecord:
+    """One socket30003 line. Only the fields the filters need are split out"""
+    __slots__ = ("line", "icao", "altitude", "distance", "squawk", "date", "time", "callsign")
+
+    def __init__(self, line, fields):
+        self.line = line
+        self.icao = fields[0]
+        self.altitude = _number(fields[1] or "0")   # the awk filter took an empty altitude as 0
+        self.date = fields[4]
+        self.time = fields[5]
+        self.distance = _number(fields[7])
+        self.squawk = fields[8]
+        self.callsign = fields[11]
+
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse(line):
+    """Return an SBSRecord for a complete socket30003 line, or None for headers and short lines"""
+    fields = line.split(",")
+    if len(fields) != NFIELDS:
+        return None
+    return SBSRecord(line, fields)
+
+
+# --- filters -------------------------------------------------------------------------------------
+
+class Filters:
+    """
+    The Planefence and Plane-Alert selection. ignore is a pflib.matcher.IgnoreMatcher (or None),
+    pa a pflib.matcher.PlaneAlertMatcher with the plane-alert-db ICAOs and the alert squawks.
+    """
+
+    def __init__(self, planefence=True, dist=None, maxalt=None, ignore=None,
+                 planealert=False, pa_range=None, pa=None):
+        self.planefence = planefence
+        self.dist = dist
+        self.maxalt = maxalt
+        self.ignore = ignore
+        self.planealert = planealert and bool(pa)
+        self.pa_range = pa_range
+        self.pa = pa
+
+    def is_pf(self, rec):
+        return (self.planefence and rec.distance is not None and rec.distance <= self.dist
+                and rec.altitude is not None and rec.altitude <= self.maxalt
+                and not (self.ignore and self.ignore.match(rec.line, rec.icao)))
+
+    def is_pa(self, rec):
+        return (self.planealert and rec.distance is not None and rec.distance <= self.pa_range
+                and self.pa.match(rec.icao, rec.squawk))
+
+
+# --- per-ICAO index ------------------------------------------------------------------------------
+
+class IcaoIndex:
+    """
+    icao -> [last callsign, last seen, [[squawk, first seen, last seen], ...]], times in epoch seconds.
+    Lines older than the last one of an ICAO are ignored, so reading a file again changes nothing.
+    """
+
+    def __init__(self, entries=None):
+        self.fresh = entries is None    # nothing was kept from earlier cycles
+        self.entries = entries or {}
+        self.midnights = {}
+
+    @classmethod
+    def from_live(cls, path):
+        """The index as the live view of the BaseStation collector has it, or None if there is none"""
+        if not os.path.isfile(path):
+            return None
+        try:
+            view = liveview.LiveView(path, readonly=True)
+            try:
+                rows = view.rows(columns=("icao", "callsign", "last_seen", "squawks")).fetchall()
+            finally:
+                view.close()
+        except sqlite3.Error:
+            return None
+        return cls({icao: [callsign.replace(" ", ""), last_seen, liveview.parse_runs(squawks)]
+                    for icao, callsign, last_seen, squawks in rows})
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls(entries if isinstance(entries, dict) else None)
+
+    def save(self, path=INDEX_FILE):
+        if self.entries:
+            newest = max(entry[1] for entry in self.entries.values())
+            self.entries = {icao: e for icao, e in self.entries.items() if e[1] >= newest - INDEX_RETENTION}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(prefix=".sbs-index-", dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmpname, path)
+
+    def epoch(self, date, clock):
+        """YYYY/MM/DD and HH:MM:SS.mmm as local epoch seconds, or None"""
+        midnight = self.midnights.get(date)
+        try:
+            if midnight is None:
+                year, month, day = (int(v) for v in date.replace("-", "/").split("/"))
+                midnight = self.midnights[date] = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+            hours, minutes, seconds = clock.split(":")
+            return midnight + int(hours) * 3600 + int(minutes) * 60 + int(float(seconds))
+        except (ValueError, OverflowError):
+            return None
+
+    def add(self, rec):
+        when = self.epoch(rec.date, rec.time)
+        if when is None:
+            return
+        entry = self.entries.get(rec.icao)
+        if entry is None:
+            entry = self.entries[rec.icao] = ["", when, []]
+        elif when < entry[1]:
+            return
+        entry[1] = when
+        callsign = rec.callsign.replace(" ", "")
+        if callsign:
+            entry[0] = callsign
+        if rec.squawk:
+            liveview.add_squawk(entry[2], rec.squawk, when, SQUAWK_RUNS)
+
+    def squawk_runs(self, squawks, icaos=None):
+        """(icao, squawk, first, last) of the latest run of each of squawks, for every ICAO (of icaos) that had one"""
+        wanted = {squawk for squawk in squawks if squawk}
+        for icao in self.entries if icaos is None else sorted(icaos):
+            entry = self.entries.get(icao)
+            if entry is None:
+                continue
+            for squawk, (first, last) in liveview.latest_runs(entry[2], wanted).items():
+                yield icao, squawk, first, last
+
+
+# --- incremental reading -------------------------------------------------------------------------
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(prefix=".sbs-ingest-", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+    os.replace(tmpname, path)
+
+
+def _offset_after_line(path, line):
+    """Byte offset just past the first occurrence of line in path (grep -F semantics), or 0"""
+    needle = line.encode("utf-8", errors="replace")
+    with open(path, "rb") as f:
+        at = 0
+        for raw in f:
+            at += len(raw)
+            if needle in raw:
+                return at
+    return 0
+
+
+def start_offset(path, state, lastline):
+    """Where to resume reading path: the saved offset if it matches lastline, else search for it"""
+    entry = state.get(path)
+    st = os.stat(path)
+    if (entry and entry.get("line") == lastline and entry.get("ino") == st.st_ino
+            and entry.get("offset", 0) <= st.st_size):
+        return entry["offset"]
+    return _offset_after_line(path, lastline) if lastline else 0
+
+
+def read_new(path, offset):
+    """
+    Read the complete lines appended to path since offset. A trailing partial line is left for the
+    next cycle. Returns (lines, new offset).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    lines = data[:end].decode("utf-8", errors="replace").splitlines()
+    return lines, offset + end
+
+
+def line_date(line):
+    """The socket30003 date of a line as YYMMDD, or None"""
+    fields = line.split(",")
+    if len(fields) < 6:
+        return None
+    date = fields[4].replace("/", "").replace("-", "")
+    return date[2:8] if len(date) == 8 else None
+
+
+def collect(today_file, yesterday_file, lastline, filters, today, yesterday, state_path=STATE_FILE, index=None,
+            touched=None):
+    """
+    Read everything new since lastline, filter it and add it to index (an IcaoIndex, if given), and the
+    ICAOs of the new lines to touched (a set, if given).
+    Returns (pf records, pa records, info) where the record lists are newest first and info holds
+    mode ("continue" or "restart"), newlines (new lines read from today's file) and lastline.
+    """
+    state = load_state(state_path)
+    last_date = line_date(lastline) if lastline else None
+    sources = []   # (path, offset)
+    if last_date == yesterday and yesterday_file and os.path.isfile(yesterday_file):
+        sources.append((yesterday_file, start_offset(yesterday_file, state, lastline)))
+    if today_file and os.path.isfile(today_file):
+        if last_date == today:
+            sources.append((today_file, start_offset(today_file, state, lastline)))
+        else:
+            sources.append((today_file, 0))
+
+    if index is not None and index.fresh:
+        # a new index (after a container restart) also gets the lines that were read before
+        for path, offset in sources:
+            with open(path, "rb") as f:
+                data = f.read(offset)
+            for line in data.decode("utf-8", errors="replace").splitlines():
+                rec = parse(line)
+                if rec is not None:
+                    index.add(rec)
+
+    pf, pa = [], []
+    newlines = 0
+    newstate = {}
+    for path, offset in sources:
+        lines, end = read_new(path, offset)
+        if path == today_file:
+            newlines = len(lines)
+        for line in lines:
+            rec = parse(line)
+            if rec is None:
+                continue
+            if index is not None:
+                index.add(rec)
+            if touched is not None:
+                touched.add(rec.icao)
+            if filters.is_pf(rec):
+                pf.append(rec)
+            if filters.is_pa(rec):
+                pa.append(rec)
+        if lines:
+            lastline = lines[-1]
+        newstate[path] = {"offset": end, "ino": os.stat(path).st_ino, "line": lastline}
+
+    # Only the last file read needs to match lastline; offsets of older files are kept for reference
+    for entry in newstate.values():
+        entry["line"] = lastline
+    save_state(newstate, state_path)
+
+    pf.reverse()
+    pa.reverse()
+    info = {"mode": "continue" if last_date == today else "restart", "newlines": newlines, "lastline": lastline}
+    return pf, pa, info
+
+
+def _write(path, lines):
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental socket30003 ingestion for Planefence")
+    parser.add_argument("command", choices=["collect"])
+    parser.add_argument("--today", required=True, help="today's dump1090-*-YYMMDD.txt file")
+    parser.add_argument("--yesterday", help="yesterday's dump1090-*-YYMMDD.txt file")
+    parser.add_argument("--lastline", default="", help="LASTPROCESSEDLINE from the records file")
+    parser.add_argument("--today-date", required=True, help="YYMMDD")
+    parser.add_argument("--yesterday-date", required=True, help="YYMMDD")
+    parser.add_argument("--outdir", required=True)
+    parser.add_argument("--state", default=STATE_FILE)
+    parser.add_argument("--index", default=INDEX_FILE, help="per-ICAO callsign and squawk index")
+    parser.add_argument("--live", help=f"live view of the collector (default: {liveview.VIEW_FILE} next to --today)")
+    parser.add_argument("--planefence", action="store_true")
+    parser.add_argument("--dist", type=float, default=0)
+    parser.add_argument("--maxalt", type=float, default=0)
+    parser.add_argument("--ignorelist")
+    parser.add_argument("--planealert", action="store_true")
+    parser.add_argument("--pa-range", type=float, default=999999)
+    parser.add_argument("--pa-file")
+    parser.add_argument("--squawks", default="", help="comma separated squawk codes")
+    args = parser.parse_args(argv)
+
+    squawks = [s.strip() for s in args.squawks.split(",")]
+    filters = Filters(planefence=args.planefence, dist=args.dist, maxalt=args.maxalt,
+                      ignore=matcher.ignore_matcher(args.ignorelist) if args.planefence else None,
+                      planealert=args.planealert, pa_range=args.pa_range,
+                      pa=matcher.planealert_matcher(args.pa_file, squawks) if args.planealert else None)
+    index = IcaoIndex.from_live(args.live or os.path.join(os.path.dirname(args.today), liveview.VIEW_FILE))
+    live = index is not None
+    if not live:
+        index = IcaoIndex.load(args.index)
+    touched = set()
+    pf, pa, info = collect(args.today, args.yesterday, args.lastline, filters,
+                           args.today_date, args.yesterday_date, args.state, None if live else index, touched)
+    if not live:
+        index.save(args.index)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    _write(os.path.join(args.outdir, "pf.txt"), (rec.line for rec in pf))
+    _write(os.path.join(args.outdir, "pa.txt"), (rec.line for rec in pa))
+    _write(os.path.join(args.outdir, "pf_icaos.txt"), sorted({rec.icao for rec in pf}))
+    _write(os.path.join(args.outdir, "pa_icaos.txt"), sorted({rec.icao for rec in pa}))
+    _write(os.path.join(args.outdir, "callsigns.tsv"),
+           (f"{icao}\t{index.entries[icao][0]}" for icao in sorted(touched)
+            if icao in index.entries and index.entries[icao][0]))
+    _write(os.path.join(args.outdir, "squawks.tsv"),
+           (f"{icao}\t{squawk}\t{first:.0f}\t{last:.0f}"
+            for icao, squawk, first, last in index.squawk_runs(squawks, touched)))
+    for key, value in info.items():
+        print(f"{key}={value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+# Screenshot job queue and result cache for screenshot.sh
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# screenshot.sh hands the ICAOs of all Planefence and Plane-Alert records that need a screenshot to
+# "run", one per line as <icao> TAB <squawk>. The jobs are kept in a persistent queue (a small SQLite
+# database in persist/.internal), so jobs that didn't get their turn, or whose run was killed, are
+# picked up by the next run. An ICAO is queued once no matter how many records ask for it, and a
+# screenshot that was taken less than --window seconds ago is handed out again instead of asking the
+# screenshot container for a new one; an ICAO whose screenshot failed isn't tried again for
+# --retry-after seconds. Jobs of aircraft squawking an emergency code go first, the others in the
+# order they were queued, and at most --workers of them are rendered at the same time.
+#
+# The screenshots are quantized with pngquant (if it's installed) and stored by content, as
+# <cache dir>/<sha256>.png, so Planefence and Plane-Alert records of the same aircraft, and the
+# Discord, Mastodon, Bluesky and Telegram notifiers that attach them, all share one file.
+# The answer is an <icao> TAB <state> TAB <file> line for each ICAO on stdin, where state is
+# done (file is the screenshot), failed, or queued (not rendered in this run; ask again next run).
+#
+# Usage:
+#   python3 -m pflib.screenshots run [--url URL] [--queue FILE] [--cache-dir DIR] [--timeout S] [--workers N]
+#                                    [--max-jobs N] [--window S] [--retry-after S]
+#   python3 -m pflib.screenshots status [--queue FILE]
+#   python3 -m pflib.screenshots serve [--port 5042] [--delay S] [--fail icao,icao]
+#       a stand-in for the screenshot container, for testing: answers GET /snap/<icao> with a small
+#       PNG after --delay seconds, and reports how many requests it served at the same time
+
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pflib import metrics
+
+SCREENSHOT_URL = "http://screenshot:5042"
+QUEUE_FILE = "/usr/share/planefence/persist/.internal/screenshots.db"
+CACHE_DIR = "/usr/share/planefence/persist/planepix/cache/screenshots"
+TIMEOUT = 60
+MAX_WORKERS = 2            # the screenshot container renders with a headless browser; don't swamp it
+MAX_JOBS = 10              # screenshots rendered per run
+WINDOW = 600               # seconds a screenshot of an ICAO is handed out again
+RETRY_AFTER = 300          # seconds before a failed ICAO is tried again
+RETENTION = 86400          # seconds finished jobs are remembered
+BUSY_TIMEOUT_MS = 30000
+
+EMERGENCY_SQUAWKS = ("7500", "7600", "7700")
+PRIORITY_EMERGENCY = 0
+PRIORITY_NORMAL = 1
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    icao TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    queued REAL NOT NULL,
+    updated REAL NOT NULL,
+    digest TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT ''
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_order ON jobs (state, priority, queued);
+"""
+
+
+def normalize_icao(icao):
+    return str(icao).strip().upper()
+
+
+def priority(squawk):
+    return PRIORITY_EMERGENCY if str(squawk).strip() in EMERGENCY_SQUAWKS else PRIORITY_NORMAL
+
+
+def cache_file(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}.png")
+
+
+class JobQueue:
+    """Persistent icao -> screenshot job queue; a job is queued, running, done or failed"""
+
+    def __init__(self, path=QUEUE_FILE, cache_dir=CACHE_DIR, window=WINDOW, retry_after=RETRY_AFTER,
+                 timeout=TIMEOUT):
+        self.cache_dir = cache_dir
+        self.window = window
+        self.retry_after = retry_after
+        self.stale_after = 2 * timeout   # a job that has been running this long belongs to a run that died
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _current(self, state, updated, digest, now):
+        """True if a job in this state doesn't have to be queued again"""
+        if state == DONE:
+            return now - updated < self.window and os.path.isfile(cache_file(self.cache_dir, digest))
+        if state == FAILED:
+            return now - updated < self.retry_after
+        if state == RUNNING:
+            return now - updated < self.stale_after
+        return False
+
+    def enqueue(self, jobs, now=None):
+        """Queue jobs ({icao: priority}) that aren't queued or answered yet; returns the number queued"""
+        now = now or time.time()
+        added = 0
+        with self.db:
+            for n, (icao, prio) in enumerate(jobs.items()):
+                row = self.db.execute("SELECT state, priority, updated, digest FROM jobs WHERE icao = ?",
+                                      (icao,)).fetchone()
+                if row and row[0] == QUEUED:
+                    if prio < row[1]:
+                        self.db.execute("UPDATE jobs SET priority = ? WHERE icao = ?", (prio, icao))
+                    continue
+                if row and self._current(row[0], row[2], row[3], now):
+                    continue
+                self.db.execute(
+                    "INSERT OR REPLACE INTO jobs (icao, priority, state, queued, updated) VALUES (?, ?, ?, ?, ?)",
+                    (icao, prio, QUEUED, now + n * 1e-6, now))   # keeps the order of the input
+                added += 1
+        return added
+
+    def claim(self, limit, now=None):
+        """Mark the first limit queued jobs (and the ones of runs that died) running; returns their ICAOs"""
+        now = now or time.time()
+        with self.db:
+            self.db.execute("UPDATE jobs SET state = ? WHERE state = ? AND updated < ?",
+                            (QUEUED, RUNNING, now - self.stale_after))
+            icaos = [icao for (icao,) in self.db.execute(
+                "SELECT icao FROM jobs WHERE state = ? ORDER BY priority, queued LIMIT ?", (QUEUED, limit))]
+            self.db.executemany("UPDATE jobs SET state = ?, updated = ? WHERE icao = ?",
+                                ((RUNNING, now, icao) for icao in icaos))
+        return icaos
+
+    def finish(self, icao, digest="", error="", now=None):
+        now = now or time.time()
+        with self.db:
+            self.db.execute("UPDATE jobs SET state = ?, updated = ?, digest = ?, error = ? WHERE icao = ?",
+                            (DONE if digest else FAILED, now, digest, error, icao))
+
+    def answers(self, icaos):
+        """{icao: (state, file)} for icaos; "queued" for the ones that haven't been answered"""
+        found = {}
+        icaos = list(icaos)
+        for i in range(0, len(icaos), 500):
+            chunk = icaos[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT icao, state, digest FROM jobs WHERE icao IN ({','.join('?' * len(chunk))})", chunk)
+            for icao, state, digest in rows:
+                found[icao] = (state, cache_file(self.cache_dir, digest) if state == DONE else "")
+        return {icao: found.get(icao, (QUEUED, "")) for icao in icaos}
+
+    def prune(self, now=None):
+        now = now or time.time()
+        with self.db:
+            self.db.execute("DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?", (DONE, FAILED, now - RETENTION))
+
+    def status(self):
+        return self.db.execute("SELECT icao, priority, state, queued, updated, digest, error FROM jobs "
+                               "ORDER BY state, priority, queued").fetchall()
+
+
+def quantize(data):
+    """The PNG reduced with pngquant (to about a third of its size), or data itself if that's not possible"""
+    if not shutil.which("pngquant"):
+        return data
+    try:
+        result = subprocess.run(["pngquant", "64", "-"], input=data, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, timeout=30, check=False)
+    except (OSError, subprocess.SubprocessError):
+        return data
+    return result.stdout if result.returncode == 0 and result.stdout else data
+
+
+def store(data, cache_dir):
+    """Store data as <cache_dir>/<sha256>.png unless it's already there; returns the digest"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = cache_file(cache_dir, digest)
+    if os.path.isfile(path):
+        os.utime(path)   # keep it from being cleaned up while it's handed out
+        return digest
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(prefix=".screenshot-", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, path)
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    return digest
+
+
+def snap(icao, url=SCREENSHOT_URL, timeout=TIMEOUT):
+    """The PNG the screenshot container renders for icao; raises OSError if it doesn't"""
+    with urllib.request.urlopen(f"{url.rstrip('/')}/snap/{icao}", timeout=timeout) as response:
+        data = response.read()
+    if not data:
+        raise OSError("empty answer")
+    return data
+
+
+def run(lines, queue, url=SCREENSHOT_URL, timeout=TIMEOUT, workers=MAX_WORKERS, max_jobs=MAX_JOBS, fetch=snap):
+    """Queue the <icao> TAB <squawk> lines, render the next max_jobs jobs and return queue.answers()"""
+    wanted = {}
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        icao = normalize_icao(fields[0])
+        if not icao:
+            continue
+        prio = priority(fields[1] if len(fields) > 1 else "")
+        wanted[icao] = min(prio, wanted.get(icao, prio))
+    added = queue.enqueue(wanted)
+    metrics.cache_result("screenshot", hits=len(wanted) - added, misses=added)
+
+    claimed = queue.claim(max_jobs)
+    if claimed:
+        def render(icao):
+            started = time.perf_counter()
+            data = quantize(fetch(icao, url, timeout))
+            return store(data, queue.cache_dir), time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(claimed)))) as pool:
+            futures = {pool.submit(render, icao): icao for icao in claimed}
+            for future in as_completed(futures):
+                icao = futures[future]
+                try:
+                    digest, seconds = future.result()
+                except OSError as e:
+                    print(f"Failed to get screenshot for {icao}: {e}", file=sys.stderr)
+                    queue.finish(icao, error=str(e))
+                    continue
+                metrics.observe("screenshot_render", seconds)
+                queue.finish(icao, digest)
+    queue.prune()
+    return queue.answers(wanted)
+
+
+# --- stand-in screenshot container ----------------------------------------------------------------
+
+def _png(icao):
+    """A small, valid PNG whose color depends on icao"""
+    color = hashlib.sha256(icao.encode("utf-8")).digest()[:3]
+    width, height = 64, 48
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def serve(port, delay=0.0, fail=()):
+    """Answer /snap/<icao> like the screenshot container, after delay seconds, until interrupted"""
+    counters = {"requests": 0, "active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.startswith("/snap/"):
+                self.send_error(404)
+                return
+            icao = normalize_icao(self.path.rsplit("/", 1)[-1])
+            with lock:
+                counters["requests"] += 1
+                counters["active"] += 1
+                counters["max_active"] = max(counters["max_active"], counters["active"])
+            try:
+                time.sleep(delay)
+                if icao in fail:
+                    self.send_error(500, "rendering failed")
+                    return
+                body = _png(icao)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                with lock:
+                    counters["active"] -= 1
+
+        def log_message(self, format, *args):
+            print(f"screenshot: {format % args} (requests={counters['requests']}, "
+                  f"max concurrent={counters['max_active']})", file=sys.stderr)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Serving screenshots on http://127.0.0.1:{server.server_port}/snap/<icao>", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screenshot job queue for Planefence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", help="queue the ICAOs on stdin, render the next jobs and report")
+    run_cmd.add_argument("--url", default=SCREENSHOT_URL, help="base URL of the screenshot container")
+    run_cmd.add_argument("--queue", default=QUEUE_FILE)
+    run_cmd.add_argument("--cache-dir", default=CACHE_DIR)
+    run_cmd.add_argument("--timeout", type=int, default=TIMEOUT, help="seconds to wait for one screenshot")
+    run_cmd.add_argument("--workers", type=int, default=MAX_WORKERS, help="screenshots rendered at the same time")
+    run_cmd.add_argument("--max-jobs", type=int, default=MAX_JOBS, help="screenshots rendered in this run")
+    run_cmd.add_argument("--window", type=int, default=WINDOW, help="seconds a screenshot is handed out again")
+    run_cmd.add_argument("--retry-after", type=int, default=RETRY_AFTER,
+                         help="seconds before a failed ICAO is tried again")
+    status_cmd = sub.add_parser("status", help="list the jobs in the queue")
+    status_cmd.add_argument("--queue", default=QUEUE_FILE)
+    serve_cmd = sub.add_parser("serve", help="run a stand-in screenshot container")
+    serve_cmd.add_argument("--port", type=int, default=5042)
+    serve_cmd.add_argument("--delay", type=float, default=0.0, help="seconds each screenshot takes")
+    serve_cmd.add_argument("--fail", default="", help="comma separated ICAOs that fail to render")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port, args.delay, {normalize_icao(icao) for icao in args.fail.split(",") if icao.strip()})
+        return 0
+
+    try:
+        queue = JobQueue(args.queue, getattr(args, "cache_dir", CACHE_DIR), getattr(args, "window", WINDOW),
+                         getattr(args, "retry_after", RETRY_AFTER), getattr(args, "timeout", TIMEOUT))
+    except sqlite3.Error as e:
+        print(f"Unable to open screenshot queue {args.queue}: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.command == "status":
+            for row in queue.status():
+                sys.stdout.write("\t".join(str(field) for field in row) + "\n")
+            return 0
+        answers = run(sys.stdin, queue, args.url, max(args.timeout, 1), max(args.workers, 1), max(args.max_jobs, 0))
+        for icao, (state, path) in answers.items():
+            sys.stdout.write(f"{icao}\t{state}\t{path}\n")
+    except sqlite3.Error as e:
+        print(f"Unable to update screenshot queue {args.queue}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# Persistent key -> values cache in SQLite, with a TTL for answers and another for "not found" answers
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The route (pflib.routes) and photo (pflib.photos) lookups keep their API answers in a small SQLite
+# database in persist/.internal: one table with the key, the value columns and the time the answer
+# was fetched. Lookups are done in chunks of CHUNK keys (below SQLite's limit on bound parameters),
+# answers are stored with INSERT OR REPLACE, and every store removes the rows that are too old to be
+# used again.
+
+import sqlite3
+import time
+
+BUSY_TIMEOUT_MS = 30000
+CHUNK = 500
+
+
+class TTLCache:
+    """
+    key -> tuple of values in table (key, *values, fetched), created with schema if it isn't there.
+    negative(*values) tells whether an answer is a "not found" one, which is kept for negative_ttl
+    seconds instead of ttl.
+    """
+
+    def __init__(self, path, schema, table, key, values, ttl, negative_ttl, negative):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.negative = negative
+        self.table = table
+        self.key = key
+        self.values = tuple(values)
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def get_many(self, keys, now=None):
+        """{key: values} for the keys with an answer that is still fresh"""
+        now = now or time.time()
+        found = {}
+        keys = list(keys)
+        columns = ", ".join((self.key,) + self.values + ("fetched",))
+        for i in range(0, len(keys), CHUNK):
+            chunk = keys[i:i + CHUNK]
+            rows = self.db.execute(
+                f"SELECT {columns} FROM {self.table} WHERE {self.key} IN ({','.join('?' * len(chunk))})", chunk)
+            for key, *values, fetched in rows:
+                ttl = self.negative_ttl if self.negative(*values) else self.ttl
+                if now - fetched < ttl:
+                    found[key] = tuple(values)
+        return found
+
+    def put_many(self, results, now=None):
+        """Store {key: values} as fetched at now, and drop the answers that have expired"""
+        now = now or time.time()
+        columns = (self.key,) + self.values + ("fetched",)
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                ((key, *values, now) for key, values in results.items()))
+            self.db.execute(f"DELETE FROM {self.table} WHERE fetched < ?", (now - max(self.ttl, self.negative_ttl),))
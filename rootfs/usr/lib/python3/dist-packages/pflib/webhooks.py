@@ -0,0 +1,179 @@
+# Concurrent, rate-limit aware delivery of Discord webhook messages
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# All posts go through one pooled requests session and a small thread pool, so a message to N
+# webhooks takes as long as the slowest webhook instead of the sum of all of them.
+# Every webhook URL has its own token bucket. It is seeded with Discord's default webhook limit
+# and then follows the X-RateLimit-* headers Discord sends back; a 429 blocks the bucket for
+# Retry-After seconds and the post is retried once that has passed.
+# Failures never raise: every webhook gets a result dict:
+#   {"webhook": <last 8 chars of the url>, "ok": bool, "status": int|None, "attempts": int,
+#    "elapsed": seconds, "link": <message link> | "error": <reason>}
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TIMEOUT = 45
+MAX_WORKERS = 8
+MAX_ATTEMPTS = 3
+MAX_RETRY_WAIT = 60   # don't wait longer than this for a rate limit to clear; report a failure instead
+
+# Discord allows about 5 messages per 2 seconds per webhook
+BUCKET_CAPACITY = 5
+BUCKET_PERIOD = 2.0
+
+
+class TokenBucket:
+
+    def __init__(self, capacity=BUCKET_CAPACITY, period=BUCKET_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return the number of seconds the caller has to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def update(self, headers, status):
+        """Adjust the bucket to the rate-limit state Discord reported"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            limit = _float(headers.get("X-RateLimit-Limit"))
+            if limit and limit >= 1:
+                self.capacity = limit
+            remaining = _float(headers.get("X-RateLimit-Remaining"))
+            reset_after = _float(headers.get("X-RateLimit-Reset-After"))
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                if remaining < 1 and reset_after:
+                    self.blocked_until = max(self.blocked_until, now + reset_after)
+            if status == 429:
+                retry_after = _float(headers.get("Retry-After")) or reset_after or BUCKET_PERIOD
+                self.tokens = 0
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def bucket(url):
+    with _buckets_lock:
+        if url not in _buckets:
+            _buckets[url] = TokenBucket()
+        return _buckets[url]
+
+
+def session():
+    """The shared, pooled HTTP session. requests is imported on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2))
+        return _session
+
+
+def post(url, payload, files=None, params=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Post one message to one webhook, honouring its rate limit. payload is a dict or a JSON string,
+    files a list of (field, (filename, bytes)) tuples.
+    """
+    if not isinstance(payload, str):
+        payload = json.dumps(payload)
+    params = dict(params or {}, wait="true")
+    result = {"webhook": url[-8:], "ok": False, "status": None, "attempts": 0}
+    limiter = bucket(url)
+    started = time.monotonic()
+
+    while result["attempts"] < MAX_ATTEMPTS:
+        wait = limiter.reserve()
+        if wait > MAX_RETRY_WAIT:
+            result["error"] = f"rate limited for another {wait:.0f}s"
+            break
+        if wait > 0:
+            time.sleep(wait)
+        result["attempts"] += 1
+        try:
+            if files:
+                response = session().post(url, params=params, timeout=timeout,
+                                          data={"payload_json": payload}, files=files)
+            else:
+                response = session().post(url, params=params, timeout=timeout, data=payload,
+                                          headers={"Content-Type": "application/json"})
+        except Exception as e:
+            result["error"] = str(e).replace("\n", " ")
+            break
+
+        result["status"] = response.status_code
+        limiter.update(response.headers, response.status_code)
+        if response.status_code == 429:
+            result["error"] = "rate limited"
+            continue
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.ok and body.get("channel_id") and body.get("id"):
+            result["ok"] = True
+            result["link"] = f"https://discord.com/channels/@me/{body['channel_id']}/{body['id']}"
+            result.pop("error", None)
+        else:
+            result["error"] = response.text.replace("\n", " ")
+        break
+
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def post_many(messages, timeout=DEFAULT_TIMEOUT):
+    """
+    Post a list of (url, payload, files, params) messages concurrently.
+    Results come back in the order of messages.
+    """
+    messages = [m for m in messages if m[0].strip()]
+    if len(messages) <= 1:
+        return [post(*m, timeout=timeout) for m in messages]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(messages))) as pool:
+        return list(pool.map(lambda m: post(*m, timeout=timeout), messages))
+
+
+def post_all(urls, payload, files=None, params=None, timeout=DEFAULT_TIMEOUT):
+    """Post the same message to every webhook in urls"""
+    return post_many([(url.strip(), payload, files, params) for url in urls], timeout)
+
+
+def max_duration(count, timeout=DEFAULT_TIMEOUT):
+    """The longest post_all can take for count webhooks: every attempt waits out the rate limit and times out"""
+    waves = max(1, -(-count // MAX_WORKERS))
+    return waves * MAX_ATTEMPTS * (timeout + MAX_RETRY_WAIT)
@@ -78,6 +78,8 @@ if [[ $inhibit_update == "false" ]]; then
 		chmod a+r /usr/share/planefence/persist/.internal/plane-alert-db.txt
 	fi
 	ln -sf /usr/share/planefence/persist/.internal/plane-alert-db.txt /usr/share/planefence/html/alertlist.txt
+	# Pre-compile the mmapped index used by pflib so the notifiers don't have to build it on first use
+	python3 -m pflib.planedb build /usr/share/planefence/persist/.internal/plane-alert-db.txt >/dev/null 2>&1 || log_print WARNING "Unable to build the plane-alert-db index"
 else
 	log_print WARNING "At least one http retrieval failed, using old list!"
 fi
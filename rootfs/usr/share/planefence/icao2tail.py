@@ -6,7 +6,6 @@
 # Licensed under Gnu Public License GPLv3.
 
 import sys
-from math import pow
 
 ICAO_SIZE = 6           # size of an icao address
 NNUMBER_MAX_SIZE = 6    # max size of a N-Number
@@ -16,12 +15,18 @@ digitset = "0123456789"
 hexset = "0123456789ABCDEF"
 allchars = charset+digitset
 
-suffix_size = 1 + len(charset) + int(pow(len(charset),2))   # 601
+suffix_size = 1 + len(charset) + len(charset)**2           # 601
 bucket4_size = 1 + len(charset) + len(digitset)             # 35
 bucket3_size = len(digitset)*bucket4_size + suffix_size     # 951
 bucket2_size = len(digitset)*(bucket3_size) + suffix_size   # 10111
 bucket1_size = len(digitset)*(bucket2_size) + suffix_size   # 101711
 
+# Precomputed lookup tables, so the conversions below need neither floats nor str.index() scans
+charset_index = {c: i for i, c in enumerate(charset)}
+allchars_index = {c: i for i, c in enumerate(allchars)}
+suffixes = [''] + [c0 + c1 for c0 in charset for c1 in [''] + list(charset)]    # offset -> suffix
+suffixes_index = {s: i for i, s in enumerate(suffixes)}                          # suffix -> offset
+
 def get_suffix(offset):
     """
     Compute the suffix for the tail number given an offset
@@ -43,13 +48,7 @@ def get_suffix(offset):
     ...
     600 -> 'ZZ'
     """
-    if offset==0:
-        return ''
-    char0 = charset[int((offset-1)/(len(charset)+1))]
-    rem = (offset-1)%(len(charset)+1)
-    if rem==0:
-        return char0
-    return char0+charset[rem-1]
+    return suffixes[offset]
 
 def suffix_offset(s):
     """
@@ -68,25 +67,10 @@ def suffix_offset(s):
     ...
     'ZZ' -> 600
     """
-    if len(s)==0:
-        return 0
-    valid = True
-    if len(s)>2:
-        valid = False
-    else:
-        for c in s:
-            if c not in charset:
-                valid = False
-                break
-
-    if not valid:
-        print("parameter of suffix_shift() invalid")
-        print(s)
-        return None
-
-    count = (len(charset)+1)*charset.index(s[0]) + 1
-    if len(s)==2:
-        count += charset.index(s[1]) + 1
+    count = suffixes_index.get(s)
+    if count is None:
+        print("parameter of suffix_shift() invalid", file=sys.stderr)
+        print(s, file=sys.stderr)
     return count
 
 
@@ -98,11 +82,11 @@ def create_icao(prefix, i):
 
     Example: create_icao('a', 11) -> "a0000b"
     """
-    suffix = hex(i)[2:]
+    suffix = format(i, 'x')
     l = len(prefix)+len(suffix)
     if l>ICAO_SIZE:
         return None
-    return prefix + '0'*(ICAO_SIZE-l) + suffix
+    return prefix + suffix.rjust(ICAO_SIZE-len(prefix), '0')
 
 def n_to_icao(nnumber):
     """
@@ -133,10 +117,13 @@ def n_to_icao(nnumber):
         for i in range(len(nnumber)):
             if i == NNUMBER_MAX_SIZE-2: # NNUMBER_MAX_SIZE-2 = 4
                 # last possible char (in allchars)
-                count += allchars.index(nnumber[i])+1
+                count += allchars_index[nnumber[i]]+1
             elif nnumber[i] in charset:
                 # first alphabetical char
-                count += suffix_offset(nnumber[i:])
+                offset = suffix_offset(nnumber[i:])
+                if offset is None:
+                    return None
+                count += offset
                 break # nothing comes after alphabetical chars
             else:
                 # number
@@ -179,32 +166,28 @@ def icao_to_n(icao):
     if i < 0:
         return output
 
-    dig1 = int(i/bucket1_size) + 1 # digit 1
-    rem1 = i%bucket1_size
-    output += str(dig1)
+    dig1, rem1 = divmod(i, bucket1_size) # digit 1
+    output += str(dig1 + 1)
 
     if rem1 < suffix_size:
         return output + get_suffix(rem1)
 
     rem1 -= suffix_size # shift for digit 2
-    dig2 = int(rem1/bucket2_size)
-    rem2 = rem1%bucket2_size
+    dig2, rem2 = divmod(rem1, bucket2_size)
     output += str(dig2)
 
     if rem2 < suffix_size:
         return output + get_suffix(rem2)
 
     rem2 -= suffix_size # shift for digit 3
-    dig3 = int(rem2/bucket3_size)
-    rem3 = rem2%bucket3_size
+    dig3, rem3 = divmod(rem2, bucket3_size)
     output += str(dig3)
 
     if rem3 < suffix_size:
         return output + get_suffix(rem3)
 
     rem3 -= suffix_size # shift for digit 4
-    dig4 = int(rem3/bucket4_size)
-    rem4 = rem3%bucket4_size
+    dig4, rem4 = divmod(rem3, bucket4_size)
     output += str(dig4)
 
     if rem4 == 0:
@@ -213,8 +196,45 @@ def icao_to_n(icao):
     # find last character
     return output + allchars[rem4-1]
 
+def convert(val):
+    """
+    Convert an ICAO address to a N-Number or a N-Number to an ICAO address, depending on the input
+    Return None for anything that isn't a valid US ICAO address or N-Number
+    """
+    val = val.strip().upper()
+    if val[:1] == 'N':
+        return n_to_icao(val)
+    if val[:1] == 'A':
+        return icao_to_n(val)
+    return None
+
+def convert_many(values):
+    """
+    Convert an iterable of ICAO addresses and/or N-Numbers in one go
+    Yields (value, result) tuples in input order; result is None for invalid values
+    Blank values are skipped, and repeated values are only converted once
+    """
+    seen = {}
+    for val in values:
+        val = val.strip()
+        if not val:
+            continue
+        if val not in seen:
+            seen[val] = convert(val)
+        yield val, seen[val]
+
+def batch(infile, outfile):
+    """
+    Read one ICAO address or N-Number per line from infile and write 'value,result' lines to outfile
+    Invalid values get an empty result, so every non-blank input line gets exactly one output line;
+    blank lines are skipped
+    """
+    for val, res in convert_many(infile):
+        outfile.write(f"{val},{res or ''}\n")
+
 def print_help():
     print(('Usage: python '+sys.argv[0]+' [icao / nnumber]'))
+    print(('       python '+sys.argv[0]+' --batch [file]   (reads one value per line from file or stdin)'))
     print()
     print('Convert an ICAO address to a N-Number (Tail Number) and reciprocally')
     print('Only works for aircraft registered in the United States')
@@ -229,6 +249,14 @@ def invalid_parameter():
     sys.exit()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        if len(sys.argv) > 2 and sys.argv[2] != '-':
+            with open(sys.argv[2]) as f:
+                batch(f, sys.stdout)
+        else:
+            batch(sys.stdin, sys.stdout)
+        sys.exit()
+
     if len(sys.argv)-1 != 1:
         print_help()
 
@@ -174,162 +174,6 @@ choose_json_for_date() {
   printf ''
 }
 
-FILTER_MODE="planefence"
-REQUESTED_DATE=""
-REQUESTED_DAYS=""
-INSIGHTS_CACHE_SCHEMA_VERSION="6"
-
-parse_params() {
-  local method key val pair raw_qs
-  method="${REQUEST_METHOD:-GET}"
-
-  urldecode() {
-    local s="${1//+/ }"
-    printf '%b' "${s//%/\\x}"
-  }
-
-  declare -a qs=()
-  if [[ "$method" == "GET" ]]; then
-    raw_qs="${QUERY_STRING:-}"
-    if [[ -z "$raw_qs" && "${REQUEST_URI:-}" == *\?* ]]; then
-      raw_qs="${REQUEST_URI#*\?}"
-    fi
-    if [[ -n "$raw_qs" ]]; then
-      IFS='&' read -ra qs <<< "$raw_qs"
-    elif [[ $# -gt 0 ]]; then
-      qs=("$@")
-    fi
-  elif [[ $# -gt 0 ]]; then
-    qs=("$@")
-  fi
-
-  for pair in "${qs[@]}"; do
-    key="${pair%%=*}"
-    val="${pair#*=}"
-    [[ "$pair" == "$key" ]] && val=""
-    key="$(urldecode "$key")"
-    val="$(urldecode "$val")"
-    case "$key" in
-      mode)
-        [[ "$val" == "pf" ]] && val="planefence"
-        [[ "$val" == "pa" ]] && val="plane-alert"
-        [[ "$val" == "plane-alert" ]] && FILTER_MODE="plane-alert"
-        [[ "$val" == "planefence" ]] && FILTER_MODE="planefence"
-        ;;
-      date)
-        if [[ "$val" =~ ^[0-9]{6}$ ]]; then
-          REQUESTED_DATE="$val"
-        elif [[ "$val" == "today" || "$val" == "all" ]]; then
-          REQUESTED_DATE="$val"
-        fi
-        ;;
-      days)
-        [[ "$val" =~ ^[0-9]+$ ]] && REQUESTED_DAYS="$val"
-        ;;
-      raw)
-        if [[ "$val" == "1" || "$val" == "true" ]]; then
-          EMIT_HEADERS=false
-        fi
-        ;;
-    esac
-  done
-}
-
-parse_params "$@"
-
-SELECTED_HINT_DATE=""
-if [[ "$REQUESTED_DATE" =~ ^[0-9]{6}$ ]]; then
-  SELECTED_HINT_DATE="$REQUESTED_DATE"
-elif [[ -z "$REQUESTED_DATE" || "$REQUESTED_DATE" == "today" ]]; then
-  SELECTED_HINT_DATE="$tz_today"
-fi
-
-if [[ "$EMIT_HEADERS" == true ]]; then
-  printf 'Content-Type: application/json\r\n'
-  printf 'Cache-Control: no-store\r\n'
-  printf 'Pragma: no-cache\r\n'
-  printf 'Expires: 0\r\n'
-  printf 'X-Content-Type-Options: nosniff\r\n'
-  printf '\r\n'
-fi
-
-HISTORY_DAYS="$(history_days_for_mode "$FILTER_MODE")"
-if [[ -n "$REQUESTED_DAYS" ]]; then
-  HISTORY_DAYS="$REQUESTED_DAYS"
-  (( HISTORY_DAYS < 1 )) && HISTORY_DAYS=1
-  (( HISTORY_DAYS > 120 )) && HISTORY_DAYS=120
-fi
-
-cache_ttl_sec="${INSIGHTS_REQUEST_CACHE_TTL_SEC:-600}"
-if [[ ! "$cache_ttl_sec" =~ ^[0-9]+$ ]] || (( cache_ttl_sec < 1 )); then
-  cache_ttl_sec=600
-fi
-
-cache_date_key="${REQUESTED_DATE:-today}"
-if [[ -z "$REQUESTED_DATE" || "$REQUESTED_DATE" == "today" ]]; then
-  cache_date_key="$tz_today"
-fi
-
-cache_key="v${INSIGHTS_CACHE_SCHEMA_VERSION}:${FILTER_MODE}:${cache_date_key}:${HISTORY_DAYS}"
-cache_hash="$(printf '%s' "$cache_key" | sha256sum | awk '{print $1}')"
-cache_file="/tmp/insights-cache-${cache_hash}.json"
-historical_cache_dir="/usr/share/planefence/persist/.internal/insights-cache"
-historical_cache_file="${historical_cache_dir}/${cache_hash}.json"
-historical_cache_ttl_sec="$(historical_cache_ttl_sec_for_mode "$FILTER_MODE")"
-historical_cache_enabled=false
-collapsewithin_sec="$(collapsewithin_sec_for_mode "$FILTER_MODE")"
-
-if [[ "$REQUESTED_DATE" =~ ^[0-9]{6}$ ]]; then
-  requested_age_days="$(age_days_from_today_tz "$REQUESTED_DATE")"
-  if [[ "$requested_age_days" =~ ^-?[0-9]+$ ]]; then
-    if (( requested_age_days >= 2 )); then
-      historical_cache_enabled=true
-    elif (( requested_age_days == 1 && tz_cutoff_sec > collapsewithin_sec )); then
-      historical_cache_enabled=true
-    fi
-  fi
-fi
-
-if [[ "$historical_cache_enabled" == true ]]; then
-  mkdir -p "$historical_cache_dir" 2>/dev/null || true
-  if [[ -s "$historical_cache_file" ]]; then
-    now_ts="$(date +%s)"
-    cache_ts="$(stat -c %Y "$historical_cache_file" 2>/dev/null || printf '0')"
-    if [[ "$cache_ts" =~ ^[0-9]+$ ]] && (( now_ts - cache_ts <= historical_cache_ttl_sec )); then
-      log_print DEBUG "Insights render mode=warm-cache source=historical key=$cache_key age_sec=$((now_ts - cache_ts))"
-      cache_action="create"
-      [[ -s "$cache_file" ]] && cache_action="update"
-      if printf '%s\n' "$(cat "$historical_cache_file")" > "$cache_file" 2>/dev/null; then
-        log_print INFO "Insights cache ${cache_action} source=request-from-historical key=$cache_key path=$cache_file"
-      else
-        log_print ERR "Insights cache write failed source=request-from-historical key=$cache_key path=$cache_file"
-      fi
-      cat "$historical_cache_file"
-      exit 0
-    fi
-  fi
-fi
-
-if [[ -s "$cache_file" ]]; then
-  now_ts="$(date +%s)"
-  cache_ts="$(stat -c %Y "$cache_file" 2>/dev/null || printf '0')"
-  if [[ "$cache_ts" =~ ^[0-9]+$ ]] && (( now_ts - cache_ts <= cache_ttl_sec )); then
-    log_print DEBUG "Insights render mode=warm-cache source=request key=$cache_key age_sec=$((now_ts - cache_ts))"
-    cat "$cache_file"
-    exit 0
-  fi
-fi
-
-log_print DEBUG "Insights render mode=cold-create key=$cache_key"
-
-series_file="$(mktemp)"
-tmp_callsign="$(mktemp)"
-tmp_icao="$(mktemp)"
-tmp_typecode="$(mktemp)"
-tmp_owner="$(mktemp)"
-tmp_airline_prefix="$(mktemp)"
-trap 'rm -f "$series_file" "$tmp_callsign" "$tmp_icao" "$tmp_typecode" "$tmp_owner" "$tmp_airline_prefix"' EXIT
-
 extract_pattern_signals() {
   local filter_file="" cand
   for cand in \
@@ -397,7 +241,6 @@ extract_pattern_signals() {
   ' "$filter_file"
 }
 
-extract_pattern_signals
 
 extract_airline_codes() {
   local airline_file="" cand
@@ -424,40 +267,32 @@ extract_airline_codes() {
   ' "$airline_file"
 }
 
-extract_airline_codes
-
-MIL_CALLSIGN_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_callsign")"
-MIL_ICAO_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_icao")"
-MIL_TYPE_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_typecode")"
-MIL_OWNER_KEYWORDS_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_owner")"
-AIRLINE_PREFIX_MAP_JSON="$(jq -Rn '[inputs | select(length>0)] | unique | reduce .[] as $p ({}; .[$p] = true)' < "$tmp_airline_prefix")"
-
-for (( day=HISTORY_DAYS-1; day>=0; day-- )); do
-  req_date="$(date -d "-${day} days" +%y%m%d 2>/dev/null || true)"
-  [[ -n "$req_date" ]] || continue
-  day_tz_offset_hhmm="$(tz_offset_for_date_hhmm "$req_date")"
-  day_tz_offset_sec="$(offset_hhmm_to_seconds "$day_tz_offset_hhmm")"
-  date_start_epoch="$(date +%s)"
-  log_print DEBUG "Insights aggregation: start processing date=$req_date mode=$FILTER_MODE"
-
-  json_file="$(choose_json_for_date "$FILTER_MODE" "$req_date")"
-  if [[ -z "$json_file" ]]; then
-    date_end_epoch="$(date +%s)"
-    log_print DEBUG "Insights aggregation: finished date=$req_date mode=$FILTER_MODE status=no-data elapsed=$((date_end_epoch - date_start_epoch))s"
-    continue
-  fi
+load_pattern_signals() {
+  local tmp_callsign tmp_icao tmp_typecode tmp_owner tmp_airline_prefix
+  tmp_callsign="$(mktemp)"
+  tmp_icao="$(mktemp)"
+  tmp_typecode="$(mktemp)"
+  tmp_owner="$(mktemp)"
+  tmp_airline_prefix="$(mktemp)"
+
+  extract_pattern_signals
+  extract_airline_codes
+
+  MIL_CALLSIGN_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_callsign")"
+  MIL_ICAO_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_icao")"
+  MIL_TYPE_PREFIXES_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_typecode")"
+  MIL_OWNER_KEYWORDS_JSON="$(jq -Rsc 'split("\n") | map(select(length>0)) | unique' "$tmp_owner")"
+  AIRLINE_PREFIX_MAP_JSON="$(jq -Rn '[inputs | select(length>0)] | unique | reduce .[] as $p ({}; .[$p] = true)' < "$tmp_airline_prefix")"
+  # Rollups classified with other pattern signals are rebuilt
+  SIGNALS_HASH="$(printf '%s\n' "$MIL_CALLSIGN_PREFIXES_JSON" "$MIL_ICAO_PREFIXES_JSON" "$MIL_TYPE_PREFIXES_JSON" "$MIL_OWNER_KEYWORDS_JSON" "$AIRLINE_PREFIX_MAP_JSON" | sha256sum | cut -c1-16)"
+
+  rm -f "$tmp_callsign" "$tmp_icao" "$tmp_typecode" "$tmp_owner" "$tmp_airline_prefix"
+}
 
-  jq -c \
-    --arg date "$req_date" \
-    --arg selected_hint_date "$SELECTED_HINT_DATE" \
-    --arg mode "$FILTER_MODE" \
-    --argjson cutoff_sec "$tz_cutoff_sec" \
-    --argjson tz_offset_sec "$day_tz_offset_sec" \
-    --argjson mil_callsign_prefixes "$MIL_CALLSIGN_PREFIXES_JSON" \
-    --argjson mil_icao_prefixes "$MIL_ICAO_PREFIXES_JSON" \
-    --argjson mil_type_prefixes "$MIL_TYPE_PREFIXES_JSON" \
-    --argjson mil_owner_keywords "$MIL_OWNER_KEYWORDS_JSON" \
-    --argjson airline_prefix_map "$AIRLINE_PREFIX_MAP_JSON" '
+# Classifies every row of one day's JSON once. The rollup holds the whole-day aggregates plus one compact
+# row per record, [second_of_day, category, military_role, type_family, confidence, icao, route_pair, item],
+# from which the aggregates up to the current time of day (the *_cutoff fields) are computed per request.
+ROLLUP_CLASSIFY_JQ='
       def clean_rows:
         if (type=="array") and (.[0]|type=="object") and (.[0]|has("index")|not) then .[1:]
         elif type=="array" then .
@@ -594,32 +429,26 @@ for (( day=HISTORY_DAYS-1; day>=0; day-- )); do
       | reduce $rows[] as $r (
           {
             date:$date,total:0,military:0,government:0,airline:0,private_jet:0,general_aviation:0,other:0,
-            total_cutoff:0,military_cutoff:0,government_cutoff:0,airline_cutoff:0,private_jet_cutoff:0,general_aviation_cutoff:0,other_cutoff:0,
             military_types:{tanker:0,transport:0,fighter:0,helicopter:0,trainer:0,patrol:0,vip:0,uav:0,other_military:0},
-            military_types_cutoff:{tanker:0,transport:0,fighter:0,helicopter:0,trainer:0,patrol:0,vip:0,uav:0,other_military:0},
             hourly:[range(0;24) | 0],
-            hourly_cutoff:[range(0;24) | 0],
             route_pairs:{},
-            route_pairs_cutoff:{},
             type_families:{jet:0,turboprop:0,piston:0,rotorcraft:0,uav:0,other:0},
-            type_families_cutoff:{jet:0,turboprop:0,piston:0,rotorcraft:0,uav:0,other:0},
             confidence:{high:0,medium:0,low:0},
-            confidence_cutoff:{high:0,medium:0,low:0},
             icao_seen:{},
-            icao_seen_cutoff:{},
             icao_items:{},
-            icao_items_cutoff:{}
+            items:[],
+            item_ids:{},
+            rows:[]
           };
           (category($r)) as $cat
-          | (within_cutoff($r)) as $in_cutoff
           | (row_second_of_day($r)) as $sec
           | (if $sec == null then null else (($sec / 3600) | floor) end) as $hour
           | (route_pair($r)) as $route_pair
           | (type_family($r)) as $family
           | (confidence_bucket($r; $cat)) as $confidence
           | (icao_of($r)) as $icao
-          | (($selected_hint_date == "" or $date == $selected_hint_date)) as $collect_icao_items
-          | (if ($collect_icao_items and ($icao | test("^[0-9A-F]{6}$"))) then {
+          | (($icao | test("^[0-9A-F]{6}$"))) as $icao_valid
+          | (if $icao_valid then {
               icao: $icao,
               callsign: safe_txt($r.callsign),
               tail: safe_txt($r.tail),
@@ -627,7 +456,10 @@ for (( day=HISTORY_DAYS-1; day>=0; day-- )); do
               type: safe_txt($r.type),
               category: $cat
             } else null end) as $icao_item
-          | (($icao | test("^[0-9A-F]{6}$"))) as $icao_valid
+          | (if $cat == "military" then military_role($r) else null end) as $role
+          | ($icao_item | tojson) as $item_key
+          | (if $icao_item == null then null else (.item_ids[$item_key] // (.items | length)) end) as $item_id
+          | if $icao_item != null and .item_ids[$item_key] == null then .item_ids[$item_key] = $item_id | .items += [$icao_item] else . end
           | .total += 1
           | .[$cat] += 1
           | .type_families[$family] += 1
@@ -636,34 +468,311 @@ for (( day=HISTORY_DAYS-1; day>=0; day-- )); do
           | if $icao_item != null then .icao_items[$icao] = (.icao_items[$icao] // $icao_item) else . end
           | if ($hour != null and $hour >= 0 and $hour < 24) then .hourly[$hour] += 1 else . end
           | if ($route_pair != null and ($route_pair | length) > 0) then .route_pairs[$route_pair] = ((.route_pairs[$route_pair] // 0) + 1) else . end
-          | if $in_cutoff then .total_cutoff += 1 | .[($cat + "_cutoff")] += 1 else . end
-          | if $in_cutoff then
-              .type_families_cutoff[$family] += 1
-              | .confidence_cutoff[$confidence] += 1
-              | if $icao_valid then .icao_seen_cutoff[$icao] = true else . end
-              | if $icao_item != null then .icao_items_cutoff[$icao] = (.icao_items_cutoff[$icao] // $icao_item) else . end
-              | if ($hour != null and $hour >= 0 and $hour < 24) then .hourly_cutoff[$hour] += 1 else . end
-              | if ($route_pair != null and ($route_pair | length) > 0) then .route_pairs_cutoff[$route_pair] = ((.route_pairs_cutoff[$route_pair] // 0) + 1) else . end
-            else . end
-          | if $cat == "military" then
-              (military_role($r)) as $role
-              | .military_types[$role] += 1
-              | if $in_cutoff then .military_types_cutoff[$role] += 1 else . end
-            else . end
+          | if $role != null then .military_types[$role] += 1 else . end
+          | .rows += [[$sec, $cat, $role, $family, $confidence, (if $icao_valid then $icao else null end), $route_pair, $item_id]]
         )
-    ' "$json_file" >> "$series_file" 2>/dev/null || true
+      | del(.item_ids)
+'
+
+# Turns a rollup into the per-day series entry, adding the aggregates of the rows seen up to cutoff_sec
+ROLLUP_EXPAND_JQ='
+  def aggregate($rows; $items):
+    reduce $rows[] as $x (
+      {
+        total:0,military:0,government:0,airline:0,private_jet:0,general_aviation:0,other:0,
+        military_types:{tanker:0,transport:0,fighter:0,helicopter:0,trainer:0,patrol:0,vip:0,uav:0,other_military:0},
+        hourly:[range(0;24) | 0],
+        route_pairs:{},
+        type_families:{jet:0,turboprop:0,piston:0,rotorcraft:0,uav:0,other:0},
+        confidence:{high:0,medium:0,low:0},
+        icao_seen:{},
+        icao_items:{}
+      };
+      .total += 1
+      | .[$x[1]] += 1
+      | .type_families[$x[3]] += 1
+      | .confidence[$x[4]] += 1
+      | if $x[5] != null then .icao_seen[$x[5]] = true else . end
+      | if ($items != null and $x[7] != null) then .icao_items[$x[5]] = (.icao_items[$x[5]] // $items[$x[7]]) else . end
+      | if $x[0] != null then .hourly[(($x[0] / 3600) | floor)] += 1 else . end
+      | if ($x[6] != null and ($x[6] | length) > 0) then .route_pairs[$x[6]] = ((.route_pairs[$x[6]] // 0) + 1) else . end
+      | if $x[2] != null then .military_types[$x[2]] += 1 else . end
+    );
+  select(type == "object")
+  | . as $d
+  | ($selected_hint_date == "" or $d.date == $selected_hint_date) as $collect_icao_items
+  | aggregate([$d.rows[] | select((.[0] // 86400) <= $cutoff_sec)]; (if $collect_icao_items then $d.items else null end)) as $c
+  | {
+      date:$d.date,total:$d.total,military:$d.military,government:$d.government,airline:$d.airline,private_jet:$d.private_jet,general_aviation:$d.general_aviation,other:$d.other,
+      total_cutoff:$c.total,military_cutoff:$c.military,government_cutoff:$c.government,airline_cutoff:$c.airline,private_jet_cutoff:$c.private_jet,general_aviation_cutoff:$c.general_aviation,other_cutoff:$c.other,
+      military_types:$d.military_types,
+      military_types_cutoff:$c.military_types,
+      hourly:$d.hourly,
+      hourly_cutoff:$c.hourly,
+      route_pairs:$d.route_pairs,
+      route_pairs_cutoff:$c.route_pairs,
+      type_families:$d.type_families,
+      type_families_cutoff:$c.type_families,
+      confidence:$d.confidence,
+      confidence_cutoff:$c.confidence,
+      icao_seen:$d.icao_seen,
+      icao_seen_cutoff:$c.icao_seen,
+      icao_items:(if $collect_icao_items then $d.icao_items else {} end),
+      icao_items_cutoff:$c.icao_items
+    }
+'
+
+# ensure_day_rollup <mode> <yyMMdd>
+# Prints the rollup file of that day, (re)building it if there is none yet or if its JSON, the pattern
+# signals or the day's UTC offset changed since. Closed days are therefore classified once. Fails if
+# there is no data for the day.
+ensure_day_rollup() {
+  local mode="$1" req_date="$2" json_file tz_offset_sec key rollup_file tmp_rollup start_epoch
+  json_file="$(choose_json_for_date "$mode" "$req_date")"
+  [[ -n "$json_file" ]] || return 1
+  tz_offset_sec="$(offset_hhmm_to_seconds "$(tz_offset_for_date_hhmm "$req_date")")"
+  key="v${INSIGHTS_ROLLUP_SCHEMA_VERSION}:${SIGNALS_HASH}:${tz_offset_sec}:$(stat -c '%Y:%s' "$json_file" 2>/dev/null || true)"
+  rollup_file="${ROLLUP_DIR}/${mode}-${req_date}.json"
+
+  # The first line of a rollup file is its key as a JSON string, the second one the rollup
+  if [[ "$(head -n 1 "$rollup_file" 2>/dev/null || true)" == "\"${key}\"" ]]; then
+    printf '%s' "$rollup_file"
+    return 0
+  fi
+
+  start_epoch="$(date +%s)"
+  mkdir -p "$ROLLUP_DIR" 2>/dev/null || true
+  tmp_rollup="$(mktemp "${ROLLUP_DIR}/.${mode}-${req_date}.XXXXXX" 2>/dev/null)" || return 1
+  if { printf '"%s"\n' "$key"
+       jq -c \
+         --arg date "$req_date" \
+         --arg mode "$mode" \
+         --argjson tz_offset_sec "$tz_offset_sec" \
+         --argjson mil_callsign_prefixes "$MIL_CALLSIGN_PREFIXES_JSON" \
+         --argjson mil_icao_prefixes "$MIL_ICAO_PREFIXES_JSON" \
+         --argjson mil_type_prefixes "$MIL_TYPE_PREFIXES_JSON" \
+         --argjson mil_owner_keywords "$MIL_OWNER_KEYWORDS_JSON" \
+         --argjson airline_prefix_map "$AIRLINE_PREFIX_MAP_JSON" \
+         "$ROLLUP_CLASSIFY_JQ" "$json_file"
+     } > "$tmp_rollup" 2>/dev/null && (( $(wc -l < "$tmp_rollup") == 2 )); then
+    chmod 0644 "$tmp_rollup" 2>/dev/null || true
+    mv -f "$tmp_rollup" "$rollup_file"
+    log_print DEBUG "Insights rollup built date=$req_date mode=$mode source=$json_file elapsed=$(( $(date +%s) - start_epoch ))s"
+    printf '%s' "$rollup_file"
+    return 0
+  fi
+  rm -f "$tmp_rollup"
+  log_print DEBUG "Insights rollup failed date=$req_date mode=$mode source=$json_file"
+  return 1
+}
 
-  date_end_epoch="$(date +%s)"
-  log_print DEBUG "Insights aggregation: finished date=$req_date mode=$FILTER_MODE status=ok elapsed=$((date_end_epoch - date_start_epoch))s"
+FILTER_MODE="planefence"
+REQUESTED_DATE=""
+REQUESTED_DAYS=""
+INSIGHTS_CACHE_SCHEMA_VERSION="6"
+# The per-day rollups are versioned on their own: bumping INSIGHTS_CACHE_SCHEMA_VERSION only merges them again
+INSIGHTS_ROLLUP_SCHEMA_VERSION="1"
+ROLLUP_DIR="/usr/share/planefence/persist/.internal/insights-rollups"
+ROLLUP_DATE=""
+
+parse_params() {
+  local method key val pair raw_qs
+  method="${REQUEST_METHOD:-GET}"
+
+  urldecode() {
+    local s="${1//+/ }"
+    printf '%b' "${s//%/\\x}"
+  }
+
+  declare -a qs=()
+  if [[ "$method" == "GET" ]]; then
+    raw_qs="${QUERY_STRING:-}"
+    if [[ -z "$raw_qs" && "${REQUEST_URI:-}" == *\?* ]]; then
+      raw_qs="${REQUEST_URI#*\?}"
+    fi
+    if [[ -n "$raw_qs" ]]; then
+      IFS='&' read -ra qs <<< "$raw_qs"
+    elif [[ $# -gt 0 ]]; then
+      qs=("$@")
+    fi
+  elif [[ $# -gt 0 ]]; then
+    qs=("$@")
+  fi
+
+  for pair in "${qs[@]}"; do
+    key="${pair%%=*}"
+    val="${pair#*=}"
+    [[ "$pair" == "$key" ]] && val=""
+    key="$(urldecode "$key")"
+    val="$(urldecode "$val")"
+    case "$key" in
+      mode)
+        [[ "$val" == "pf" ]] && val="planefence"
+        [[ "$val" == "pa" ]] && val="plane-alert"
+        [[ "$val" == "plane-alert" ]] && FILTER_MODE="plane-alert"
+        [[ "$val" == "planefence" ]] && FILTER_MODE="planefence"
+        ;;
+      date)
+        if [[ "$val" =~ ^[0-9]{6}$ ]]; then
+          REQUESTED_DATE="$val"
+        elif [[ "$val" == "today" || "$val" == "all" ]]; then
+          REQUESTED_DATE="$val"
+        fi
+        ;;
+      days)
+        [[ "$val" =~ ^[0-9]+$ ]] && REQUESTED_DAYS="$val"
+        ;;
+      raw)
+        if [[ "$val" == "1" || "$val" == "true" ]]; then
+          EMIT_HEADERS=false
+        fi
+        ;;
+      rollup)
+        if [[ "$val" =~ ^[0-9]{6}$ || "$val" == "today" || "$val" == "all" ]]; then
+          ROLLUP_DATE="$val"
+        fi
+        ;;
+    esac
+  done
+}
+
+parse_params "$@"
+
+SELECTED_HINT_DATE=""
+if [[ "$REQUESTED_DATE" =~ ^[0-9]{6}$ ]]; then
+  SELECTED_HINT_DATE="$REQUESTED_DATE"
+elif [[ -z "$REQUESTED_DATE" || "$REQUESTED_DATE" == "today" ]]; then
+  SELECTED_HINT_DATE="$tz_today"
+fi
+
+# rollup=today|all|yyMMdd only brings the rollups of those days up to date (for pf-run.sh and insights-precompute)
+if [[ -n "$ROLLUP_DATE" ]]; then
+  load_pattern_signals
+  case "$ROLLUP_DATE" in
+    today) rollup_dates=("$tz_today") ;;
+    all)
+      rollup_dates=()
+      for (( day=0; day<$(history_days_for_mode "$FILTER_MODE"); day++ )); do
+        rollup_dates+=("$(date -d "-${day} days" +%y%m%d)")
+      done
+      ;;
+    *) rollup_dates=("$ROLLUP_DATE") ;;
+  esac
+  for req_date in "${rollup_dates[@]}"; do
+    ensure_day_rollup "$FILTER_MODE" "$req_date" >/dev/null || true
+  done
+  exit 0
+fi
+
+if [[ "$EMIT_HEADERS" == true ]]; then
+  printf 'Content-Type: application/json\r\n'
+  printf 'Cache-Control: no-store\r\n'
+  printf 'Pragma: no-cache\r\n'
+  printf 'Expires: 0\r\n'
+  printf 'X-Content-Type-Options: nosniff\r\n'
+  printf '\r\n'
+fi
+
+HISTORY_DAYS="$(history_days_for_mode "$FILTER_MODE")"
+if [[ -n "$REQUESTED_DAYS" ]]; then
+  HISTORY_DAYS="$REQUESTED_DAYS"
+  (( HISTORY_DAYS < 1 )) && HISTORY_DAYS=1
+  (( HISTORY_DAYS > 120 )) && HISTORY_DAYS=120
+fi
+
+cache_ttl_sec="${INSIGHTS_REQUEST_CACHE_TTL_SEC:-600}"
+if [[ ! "$cache_ttl_sec" =~ ^[0-9]+$ ]] || (( cache_ttl_sec < 1 )); then
+  cache_ttl_sec=600
+fi
+
+cache_date_key="${REQUESTED_DATE:-today}"
+if [[ -z "$REQUESTED_DATE" || "$REQUESTED_DATE" == "today" ]]; then
+  cache_date_key="$tz_today"
+fi
+
+cache_key="v${INSIGHTS_CACHE_SCHEMA_VERSION}:${FILTER_MODE}:${cache_date_key}:${HISTORY_DAYS}"
+cache_hash="$(printf '%s' "$cache_key" | sha256sum | awk '{print $1}')"
+cache_file="/tmp/insights-cache-${cache_hash}.json"
+historical_cache_dir="/usr/share/planefence/persist/.internal/insights-cache"
+historical_cache_file="${historical_cache_dir}/${cache_hash}.json"
+historical_cache_ttl_sec="$(historical_cache_ttl_sec_for_mode "$FILTER_MODE")"
+historical_cache_enabled=false
+collapsewithin_sec="$(collapsewithin_sec_for_mode "$FILTER_MODE")"
+
+if [[ "$REQUESTED_DATE" =~ ^[0-9]{6}$ ]]; then
+  requested_age_days="$(age_days_from_today_tz "$REQUESTED_DATE")"
+  if [[ "$requested_age_days" =~ ^-?[0-9]+$ ]]; then
+    if (( requested_age_days >= 2 )); then
+      historical_cache_enabled=true
+    elif (( requested_age_days == 1 && tz_cutoff_sec > collapsewithin_sec )); then
+      historical_cache_enabled=true
+    fi
+  fi
+fi
+
+if [[ "$historical_cache_enabled" == true ]]; then
+  mkdir -p "$historical_cache_dir" 2>/dev/null || true
+  if [[ -s "$historical_cache_file" ]]; then
+    now_ts="$(date +%s)"
+    cache_ts="$(stat -c %Y "$historical_cache_file" 2>/dev/null || printf '0')"
+    if [[ "$cache_ts" =~ ^[0-9]+$ ]] && (( now_ts - cache_ts <= historical_cache_ttl_sec )); then
+      log_print DEBUG "Insights render mode=warm-cache source=historical key=$cache_key age_sec=$((now_ts - cache_ts))"
+      cache_action="create"
+      [[ -s "$cache_file" ]] && cache_action="update"
+      if printf '%s\n' "$(cat "$historical_cache_file")" > "$cache_file" 2>/dev/null; then
+        log_print INFO "Insights cache ${cache_action} source=request-from-historical key=$cache_key path=$cache_file"
+      else
+        log_print ERR "Insights cache write failed source=request-from-historical key=$cache_key path=$cache_file"
+      fi
+      cat "$historical_cache_file"
+      exit 0
+    fi
+  fi
+fi
+
+if [[ -s "$cache_file" ]]; then
+  now_ts="$(date +%s)"
+  cache_ts="$(stat -c %Y "$cache_file" 2>/dev/null || printf '0')"
+  if [[ "$cache_ts" =~ ^[0-9]+$ ]] && (( now_ts - cache_ts <= cache_ttl_sec )); then
+    log_print DEBUG "Insights render mode=warm-cache source=request key=$cache_key age_sec=$((now_ts - cache_ts))"
+    cat "$cache_file"
+    exit 0
+  fi
+fi
+
+log_print DEBUG "Insights render mode=cold-create key=$cache_key"
+
+series_file="$(mktemp)"
+trap 'rm -f "$series_file"' EXIT
+
+load_pattern_signals
+
+
+rollup_files=()
+for (( day=HISTORY_DAYS-1; day>=0; day-- )); do
+  req_date="$(date -d "-${day} days" +%y%m%d 2>/dev/null || true)"
+  [[ -n "$req_date" ]] || continue
+  if rollup_file="$(ensure_day_rollup "$FILTER_MODE" "$req_date")"; then
+    rollup_files+=("$rollup_file")
+  else
+    log_print DEBUG "Insights aggregation: date=$req_date mode=$FILTER_MODE status=no-data"
+  fi
 done
 
+if (( ${#rollup_files[@]} > 0 )); then
+  jq -c \
+    --arg selected_hint_date "$SELECTED_HINT_DATE" \
+    --argjson cutoff_sec "$tz_cutoff_sec" \
+    "$ROLLUP_EXPAND_JQ" "${rollup_files[@]}" > "$series_file" 2>/dev/null || true
+fi
+
 if [[ ! -s "$series_file" ]]; then
   printf '{"error":"no data files found for mode %s in the requested history window"}\n' "$FILTER_MODE"
   exit 0
 fi
 
 jq_err_file="$(mktemp)"
-trap 'rm -f "$series_file" "$tmp_callsign" "$tmp_icao" "$tmp_typecode" "$tmp_owner" "$tmp_airline_prefix" "$jq_err_file"' EXIT
+trap 'rm -f "$series_file" "$jq_err_file"' EXIT
 
 payload="$(jq -s \
   --arg mode "$FILTER_MODE" \
@@ -95,7 +95,7 @@ TODAY="${TODAY:-$(date +%y%m%d)}"
 RECORDSDIR="${RECORDSDIR:-/run/planefence}"
 RECORDSFILE="${RECORDSFILE:-$RECORDSDIR/planefence-records-${TODAY}.gz}"
 
-READ_RECORDS
+READ_RECORDS "" pa_records
 
 log_print DEBUG "Getting indices of records ready for Discord notification and stale records"
 build_index_and_stale INDEX STALE discord pa
@@ -251,7 +251,7 @@ for idx in "${INDEX[@]}"; do
   fi
 
   #################################
-  image=""; thumb=""; curlfile_args=()
+  image=""; thumb=""; curlfile_args=(); attachment=""
   log_print DEBUG "DISCORD_MEDIA is set to '$DISCORD_MEDIA'"
   case "$DISCORD_MEDIA" in
     "photo")
@@ -262,6 +262,7 @@ for idx in "${INDEX[@]}"; do
       if chk_enabled $screenshots && [[ -f "${pa_records["$idx":screenshot:file]}" ]]; then
           thumb="attachment://$(basename "${pa_records["$idx":screenshot:file]}")"
           curlfile_args=(-F "file1=@${pa_records["$idx":screenshot:file]}")
+          attachment="${pa_records["$idx":screenshot:file]}"
       fi
       ;;
     "screenshot+photo")
@@ -269,12 +270,14 @@ for idx in "${INDEX[@]}"; do
       if chk_enabled $screenshots && [[ -f "${pa_records["$idx":screenshot:file]}" ]]; then
         image="attachment://$(basename "${pa_records["$idx":screenshot:file]}")"
         curlfile_args=(-F "file1=@${pa_records["$idx":screenshot:file]}")
+        attachment="${pa_records["$idx":screenshot:file]}"
       fi
       ;;
     "screenshot")
       if chk_enabled $screenshots && [[ -f "${pa_records["$idx":screenshot:file]}" ]]; then
         image="attachment://$(basename "${pa_records["$idx":screenshot:file]}")"
         curlfile_args=(-F "file1=@${pa_records["$idx":screenshot:file]}")
+        attachment="${pa_records["$idx":screenshot:file]}"
       fi
       ;;
   esac
@@ -311,55 +314,67 @@ for idx in "${INDEX[@]}"; do
   # Now send the notification to Discord
   readarray -td, webhooks <<<"${DISCORD_WEBHOOKS}"
 
-  for url in "${webhooks[@]}"; do
-    url="${url//$'\n'/}"    # remove any stray newlines from the URL
-    if ! response="$(curl -sS -L \
-      --connect-timeout "$DISCORD_CURL_CONNECT_TIMEOUT" \
-      --max-time "$DISCORD_CURL_MAX_TIME" \
-      --retry "$DISCORD_CURL_RETRY" \
-      --retry-delay 1 \
-      "${curlfile_args[@]}" \
-      -F "payload_json=${template}" \
-      "${url}?wait=true" 2>&1)"; then
-      log_print WARNING "Discord notification failed at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}). curl failed: ${response//$'\n'/ }"
-      delivery_errors[idx]=true
-      continue
-    fi
-    # check if there was an error
-    if channel_id=$(jq -r '.channel_id' <<<"$response") && message_id=$(jq -r '.id' <<<"$response"); then
-      discord_link="https://discord.com/channels/@me/${channel_id}/${message_id}"
-      log_print INFO "Discord notification successful at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}): ${discord_link}"
-      link[idx]+="${link[idx]:+,}$discord_link"
-    else
-      log_print WARNING "Discord notification failed at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}). Discord returned this error: ${response}"
-      delivery_errors[idx]=true
-    fi
-  done
+  # Hand the payload to the resident notification service if it's running (it keeps its HTTPS
+  # connections to Discord open between runs); otherwise post it to each webhook with curl.
+  if results="$(notifyd_discord_send "$template" "$attachment" "$DISCORD_WEBHOOKS")"; then
+    while IFS=$'\t' read -r ok webhook detail; do
+      [[ -n "$ok" ]] || continue
+      if [[ "$ok" == "true" ]]; then
+        log_print INFO "Discord notification successful at Webhook ending in ${webhook} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}): ${detail}"
+        link[idx]+="${link[idx]:+,}$detail"
+      else
+        log_print WARNING "Discord notification failed at Webhook ending in ${webhook} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}). Discord returned this error: ${detail}"
+        delivery_errors[idx]=true
+      fi
+    done <<< "$results"
+  else
+    for url in "${webhooks[@]}"; do
+      url="${url//$'\n'/}"    # remove any stray newlines from the URL
+      if ! response="$(curl -sS -L \
+        --connect-timeout "$DISCORD_CURL_CONNECT_TIMEOUT" \
+        --max-time "$DISCORD_CURL_MAX_TIME" \
+        --retry "$DISCORD_CURL_RETRY" \
+        --retry-delay 1 \
+        "${curlfile_args[@]}" \
+        -F "payload_json=${template}" \
+        "${url}?wait=true" 2>&1)"; then
+        log_print WARNING "Discord notification failed at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}). curl failed: ${response//$'\n'/ }"
+        delivery_errors[idx]=true
+        continue
+      fi
+      # check if there was an error
+      if channel_id=$(jq -r '.channel_id' <<<"$response") && message_id=$(jq -r '.id' <<<"$response"); then
+        discord_link="https://discord.com/channels/@me/${channel_id}/${message_id}"
+        log_print INFO "Discord notification successful at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}): ${discord_link}"
+        link[idx]+="${link[idx]:+,}$discord_link"
+      else
+        log_print WARNING "Discord notification failed at Webhook ending in ${url: -8} for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}). Discord returned this error: ${response}"
+        delivery_errors[idx]=true
+      fi
+    done
+  fi
 done
 
 # Save the records again
 log_print DEBUG "Updating records after Discord notifications"
 
-LOCK_RECORDS
-READ_RECORDS ignore-lock
-
-if [[ ${#link[@]} -gt 0 || ${#delivery_errors[@]} -gt 0 ]]; then pa_records[HASNOTIFS]=true; fi
+if [[ ${#link[@]} -gt 0 || ${#delivery_errors[@]} -gt 0 ]]; then RECORD_SET pa_records HASNOTIFS true; fi
 
 for idx in "${STALE[@]}"; do
-  pa_records["$idx":discord:notified]="stale"
+  RECORD_SET pa_records "$idx":discord:notified "stale"
 done
 
 for idx in "${!delivery_errors[@]}"; do
-  pa_records["$idx":discord:notified]="error"
+  RECORD_SET pa_records "$idx":discord:notified "error"
 done
 
 # For the ones that were successful, even if they had some errors on other webhooks, mark as notified
 for idx in "${!link[@]}"; do
-  pa_records["$idx":discord:notified]=true
-  pa_records["$idx":discord:link]="${link[idx]}"
+  RECORD_SET pa_records "$idx":discord:notified true
+  RECORD_SET pa_records "$idx":discord:link "${link[idx]}"
 done
 
 # Save the records again
 log_print DEBUG "Saving records..."
-WRITE_RECORDS ignore-lock
+COMMIT_RECORDS
 log_print INFO "Discord notifications run completed."
@@ -66,7 +66,7 @@ TODAY="${TODAY:-$(date +%y%m%d)}"
 RECORDSDIR="${RECORDSDIR:-/run/planefence}"
 RECORDSFILE="${RECORDSFILE:-$RECORDSDIR/planefence-records-${TODAY}.gz}"
 
-READ_RECORDS
+READ_RECORDS "" pa_records
 
 log_print DEBUG "Getting indices of records ready for Mastodon notification and stale records"
 build_index_and_stale INDEX STALE mastodon pa
@@ -162,8 +162,13 @@ for idx in "${INDEX[@]}"; do
   # Post to Bsky
   log_print DEBUG "Posting to Bsky: ${pa_records["$idx":tail]} (${pa_records["$idx":icao]})"
 
+  export NOTIFY_EVENT="pa-$idx"   # lets pf-run.sh send this record's posts as one job (see notifyd_post)
   # shellcheck disable=SC2068,SC2086
   posturl="$(/scripts/post2mastodon.sh pa "$template" ${img_array[@]})" || true
+  if [[ "$posturl" == "queued" ]]; then
+    log_print DEBUG "Mastodon notification for #$idx queued; pf-run.sh posts it together with the other channels"
+    continue
+  fi
   if url="$(extract_url "$posturl")"; then
     log_print INFO "Mastodon notification successful for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}): $url"
   else
@@ -175,22 +180,19 @@ done
 
 # read, update, and thensave the records:
 log_print DEBUG "Updating records after Mastodon notifications"
-LOCK_RECORDS
-READ_RECORDS ignore-lock
-
 for idx in "${STALE[@]}"; do
-  pa_records["$idx":mastodon:notified]="stale"
+  RECORD_SET pa_records "$idx":mastodon:notified "stale"
 done
 for idx in "${!link[@]}"; do
   if [[ "${link[idx]:0:4}" == "http" ]]; then
-    pa_records["$idx":mastodon:notified]=true
-    pa_records["$idx":mastodon:link]="${link[idx]}"
+    RECORD_SET pa_records "$idx":mastodon:notified true
+    RECORD_SET pa_records "$idx":mastodon:link "${link[idx]}"
   else
-    pa_records["$idx":mastodon:notified]="error"
+    RECORD_SET pa_records "$idx":mastodon:notified "error"
   fi
 done
 
 # Save the records again
 log_print DEBUG "Saving records..."
-WRITE_RECORDS ignore-lock
+COMMIT_RECORDS
 log_print INFO "Mastodon notifications run completed."
@@ -65,7 +65,7 @@ xml_escape() {
 # Function to generate RSS feed for a specific CSV file (optimized)
 generate_rss() {
   # RSS generation is read-only; ignore advisory lock to avoid notifier stalls.
-  READ_RECORDS ignore-lock
+  READ_RECORDS ignore-lock pa_records
 
   # Precompute some values to avoid repeated expansions
   local site_link="${SITE_LINK}"
@@ -70,7 +70,7 @@ TODAY="${TODAY:-$(date +%y%m%d)}"
 RECORDSDIR="${RECORDSDIR:-/run/planefence}"
 RECORDSFILE="${RECORDSFILE:-$RECORDSDIR/planefence-records-${TODAY}.gz}"
 
-READ_RECORDS
+READ_RECORDS "" pa_records
 
 log_print DEBUG "Getting indices of records ready for Telegram notification and stale records"
 build_index_and_stale INDEX STALE telegram pa
@@ -167,8 +167,13 @@ for idx in "${INDEX[@]}"; do
   # Post to Telegram
   log_print DEBUG "Posting to Telegram: ${pa_records["$idx":tail]} (${pa_records["$idx":icao]})"
 
+  export NOTIFY_EVENT="pa-$idx"   # lets pf-run.sh send this record's posts as one job (see notifyd_post)
   # shellcheck disable=SC2068,SC2086
   if ! posturl="$(/scripts/post2telegram.sh PA "$template" ${img_array[@]})"; then result=false; else result=true; fi
+  if [[ "$posturl" == "queued" ]]; then
+    log_print DEBUG "Telegram notification for #$idx queued; pf-run.sh posts it together with the other channels"
+    continue
+  fi
   if $result; then
     log_print INFO "Telegram notification successful for #$idx ${pa_records["$idx":tail]} (${pa_records["$idx":icao]}): $posturl"
   else
@@ -190,30 +195,28 @@ for idx in "${INDEX[@]}"; do
     fi
   fi
   link[idx]="$posturl"
-  sleep 3 # be nice to Telegram and space out messages a bit
+  # be nice to Telegram and space out messages a bit; the notification service has its own rate budget for that
+  if ! notifyd_running; then sleep 3; fi
 done
 
 # read, update, and thensave the records:
 log_print DEBUG "Updating records after Telegram notifications"
-LOCK_RECORDS
-READ_RECORDS ignore-lock
-
 for idx in "${STALE[@]}"; do
-  pa_records["$idx":telegram:notified]="stale"
+  RECORD_SET pa_records "$idx":telegram:notified "stale"
 done
 for idx in "${!link[@]}"; do
   if [[ "${link[idx]:0:4}" == "http" ]]; then
-    pa_records["$idx":telegram:notified]=true
-    pa_records["$idx":telegram:link]="${link[idx]}"
+    RECORD_SET pa_records "$idx":telegram:notified true
+    RECORD_SET pa_records "$idx":telegram:link "${link[idx]}"
   elif [[ "${link[idx]}" == "private" ]]; then
-    pa_records["$idx":telegram:notified]=true
-    pa_records["$idx":telegram:link]=""
+    RECORD_SET pa_records "$idx":telegram:notified true
+    RECORD_SET pa_records "$idx":telegram:link ""
   else
-    pa_records["$idx":telegram:notified]="error"
+    RECORD_SET pa_records "$idx":telegram:notified "error"
   fi
 done
 
 # Save the records again
 log_print DEBUG "Saving records..."
-WRITE_RECORDS ignore-lock
+COMMIT_RECORDS
 log_print INFO "Telegram notifications run completed."
@@ -28,6 +28,10 @@ declare -a INDEX=() STALE=() link=()
 DEBUG="${DEBUG:-false}"
 MQTT_CMD_TIMEOUT="${MQTT_CMD_TIMEOUT:-30}"
 MQTT_SOCKET_TIMEOUT="${MQTT_SOCKET_TIMEOUT:-15}"
+# Messages are queued in an on-disk spool and published by a background drainer, so a slow or
+# unreachable broker doesn't hold up the run. Set MQTT_SPOOL=false to publish synchronously instead.
+MQTT_SPOOL="${MQTT_SPOOL:-true}"
+MQTT_SPOOLDIR="${MQTT_SPOOLDIR:-/usr/share/planefence/persist/.internal/mqtt-spool/pf}"
 
 # Get today's date in yymmdd format
 TODAY=$(date --date="today" '+%y%m%d')
@@ -36,8 +40,45 @@ TODAY=$(date --date="today" '+%y%m%d')
 #      FUNCTIONS
 # -----------------------------------------------------------------------------------
 
+publish_mqtt_batch() {
+  # Publish all messages in MQTT_BATCH over a single MQTT session and set link[idx] for each of them
+  local outputmsg exitstatus result idx ok
+  local -a drain_args=()
+
+  if ! chk_disabled "$MQTT_SPOOL"; then
+    # Queue the messages (no network involved) and make sure a drainer is running. The drainer
+    # retries with exponential backoff until the broker takes them; if one is already running
+    # for this spool, the new one exits right away.
+    outputmsg="$(mqtt "${mqtt_string[@]}" --spool "$MQTT_SPOOLDIR" --batch <<< "$MQTT_BATCH" 2>/dev/null)"
+    if chk_enabled "$MQTT_COALESCE"; then drain_args+=(--coalesce); fi
+    setsid mqtt "${mqtt_string[@]}" --spool "$MQTT_SPOOLDIR" --drain "${drain_args[@]}" </dev/null >/dev/null &
+  else
+    outputmsg="$(timeout --kill-after=5s "$(( MQTT_CMD_TIMEOUT + ${#INDEX[@]} ))" mqtt "${mqtt_string[@]}" --batch <<< "$MQTT_BATCH" 2>/dev/null)"
+    exitstatus=$?
+
+    if [[ $exitstatus -eq 124 ]]; then
+      log_print DEBUG "MQTT Delivery Error: publish command timed out after $(( MQTT_CMD_TIMEOUT + ${#INDEX[@]} ))s"
+    elif [[ $exitstatus -eq 137 ]]; then
+      log_print DEBUG "MQTT Delivery Error: publish command required force-kill"
+    fi
+  fi
+
+  # One JSON result per message: {"id": idx, "ok": true|false, "latency_ms"|"queued"|"error": ...}
+  while IFS=$'\t' read -r idx ok result; do
+    [[ -z "$idx" ]] && continue
+    link[idx]="$ok"
+    if [[ "$ok" != "true" ]]; then
+      log_print DEBUG "MQTT Delivery Error for index $idx: $result"
+    elif [[ "$result" == "queued" ]]; then
+      log_print DEBUG "MQTT message for index $idx queued for delivery"
+    else
+      log_print DEBUG "MQTT Delivery successful for index $idx (${result}ms)"
+    fi
+  done <<< "$(jq -r 'select(.id != null) | [.id, (.ok | tostring), (.latency_ms // .error // (if .queued then "queued" else "" end) | tostring)] | @tsv' <<< "$outputmsg" 2>/dev/null)"
+}
+
 generate_mqtt() {
-  # Generate a MQTT notification
+  # Generate a MQTT notification and add it to MQTT_BATCH; publish_mqtt_batch sends them all at once
 
 	local idx="$1" key
 
@@ -85,7 +126,7 @@ generate_mqtt() {
 		if [[ -n "$MQTT_QOS" ]]; then log_print DEBUG "MQTT QOS: $MQTT_QOS"; fi
 		log_print DEBUG "MQTT Payload JSON Object: $MQTT_JSON"
 
-		# send the MQTT message:
+		# prep the MQTT command line (the message itself is passed in the batch):
 		mqtt_string=(--broker "$MQTT_HOST")
 		if [[ -n "$MQTT_PORT" ]]; then mqtt_string+=(--port "$MQTT_PORT"); fi
 		if [[ -n "$MQTT_TLS" ]]; then mqtt_string+=(--tls); fi
@@ -96,30 +137,9 @@ generate_mqtt() {
 		mqtt_string+=(--client_id "${MQTT_CLIENT_ID:-$(hostname)}")
 		if [[ -n "$MQTT_USERNAME" ]]; then mqtt_string+=(--username "$MQTT_USERNAME"); fi
 		if [[ -n "$MQTT_PASSWORD" ]]; then mqtt_string+=(--password "$MQTT_PASSWORD"); fi
-		mqtt_string+=(--message "${MQTT_JSON}")
 		mqtt_string+=(--socket-timeout "$MQTT_SOCKET_TIMEOUT")
 
-		outputmsg="$(timeout --kill-after=5s "$MQTT_CMD_TIMEOUT" mqtt "${mqtt_string[@]}" 2>&1)"
-		exitstatus=$?
-
-		if [[ $exitstatus -eq 124 ]]; then
-			log_print DEBUG "MQTT Delivery Error: publish command timed out after ${MQTT_CMD_TIMEOUT}s"
-			return 1
-		elif [[ $exitstatus -eq 137 ]]; then
-			log_print DEBUG "MQTT Delivery Error: publish command required force-kill"
-			return 1
-		elif [[ $exitstatus -ne 0 ]]; then
-			log_print DEBUG "MQTT Delivery Error: ${outputmsg//$'\n'/ }"
-			return 1
-		fi
-
-		if [[ "${outputmsg:0:6}" == "Failed" ]] || [[ "${outputmsg:0:5}" == "usage" ]] || [[ "$outputmsg" == *"Failure in publishing message"* ]]; then
-			log_print DEBUG "MQTT Delivery Error: ${outputmsg//$'\n'/ }"
-			return 1
-		else
-			log_print DEBUG "MQTT Delivery successful!"
-			log_print DEBUG "Results string: ${outputmsg//$'\n'/ }"
-		fi
+		MQTT_BATCH+="$(jq -cn --arg id "$idx" --arg msg "$MQTT_JSON" '{id: $id, message: $msg}')"$'\n'
 	fi
 }
 
@@ -137,7 +157,7 @@ TODAY="${TODAY:-$(date +%y%m%d)}"
 RECORDSDIR="${RECORDSDIR:-/run/planefence}"
 RECORDSFILE="${RECORDSFILE:-$RECORDSDIR/planefence-records-${TODAY}.gz}"
 
-READ_RECORDS
+READ_RECORDS "" records
 
 # build index and stale arrays
 build_index_and_stale INDEX STALE mqtt pf
@@ -166,9 +186,14 @@ done
 
 # Loop through the INDEX array and send MQTT notifications
 
+MQTT_BATCH=""
+for idx in "${INDEX[@]}"; do
+  generate_mqtt "$idx" || true
+done
+if [[ -n "$MQTT_BATCH" ]]; then publish_mqtt_batch || true; fi
+
 for idx in "${INDEX[@]}"; do
-  if generate_mqtt "$idx"; then
-  	link[idx]=true
+  if [[ "${link[idx]}" == "true" ]]; then
 	log_print INFO "MQTT notification successful for index $idx (${records["$idx":icao]}/${records["$idx":tail]})"
   else
   	link[idx]=false
@@ -179,20 +204,17 @@ done
 # Save the records again
 log_print DEBUG "Updating records after MQTT notifications"
 
-LOCK_RECORDS
-READ_RECORDS ignore-lock
-
 for idx in "${STALE[@]}"; do
-  records["$idx":mqtt:notified]="stale"
+  RECORD_SET records "$idx":mqtt:notified "stale"
 done
 
-if [[ ${#link[@]} -gt 0 ]]; then records[HASNOTIFS]=true; fi
+if [[ ${#link[@]} -gt 0 ]]; then RECORD_SET records HASNOTIFS true; fi
 
 for idx in "${!link[@]}"; do
-    records["$idx":mqtt:notified]="${link[idx]}"
+    RECORD_SET records "$idx":mqtt:notified "${link[idx]}"
 done
 
 # Save the records again
 log_print DEBUG "Saving records..."
-WRITE_RECORDS ignore-lock
+COMMIT_RECORDS
 log_print INFO "MQTT notifications run completed."
@@ -0,0 +1,95 @@
+#!/usr/bin/python3 -IS
+# Client of the resident notification service (pflib.notifyd)
+#
+# Copyright 2022-2026 Ramon F. Kolb and Justin DiPierro - licensed under the terms and conditions
+# of GPLv3. The terms and conditions of this license are included with the Github
+# distribution of this package, and are also available here:
+# https://github.com/sdr-enthusiasts/docker-planefence/
+#
+# The notifiers run this once per alert, so it only imports socket and json (run it with python3 -I -S
+# to skip site-packages as well): pflib.notifyd pulls in the delivery code and its dependencies, which
+# made the client take several times as long to start as it takes to send the job.
+# Every job is sent with "ack": true, and the service acknowledges it with the time it may take to
+# answer it (pflib.notifyd.job_timeout) before it carries it out.
+#
+# Usage:
+#   python3 -I -S notifyd-client.py [--socket <path>]   (NDJSON jobs on stdin, one reply per job on stdout)
+# Exit codes: 0 all jobs were answered, 3 the service can't be reached, 4 it took the jobs but didn't
+# answer all of them in time (the replies it did send are printed).
+
+import json
+import os
+import socket
+import sys
+
+SOCKET_PATH = os.getenv("PF_NOTIFYD_SOCKET", "/run/planefence/notifyd.sock")
+CLIENT_UNREACHABLE = 3
+CLIENT_NO_REPLY = 4
+CONNECT_TIMEOUT = 5
+ACK_TIMEOUT = 30        # the service answers the jobs of a connection one after the other
+
+
+class NoReply(Exception):
+    """The service took the jobs but didn't answer them; they may or may not have been carried out"""
+
+
+def client(lines, path=SOCKET_PATH):
+    """
+    Send NDJSON job lines to the service and yield the decoded replies, one per job.
+    Raises OSError if the service can't be reached, and NoReply if it took the jobs but didn't answer
+    one of them within the time it said that job may take.
+    """
+    jobs = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            job = None
+        if isinstance(job, dict):
+            job["ack"] = True
+            line = json.dumps(job)
+        jobs.append(line)   # anything else is sent as it is, and the service answers it with an error
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.sendall(b"".join(job.encode() + b"\n" for job in jobs))
+        sock.shutdown(socket.SHUT_WR)
+        try:
+            with sock.makefile("rb") as replies:
+                for _ in jobs:
+                    sock.settimeout(ACK_TIMEOUT)
+                    reply = json.loads(replies.readline() or "null")
+                    if isinstance(reply, dict) and reply.get("ack"):
+                        sock.settimeout(reply.get("timeout", ACK_TIMEOUT))
+                        reply = json.loads(replies.readline() or "null")
+                    if reply is None:
+                        raise NoReply("the service closed the connection")
+                    yield reply
+        except OSError as e:
+            raise NoReply(str(e) or type(e).__name__)
+
+
+def main(argv):
+    path = SOCKET_PATH
+    if len(argv) == 2 and argv[0] == "--socket":
+        path = argv[1]
+    elif argv:
+        print("Usage: notifyd-client.py [--socket <path>]", file=sys.stderr)
+        return 2
+    try:
+        for reply in client(sys.stdin, path):
+            print(json.dumps(reply), flush=True)
+    except NoReply as e:
+        print(f"No reply from notifyd at {path}: {e}", file=sys.stderr)
+        return CLIENT_NO_REPLY
+    except OSError as e:
+        print(f"notifyd not reachable at {path}: {e}", file=sys.stderr)
+        return CLIENT_UNREACHABLE
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -162,6 +162,7 @@ declare -gA OPENSKY_HEADER_INDEX
 declare -g -a FILTER_DATABASE_SPECS FILTER_DATABASE_EXCLUDE_SPECS
 declare -gA DB_MATCH_REASON DB_EXCLUDED_REASON DB_TAIL DB_OWNER DB_TYPE DB_ICAO_TYPE
 declare -gA OPENSKY_REG_BY_ICAO
+declare -gA CANDIDATE_RESULT CANDIDATE_REASON CANDIDATE_OWNER
 
 LOAD_OPENSKY_HEADERS() {
 	OPENSKY_HEADER_INDEX=()
@@ -437,6 +438,57 @@ LOAD_CANDIDATE_FILTERS() {
 	done < "$FILTER_FILE"
 }
 
+EVALUATE_CANDIDATES() {
+	# Evaluate all candidates in one pass with pflib.candidates, which compiles the filter file into one matcher per
+	# field and reads the DATABASE fields through the OpenSky DB index instead of scanning the CSV.
+	# Fills the same arrays as LOAD_CANDIDATE_FILTERS/EVALUATE_DATABASE_MATCHES, and CANDIDATE_RESULT/REASON/OWNER
+	# for MATCH_CANDIDATE_FILTER. Returns 1 if the engine can't be used, so the caller can fall back to the bash filters.
+	CANDIDATE_RESULT=()
+	CANDIDATE_REASON=()
+	CANDIDATE_OWNER=()
+	DB_MATCH_REASON=()
+	DB_EXCLUDED_REASON=()
+	DB_TAIL=()
+	DB_OWNER=()
+	DB_TYPE=()
+	DB_ICAO_TYPE=()
+	OPENSKY_REG_BY_ICAO=()
+
+	local output kind icao result reason owner dbstate db_tail db_owner db_type db_icao_type registration
+	local -a counts
+	output="$(for icao in "${candidate_icaos[@]}"; do printf '%s\t%s\n' "$icao" "${latest_callsign["$icao"]:-}"; done \
+		| python3 -m pflib.candidates evaluate --filter "$FILTER_FILE" --opensky /run/OpenSkyDB.csv 2>/dev/null)" || return 1
+	[[ "$output" == F* ]] || return 1
+
+	while IFS=$'\x1f' read -r kind icao result reason owner dbstate db_tail db_owner db_type db_icao_type registration; do
+		case "$kind" in
+			F)
+				counts=("$icao" "$result" "$reason" "$owner" "$dbstate" "$db_tail")
+				log_print DEBUG "Loaded include filters: ICAO=${counts[0]}, CALLSIGN=${counts[1]}, DATABASE=${counts[2]} from $FILTER_FILE"
+				log_print DEBUG "Loaded exclude filters: ICAO=${counts[3]}, CALLSIGN=${counts[4]}, DATABASE=${counts[5]} from $FILTER_FILE"
+				;;
+			W)
+				log_print WARN "$icao"
+				;;
+			C)
+				CANDIDATE_RESULT["$icao"]="$result"
+				CANDIDATE_REASON["$icao"]="$reason"
+				CANDIDATE_OWNER["$icao"]="$owner"
+				[[ -n "$registration" ]] && OPENSKY_REG_BY_ICAO["$icao"]="$registration"
+				if [[ "$dbstate" == "exclude" ]]; then
+					DB_EXCLUDED_REASON["$icao"]="$reason"
+				elif [[ "$dbstate" == "match" ]]; then
+					DB_MATCH_REASON["$icao"]="$reason"
+					DB_TAIL["$icao"]="$db_tail"
+					DB_OWNER["$icao"]="$db_owner"
+					DB_TYPE["$icao"]="$db_type"
+					DB_ICAO_TYPE["$icao"]="$db_icao_type"
+				fi
+				;;
+		esac
+	done <<< "$output"
+}
+
 MATCH_CANDIDATE_FILTER() {
 	local icao="${1^^}"
 	local callsign="${2^^}"
@@ -444,6 +496,14 @@ MATCH_CANDIDATE_FILTER() {
 	CANDIDATE_MATCH_REASON=""
 	CANDIDATE_MATCH_OWNER=""
 
+	# Already evaluated by EVALUATE_CANDIDATES
+	if [[ -n "${CANDIDATE_RESULT[$icao]:-}" ]]; then
+		CANDIDATE_MATCH_REASON="${CANDIDATE_REASON[$icao]:-}"
+		CANDIDATE_MATCH_OWNER="${CANDIDATE_OWNER[$icao]:-}"
+		[[ "${CANDIDATE_RESULT[$icao]}" == "1" ]]
+		return
+	fi
+
 	if [[ -n "${DB_EXCLUDED_REASON[$icao]:-}" ]]; then
 		CANDIDATE_MATCH_REASON="${DB_EXCLUDED_REASON[$icao]}"
 		return 1
@@ -513,10 +573,6 @@ log_print DEBUG "Config: TODAY=$TODAY, PA_FILE=$PA_FILE, CANDIDATE_FILE=$CANDIDA
 
 mkdir -p "$(dirname "$CANDIDATE_FILE")" 2>/dev/null || :
 
-LOAD_CANDIDATE_FILTERS
-log_print DEBUG "Loaded include filters: ICAO=${#FILTER_ICAO_PATTERNS[@]}, CALLSIGN=${#FILTER_CALLSIGN_PATTERNS[@]}, DATABASE=${#FILTER_DATABASE_SPECS[@]} from $FILTER_FILE"
-log_print DEBUG "Loaded exclude filters: ICAO=${#FILTER_ICAO_EXCLUDE_PATTERNS[@]}, CALLSIGN=${#FILTER_CALLSIGN_EXCLUDE_PATTERNS[@]}, DATABASE=${#FILTER_DATABASE_EXCLUDE_SPECS[@]} from $FILTER_FILE"
-
 readarray -t dumpfiles < <(find /run/socket30003 -type f -name "dump1090-*-${TODAY}.txt" -print | sort)
 if (( ${#dumpfiles[@]} == 0 )); then
 	log_print INFO "No dump1090 input files found for $TODAY; exiting"
@@ -600,7 +656,13 @@ rm -f "$tmp_icaos" "$tmp_callsigns"
 log_print DEBUG "Built latest callsign map for ${#latest_callsign[@]} ICAO(s)"
 log_print DEBUG "Collapsed socket records into ${#candidate_icaos[@]} unique ICAO candidate(s)"
 
-EVALUATE_DATABASE_MATCHES
+if ! EVALUATE_CANDIDATES; then
+	log_print DEBUG "Candidate engine unavailable; evaluating the filters in bash"
+	LOAD_CANDIDATE_FILTERS
+	log_print DEBUG "Loaded include filters: ICAO=${#FILTER_ICAO_PATTERNS[@]}, CALLSIGN=${#FILTER_CALLSIGN_PATTERNS[@]}, DATABASE=${#FILTER_DATABASE_SPECS[@]} from $FILTER_FILE"
+	log_print DEBUG "Loaded exclude filters: ICAO=${#FILTER_ICAO_EXCLUDE_PATTERNS[@]}, CALLSIGN=${#FILTER_CALLSIGN_EXCLUDE_PATTERNS[@]}, DATABASE=${#FILTER_DATABASE_EXCLUDE_SPECS[@]} from $FILTER_FILE"
+	EVALUATE_DATABASE_MATCHES
+fi
 log_print DEBUG "DATABASE filters matched ${#DB_MATCH_REASON[@]} ICAO(s)"
 log_print DEBUG "DATABASE filters excluded ${#DB_EXCLUDED_REASON[@]} ICAO(s)"
 
@@ -668,6 +730,11 @@ if (( ${#new_candidate_icaos[@]} > 0 )); then
 	rm -rf "$tmp_meta_dir"
 	prefetch_end_epoch="$(date +%s)"
 	log_print DEBUG "Prefetched ADS-B metadata for ${#adsb_icao_type[@]} ICAO(s) in $((prefetch_end_epoch - prefetch_start_epoch))s (max_jobs=$max_jobs)"
+
+	# candidates aren't in the Plane-Alert DB, so only planespotters is asked
+	if chk_enabled "${SHOWIMAGES:-true}" && PA_FILE="" photos_prefetch --links "${new_candidate_icaos[@]}"; then
+		log_print DEBUG "Prefetched planespotters links for ${#photo_link[@]} ICAO(s) in $(( $(date +%s) - prefetch_end_epoch ))s"
+	fi
 fi
 
 for icao in "${new_candidate_icaos[@]}"; do
@@ -717,10 +784,15 @@ for icao in "${new_candidate_icaos[@]}"; do
 		category="$owner"
 	fi
 
-	photo_link="$(GET_PS_PHOTO_LINK "$icao" 2>/dev/null || true)"
-	ImageLink="${ImageLink:-}"
+	if [[ -n "${photo_link["$icao"]+x}" ]]; then
+		ps_link="${photo_link["$icao"]}"
+		ImageLink="${photo_thumb["$icao"]}"
+	else
+		ps_link="$(GET_PS_PHOTO_LINK "$icao" 2>/dev/null || true)"
+		ImageLink="${ImageLink:-}"
+	fi
 
-	row="$(csv_encode "$icao"),$(csv_encode "$tail"),$(csv_encode "$owner"),$(csv_encode "$type_long"),$(csv_encode "$icao_type"),$(csv_encode "$cpmg"),,,,$(csv_encode "$category"),$(csv_encode "$photo_link"),,,,$(csv_encode "$ImageLink")"
+	row="$(csv_encode "$icao"),$(csv_encode "$tail"),$(csv_encode "$owner"),$(csv_encode "$type_long"),$(csv_encode "$icao_type"),$(csv_encode "$cpmg"),,,,$(csv_encode "$category"),$(csv_encode "$ps_link"),,,,$(csv_encode "$ImageLink")"
 	new_rows+=("$row")
 	existing_candidates["$icao"]="$row"
 done
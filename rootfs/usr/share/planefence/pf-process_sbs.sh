@@ -61,6 +61,7 @@ CSVOUT="/run/planefence/planefence-${TODAY}.csv"
 PA_CSVOUT="/run/planefence/plane-alert-${TODAY}.csv"
 JSONOUT="/run/planefence/planefence-${TODAY}.json"
 PA_JSONOUT="/run/planefence/plane-alert-${TODAY}.json"
+HEATMAPSTORE="/run/planefence/heatmap-${TODAY}.bin"  # pf-run.sh and planefence-finish back it up to persist/.internal
 
 VERSION="${VERSION}${VERSION:+-}"
 if [[ -s "/.VERSION" ]]; then
@@ -80,8 +81,13 @@ tracedate="${today_ymd//\//-}"  # YYYY-MM-DD
 COLLAPSEWITHIN_SECS=${COLLAPSEWITHIN:?}
 declare -A last_idx_for_icao pa_last_idx_for_icao   # icao -> most recent idx within window
 declare -A lastseen_for_icao  # icao -> lastseen epoch
-declare -A heatmap            # lat,lon -> count
+declare -A heatmap            # lat,lon -> count that isn't in the heatmap store yet (see GENERATE_HEATMAPJS)
 declare -A pa_squawkmatch     # icao -> "true" if the icao matches the squawk filter (and has been seen with that squawk for at least SQUAWKTIME seconds), empty or "false" otherwise. This is used to mark records that match the squawk filter in the planefence and plane-alert records, and is updated in real time as new squawks are seen.
+declare -A index_callsign index_squawkrun  # icao -> last callsign, "icao,squawk" -> "first last" epoch of its latest run; from pflib.sbs, for the ICAOs heard this cycle
+declare -A tail_cache algo_tail type_cache type_source looked_up  # icao -> tail/type; filled once per run by PRELOAD_LOOKUPS, used by GET_TAIL and GET_TYPE
+declare -A NOISE_DATA NOISE_PLOT NOISE_SPECTRO NOISE_MP3  # idx -> noise data; filled once per run by NOISE_PREFETCH
+declare -A photo_link photo_thumb photo_file  # icao -> photo; filled once per run by photos_prefetch, used by GET_PS_PHOTO
+declare -a heatmap_points     # lat,lon of every PF position of this run
 declare -a updatedrecords newrecords processed_indices pa_updatedrecords pa_newrecords pa_processed_indices ready_to_notify_initial
 
 if [[ -z "$TRACKSERVICE" || "${TRACKSERVICE,,}" == "adsbexchange" ]]; then
@@ -153,12 +159,55 @@ CLEANUP() {
     -exec rm -f -- {} + 2>/dev/null || :
 }
 
+PRELOAD_LOOKUPS() {
+  # Usage: PRELOAD_LOOKUPS icao [icao ...]
+  # Resolves the tails and types of all ICAOs of this run with a single pflib.lookup call, which reads
+  # icao2tail.cache, icao2plane.txt and the OpenSky DB through their indexes, and computes the
+  # algorithmic US tails of the ICAOs that are in none of them with a single icao2tail.py call.
+  # GET_TAIL and GET_TYPE then don't have to scan any of these files or fork for each aircraft.
+  local icao tail tail_src type type_src lookups newtails=""
+  if lookups="$(printf '%s\n' "${@^^}" | sort -u | python3 -m pflib.lookup planes 2>/dev/null)"; then
+    while IFS=, read -r icao tail tail_src type type_src; do
+      [[ -z "$icao" ]] && continue
+      looked_up["$icao"]=true
+      if [[ -n "$tail" ]]; then
+        tail_cache["$icao"]="$tail"
+        # keep adding database tails to icao2tail.cache, like GET_TAIL does
+        [[ "$tail_src" != "cache" ]] && newtails+="$icao,$tail"$'\n'
+      fi
+      if [[ -n "$type" ]]; then
+        type_cache["$icao"]="$type"
+        type_source["$icao"]="$type_src"
+      fi
+    done <<< "$lookups"
+    if [[ -n "$newtails" ]]; then printf '%s' "$newtails" >> "/usr/share/planefence/persist/.internal/icao2tail.cache"; fi
+  else
+    if [[ -f "/usr/share/planefence/persist/.internal/icao2tail.cache" ]]; then
+      while IFS=, read -r icao tail; do
+        [[ -n "$icao" && -n "$tail" && -z "${tail_cache["$icao"]}" ]] && tail_cache["$icao"]="${tail// /}"
+      done < "/usr/share/planefence/persist/.internal/icao2tail.cache"
+    fi
+    tails_preloaded=true
+  fi
+  while IFS=, read -r icao tail; do
+    [[ -n "$tail" ]] && algo_tail["$icao"]="$tail"
+  done < <(for icao in "${@^^}"; do
+             if [[ -z "${tail_cache["$icao"]}" && "$icao" =~ ^A && ! "$icao" =~ ^(AE|ADE|ADF) ]]; then echo "$icao"; fi
+           done | sort -u | /usr/share/planefence/icao2tail.py --batch 2>/dev/null || true)
+}
+
 GET_TAIL() {
   # Usage: GET_TAIL "$icao"
   local icao=${1^^}
 
   # see if it's in our own cache first
-  if [[  -f "/usr/share/planefence/persist/.internal/icao2tail.cache" ]]; then
+  if [[ -n "${tail_cache["$icao"]}" ]]; then
+    METRICS_CACHE tail hit
+    echo "${tail_cache["$icao"]}"
+    return
+  fi
+  METRICS_CACHE tail miss
+  if [[ "$tails_preloaded" != "true" && -z "${looked_up["$icao"]}" && -f "/usr/share/planefence/persist/.internal/icao2tail.cache" ]]; then
     tail="$(awk -F, -v icao="$icao" '$1 == icao {print $2; exit}' "/usr/share/planefence/persist/.internal/icao2tail.cache")"
     if [[ -n "$tail" ]]; then
       echo "${tail// /}"
@@ -166,20 +215,21 @@ GET_TAIL() {
     fi
   fi
 
-  # Look up the ICAO in the mictronics database (local copy) if we have it downloaded:
-	if [[ -f /run/planefence/icao2plane.txt ]]; then
+  # Look up the ICAO in the mictronics database (local copy) if we have it downloaded.
+  # (PRELOAD_LOOKUPS has already done this and the OpenSky lookup below for all ICAOs of this run)
+	if [[ -z "${looked_up["$icao"]}" && -f /run/planefence/icao2plane.txt ]]; then
 		tail="$(grep -m1 -i -F "$icao" /run/planefence/icao2plane.txt 2>/dev/null | awk -F, '{print $2}')"
 	fi
 
   # If there is a OpenSkyDB file, check that one:
-  if [[ -z "$tail" && -f /run/OpenSkyDB.csv ]]; then
+  if [[ -z "${looked_up["$icao"]}" && -z "$tail" && -f /run/OpenSkyDB.csv ]]; then
     tail="$(grep -m1 -i -F "$icao" /run/OpenSkyDB.csv | awk -F, '{print $27}')"
     tail="${tail//[ \"\']/}"
   fi
 
 	# If the ICAO starts with "A"  (but is not in  the range of AExxxx ADExxx ADFxxx - those are US military without N number) and there is no flight or tail number, let's algorithmically determine the tail number
 	if [[ -z "$tail" ]] &&  [[ "$icao" =~ ^A && ! "$icao" =~ ^AE && ! "$icao" =~ ^ADE && ! "$icao" =~ ^ADF ]]; then
-		tail="$(/usr/share/planefence/icao2tail.py "$icao")"
+		tail="${algo_tail["$icao"]:-$(/usr/share/planefence/icao2tail.py "$icao")}"
 	fi
 	if [[ -n "$tail" ]]; then
     echo "$icao,${tail// /}" >> "/usr/share/planefence/persist/.internal/icao2tail.cache"
@@ -192,8 +242,12 @@ GET_CALLSIGN() {
   local icao="$1"
   local tail=""
 
-	# See if we have it somewhere in the socket30003 file:
-  if [[ -f "$TODAYFILE" ]]; then
+	# pflib.sbs has the last callsign of every ICAO heard this cycle (from the live view of the collector, or its
+	# own index); the records without one that didn't get new lines already asked for it when they did.
+	# Without pflib.sbs, search the socket30003 file:
+  if [[ -n "$index_loaded" ]]; then
+    tail="${index_callsign["$icao"]}"
+  elif [[ -f "$TODAYFILE" ]]; then
     tail="$(tac "$TODAYFILE" | awk -F "," -v icao="$icao" '($1 == icao && $12 != "") {print $12;exit;}' 2>/dev/null)"
   fi
 	if [[ -n "$tail" ]]; then echo "${tail// /}"; return; fi
@@ -210,14 +264,23 @@ GET_TYPE () {
   local _osdb_header _osdb_col _osdb_norm i
   local provenance=""
 
+  # PRELOAD_LOOKUPS has already looked up the ICAOs of this run in the mictronics and OpenSky databases
+  if [[ -n "${type_cache["${icao^^}"]}" ]]; then
+    METRICS_CACHE type hit
+    type="${type_cache["${icao^^}"]}"
+    provenance="${type_source["${icao^^}"]}"
+  else
+    METRICS_CACHE type miss
+  fi
+
   # Look up the ICAO in the mictronics database (local copy) if we have it downloaded:
-	if [[ -f /run/planefence/icao2plane.txt ]]; then
+	if [[ -z "${looked_up["${icao^^}"]}" && -f /run/planefence/icao2plane.txt ]]; then
 		type="$(grep -m1 -i -F "$icao" /run/planefence/icao2plane.txt 2>/dev/null | awk -F, '{print $3}')"
     if [[ -n "$type" ]]; then provenance="mictronics"; fi
 	fi
 
   # If there is a OpenSkyDB file, check that one:
-  if [[ -z "$type" && -f /run/OpenSkyDB.csv ]]; then
+  if [[ -z "${looked_up["${icao^^}"]}" && -z "$type" && -f /run/OpenSkyDB.csv ]]; then
     # Determine icao24/typecode column numbers once from header, then do a fast grep prefilter + awk exact-column match
     if [[ -z "${OPENSKYDB_ICAO24_COL:-}" || -z "${OPENSKYDB_TYPECODE_COL:-}" ]]; then
       _osdb_header="$(head -n1 /run/OpenSkyDB.csv 2>/dev/null)"
@@ -256,112 +319,55 @@ GET_TYPE () {
 }
 
 GET_ROUTE_BULK () {
-  # function to get a route by callsign. Must have a callsign - ICAO won't work
-  # Usage: GET_ROUTE <callsign>
-  # Uses the adsb.im API to retrieve the route
+  # function to get the routes of all records that don't have one yet. Must have a callsign - ICAO won't work
+  # Usage: GET_ROUTE_BULK
+  # Uses the adsb.im API through pflib.routes, which caches the routes for a few days and
+  # only asks the API for the callsigns it doesn't know yet, in batches
 
   local apiUrl="https://adsb.im/api/0/routeset"
-  declare -A routesarray=()
-  declare -A pf_indexarray=() pa_indexarray=()
-  local idx line call route plausible
+  local -a route_requests=()
+  local idx key route
 
   # first comb through records[] to get the callsigns we need to look up the route for
   for (( idx=0; idx<=records[maxindex]; idx++ )); do
     if [[ "${records["$idx":checked:route]}" != "true" && -n "${records["$idx":callsign]}" ]]; then
-      routesarray["$idx":callsign]="${records["$idx":callsign]:-${records["$idx":tail]}}"
-      routesarray["$idx":lat]="${records["$idx":lat]}"
-      routesarray["$idx":lon]="${records["$idx":lon]}"
-      pf_indexarray["$idx"]="${records["$idx":callsign]}"
+      route_requests+=("pf:$idx"$'\t'"${records["$idx":callsign]}"$'\t'"${records["$idx":lat]}"$'\t'"${records["$idx":lon]}")
+      RECORD_SET records HASROUTE true
     fi
   done
-    for (( idx=0; idx<=pa_records[maxindex]; idx++ )); do
+  for (( idx=0; idx<=pa_records[maxindex]; idx++ )); do
     if [[ "${pa_records["$idx":checked:route]}" != "true" && -n "${pa_records["$idx":callsign]}" ]]; then
-      routesarray["$idx":callsign]="${pa_records["$idx":callsign]:-${pa_records["$idx":tail]}}"
-      routesarray["$idx":lat]="${pa_records["$idx":lat]}"
-      routesarray["$idx":lon]="${pa_records["$idx":lon]}"
-      pa_indexarray["$idx"]="${pa_records["$idx":callsign]}"
+      route_requests+=("pa:$idx"$'\t'"${pa_records["$idx":callsign]}"$'\t'"${pa_records["$idx":lat]}"$'\t'"${pa_records["$idx":lon]}")
+      RECORD_SET pa_records HASROUTE true
     fi
   done
 
-  if (( ${#pf_indexarray[@]} > 0 )); then
-    records[HASROUTE]=true
-  fi
-  if (( ${#pa_indexarray[@]} > 0 )); then
-    pa_records[HASROUTE]=true
-  fi
-
-  # If there's anything to be looked up, then create a JSON object and submit it to the API. The call returns a comma separated object with call,route,plausibility(boolean)
-  if (( ${#pf_indexarray[@]} + ${#pa_indexarray[@]} > 0 )); then
+  (( ${#route_requests[@]} > 0 )) || return 0
 
-    json='{ "planes": [ '
-    for idx in "${!pf_indexarray[@]}"; do
-      json+="{ \"callsign\":\"${routesarray["$idx":callsign]}\", \"lat\": ${routesarray["$idx":lat]}, \"lng\": ${routesarray["$idx":lon]} },"
-    done
-    for idx in "${!pa_indexarray[@]}"; do
-      json+="{ \"callsign\":\"${routesarray["$idx":callsign]}\", \"lat\": ${routesarray["$idx":lat]}, \"lng\": ${routesarray["$idx":lon]} },"
-    done
-    json="${json:0:-1}" # strip the final comma
-    json+=" ] }" # terminate the JSON object
-
-    while read -r line; do
-      IFS=, read -r call route plausible <<< "$line"
-
-      # get the routes, process them line by line.
-      # Example results: RPA5731,BOS-PIT-BOS,true\nRPA5631,IND-BOS,true\nN409FZ,unknown,null\n
-      for idx in "${!pf_indexarray[@]}"; do
-        if [[ "${pf_indexarray["$idx"]}" == "$call" && "${records["$idx":checked:route]}" != "true" ]]; then
-          if [[ -z "$route" || "$route" == "unknown" || "$route" == "null" ]]; then
-            records["$idx":route]="n/a"
-          else
-            records["$idx":route]="$route"
-            if chk_disabled "$plausible"; then records["$idx":route]+=" (?)"; fi
-          fi
-          records["$idx":checked:route]=true
-        fi
-      done
-      for idx in "${!pa_indexarray[@]}"; do
-        if [[ "${pa_indexarray["$idx"]}" == "$call" && "${pa_records["$idx":checked:route]}" != "true" ]]; then
-          if [[ -z "$route" || "$route" == "unknown" || "$route" == "null" ]]; then
-            pa_records["$idx":route]="n/a"
-          else
-            pa_records["$idx":route]="$route"
-            if chk_disabled "$plausible"; then pa_records["$idx":route]+=" (?)"; fi
-          fi
-          pa_records["$idx":checked:route]=true
-        fi
-      done
-    done <<< "$(curl -m 30 -sSL -X 'POST' "$apiUrl" -H 'accept: application/json' -H 'Content-Type: application/json' -d "$json" | jq -r '.[] | if type=="object" then [((.callsign // "")|tostring), ((._airport_codes_iata // "")|tostring), ((.plausible // "")|tostring)] elif type=="array" then [((.[0] // "")|tostring), ((.[1] // "")|tostring), ((.[2] // "")|tostring)] else empty end | @csv | gsub("\"";"")')"
-  fi
+  # The answers come back as <key> TAB <route>, with "n/a" for unknown routes and " (?)" added to implausible ones.
+  # Records without an answer (API unreachable) stay unchecked and are tried again on the next run.
+  while IFS=$'\t' read -r key route; do
+    idx="${key#*:}"
+    if [[ "${key%%:*}" == "pa" ]]; then
+      RECORD_SET pa_records "$idx:route" "$route"
+      RECORD_SET pa_records "$idx:checked:route" true
+    else
+      RECORD_SET records "$idx:route" "$route"
+      RECORD_SET records "$idx:checked:route" true
+    fi
+  done < <(printf '%s\n' "${route_requests[@]}" | python3 -m pflib.routes resolve --api-url "$apiUrl" 2>/dev/null || true)
 }
 
 GET_ROUTE_INDIVIDUAL () {
 		# function to get a route by callsign. Must have a callsign - ICAO won't work
 		# Usage: GET_ROUTE <callsign>
-		# Uses the adsb.lol API to retrieve the route
+		# Uses the adsb.lol API to retrieve the route, through the same route cache as GET_ROUTE_BULK
 
 		local route
-
-		# first let's see if it's in the cache
-		if [[ -f /usr/share/planefence/persist/.internal/routecache-$(date +%y%m%d).txt ]]; then
-			route="$(awk -F, -v callsign="${1^^}" '$1 == callsign {print $2; exit}' "/usr/share/planefence/persist/.internal/routecache-$(date +%y%m%d).txt")"
-			if [[ -n "$route" ]]; then
-				if  [[ "$route" != "unknown" ]]; then echo "$route"; fi
-				return
-			fi
-		fi
-
-    if route="$(curl -m 30 -fsSL -X 'POST' 'https://api.adsb.lol/api/0/routeset' \
-		                      -H 'accept: application/json' \
-													-H 'Content-Type: application/json' \
-													-d '{"planes": [{"callsign": "'"${1^^}"'","lat": '"$LAT"',"lng": '"$LON"'}] }' \
-								| jq -r '.[]._airport_codes_iata')" \
-				&& [[ -n "$route" && "$route" != "unknown" && "$route" != "null" ]]
-		then
-			echo "${1^^},$route" >> "/usr/share/planefence/persist/.internal/routecache-$(date +%y%m%d).txt"
-			echo "$route"
-		elif [[ "${route,,}" == "unknown" || "${route,,}" == "null" ]]; then
-			echo "${1^^},unknown" >> "/usr/share/planefence/persist/.internal/routecache-$(date +%y%m%d).txt"
-		fi
+		route="$(printf '0\t%s\t%s\t%s\n' "${1^^}" "$LAT" "$LON" \
+		         | python3 -m pflib.routes resolve --api-url 'https://api.adsb.lol/api/0/routeset' 2>/dev/null \
+		         | cut -f2 || true)"
+		if [[ -n "$route" && "$route" != "n/a" ]]; then echo "$route"; fi
 }
 
 GET_PA_INFO () {
@@ -498,6 +504,16 @@ GET_PS_PHOTO () {
 
   $SHOWIMAGES || return 0
 
+  # photos_prefetch has already looked up the ICAOs of this run
+  if [[ -n "${photo_link["$icao"]+x}" ]]; then
+    case "$returntype" in
+      image)     [[ -z "${photo_file["$icao"]}" ]] || printf '%s\n' "${photo_file["$icao"]}" ;;
+      link)      [[ -z "${photo_link["$icao"]}" ]] || printf '%s\n' "${photo_link["$icao"]}" ;;
+      thumblink) [[ -z "${photo_thumb["$icao"]}" ]] || printf '%s\n' "${photo_thumb["$icao"]}" ;;
+    esac
+    return 0
+  fi
+
   CACHETIME=$((3 * 24 * 3600))  # 3 days in seconds
 
   local dir="/usr/share/planefence/persist/planepix/cache"
@@ -614,6 +630,31 @@ CHK_NOTIFICATIONS_ENABLED () {
   fi
 }
 
+NOISE_PREFETCH () {
+  # Look up the noise data of all records of this run that still need it with a single pflib.noise call.
+  # pflib.noise keeps incrementally downloaded, time-indexed copies of the noisecapt logs, so this doesn't
+  # download the logs again or scan them once per record. GET_NOISEDATA, CREATE_NOISEPLOT, CREATE_SPECTROGRAM
+  # and CREATE_MP3 use the answers for the current $idx, and fall back to reading the logs themselves
+  # for records that aren't in NOISE_PLOT.
+  # Usage: NOISE_PREFETCH <noise listing file>
+  local i key data plot spectro mp3
+  NOISE_DATA=(); NOISE_PLOT=(); NOISE_SPECTRO=(); NOISE_MP3=()
+  while IFS=$'\x1f' read -r key data plot spectro mp3; do
+    [[ -z "$key" ]] && continue
+    NOISE_DATA["$key"]="$data"
+    NOISE_PLOT["$key"]="$plot"
+    NOISE_SPECTRO["$key"]="$spectro"
+    NOISE_MP3["$key"]="$mp3"
+  done < <(
+    for i in "${!processed_indices[@]}"; do
+      if [[ -n "${records["$i":time:firstseen]}" && "${records["$i":checked:noisegraph]}" != "true" ]]; then
+        printf '%s\t%s\t%s\t%s\n' "$i" "${records["$i":time:firstseen]}" "${records["$i":time:lastseen]}" "${records["$i":time:time_at_mindist]}"
+      fi
+    done | python3 -m pflib.noise query --remote "$REMOTENOISE" --dates "$TODAY,$YESTERDAY" --listing "$1" --maxspread "${MAXSPREAD:-15}" 2>/dev/null || true
+  )
+  log_print DEBUG "Prefetched noise data for ${#NOISE_PLOT[@]} records"
+}
+
 GET_NOISEDATA () {
   # Get noise data from the remote server
   # It returns the average values over the specified time range
@@ -621,6 +662,19 @@ GET_NOISEDATA () {
   if [[ -z "$REMOTENOISE" || -z "$1" ]]; then return; fi
   local firstseen lastseen samplescount=0 ts level level_1min level_5min level_10min level_1hr loudness color avglevel avg1min avg5min avg10min avg1hr
   local noiselogdate
+
+  if [[ -n "${NOISE_PLOT["${idx:-_}"]}" ]]; then
+    # already looked up by NOISE_PREFETCH
+    read -r avglevel avg1min avg5min avg10min avg1hr loudness <<< "${NOISE_DATA["$idx"]}"
+    if [[ -n "$loudness" ]]; then
+      if (( loudness > YELLOWLIMIT )); then color="$RED"
+      elif (( loudness > GREENLIMIT )); then color="$YELLOW"
+      else color="$GREEN"; fi
+      echo "$avglevel $avg1min $avg5min $avg10min $avg1hr $loudness $color"
+    fi
+    return
+  fi
+
   firstseen="$1"
   lastseen="$2"
   if [[ -z "$lastseen" ]] || (( lastseen - firstseen < 15 )); then lastseen="$(( firstseen + 15 ))"; fi
@@ -704,10 +758,10 @@ CREATE_NOISEPLOT () {
 	# if the timeframe is less than 30 seconds, extend the ENDTIME to 30 seconds
 	if (( ENDTIME - STARTTIME < 15 )); then ENDTIME=$(( STARTTIME + 15 )); fi
 	STARTTIME=$(( STARTTIME - 15))
-	# check if there are any noise samples
+	# check if there are any noise samples (NOISE_PREFETCH has already counted them for most records)
 	if (( (NOWTIME - ENDTIME) > (ENDTIME - STARTTIME) )) && \
 			[[ -f "/tmp/noisecapt.log" ]] && \
-			[[ "$(awk -v s="$STARTTIME" -v e="$ENDTIME" '$1>=s && $1<=e' "/tmp/noisecapt.log" | wc -l)" -gt "0" ]]
+			(( ${NOISE_PLOT["${idx:-_}"]:-$(awk -v s="$STARTTIME" -v e="$ENDTIME" '$1>=s && $1<=e' "/tmp/noisecapt.log" | wc -l)} > 0 ))
 	then
 		if gnuplot -e "offset=$(echo "$(date +%z) * 36" | sed 's/+[0]\?//g' | bc); start=$STARTTIME; end=$ENDTIME; infile='/tmp/noisecapt.log'; outfile='$NOISEGRAPHFILE'; plottitle='$TITLE'; margin=60" "$PLANEFENCEDIR/noiseplot.gnuplot"; then
 			# Plotting succeeded
@@ -726,39 +780,44 @@ CREATE_SPECTROGRAM () {
   local MAXSPREAD=${MAXSPREAD:-15}
   local spectrofile
 
-  # get the noisecapt log - download them all in case there's a date discrepancy
-  # Extract matching filenames, sorted
-  readarray -t files < <(
-    printf '%s\n' "$noiselist" |
-      sed -En 's/.*\b(noisecapt-[0-9]{6}\.log)\b.*/\1/p' |
-      sort -u
-  )
-
-  # Assumes $noiselist is newline-separated filenames
-  spectrofile="$(awk -v T="${records["$idx":time:time_at_mindist]}" -v L="$MAXSPREAD" '
-    BEGIN {
-      INF = 9223372036854775807   # big sentinel
-      best_before_dt = INF; best_after_dt = INF
-      best_before = ""; best_after = ""
-    }
-    $0 ~ /^noisecapt-spectro-[0-9]+\.png$/ {
-      if (match($0, /noisecapt-spectro-([0-9]+)\.png/, m)) {
-        ts = m[1] + 0
-        if (ts <= T) {
-          dt = T - ts
-          if (dt < best_before_dt) { best_before_dt = dt; best_before = $0 }
-        } else {
-          dt = ts - T
-          if (dt < best_after_dt)  { best_after_dt  = dt; best_after  = $0 }
+  if [[ -n "${NOISE_PLOT["${idx:-_}"]}" ]]; then
+    # already looked up by NOISE_PREFETCH
+    spectrofile="${NOISE_SPECTRO["$idx"]}"
+  else
+    # get the noisecapt log - download them all in case there's a date discrepancy
+    # Extract matching filenames, sorted
+    readarray -t files < <(
+      printf '%s\n' "$noiselist" |
+        sed -En 's/.*\b(noisecapt-[0-9]{6}\.log)\b.*/\1/p' |
+        sort -u
+    )
+  
+    # Assumes $noiselist is newline-separated filenames
+    spectrofile="$(awk -v T="${records["$idx":time:time_at_mindist]}" -v L="$MAXSPREAD" '
+      BEGIN {
+        INF = 9223372036854775807   # big sentinel
+        best_before_dt = INF; best_after_dt = INF
+        best_before = ""; best_after = ""
+      }
+      $0 ~ /^noisecapt-spectro-[0-9]+\.png$/ {
+        if (match($0, /noisecapt-spectro-([0-9]+)\.png/, m)) {
+          ts = m[1] + 0
+          if (ts <= T) {
+            dt = T - ts
+            if (dt < best_before_dt) { best_before_dt = dt; best_before = $0 }
+          } else {
+            dt = ts - T
+            if (dt < best_after_dt)  { best_after_dt  = dt; best_after  = $0 }
+          }
         }
       }
-    }
-    END {
-      if (best_before != "" && best_before_dt <= L) { print best_before; exit }
-      if (best_after  != "" && best_after_dt  <= L) { print best_after;  exit }
-      # else print nothing (empty result)
-    }
-  ' <<< "$noiselist")"
+      END {
+        if (best_before != "" && best_before_dt <= L) { print best_before; exit }
+        if (best_after  != "" && best_after_dt  <= L) { print best_after;  exit }
+        # else print nothing (empty result)
+      }
+    ' <<< "$noiselist")"
+  fi
 
 
 	if [[ -z "$spectrofile" ]]; then
@@ -823,8 +882,12 @@ CREATE_MP3 () {
 
 	# get the measurement from noisecapt-"$FENCEDATE".log that contains the peak value
 	# limited by $STARTTIME and $ENDTIME, and then get the corresponding spectrogram file name
-	mp3time="$(awk -F, -v a="$STARTTIME" -v b="$ENDTIME" 'BEGIN{c=-999; d=0}{if ($1>=0+a && $1<=1+b && $2>0+c) {c=$2; d=$1}} END{print d}' /tmp/noisecapt.log)"
-	mp3f="noisecapt-recording-${mp3time}.mp3"
+	if [[ -n "${NOISE_PLOT["${idx:-_}"]}" ]]; then
+		mp3f="${NOISE_MP3["$idx"]}"
+	else
+		mp3time="$(awk -F, -v a="$STARTTIME" -v b="$ENDTIME" 'BEGIN{c=-999; d=0}{if ($1>=0+a && $1<=1+b && $2>0+c) {c=$2; d=$1}} END{print d}' /tmp/noisecapt.log)"
+		mp3f="noisecapt-recording-${mp3time}.mp3"
+	fi
 
 	# shellcheck disable=SC2076
 	if [[ ! -s "$OUTFILEDIR/noise/$mp3f" && $noiselist =~ "$mp3f" ]] ; then
@@ -1181,8 +1244,26 @@ GENERATE_PA_JSON() {
 }
 
 GENERATE_HEATMAPJS() {
-  	# Create the heatmap data
-    local tmpfile="$(mktemp)"
+  # Create the heatmap data
+  # The positions of this run (and any counts still waiting in heatmap[]) are added to the heatmap store of the day,
+  # and planeheatdata.js and the planeheatdata.bin pyramid are written from it (see pflib.heatmap). They are added as
+  # a batch read after heatmap_since, so if the last run didn't get to write the records and its lines were read
+  # again, its batch is replaced instead of counted twice. If that fails, the positions are tallied in heatmap[],
+  # which is kept with the records until a later run can store them.
+  local i latlonkey
+  local tmpfile
+  if { for i in "${!heatmap[@]}"; do printf '%s,%s\n' "$i" "${heatmap["$i"]}"; done
+       printf '%s\n' "${heatmap_points[@]}"
+     } | python3 -m pflib.heatmap update --store "$HEATMAPSTORE" --since "$heatmap_since" --js "$OUTFILEDIR/js/planeheatdata.js" --pyramid "$OUTFILEDIR/js/planeheatdata.bin" 2>/dev/null; then
+    if (( ${#heatmap[@]} > 0 )); then RECORD_CLEAR heatmap; fi
+    return
+  fi
+
+  for i in "${heatmap_points[@]}"; do
+    printf -v latlonkey "%.3f,%.3f" "${i%%,*}" "${i#*,}" 2>/dev/null || continue
+    RECORD_SET heatmap "$latlonkey" "$(( ${heatmap["$latlonkey"]:-0} + 1 ))"
+  done
+  tmpfile="$(mktemp)"
 	{ printf "var addressPoints = [\n"
 		for i in "${!heatmap[@]}"; do
 				printf "[ %s,%s ],\n" "$i" "${heatmap["$i"]}"
@@ -1194,31 +1275,32 @@ GENERATE_HEATMAPJS() {
 
 log_print INFO "Hello. Starting $0"
 
+# time the stages of this run, and count the external commands it runs (see pflib.metrics)
+METRICS_INIT curl jq awk python3
+METRICS_START cycle
+
 # ==========================
 # Prep-work:
 # ==========================
 
 
 log_print DEBUG "Getting RECORDSFILE"
+METRICS_START read_records
 LOCK_RECORDS
 READ_RECORDS ignore-lock
+METRICS_STOP read_records
+heatmap_since="$LASTPROCESSEDLINE"   # the line this run's positions are read after (see GENERATE_HEATMAPJS)
 
 
 
 log_print DEBUG "Getting noiselist in the background as this may take a while"
 if [[ -n $REMOTENOISE ]]; then
-  curl -m 30 -fsSL "$REMOTENOISE/noisecapt-dir.gz" 2>/dev/null | zcat > /tmp/.allnoise 2>/dev/null &
+  # pflib.noise keeps a copy of the listing and only downloads it again if it has changed
+  { python3 -m pflib.noise listing --remote "$REMOTENOISE" 2>/dev/null || \
+      curl -m 30 -fsSL "$REMOTENOISE/noisecapt-dir.gz" 2>/dev/null | zcat 2>/dev/null; } > /tmp/.allnoise &
   noise_pid=$!
 fi
 
-if chk_enabled "$PLANEALERT"; then
-  awk -F',' 'NR>1 {print "^" $1 "," }' "$PA_FILE" > /tmp/pa_keys_$$ 2>/dev/null || touch /tmp/pa_keys_$$
-  if (( ${#SQUAWKS[@]} > 0 )); then
-    # shellcheck disable=SC2046
-    printf "^([^,]*,){8}%s(,|$)\n" "${SQUAWKS[@]}" >> /tmp/pa_keys_$$
-  fi
-fi
-
 # ==========================
 # Collect new lines
 # ==========================
@@ -1227,80 +1309,143 @@ if [[ -n "$LASTPROCESSEDLINE" ]]; then
 fi
 
 log_print INFO "Collecting new records. Last processed date is $lastdate"
-
-if [[ "$(date -d "${lastdate:-@0}" +%y%m%d)" == "$TODAY" ]]; then
-  nowlines="$(grep -A9999999 -F "$LASTPROCESSEDLINE" "$TODAYFILE" | wc -l)" || true
-  records[totallines]="$(( records[totallines] + nowlines ))"
-elif [[ -f "$TODAYFILE" ]]; then
-  # shellcheck disable=SC2002
-  records[totallines]="$(cat "$TODAYFILE" | wc -l)"
-  nowlines="${records[totallines]}"
+METRICS_START collect
+
+# pflib.sbs keeps a byte offset per socket30003 file, so it only reads what was appended since the
+# last run, and applies the fence, ignore list and plane-alert filters in a single pass.
+# The grep/awk pipeline in the else branch is the fallback if it can't be used.
+ingestdir="$(mktemp -d)"
+ingest_args=(collect --today "$TODAYFILE" --today-date "$TODAY" --yesterday-date "$YESTERDAY" --lastline "$LASTPROCESSEDLINE" --outdir "$ingestdir")
+if [[ -n "$YESTERDAYFILE" ]]; then ingest_args+=(--yesterday "$YESTERDAYFILE"); fi
+if chk_enabled "$PLANEFENCE"; then ingest_args+=(--planefence --dist "$DIST" --maxalt "$MAXALT"); fi
+if chk_enabled "$PLANEFENCE" && [[ -n "$IGNORELIST" ]]; then ingest_args+=(--ignorelist "$IGNORELIST"); fi
+if chk_enabled "$PLANEALERT"; then ingest_args+=(--planealert --pa-range "$PA_RANGE" --pa-file "$PA_FILE" --squawks "$(IFS=,; echo "${SQUAWKS[*]}")"); fi
+
+if [[ -f "$TODAYFILE" ]] && ingest="$(python3 -m pflib.sbs "${ingest_args[@]}" 2>/dev/null)"; then
+  while IFS='=' read -r key value; do
+    case "$key" in
+      mode) ingest_mode="$value" ;;
+      newlines) nowlines="$value" ;;
+      lastline) LASTPROCESSEDLINE="$value" ;;
+    esac
+  done <<< "$ingest"
+  if [[ "$ingest_mode" == "continue" ]]; then
+    RECORD_SET records totallines "$(( records[totallines] + nowlines ))"
+  else
+    RECORD_SET records totallines "$nowlines"
+  fi
+  RECORD_SET pa_records totallines "${records[totallines]}"
+  currentrecords=$(( records[maxindex] + 1 ))
+  log_print DEBUG "Collected $nowlines new lines with pflib.sbs"
+
+  if chk_enabled "$PLANEFENCE"; then
+    readarray -t pf_socketrecords < "$ingestdir/pf.txt"
+    readarray -t pf_icaos < "$ingestdir/pf_icaos.txt"
+    log_print DEBUG "Created pf_socketrecords array with ${#pf_socketrecords[@]} entries and ${#pf_icaos[@]} unique planefence entries"
+  fi
+  if chk_enabled "$PLANEALERT"; then
+    readarray -t pa_socketrecords < "$ingestdir/pa.txt"
+    readarray -t pa_icaos < "$ingestdir/pa_icaos.txt"
+    log_print DEBUG "Created pa_socketrecords array with ${#pa_socketrecords[@]} entries and ${#pa_icaos[@]} unique plane-alert entries"
+  fi
+  # pflib.sbs only writes the callsigns and squawk runs of the ICAOs in the new lines
+  while IFS=$'\t' read -r index_icao index_value; do
+    index_callsign["$index_icao"]="$index_value"
+  done < "$ingestdir/callsigns.tsv"
+  while IFS=$'\t' read -r index_icao index_squawk index_first index_last; do
+    index_squawkrun["$index_icao,$index_squawk"]="$index_first $index_last"
+  done < "$ingestdir/squawks.tsv"
+  index_loaded=true
 else
-  records[totallines]="0"
-  nowlines=0
-fi
+  if chk_enabled "$PLANEALERT"; then
+    awk -F',' 'NR>1 {print "^" $1 "," }' "$PA_FILE" > /tmp/pa_keys_$$ 2>/dev/null || touch /tmp/pa_keys_$$
+    if (( ${#SQUAWKS[@]} > 0 )); then
+      # shellcheck disable=SC2046
+      printf "^([^,]*,){8}%s(,|$)\n" "${SQUAWKS[@]}" >> /tmp/pa_keys_$$
+    fi
+  fi
 
-pa_records[totallines]="${records[totallines]}"
-currentrecords=$(( records[maxindex] + 1 ))
+  if [[ "$(date -d "${lastdate:-@0}" +%y%m%d)" == "$TODAY" ]]; then
+    nowlines="$(grep -A9999999 -F "$LASTPROCESSEDLINE" "$TODAYFILE" | wc -l)" || true
+    RECORD_SET records totallines "$(( records[totallines] + nowlines ))"
+  elif [[ -f "$TODAYFILE" ]]; then
+    # shellcheck disable=SC2002
+    RECORD_SET records totallines "$(cat "$TODAYFILE" | wc -l)"
+    nowlines="${records[totallines]}"
+  else
+    RECORD_SET records totallines "0"
+    nowlines=0
+  fi
 
-{ if [[ -n "$LASTPROCESSEDLINE" ]]; then
-      # Check if last run was yesterday
-      if [[ "$(date -d "$lastdate" +%y%m%d)" == "$YESTERDAY" ]]; then
-          # Grab remainder of yesterday + all of today
-          { log_print DEBUG "Last processed line was from yesterday ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing remainder of yesterday's file and all of today's file"
-            grep -A9999999 -F "$LASTPROCESSEDLINE" "$YESTERDAYFILE" 2>/dev/null || true
-            cat "$TODAYFILE"
-          }
-      elif [[ "$(date -d "$lastdate" +%y%m%d)" == "$TODAY" ]]; then # Just grab remainder of today
-        log_print DEBUG "Last processed line was from today ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing remainder of today's file"
-        grep -A9999999 -F "$LASTPROCESSEDLINE" "$TODAYFILE" 2>/dev/null || cat "$TODAYFILE" || true
+  RECORD_SET pa_records totallines "${records[totallines]}"
+  currentrecords=$(( records[maxindex] + 1 ))
+
+  { if [[ -n "$LASTPROCESSEDLINE" ]]; then
+        # Check if last run was yesterday
+        if [[ "$(date -d "$lastdate" +%y%m%d)" == "$YESTERDAY" ]]; then
+            # Grab remainder of yesterday + all of today
+            { log_print DEBUG "Last processed line was from yesterday ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing remainder of yesterday's file and all of today's file"
+              grep -A9999999 -F "$LASTPROCESSEDLINE" "$YESTERDAYFILE" 2>/dev/null || true
+              cat "$TODAYFILE"
+            }
+        elif [[ "$(date -d "$lastdate" +%y%m%d)" == "$TODAY" ]]; then # Just grab remainder of today
+          log_print DEBUG "Last processed line was from today ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing remainder of today's file"
+          grep -A9999999 -F "$LASTPROCESSEDLINE" "$TODAYFILE" 2>/dev/null || cat "$TODAYFILE" || true
+        else
+          log_print DEBUG "Last processed line was from before today ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing all of today's file"
+          cat "$TODAYFILE"
+        fi
       else
-        log_print DEBUG "Last processed line was from before today ($(awk -F, '{print $5 " " $6}' <<< "$LASTPROCESSEDLINE")), so grabbing all of today's file"
-        cat "$TODAYFILE"
-      fi
-    else
-      # First run: all of today’s file
-      log_print DEBUG "No last processed line found, so grabbing all of today's file"
-        cat "$TODAYFILE"
+        # First run: all of today’s file
+        log_print DEBUG "No last processed line found, so grabbing all of today's file"
+          cat "$TODAYFILE"
+    fi
+  } | tac > /tmp/filtered_records_$$ \
+  || { rm -f /run/socket30003/*.pid 2>/dev/null || true; exit 1; }  # if tac fails, it's likely disk full; so kill socket30003.pl to trigger a log file cleanup and exit with error
+  log_print DEBUG "Collected new records into /tmp/filtered_records_$$"
+
+  # since the last line may be incomplete, set the LASTPROCESSEDLINE to the second line
+  # note that they are in reverse order due to tac
+  LASTPROCESSEDLINE="$(head -n2 /tmp/filtered_records_$$ | tail -1 || true)"
+
+  # Create pf_socketrecords array
+  if chk_enabled "$PLANEFENCE"; then
+    readarray -t pf_socketrecords < <(grep -v -i -f "$IGNORELIST" /tmp/filtered_records_$$ 2>/dev/null | awk -F, -v dist="$DIST" -v maxalt="$MAXALT" '$8 <= dist && $2 <= maxalt && NF==12 { print }' || true)
+    log_print DEBUG "Created pf_socketrecords array with ${#pf_socketrecords[@]} entries"
   fi
-} | tac > /tmp/filtered_records_$$ \
-|| { rm -f /run/socket30003/*.pid 2>/dev/null || true; exit 1; }  # if tac fails, it's likely disk full; so kill socket30003.pl to trigger a log file cleanup and exit with error
-log_print DEBUG "Collected new records into /tmp/filtered_records_$$"
-
-# since the last line may be incomplete, set the LASTPROCESSEDLINE to the second line
-# note that they are in reverse order due to tac
-LASTPROCESSEDLINE="$(head -n2 /tmp/filtered_records_$$ | tail -1 || true)"
-
-# Create pf_socketrecords array
-if chk_enabled "$PLANEFENCE"; then
-  readarray -t pf_socketrecords < <(grep -v -i -f "$IGNORELIST" /tmp/filtered_records_$$ 2>/dev/null | awk -F, -v dist="$DIST" -v maxalt="$MAXALT" '$8 <= dist && $2 <= maxalt && NF==12 { print }' || true)
-  log_print DEBUG "Created pf_socketrecords array with ${#pf_socketrecords[@]} entries"
-fi
 
-# Create pa_socketrecords array
-if chk_enabled "$PLANEALERT" && (( $(wc -l < /tmp/pa_keys_$$) > 0 )); then
-  # Patterns in /tmp/pa_keys_$$ are regular expressions anchored with ^, so use regex grep
-  readarray -t pa_socketrecords < <(grep -E -f /tmp/pa_keys_$$ /tmp/filtered_records_$$ 2>/dev/null | awk -F, -v dist="$PA_RANGE" '$8 <= dist && NF==12 { print }' || true)
-  rm -f /tmp/pa_keys_$$
-  log_print DEBUG "Created pa_socketrecords array with ${#pa_socketrecords[@]} entries"
-else
-  log_print DEBUG "Note - PlaneAlert not enabled or no PA keys found, so skipping PA records"
-fi
-rm -f /tmp/filtered_records_$$
+  # Create pa_socketrecords array
+  if chk_enabled "$PLANEALERT" && (( $(wc -l < /tmp/pa_keys_$$) > 0 )); then
+    # Patterns in /tmp/pa_keys_$$ are regular expressions anchored with ^, so use regex grep
+    readarray -t pa_socketrecords < <(grep -E -f /tmp/pa_keys_$$ /tmp/filtered_records_$$ 2>/dev/null | awk -F, -v dist="$PA_RANGE" '$8 <= dist && NF==12 { print }' || true)
+    rm -f /tmp/pa_keys_$$
+    log_print DEBUG "Created pa_socketrecords array with ${#pa_socketrecords[@]} entries"
+  else
+    log_print DEBUG "Note - PlaneAlert not enabled or no PA keys found, so skipping PA records"
+  fi
+  rm -f /tmp/filtered_records_$$
 
-# read the unique icao's into arrays:
-if chk_enabled "$PLANEFENCE"; then
-  readarray -t pf_icaos < <(printf '%s\n' "${pf_socketrecords[@]}" | sort -t, -k1,1 -u | awk -F, '{print $1}')
-  log_print DEBUG "Created index array with ${#pf_icaos[@]} unique planefence entries"
-fi
-if chk_enabled "$PLANEALERT"; then
-  readarray -t pa_icaos < <(printf '%s\n' "${pa_socketrecords[@]}" | sort -t, -k1,1 -u | awk -F, '{print $1}')
-  log_print DEBUG "Created index array with ${#pa_icaos[@]} unique plane-alert entries"
+  # read the unique icao's into arrays:
+  if chk_enabled "$PLANEFENCE"; then
+    readarray -t pf_icaos < <(printf '%s\n' "${pf_socketrecords[@]}" | sort -t, -k1,1 -u | awk -F, '{print $1}')
+    log_print DEBUG "Created index array with ${#pf_icaos[@]} unique planefence entries"
+  fi
+  if chk_enabled "$PLANEALERT"; then
+    readarray -t pa_icaos < <(printf '%s\n' "${pa_socketrecords[@]}" | sort -t, -k1,1 -u | awk -F, '{print $1}')
+    log_print DEBUG "Created index array with ${#pa_icaos[@]} unique plane-alert entries"
+  fi
 fi
+rm -rf "$ingestdir"
+METRICS_STOP collect
+METRICS_START lookups
+PRELOAD_LOOKUPS "${pf_icaos[@]}" "${pa_icaos[@]}"
+METRICS_STOP lookups
+log_print DEBUG "Preloaded ${#tail_cache[@]} known and ${#algo_tail[@]} computed tails, and ${#type_cache[@]} types"
 
 # ==========================
 # Process lines
 # ==========================
+METRICS_START positions
 if (( ${#pf_socketrecords[@]} + ${#pa_socketrecords[@]} > 0 )); then
   # Build a de-duplicated combined list efficiently (preserves first-seen order)
   orig_count=$(( ${#pf_socketrecords[@]} + ${#pa_socketrecords[@]} ))
@@ -1343,19 +1488,18 @@ for line in "${socketrecords[@]}"; do
     # Create new idx if needed
     if [[ -z "$idx" ]]; then
       idx=$(( records[maxindex] + 1 ))
-      records[maxindex]="$idx"
-      records["$idx":complete]=false
+      RECORD_SET records maxindex "$idx"
+      RECORD_SET records "$idx:complete" false
       newrecords["$idx"]=1
     else
       updatedrecords["$idx"]=1
     fi
     # Update fast ICAO index maps
-    last_idx_for_icao["$icao"]="$idx"
-    lastseen_for_icao["$icao"]="$seentime"
+    RECORD_SET last_idx_for_icao "$icao" "$idx"
+    RECORD_SET lastseen_for_icao "$icao" "$seentime"
 
-    # Heatmap tally (for PF records only)
-    latlonkey="$(printf "%.3f,%.3f" "$lat" "$lon")"
-    heatmap["$latlonkey"]=$(( ${heatmap["$latlonkey"]:-0} + 1 ))
+    # Heatmap tally (for PF records only); counted into the heatmap store by GENERATE_HEATMAPJS
+    heatmap_points+=("$lat,$lon")
     mode_pf=true
   else
     mode_pf=false
@@ -1366,39 +1510,46 @@ for line in "${socketrecords[@]}"; do
         "${pa_squawkmatch["$icao"]}" != "true" && \
         -n "$SQUAWKS_REGEX" && $squawk =~ $SQUAWKS_REGEX ]]; then
     log_print DEBUG "$icao matches squawk filter with $squawk!"
-    # Find first and last occurrence of the icao/squawk combination:
-    read -r sq_start sq_end < <(
-      printf '%s\n' "${socketrecords[@]}" |
-      awk -F',' -v icao="$icao" -v squawk="$squawk" '
-        # d = YYYY/MM/DD, t = HH:MM:SS.mmm  (we ignore .mmm)
-        function to_epoch(d, t,    y, m, d2, H, M, S, tmp) {
-          split(d, a, "/");  y=a[1]; m=a[2]; d2=a[3]
-
-          # remove milliseconds
-          split(t, tmp, ".");  t = tmp[1]
-          split(t, b, ":");    H=b[1]; M=b[2]; S=b[3]
-
-          return mktime(y " " m " " d2 " " H " " M " " S)
-        }
+    METRICS_START squawk
+    # Find first and last occurrence of the icao/squawk combination. The index has the latest run of it
+    # across cycles; the awk scan of this cycle's lines is the fallback:
+    if [[ -n "${index_squawkrun["$icao,$squawk"]}" ]]; then
+      read -r sq_start sq_end <<< "${index_squawkrun["$icao,$squawk"]}"
+    else
+      read -r sq_start sq_end < <(
+        printf '%s\n' "${socketrecords[@]}" |
+        awk -F',' -v icao="$icao" -v squawk="$squawk" '
+          # d = YYYY/MM/DD, t = HH:MM:SS.mmm  (we ignore .mmm)
+          function to_epoch(d, t,    y, m, d2, H, M, S, tmp) {
+            split(d, a, "/");  y=a[1]; m=a[2]; d2=a[3]
+
+            # remove milliseconds
+            split(t, tmp, ".");  t = tmp[1]
+            split(t, b, ":");    H=b[1]; M=b[2]; S=b[3]
+
+            return mktime(y " " m " " d2 " " H " " M " " S)
+          }
 
-        $1 == icao && $9 == squawk {
-          ts = to_epoch($5, $6)
-          if (first_ts == "" || ts < first_ts) first_ts = ts
-          if (last_ts  == "" || ts > last_ts)  last_ts  = ts
-        }
+          $1 == icao && $9 == squawk {
+            ts = to_epoch($5, $6)
+            if (first_ts == "" || ts < first_ts) first_ts = ts
+            if (last_ts  == "" || ts > last_ts)  last_ts  = ts
+          }
 
-        END {
-          if (first_ts != "")
-            print first_ts, last_ts
-        }
-      '
-    )
+          END {
+            if (first_ts != "")
+              print first_ts, last_ts
+          }
+        '
+      )
+    fi
     if (( ${sq_end:-999999} - ${sq_start:-0} < SQUAWKTIME )); then
       log_print DEBUG "NOK: Squawk $squawk for $icao has not been active for at least $SQUAWKTIME seconds (only from $(date -d "@$sq_start") to $(date -d "@$sq_end")), so skipping for PlaneAlert."
     else
       log_print DEBUG "OK: Squawk $squawk for $icao was active for at least $SQUAWKTIME seconds (from $(date -d "@$sq_start") to $(date -d "@$sq_end")), so including it for PlaneAlert."
       pa_squawkmatch["$icao"]=true
     fi
+    METRICS_STOP squawk
   fi
 
   # For plane-alert, always collapse into an existing record if any was available today
@@ -1407,14 +1558,14 @@ for line in "${socketrecords[@]}"; do
     # Create new idx if none found or if last seen was before today
     if [[ -z "$pa_idx" || ${pa_records["$pa_idx":time:lastseen]:-0} -lt $midnight_epoch ]]; then
       pa_idx=$(( pa_records[maxindex] + 1 ))
-      pa_records[maxindex]="$pa_idx"
-      pa_records["$pa_idx":complete]=true # always complete for PA records
+      RECORD_SET pa_records maxindex "$pa_idx"
+      RECORD_SET pa_records "$pa_idx:complete" true # always complete for PA records
       pa_newrecords["$pa_idx"]=1
     else
       pa_updatedrecords["$pa_idx"]=1
     fi
     # Update fast ICAO index maps
-    pa_last_idx_for_icao["$icao"]="$pa_idx"
+    RECORD_SET pa_last_idx_for_icao "$icao" "$pa_idx"
     mode_pa=true
   else
     mode_pa=false
@@ -1425,48 +1576,48 @@ for line in "${socketrecords[@]}"; do
     # Initialize once-per-record fields
     # add a tail if there isn't any
     if [[ "${records["$idx":checked:tail]}" != "true" && -z "${records["$idx":tail]}" ]]; then
-      if [[ -n "$icao" ]]; then records["$idx":tail]="$(GET_TAIL "$icao")"; fi
+      if [[ -n "$icao" ]]; then RECORD_SET records "$idx:tail" "$(GET_TAIL "$icao")"; fi
       if [[ -n "${records["$idx":tail]}" ]]; then
         if [[ ${icao:0:1} =~ [aA] ]]; then
-          records["$idx":link:faa]="https://registry.faa.gov/AircraftInquiry/Search/NNumberResult?nNumberTxt=${records["$idx":tail]}"
+          RECORD_SET records "$idx:link:faa" "https://registry.faa.gov/AircraftInquiry/Search/NNumberResult?nNumberTxt=${records["$idx":tail]}"
         elif [[ ${icao:0:1} =~ [cC] ]]; then
           t="${records["$idx":tail]:1}"  # remove leading C
-          records["$idx":link:faa]="https://wwwapps.tc.gc.ca/saf-sec-sur/2/ccarcs-riacc/RchSimpRes.aspx?m=%7c${t//-/}%7c"
+          RECORD_SET records "$idx:link:faa" "https://wwwapps.tc.gc.ca/saf-sec-sur/2/ccarcs-riacc/RchSimpRes.aspx?m=%7c${t//-/}%7c"
         fi
         # map link at first touch
         if [[ "${TRACKSERVICE,,}" == "flightaware" ]]; then
-          records["$idx":link:map]="$TRACKURL/${records["$idx":tail]}"
+          RECORD_SET records "$idx:link:map" "$TRACKURL/${records["$idx":tail]}"
         else
           if [[ -n $lat && -n $lon ]]; then
-            records["$idx":link:map]="$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
+            RECORD_SET records "$idx:link:map" "$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
           else
-            records["$idx":link:map]="$TRACKURL/?icao=$icao&showTrace=$tracedate"
+            RECORD_SET records "$idx:link:map" "$TRACKURL/?icao=$icao&showTrace=$tracedate"
           fi
         fi
       fi
-      records["$idx":checked:tail]=true
+      RECORD_SET records "$idx:checked:tail" true
     fi
     # add ICAO
     if [[ -z ${records["$idx":icao]} ]]; then
-      records["$idx":icao]="$icao"
+      RECORD_SET records "$idx:icao" "$icao"
     fi
     # get type
     if [[ "${records["$idx":checked:type]}" != "true" && -z "${records["$idx":type]}" ]]; then
-      records["$idx":type]="$(GET_TYPE "${records["$idx":icao]}")"
-      records["$idx":checked:type]=true
+      RECORD_SET records "$idx:type" "$(GET_TYPE "${records["$idx":icao]}")"
+      RECORD_SET records "$idx:checked:type" true
     fi
 
     # Callsign handling
     callsign="${callsign//[[:space:]]/}"
     if [[ -n $callsign ]]; then
-      records["$idx":callsign]="$callsign"
-      records["$idx":link:fa]="https://flightaware.com/live/modes/$icao/ident/$callsign/redirect"
-      records["$idx":checked:callsign]=true
+      RECORD_SET records "$idx:callsign" "$callsign"
+      RECORD_SET records "$idx:link:fa" "https://flightaware.com/live/modes/$icao/ident/$callsign/redirect"
+      RECORD_SET records "$idx:checked:callsign" true
     fi
 
     # First/last seen
-    if (( seentime < ${records["$idx":time:firstseen]:-9999999999} )); then records["$idx":time:firstseen]="$seentime"; fi
-    if (( seentime > ${records["$idx":time:lastseen]:-0} )); then records["$idx":time:lastseen]="$seentime"; fi
+    if (( seentime < ${records["$idx":time:firstseen]:-9999999999} )); then RECORD_SET records "$idx:time:firstseen" "$seentime"; fi
+    if (( seentime > ${records["$idx":time:lastseen]:-0} )); then RECORD_SET records "$idx:time:lastseen" "$seentime"; fi
 
     # Min-distance update (float-safe without awk by string compare fallback)
     curdist=${records["$idx":distance:value]}
@@ -1488,14 +1639,14 @@ for line in "${socketrecords[@]}"; do
       fi
     fi
     if $do_update; then
-      records["$idx":distance:value]="$distance" && records["$idx":distance:unit]="$DISTUNIT"
-      [[ -n $lat ]] && records["$idx":lat]="$lat"
-      [[ -n $lon ]] && records["$idx":lon]="$lon"
-      [[ -n $altitude ]] && records["$idx":altitude:value]="$altitude" && records["$idx":altitude:unit]="$ALTUNIT" && records["$idx":altitude:reference]="$ALTREF"
-      [[ -n $angle ]] && records["$idx":angle:value]="${angle%.*}" && records["$idx":angle:name]="$(deg_to_compass "$angle")"
-      [[ -n $gs ]] && records["$idx":groundspeed:value]="$gs" && records["$idx":groundspeed:unit]="$SPEEDUNIT"
-      [[ -n $track ]] && records["$idx":track:value]="$track" && records["$idx":track:name]="$(deg_to_compass "$track")"
-      records["$idx":time:time_at_mindist]="$seentime"
+      RECORD_SET records "$idx:distance:value" "$distance" && RECORD_SET records "$idx:distance:unit" "$DISTUNIT"
+      [[ -n $lat ]] && RECORD_SET records "$idx:lat" "$lat"
+      [[ -n $lon ]] && RECORD_SET records "$idx:lon" "$lon"
+      [[ -n $altitude ]] && RECORD_SET records "$idx:altitude:value" "$altitude" && RECORD_SET records "$idx:altitude:unit" "$ALTUNIT" && RECORD_SET records "$idx:altitude:reference" "$ALTREF"
+      [[ -n $angle ]] && RECORD_SET records "$idx:angle:value" "${angle%.*}" && RECORD_SET records "$idx:angle:name" "$(deg_to_compass "$angle")"
+      [[ -n $gs ]] && RECORD_SET records "$idx:groundspeed:value" "$gs" && RECORD_SET records "$idx:groundspeed:unit" "$SPEEDUNIT"
+      [[ -n $track ]] && RECORD_SET records "$idx:track:value" "$track" && RECORD_SET records "$idx:track:name" "$(deg_to_compass "$track")"
+      RECORD_SET records "$idx:time:time_at_mindist" "$seentime"
     fi
     if [[ -z ${ready_to_notify_initial[$idx]+set} ]]; then
       ready_to_notify_initial[idx]="${records["$idx":ready_to_notify]}"
@@ -1512,20 +1663,20 @@ for line in "${socketrecords[@]}"; do
         :
       elif $ready_updated; then
         log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) updated since READ_RECORD; setting FALSE (closest dist detected)"
-        records["$idx":ready_to_notify]="false"
+        RECORD_SET records "$idx:ready_to_notify" "false"
       fi
     elif $ready_updated; then
       if [[ "$current_ready" == "false" ]]; then
         log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) was ${current_ready^^} and is now SEMI"
-        records["$idx":ready_to_notify]="semi"
+        RECORD_SET records "$idx:ready_to_notify" "semi"
       elif [[ "$current_ready" == "semi" ]]; then
         log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) was ${current_ready^^} and is now TRUE"
-        records["$idx":ready_to_notify]="true"
+        RECORD_SET records "$idx:ready_to_notify" "true"
       fi
     fi
 
     if [[ -n $squawk && -z ${records["$idx":squawk:value]} ]]; then
-      records["$idx":squawk:value]="$squawk" && records["$idx":squawk:description]="$(GET_SQUAWK_DESCRIPTION "$squawk")"
+      RECORD_SET records "$idx:squawk:value" "$squawk" && RECORD_SET records "$idx:squawk:description" "$(GET_SQUAWK_DESCRIPTION "$squawk")"
     fi
     # last - make sure we're storing the idx in the list of processed indices:
     processed_indices["$idx"]=true
@@ -1536,33 +1687,33 @@ for line in "${socketrecords[@]}"; do
   if $mode_pa; then
     # Initialize once-per-record fields
     if [[ -z ${pa_records["$pa_idx":icao]} ]]; then
-      pa_records["$pa_idx":icao]="$icao"
+      RECORD_SET pa_records "$pa_idx:icao" "$icao"
     fi
 
     # get info from the plane-alert-db file:
     if [[ "${pa_records["$pa_idx":checked:db]}" != "true" ]]; then
       IFS=',' read -r Registration CPMG Tag1 Tag2 Tag3 Category Link ImageLink1 ImageLink2 ImageLink3 <<< "$(GET_PA_INFO "$icao")"
-      pa_records["$pa_idx":tail]="${pa_records["$pa_idx":tail]:-$Registration}"
-      pa_records["$pa_idx":db:cpmg]="${pa_records["$pa_idx":db:cpmg]:-$CPMG}"
-      pa_records["$pa_idx":db:tag1]="${pa_records["$pa_idx":db:tag1]:-$Tag1}"
-      pa_records["$pa_idx":db:tag2]="${pa_records["$pa_idx":db:tag2]:-$Tag2}"
-      pa_records["$pa_idx":db:tag3]="${pa_records["$pa_idx":db:tag3]:-$Tag3}"
-      pa_records["$pa_idx":db:category]="${pa_records["$pa_idx":db:category]:-$Category}"
-      pa_records["$pa_idx":db:link]="${pa_records["$pa_idx":db:link]:-$Link}"
-      pa_records["$pa_idx":db:imagelink1]="${pa_records["$pa_idx":db:imagelink1]:-$ImageLink1}"
-      pa_records["$pa_idx":db:imagelink2]="${pa_records["$pa_idx":db:imagelink2]:-$ImageLink2}"
-      pa_records["$pa_idx":db:imagelink3]="${pa_records["$pa_idx":db:imagelink3]:-$ImageLink3}"
-      pa_records["$pa_idx":checked:db]=true
+      RECORD_SET pa_records "$pa_idx:tail" "${pa_records["$pa_idx":tail]:-$Registration}"
+      RECORD_SET pa_records "$pa_idx:db:cpmg" "${pa_records["$pa_idx":db:cpmg]:-$CPMG}"
+      RECORD_SET pa_records "$pa_idx:db:tag1" "${pa_records["$pa_idx":db:tag1]:-$Tag1}"
+      RECORD_SET pa_records "$pa_idx:db:tag2" "${pa_records["$pa_idx":db:tag2]:-$Tag2}"
+      RECORD_SET pa_records "$pa_idx:db:tag3" "${pa_records["$pa_idx":db:tag3]:-$Tag3}"
+      RECORD_SET pa_records "$pa_idx:db:category" "${pa_records["$pa_idx":db:category]:-$Category}"
+      RECORD_SET pa_records "$pa_idx:db:link" "${pa_records["$pa_idx":db:link]:-$Link}"
+      RECORD_SET pa_records "$pa_idx:db:imagelink1" "${pa_records["$pa_idx":db:imagelink1]:-$ImageLink1}"
+      RECORD_SET pa_records "$pa_idx:db:imagelink2" "${pa_records["$pa_idx":db:imagelink2]:-$ImageLink2}"
+      RECORD_SET pa_records "$pa_idx:db:imagelink3" "${pa_records["$pa_idx":db:imagelink3]:-$ImageLink3}"
+      RECORD_SET pa_records "$pa_idx:checked:db" true
       if [[ -n "${pa_records["$pa_idx":tail]}" ]]; then
-        pa_records["$pa_idx":checked:tail]=true
+        RECORD_SET pa_records "$pa_idx:checked:tail" true
         if [[ -z "${pa_records["$pa_idx":link:map]}" ]]; then
           if [[ "${TRACKSERVICE,,}" == "flightaware" ]]; then
-            pa_records["$pa_idx":link:map]="$TRACKURL/${pa_records["$pa_idx":tail]}"
+            RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/${pa_records["$pa_idx":tail]}"
           else
             if [[ -n $lat && -n $lon ]]; then
-              pa_records["$pa_idx":link:map]="$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
+              RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
             else
-              pa_records["$pa_idx":link:map]="$TRACKURL/?icao=$icao&showTrace=$tracedate"
+              RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/?icao=$icao&showTrace=$tracedate"
             fi
           fi
         fi
@@ -1572,46 +1723,46 @@ for line in "${socketrecords[@]}"; do
 
     # add a tail if there still isn't any
     if [[ "${pa_records["$pa_idx":checked:tail]}" != "true" && -z "${pa_records["$pa_idx":tail]}" ]]; then
-      pa_records["$pa_idx":tail]="$(GET_TAIL "$icao")"
-      pa_records["$pa_idx":checked:tail]=true
+      RECORD_SET pa_records "$pa_idx:tail" "$(GET_TAIL "$icao")"
+      RECORD_SET pa_records "$pa_idx:checked:tail" true
       # map link at first touch
       if [[ "${TRACKSERVICE,,}" == "flightaware" ]]; then
-        pa_records["$pa_idx":link:map]="$TRACKURL/${pa_records["$pa_idx":tail]}"
+        RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/${pa_records["$pa_idx":tail]}"
       else
         if [[ -n $lat && -n $lon ]]; then
-          pa_records["$pa_idx":link:map]="$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
+          RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/?icao=$icao&lat=$lat&lon=$lon&showTrace=$tracedate"
         else
-          pa_records["$pa_idx":link:map]="$TRACKURL/?icao=$icao&showTrace=$tracedate"
+          RECORD_SET pa_records "$pa_idx:link:map" "$TRACKURL/?icao=$icao&showTrace=$tracedate"
         fi
       fi
     fi
     if [[ "${pa_records["$pa_idx":checked:faa]}" != "true" && -n "${pa_records["$pa_idx":tail]}" && -z "${pa_records["$pa_idx":link:faa]}" ]]; then
       if [[ ${icao:0:1} =~ [aA] ]]; then
-        pa_records["$pa_idx":link:faa]="https://registry.faa.gov/AircraftInquiry/Search/NNumberResult?nNumberTxt=${pa_records["$pa_idx":tail]}"
+        RECORD_SET pa_records "$pa_idx:link:faa" "https://registry.faa.gov/AircraftInquiry/Search/NNumberResult?nNumberTxt=${pa_records["$pa_idx":tail]}"
       elif [[ ${icao:0:1} =~ [cC] ]]; then
         t="${pa_records["$pa_idx":tail]:1}"  # remove leading C
-        pa_records["$pa_idx":link:faa]="https://wwwapps.tc.gc.ca/saf-sec-sur/2/ccarcs-riacc/RchSimpRes.aspx?m=%7c${t//-/}%7c"
+        RECORD_SET pa_records "$pa_idx:link:faa" "https://wwwapps.tc.gc.ca/saf-sec-sur/2/ccarcs-riacc/RchSimpRes.aspx?m=%7c${t//-/}%7c"
       fi
-      pa_records["$pa_idx":checked:faa]=true
+      RECORD_SET pa_records "$pa_idx:checked:faa" true
     fi
 
     # get type
     if [[ "${pa_records["$pa_idx":checked:type]}" != "true" && -z "${pa_records["$pa_idx":type]}" ]]; then
-      pa_records["$pa_idx":type]="$(GET_TYPE "${pa_records["$pa_idx":icao]}")"
-      pa_records["$pa_idx":checked:type]=true
+      RECORD_SET pa_records "$pa_idx:type" "$(GET_TYPE "${pa_records["$pa_idx":icao]}")"
+      RECORD_SET pa_records "$pa_idx:checked:type" true
     fi
 
     # Callsign handling
     callsign="${callsign//[[:space:]]/}"
     if [[ -n $callsign ]]; then
-      pa_records["$pa_idx":callsign]="$callsign"
-      pa_records["$pa_idx":link:fa]="https://flightaware.com/live/modes/$icao/ident/$callsign/redirect"
-      pa_records["$pa_idx":checked:callsign]=true
+      RECORD_SET pa_records "$pa_idx:callsign" "$callsign"
+      RECORD_SET pa_records "$pa_idx:link:fa" "https://flightaware.com/live/modes/$icao/ident/$callsign/redirect"
+      RECORD_SET pa_records "$pa_idx:checked:callsign" true
     fi
 
     # First/last seen
-    if (( seentime < ${pa_records["$pa_idx":time:firstseen]:-9999999999} )); then pa_records["$pa_idx":time:firstseen]="$seentime"; fi
-    if (( seentime > ${pa_records["$pa_idx":time:lastseen]:-0} )); then pa_records["$pa_idx":time:lastseen]="$seentime"; fi
+    if (( seentime < ${pa_records["$pa_idx":time:firstseen]:-9999999999} )); then RECORD_SET pa_records "$pa_idx:time:firstseen" "$seentime"; fi
+    if (( seentime > ${pa_records["$pa_idx":time:lastseen]:-0} )); then RECORD_SET pa_records "$pa_idx:time:lastseen" "$seentime"; fi
 
     # Min-distance update (float-safe without awk by string compare fallback)
     curdist=${pa_records["$pa_idx":distance:value]}
@@ -1629,24 +1780,24 @@ for line in "${socketrecords[@]}"; do
       if (( s1 < s2 )); then do_update=true; fi
     fi
     if $do_update; then
-      pa_records["$pa_idx":distance:value]="$distance" && pa_records["$pa_idx":distance:unit]="$DISTUNIT"
-      [[ -n $lat ]] && pa_records["$pa_idx":lat]="$lat"
-      [[ -n $lon ]] && pa_records["$pa_idx":lon]="$lon"
-      [[ -n $altitude ]] && pa_records["$pa_idx":altitude:value]="$altitude" && pa_records["$pa_idx":altitude:unit]="$ALTUNIT" && pa_records["$pa_idx":altitude:reference]="$ALTREF"
-      [[ -n $angle ]] && pa_records["$pa_idx":angle:value]="${angle%.*}" && pa_records["$pa_idx":angle:name]="$(deg_to_compass "$angle")"
-      [[ -n $gs ]] && pa_records["$pa_idx":groundspeed:value]="$gs" && pa_records["$pa_idx":groundspeed:unit]="$SPEEDUNIT"
-      [[ -n $track ]] && pa_records["$pa_idx":track:value]="$track" && pa_records["$pa_idx":track:name]="$(deg_to_compass "$track")"
-      pa_records["$pa_idx":time:time_at_mindist]="$seentime"
+      RECORD_SET pa_records "$pa_idx:distance:value" "$distance" && RECORD_SET pa_records "$pa_idx:distance:unit" "$DISTUNIT"
+      [[ -n $lat ]] && RECORD_SET pa_records "$pa_idx:lat" "$lat"
+      [[ -n $lon ]] && RECORD_SET pa_records "$pa_idx:lon" "$lon"
+      [[ -n $altitude ]] && RECORD_SET pa_records "$pa_idx:altitude:value" "$altitude" && RECORD_SET pa_records "$pa_idx:altitude:unit" "$ALTUNIT" && RECORD_SET pa_records "$pa_idx:altitude:reference" "$ALTREF"
+      [[ -n $angle ]] && RECORD_SET pa_records "$pa_idx:angle:value" "${angle%.*}" && RECORD_SET pa_records "$pa_idx:angle:name" "$(deg_to_compass "$angle")"
+      [[ -n $gs ]] && RECORD_SET pa_records "$pa_idx:groundspeed:value" "$gs" && RECORD_SET pa_records "$pa_idx:groundspeed:unit" "$SPEEDUNIT"
+      [[ -n $track ]] && RECORD_SET pa_records "$pa_idx:track:value" "$track" && RECORD_SET pa_records "$pa_idx:track:name" "$(deg_to_compass "$track")"
+      RECORD_SET pa_records "$pa_idx:time:time_at_mindist" "$seentime"
       # ensure squawk gets set once if still empty
     fi
-    pa_records["$pa_idx":latfirstseen]="${pa_records["$pa_idx":latfirstseen]:-$lat}"
-    pa_records["$pa_idx":lonfirstseen]="${pa_records["$pa_idx":lonfirstseen]:-$lon}"
+    RECORD_SET pa_records "$pa_idx:latfirstseen" "${pa_records["$pa_idx":latfirstseen]:-$lat}"
+    RECORD_SET pa_records "$pa_idx:lonfirstseen" "${pa_records["$pa_idx":lonfirstseen]:-$lon}"
 
     if [[ -n $squawk && -z ${pa_records["$pa_idx":squawk:value]} ]]; then
-      pa_records["$pa_idx":squawk:value]="$squawk"
-      pa_records["$pa_idx":squawk:description]="$(GET_SQUAWK_DESCRIPTION "$squawk")"
+      RECORD_SET pa_records "$pa_idx:squawk:value" "$squawk"
+      RECORD_SET pa_records "$pa_idx:squawk:description" "$(GET_SQUAWK_DESCRIPTION "$squawk")"
       if [[ "${pa_squawkmatch["$icao"]}" == "true" ]]; then
-        pa_records["$pa_idx":squawk:match]=true
+        RECORD_SET pa_records "$pa_idx:squawk:match" true
       fi
     fi
 
@@ -1662,30 +1813,60 @@ for ((idx=0; idx<=records[maxindex]; idx++)); do
     processed_indices["$idx"]=true
     if [[ -n "$TWEET_MINTIME" ]]; then
       if tweet_mintime_delay_active_for_idx "$idx"; then
-        records["$idx":ready_to_notify]=false
+        RECORD_SET records "$idx:ready_to_notify" false
         log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) remains FALSE due to TWEET_MINTIME delay"
       fi
     else
-      records["$idx":ready_to_notify]=true
+      RECORD_SET records "$idx:ready_to_notify" true
       log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) is now TRUE due to collapse timeout"
     fi
   fi
 done
+METRICS_STOP positions
 
 log_print INFO "Initial processing complete. New/Updated: ${#newrecords[@]}/${#updatedrecords[@]} (PF); ${#pa_newrecords[@]}/${#pa_updatedrecords[@]} (PA). Total number of records is now $((records[maxindex] + 1)) (PF); $((pa_records[maxindex] + 1)) (PA) . Continue adding more info for records ${!processed_indices[*]} (PF) and ${!pa_processed_indices[*]} (PA)."
 
-# try to pre-seed the noisecapt log:
-if [[ -n "$REMOTENOISE" ]] && curl -m 30 -fsSL "$REMOTENOISE/noisecapt-$TODAY.log" >/tmp/noisecapt.log 2>/dev/null; then
+# try to pre-seed the noisecapt log (pflib.noise only downloads what was added to it since the last run):
+METRICS_START noise_log
+if [[ -n "$REMOTENOISE" ]] && \
+   { python3 -m pflib.noise log --remote "$REMOTENOISE" --date "$TODAY" >/tmp/noisecapt.log 2>/dev/null || \
+     curl -m 30 -fsSL "$REMOTENOISE/noisecapt-$TODAY.log" >/tmp/noisecapt.log 2>/dev/null; }; then
   noiselog="$(</tmp/noisecapt.log)"
 fi
-
-# generate the heatmap data in the background
-{ GENERATE_HEATMAPJS
-  log_print DEBUG "Wrote Heatmap JS object"
-} &
+METRICS_STOP noise_log
+
+# generate the heatmap data. This only adds this run's positions to the store, so it's quick; it isn't done
+# in the background because it updates heatmap[], which is written with the records
+METRICS_START heatmap
+GENERATE_HEATMAPJS
+METRICS_STOP heatmap
+log_print DEBUG "Wrote Heatmap JS object and pyramid for ${#heatmap_points[@]} new positions"
+
+# look up the photos of all records that still need one with a single pflib.photos call; GET_PS_PHOTO
+# only looks up the ICAOs itself if that failed
+if chk_enabled "$SHOWIMAGES"; then
+  METRICS_START photos
+  photo_icaos=()
+  for idx in "${!processed_indices[@]}"; do
+    if [[ "${records["$idx":checked:image]}" != "true" && -z "${records["$idx":image:thumblink]}" && -n "${records["$idx":icao]}" ]]; then
+      photo_icaos+=("${records["$idx":icao]}")
+    fi
+  done
+  for idx in "${!pa_processed_indices[@]}"; do
+    if [[ "${pa_records["$idx":checked:image]}" != "true" && -z "${pa_records["$idx":image:thumblink]}" && -n "${pa_records["$idx":icao]}" ]]; then
+      photo_icaos+=("${pa_records["$idx":icao]}")
+    fi
+  done
+  if ! photos_prefetch "${photo_icaos[@]}"; then
+    log_print WARN "pflib.photos failed; looking up the photos of ${#photo_icaos[@]} records one by one"
+  fi
+  METRICS_STOP photos
+  log_print DEBUG "Looked up the photos of ${#photo_link[@]} ICAOs"
+fi
 
 # Now try to add callsigns and owners for those that don't already have them:
 # Planefence:
+METRICS_START enrich_pf
 for idx in "${!processed_indices[@]}"; do
 
   icao="${records["$idx":icao]}"
@@ -1696,8 +1877,8 @@ for idx in "${!processed_indices[@]}"; do
   # ------------------------------------------------------------------------------------
   if [[ "${records["$idx":checked:owner]}" != "true" && -n "$callsign" ]]; then
     log_print DEBUG "Getting owner data for record $idx"
-    records["$idx":owner]="$(/usr/share/planefence/airlinename.sh "$callsign" "$icao" 2>/dev/null)"
-    records["$idx":checked:owner]=true
+    RECORD_SET records "$idx:owner" "$(/usr/share/planefence/airlinename.sh "$callsign" "$icao" 2>/dev/null)"
+    RECORD_SET records "$idx:checked:owner" true
   fi
 
   # get images
@@ -1706,19 +1887,19 @@ for idx in "${!processed_indices[@]}"; do
       [[ -z "${records["$idx":image:thumblink]}" ]] && \
       [[ -n "$icao" ]]; then
         log_print DEBUG "Getting image data for record $idx"
-        records["$idx":image:thumblink]="$(GET_PS_PHOTO "$icao" "thumblink")"
-        records["$idx":image:link]="$(GET_PS_PHOTO "$icao" "link")"
-        records["$idx":image:file]="$(GET_PS_PHOTO "$icao" "image")"
-        records["$idx":checked:image]=true
-        records[HASIMAGES]=true
+        RECORD_SET records "$idx:image:thumblink" "$(GET_PS_PHOTO "$icao" "thumblink")"
+        RECORD_SET records "$idx:image:link" "$(GET_PS_PHOTO "$icao" "link")"
+        RECORD_SET records "$idx:image:file" "$(GET_PS_PHOTO "$icao" "image")"
+        RECORD_SET records "$idx:checked:image" true
+        RECORD_SET records HASIMAGES true
   fi
 
   # Add a callsign if there isn't any
   if [[ -z "$callsign" ]]; then
     log_print DEBUG "Getting callsign data for record $idx"
     callsign="$(GET_CALLSIGN "$icao")"
-    records["$idx":callsign]="${callsign//[[:space:]]/}"
-    records["$idx":link:fa]="https://flightaware.com/live/modes/$hex:ident/ident/${callsign//[[:space:]]/}/redirect/"
+    RECORD_SET records "$idx:callsign" "${callsign//[[:space:]]/}"
+    RECORD_SET records "$idx:link:fa" "https://flightaware.com/live/modes/$hex:ident/ident/${callsign//[[:space:]]/}/redirect/"
   fi
 
   # If TWEET_MINTIME is set, hold readiness at FALSE until the configured
@@ -1728,7 +1909,7 @@ for idx in "${!processed_indices[@]}"; do
     if tweet_mintime_delay_active_for_idx "$idx"; then
       mintime_blocking=true
       if [[ "${records["$idx":ready_to_notify]}" != "false" ]]; then
-        records["$idx":ready_to_notify]="false"
+        RECORD_SET records "$idx:ready_to_notify" "false"
         if [[ "${TWEET_BEHAVIOR,,}" == "post" ]]; then
           log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) is now FALSE due to TWEET_MINTIME not yet passed since last seen"
         else
@@ -1747,8 +1928,8 @@ for idx in "${!processed_indices[@]}"; do
     continue
   fi
 
-  records["$idx":complete]=true
-  records["$idx":ready_to_notify]=true
+  RECORD_SET records "$idx:complete" true
+  RECORD_SET records "$idx:ready_to_notify" true
   log_print DEBUG "[READY_TO_NOTIFY] $idx ($icao $callsign) is now TRUE due to record marked complete"
 
   # Add noisecapt stuff
@@ -1759,15 +1940,26 @@ for idx in "${!processed_indices[@]}"; do
         # Make sure we have the noiselist
         if [[ -z "$noiselist" ]]; then
           wait "$noise_pid" 2>/dev/null || true
-          if [[ -s /tmp/.allnoise ]]; then noiselist="$(</tmp/.allnoise)"; else REMOTENOISE=""; fi
+          if [[ -s /tmp/.allnoise ]]; then
+            noiselist="$(</tmp/.allnoise)"
+            METRICS_START noise_prefetch
+            NOISE_PREFETCH /tmp/.allnoise
+            METRICS_STOP noise_prefetch
+          else
+            REMOTENOISE=""
+          fi
           rm -f /tmp/.allnoise
         fi
         if [[ -n "$REMOTENOISE" ]]; then
           noisedate="$(awk -F'[.-]' '($1=="noisecapt" && $2 ~ /^[0-9]{6}$/ && $2>m){m=$2} END{if(m!="")print m}' <<< "$noiselist")"
           noisedate="${noisedate:-$TODAY}"
-          read -r records["$idx":sound:peak] records["$idx":sound:1min] records["$idx":sound:5min] records["$idx":sound:10min] records["$idx":sound:1hour] records["$idx":sound:loudness] records["$idx":sound:color] <<< "$(GET_NOISEDATA "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
-          records["$idx":checked:noisedata]=true
-          if [[ -n "${records["$idx":sound:peak]}" ]]; then records[HASNOISE]=true; fi
+          read -r -a noisedata <<< "$(GET_NOISEDATA "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
+          noisefield=0
+          for noisekey in peak 1min 5min 10min 1hour loudness color; do
+            RECORD_SET records "$idx:sound:$noisekey" "${noisedata[noisefield++]}"
+          done
+          RECORD_SET records "$idx:checked:noisedata" true
+          if [[ -n "${records["$idx":sound:peak]}" ]]; then RECORD_SET records HASNOISE true; fi
         fi
   fi
   if [[ -n "$REMOTENOISE" ]] && \
@@ -1776,21 +1968,21 @@ for idx in "${!processed_indices[@]}"; do
       [[ -z "${records["$idx":noisegraph:file]}" ]] && \
       [[ -n "${records["$idx":icao]}" ]]; then
         log_print DEBUG "Getting noisegraph for record $idx"
-        records["$idx":noisegraph:file]="$(CREATE_NOISEPLOT "${records["$idx":callsign]:-${records["$idx":icao]}}" "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}" "${records["$idx":icao]}")"
+        RECORD_SET records "$idx:noisegraph:file" "$(CREATE_NOISEPLOT "${records["$idx":callsign]:-${records["$idx":icao]}}" "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}" "${records["$idx":icao]}")"
         if [[ -n "${records["$idx":noisegraph:file]}" ]]; then
-          records["$idx":noisegraph:link]="noise/$(basename "${records["$idx":noisegraph:file]}")"
+          RECORD_SET records "$idx:noisegraph:link" "noise/$(basename "${records["$idx":noisegraph:file]}")"
         fi
         log_print DEBUG "Getting spectrogram for record $idx"
-        records["$idx":spectro:file]="$(CREATE_SPECTROGRAM "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
+        RECORD_SET records "$idx:spectro:file" "$(CREATE_SPECTROGRAM "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
         if [[ -n "${records["$idx":spectro:file]}" ]]; then
-          records["$idx":spectro:link]="noise/$(basename "${records["$idx":spectro:file]}")"
+          RECORD_SET records "$idx:spectro:link" "noise/$(basename "${records["$idx":spectro:file]}")"
         fi
         log_print DEBUG "Getting mp3 for record $idx"
-        records["$idx":mp3:file]="$(CREATE_MP3 "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
+        RECORD_SET records "$idx:mp3:file" "$(CREATE_MP3 "${records["$idx":time:firstseen]}" "${records["$idx":time:lastseen]}")"
         if [[ -n "${records["$idx":mp3:file]}" ]]; then
-          records["$idx":mp3:link]="noise/$(basename "${records["$idx":mp3:file]}")"
+          RECORD_SET records "$idx:mp3:link" "noise/$(basename "${records["$idx":mp3:file]}")"
         fi
-        records["$idx":checked:noisegraph]=true
+        RECORD_SET records "$idx:checked:noisegraph" true
   fi
 
   # get Nominating location. Note - this is slow because we need to do an API call for each lookup
@@ -1798,25 +1990,27 @@ for idx in "${!processed_indices[@]}"; do
       [[ -n "${records["$idx":lat]}" ]] && \
       [[ -n "${records["$idx":lon]}" ]]; then
     log_print DEBUG "Getting nominatim data for record $idx"
-    records["$idx":nominatim]="$(/usr/share/planefence/nominatim.sh --lat="${records["$idx":lat]}" --lon="${records["$idx":lon]}" 2>/dev/null || true)"
-    records["$idx":checked:nominatim]=true
+    RECORD_SET records "$idx:nominatim" "$(/usr/share/planefence/nominatim.sh --lat="${records["$idx":lat]}" --lon="${records["$idx":lon]}" 2>/dev/null || true)"
+    RECORD_SET records "$idx:checked:nominatim" true
   fi
 done
+METRICS_STOP enrich_pf
 
 # Plane-alert:
+METRICS_START enrich_pa
   for idx in "${!pa_processed_indices[@]}"; do
 
   # There's no real concept of "complete" in plane-alert mode, so we just process all records that were touched. We're also setting the "complete" flag; this is not really needed but keeps the logic similar.
 
   icao="${pa_records["$idx":icao]}"
   callsign="${pa_records["$idx":callsign]}"
-  pa_records["$idx":complete]=true  # mark as complete since plane-alert mode has no collapse window
+  RECORD_SET pa_records "$idx:complete" true  # mark as complete since plane-alert mode has no collapse window
 
   # ------------------------------------------------------------------------------------
   if [[ "${pa_records["$idx":checked:owner]}" != "true" && -n "$callsign" ]]; then
     log_print DEBUG "Getting owner data for record $idx"
-    pa_records["$idx":owner]="$(/usr/share/planefence/airlinename.sh "$callsign" "$icao" 2>/dev/null)"
-    pa_records["$idx":checked:owner]=true
+    RECORD_SET pa_records "$idx:owner" "$(/usr/share/planefence/airlinename.sh "$callsign" "$icao" 2>/dev/null)"
+    RECORD_SET pa_records "$idx:checked:owner" true
   fi
 
   # get images
@@ -1825,19 +2019,19 @@ done
       [[ -z "${pa_records["$idx":image:thumblink]}" ]] && \
       [[ -n "$icao" ]]; then
         log_print DEBUG "Getting image data for record $idx"
-        pa_records["$idx":image:thumblink]="$(GET_PS_PHOTO "$icao" "thumblink")"
-        pa_records["$idx":image:link]="$(GET_PS_PHOTO "$icao" "link")"
-        pa_records["$idx":image:file]="$(GET_PS_PHOTO "$icao" "image")"
-        pa_records["$idx":checked:image]=true
-        pa_records[HASIMAGES]=true
+        RECORD_SET pa_records "$idx:image:thumblink" "$(GET_PS_PHOTO "$icao" "thumblink")"
+        RECORD_SET pa_records "$idx:image:link" "$(GET_PS_PHOTO "$icao" "link")"
+        RECORD_SET pa_records "$idx:image:file" "$(GET_PS_PHOTO "$icao" "image")"
+        RECORD_SET pa_records "$idx:checked:image" true
+        RECORD_SET pa_records HASIMAGES true
   fi
 
   # Add a callsign if there isn't any
   if [[ -z "$callsign" ]]; then
     log_print DEBUG "Getting callsign data for record $idx"
     callsign="$(GET_CALLSIGN "$icao")"
-    pa_records["$idx":callsign]="${callsign//[[:space:]]/}"
-    pa_records["$idx":link:fa]="https://flightaware.com/live/modes/$hex:ident/ident/${callsign//[[:space:]]/}/redirect/"
+    RECORD_SET pa_records "$idx:callsign" "${callsign//[[:space:]]/}"
+    RECORD_SET pa_records "$idx:link:fa" "https://flightaware.com/live/modes/$hex:ident/ident/${callsign//[[:space:]]/}/redirect/"
   fi
 
   # get Nominating location. Note - this is slow because we need to do an API call for each lookup
@@ -1845,22 +2039,25 @@ done
       [[ -n "${pa_records["$idx":latfirstseen]}" ]] && \
       [[ -n "${pa_records["$idx":lonfirstseen]}" ]]; then
     log_print DEBUG "Getting nominatim data for record $idx"
-    pa_records["$idx":nominatim]="$(/usr/share/planefence/nominatim.sh --lat="${pa_records["$idx":latfirstseen]}" --lon="${pa_records["$idx":lonfirstseen]}" 2>/dev/null || true)"
-    pa_records["$idx":checked:nominatim]=true
+    RECORD_SET pa_records "$idx:nominatim" "$(/usr/share/planefence/nominatim.sh --lat="${pa_records["$idx":latfirstseen]}" --lon="${pa_records["$idx":lonfirstseen]}" 2>/dev/null || true)"
+    RECORD_SET pa_records "$idx:checked:nominatim" true
   fi
 done
+METRICS_STOP enrich_pa
 
 # get route information in bulk (single API call)
 if ! chk_disabled "$CHECKROUTE"; then
   log_print DEBUG "Getting route data for record $idx"
+  METRICS_START routes
   GET_ROUTE_BULK
+  METRICS_STOP routes
 fi
 
-if [[ -z "${records[HASROUTE]}" ]]; then records[HASROUTE]=false; fi
-if [[ -z "${records[HASIMAGES]}" ]]; then records[HASIMAGES]=false; fi
-if [[ -z "${pa_records[HASROUTE]}" ]]; then pa_records[HASROUTE]=false; fi
-if [[ -z "${pa_records[HASIMAGES]}" ]]; then pa_records[HASIMAGES]=false; fi
-if [[ -z "${records[HASNOISE]}" || -z "$REMOTENOISE" ]] || chk_disabled "$REMOTENOISE"; then records[HASNOISE]=false; else LINK_LATEST_SPECTROFILE; fi
+if [[ -z "${records[HASROUTE]}" ]]; then RECORD_SET records HASROUTE false; fi
+if [[ -z "${records[HASIMAGES]}" ]]; then RECORD_SET records HASIMAGES false; fi
+if [[ -z "${pa_records[HASROUTE]}" ]]; then RECORD_SET pa_records HASROUTE false; fi
+if [[ -z "${pa_records[HASIMAGES]}" ]]; then RECORD_SET pa_records HASIMAGES false; fi
+if [[ -z "${records[HASNOISE]}" || -z "$REMOTENOISE" ]] || chk_disabled "$REMOTENOISE"; then RECORD_SET records HASNOISE false; else LINK_LATEST_SPECTROFILE; fi
 
 # Apply FUDGELOC rounding to station coordinates
 case "${FUDGELOC:-3}" in
@@ -1874,46 +2071,54 @@ esac
 printf -v _fudged_lat "%.${_fudge_decimals}f" "$LAT"
 printf -v _fudged_lon "%.${_fudge_decimals}f" "$LON"
 
+# maxindex is only set when a record is added, so also store it for a day that has none yet
+RECORD_SET records maxindex "${records[maxindex]}"
+RECORD_SET pa_records maxindex "${pa_records[maxindex]}"
+
 # Provide station metadata for front-end summaries
-records["station:dist:value"]="${DIST:-}"
-records["station:dist:unit"]="${DISTUNIT:-}"
-records["station:altitude:value"]="${MAXALT:-}"
-records["station:altitude:unit"]="${ALTUNIT:-}"
-records["station:lat"]="${_fudged_lat:-}"
-records["station:lon"]="${_fudged_lon:-}"
-records["station:version"]="$VERSION"
-records["station:heatmapzoom"]="$HEATMAPZOOM"
-records["station:me"]="$MY"
-records["station:myurl"]="$MYURL"
-records["station:motd"]="$PF_MOTD"
-records["station:histtime"]="$HISTTIME"
-records["LASTUPDATE"]="$NOWTIME"
-
-pa_records["station:dist:value"]="${DIST:-}"
-pa_records["station:dist:unit"]="${DISTUNIT:-}"
-pa_records["station:altitude:value"]="${MAXALT:-}"
-pa_records["station:altitude:unit"]="${ALTUNIT:-}"
-pa_records["station:lat"]="${_fudged_lat:-}"
-pa_records["station:lon"]="${_fudged_lon:-}"
-pa_records["station:version"]="$VERSION"
-pa_records["station:me"]="$MY"
-pa_records["station:myurl"]="$MYURL"
-pa_records["station:me"]="$MY"
-pa_records["station:myurl"]="$MYURL"
-pa_records["station:motd"]="$PA_MOTD"
+RECORD_SET records "station:dist:value" "${DIST:-}"
+RECORD_SET records "station:dist:unit" "${DISTUNIT:-}"
+RECORD_SET records "station:altitude:value" "${MAXALT:-}"
+RECORD_SET records "station:altitude:unit" "${ALTUNIT:-}"
+RECORD_SET records "station:lat" "${_fudged_lat:-}"
+RECORD_SET records "station:lon" "${_fudged_lon:-}"
+RECORD_SET records "station:version" "$VERSION"
+RECORD_SET records "station:heatmapzoom" "$HEATMAPZOOM"
+RECORD_SET records "station:me" "$MY"
+RECORD_SET records "station:myurl" "$MYURL"
+RECORD_SET records "station:motd" "$PF_MOTD"
+RECORD_SET records "station:histtime" "$HISTTIME"
+RECORD_SET records "LASTUPDATE" "$NOWTIME"
+
+RECORD_SET pa_records "station:dist:value" "${DIST:-}"
+RECORD_SET pa_records "station:dist:unit" "${DISTUNIT:-}"
+RECORD_SET pa_records "station:altitude:value" "${MAXALT:-}"
+RECORD_SET pa_records "station:altitude:unit" "${ALTUNIT:-}"
+RECORD_SET pa_records "station:lat" "${_fudged_lat:-}"
+RECORD_SET pa_records "station:lon" "${_fudged_lon:-}"
+RECORD_SET pa_records "station:version" "$VERSION"
+RECORD_SET pa_records "station:me" "$MY"
+RECORD_SET pa_records "station:myurl" "$MYURL"
+RECORD_SET pa_records "station:me" "$MY"
+RECORD_SET pa_records "station:myurl" "$MYURL"
+RECORD_SET pa_records "station:motd" "$PA_MOTD"
 if [[ "$PA_RANGE" != "999999" ]]; then
-  pa_records["station:range"]="$PA_RANGE"
+  RECORD_SET pa_records "station:range" "$PA_RANGE"
 else
-  pa_records["station:range"]="-1";
+  RECORD_SET pa_records "station:range" "-1";
 fi
-pa_records["LASTUPDATE"]="$NOWTIME"
+RECORD_SET pa_records "LASTUPDATE" "$NOWTIME"
 
 log_print INFO "Processing complete. Now writing results to disk..."
 
 # ==========================
 # Save state
 # ==========================
-{ WRITE_RECORDS ignore-lock
+# Only the entries set with RECORD_SET during this run are written (we already hold the lock)
+RECORD_SET LASTPROCESSEDLINE "" "$LASTPROCESSEDLINE"
+{ METRICS_START write_records
+  COMMIT_RECORDS ignore-lock
+  METRICS_STOP write_records
   log_print DEBUG "Wrote RECORDSFILE"
 } &
 
@@ -1923,21 +2128,29 @@ log_print INFO "Processing complete. Now writing results to disk..."
 
 if chk_enabled "$PLANEFENCE"; then
   if chk_enabled "$GENERATE_CSV"; then
-    { GENERATE_PF_CSV
+    { METRICS_START pf_csv
+      GENERATE_PF_CSV
+      METRICS_STOP pf_csv
       log_print DEBUG "Wrote PF CSV object to $CSVOUT"
     } &
   fi
-  { GENERATE_PF_JSON
+  { METRICS_START pf_json
+    GENERATE_PF_JSON
+    METRICS_STOP pf_json
     log_print DEBUG "Wrote PF JSON object to $JSONOUT"
   } &
 fi
 if chk_enabled "$PLANEALERT"; then
   if chk_enabled "$GENERATE_CSV"; then
-    { GENERATE_PA_CSV
+    { METRICS_START pa_csv
+      GENERATE_PA_CSV
+      METRICS_STOP pa_csv
       log_print DEBUG "Wrote PA CSV object to ${PA_CSVOUT}"
     } &
   fi
-  { GENERATE_PA_JSON
+  { METRICS_START pa_json
+    GENERATE_PA_JSON
+    METRICS_STOP pa_json
     log_print DEBUG "Wrote PA JSON object to ${PA_JSONOUT}"
   } &
 fi
@@ -1949,4 +2162,6 @@ rm -rf "$NOISECACHE_DIR"
 # wait for any straggler background processes to finish
 wait 2>/dev/null || true
 
+METRICS_STOP cycle
+METRICS_FLUSH
 log_print INFO "Done."
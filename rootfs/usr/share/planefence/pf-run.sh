@@ -53,6 +53,9 @@ shopt -s nullglob
 if [[ -f "$RECORDSFILE" ]]; then
   cp -n "$RECORDSFILE" "/run/planefence/"
 fi
+if [[ -f "/usr/share/planefence/persist/.internal/heatmap-${TODAY}.bin" ]]; then
+  cp -n "/usr/share/planefence/persist/.internal/heatmap-${TODAY}.bin" "/run/planefence/"
+fi
 if [[ ! -f "/run/planefence/planefence-${TODAY}.json" && -f "/usr/share/planefence/html/planefence-${TODAY}.json" ]]; then
   cp -n "/usr/share/planefence/html/planefence-${TODAY}.json" "/run/planefence/planefence-${TODAY}.json"
 fi
@@ -75,6 +78,10 @@ fi
 
 cd "$PF_PATH"
 
+# time the stages of this cycle (see pflib.metrics); pf-process_sbs.sh adds its own stages to them
+METRICS_INIT jq
+METRICS_START cycle
+
 if [[ -f /run/planefence/last-config-change ]] && \
    (( $(</run/planefence/last-config-change) < $(stat -c %Z /usr/share/planefence/persist/planefence.config) )); then
   log_print INFO "Detected a change in the config file since last run. Applying config changes."
@@ -87,39 +94,72 @@ elif [[ -f /run/planefence/last-config-change ]] && [[ -f /usr/share/planefence/
   date +%s >/run/planefence/last-config-change
 fi
 
+METRICS_START process
 ./pf-process_sbs.sh	&	# read and process SBS data
 pid=$!
 echo "$pid" > /run/pf-process_sbs.pid
 wait "$pid" &>/dev/null || true
 rm -f "/run/pf-process_sbs.pid" "/tmp/.records.lock"
+METRICS_STOP process
 
 # Remove noisecache
 find /tmp -maxdepth 1 -mindepth 1 \
-  \( -name '.pf-noisecache-*' -o -name 'tmp.*' -o -name 'pa_key_*' \) \
+  \( -name '.pf-noisecache-*' -o -name '.pf-metrics-*' -o -name 'tmp.*' -o -name 'pa_key_*' \) \
   -mmin +"${DELETEAFTER}" \
   -exec rm -rf -- {} + 2>/dev/null || :
 
-# Run notifier scripts sequentially with timeout protection.
-# Sequential execution avoids lock contention on /tmp/.records.lock between notifiers.
+# Run the notifier scripts with timeout protection, up to NOTIFIER_CONCURRENCY of them at the same time,
+# so the time spent notifying doesn't add up over the enabled channels. They only take /tmp/.records.lock
+# for the moment they commit their record entries (COMMIT_RECORDS), so they don't hold each other up.
 NOTIFIER_TIMEOUT="${NOTIFIER_TIMEOUT:-600}"  # default 10 minute timeout per notifier
+NOTIFIER_CONCURRENCY="${NOTIFIER_CONCURRENCY:-4}"
+
+run_notifier() {
+  local script="$1" notifier exitcode=0
+
+  notifier="${script##*/}"
+  METRICS_START "${notifier%.sh}"
+  # Use a TERM then KILL escalation to avoid stuck notifier processes.
+  timeout --kill-after=15s "$NOTIFIER_TIMEOUT" bash "$script" || exitcode=$?
+  METRICS_STOP "${notifier%.sh}"
+
+  if [[ $exitcode -eq 124 ]]; then
+    log_print WARN "Notifier ${script##*/} timed out after ${NOTIFIER_TIMEOUT}s and was terminated"
+  elif [[ $exitcode -eq 137 ]]; then
+    log_print WARN "Notifier ${script##*/} did not stop after TERM and was force-killed"
+  elif [[ $exitcode -ne 0 ]]; then
+    log_print WARN "Notifier ${script##*/} exited with status ${exitcode}"
+  fi
+}
+
+# If the notification service is running, the Bluesky, Mastodon and Telegram notifiers only queue
+# their posts (see notifyd_post), and every record's posts are then sent as one job, so its images
+# are read once and its channels are posted to at the same time.
+NOTIFY_QUEUE=""
+if notifyd_running; then
+  NOTIFY_QUEUE="$(mktemp -d /run/planefence/notify-queue.XXXXXX)" || NOTIFY_QUEUE=""
+fi
+export NOTIFY_QUEUE
 
+METRICS_START notify
 if script_array="$(compgen -G "$NOTIFY_PATH/send*.sh" 2>/dev/null)"; then
   while read -r script; do
     [[ -n "$script" ]] || continue
-
-    # Use a TERM then KILL escalation to avoid stuck notifier processes.
-    timeout --kill-after=15s "$NOTIFIER_TIMEOUT" bash "$script"
-    exitcode=$?
-
-    if [[ $exitcode -eq 124 ]]; then
-      log_print WARN "Notifier ${script##*/} timed out after ${NOTIFIER_TIMEOUT}s and was terminated"
-    elif [[ $exitcode -eq 137 ]]; then
-      log_print WARN "Notifier ${script##*/} did not stop after TERM and was force-killed"
-    elif [[ $exitcode -ne 0 ]]; then
-      log_print WARN "Notifier ${script##*/} exited with status ${exitcode}"
-    fi
+    while (( $(jobs -rp | wc -l) >= NOTIFIER_CONCURRENCY )); do
+      wait -n || true
+    done
+    run_notifier "$script" </dev/null &
   done <<< "$script_array"
+  wait || true
+fi
+if [[ -n "$NOTIFY_QUEUE" ]]; then
+  METRICS_START notify_queue
+  # the notifiers keep their records in /run/planefence
+  ( RECORDSFILE="/run/planefence/${RECORDSFILE##*/}"; notifyd_send_queue "$NOTIFY_QUEUE" ) || true
+  METRICS_STOP notify_queue
+  rm -rf -- "$NOTIFY_QUEUE"
 fi
+METRICS_STOP notify
 
 # Sync notifier results from records into runtime JSON so stream/UI can render links.
 sync_notifier_links_into_json() {
@@ -209,15 +249,38 @@ sync_notifier_links_into_json() {
   rm -f "$tmp_map"
 }
 
-READ_RECORDS ignore-lock
+METRICS_START sync_links
+READ_RECORDS ignore-lock records pa_records
 sync_notifier_links_into_json pf "/run/planefence/planefence-${TODAY}.json"
 sync_notifier_links_into_json pa "/run/planefence/plane-alert-${TODAY}.json"
+METRICS_STOP sync_links
+
+# Index the rows of today's JSON files, for the paged history (date=all) in stream.sh
+for json_file in "/run/planefence/planefence-${TODAY}.json" "/run/planefence/plane-alert-${TODAY}.json"; do
+  if [[ -f "$json_file" ]]; then python3 -m pflib.rowindex build "$json_file" >/dev/null 2>&1 || true; fi
+done
+
+# Bring today's Insights rollups up to date, so Insights requests only have to merge the per-day rollups
+{ bash /usr/share/planefence/insights.sh mode=planefence rollup=today
+  bash /usr/share/planefence/insights.sh mode=plane-alert rollup=today
+} >/dev/null 2>&1 &
 
 # Backup data files if needed
 if [[ "$backup_data_files" == true ]]; then
+  # The notifiers only update the records store, so bring its .gz export up to date before copying it
+  if [[ -f "/run/planefence/${RECORDSFILE##*/}" && -f "/run/planefence/$(basename "$RECORDSFILE" .gz).db" ]]; then
+    python3 -m pflib.records export --gz "/run/planefence/${RECORDSFILE##*/}" >/dev/null 2>&1 || true
+  fi
   if [[ -f "/run/planefence/${RECORDSFILE##*/}" ]]; then  cp -f "/run/planefence/${RECORDSFILE##*/}" "$RECORDSDIR/"; fi
+  if [[ -f "/run/planefence/heatmap-${TODAY}.bin" ]]; then  cp -f "/run/planefence/heatmap-${TODAY}.bin" "/usr/share/planefence/persist/.internal/"; fi
   if [[ -f "/run/planefence/planefence-${TODAY}.json" ]]; then  cp -f "/run/planefence/planefence-${TODAY}.json" "/usr/share/planefence/html/planefence-${TODAY}.json"; fi
   if [[ -f "/run/planefence/plane-alert-${TODAY}.json" ]]; then  cp -f "/run/planefence/plane-alert-${TODAY}.json" "/usr/share/planefence/html/plane-alert-${TODAY}.json"; fi
+  for json_file in "/usr/share/planefence/html/planefence-${TODAY}.json" "/usr/share/planefence/html/plane-alert-${TODAY}.json"; do
+    if [[ -f "$json_file" ]]; then python3 -m pflib.rowindex build "$json_file" >/dev/null 2>&1 || true; fi
+  done
   if [[ -f "/run/planefence/planefence-${TODAY}.csv" ]]; then  cp -f "/run/planefence/planefence-${TODAY}.csv" "/usr/share/planefence/html/planefence-${TODAY}.csv"; fi
   if [[ -f "/run/planefence/plane-alert-${TODAY}.csv" ]]; then  cp -f "/run/planefence/plane-alert-${TODAY}.csv" "/usr/share/planefence/html/plane-alert-${TODAY}.csv"; fi
 fi
+
+METRICS_STOP cycle
+METRICS_FLUSH
@@ -252,6 +252,9 @@ fi
 if [[ -n "$PF_SCREENSHOT_TIMEOUT" ]]; then
 	configure_both "SCREENSHOT_TIMEOUT" "$PF_SCREENSHOT_TIMEOUT"
 fi
+if [[ -n "$PF_SCREENSHOT_CONCURRENCY" ]]; then
+	configure_both "SCREENSHOT_CONCURRENCY" "$PF_SCREENSHOT_CONCURRENCY"
+fi
 
 
 # make sure $PLANEALERT is set to ON in the planefence.conf file, so it will be invoked:
@@ -365,7 +368,8 @@ if [[ "$PF_DISTUNIT" != $(sed -n 's/^\s*distanceunit=\(.*\)/\1/p' /usr/share/soc
 	sed -i 's/\(^\s*longitude=\).*/\1'"${FEEDER_LON:-$FEEDER_LONG}"'/' /usr/share/socket30003/socket30003.cfg
 	sed -i 's|\(^\s*PEER_HOST=\).*|\1'"$PF_SOCK30003HOST"'|' /usr/share/socket30003/socket30003.cfg
 	sed -i 's|\(^\s*PEER_PORT=\).*|\1'"${PF_SOCK30003PORT:-30003}"'|' /usr/share/socket30003/socket30003.cfg
-	pkill socket30003.pl
+	pkill socket30003.pl || true
+	pkill -f "pflib.basestation collect" || true
 fi
 #
 #--------------------------------------------------------------------------------
@@ -38,6 +38,9 @@ source /usr/share/planefence/planefence.conf
 
 declare -A screenshot_file_map=()
 declare -A screenshot_checked_map=()
+declare -A screenshot_jobs=()      # dataset|idx -> icao of the records that need a screenshot in this run
+declare -A screenshot_squawks=()   # icao -> squawk, so pflib.screenshots can put emergencies first
+declare -A screenshot_labels=()    # dataset -> label for the log
 any_candidates=0
 
 DEBUG="${DEBUG:-false}"
@@ -186,7 +189,7 @@ process_dataset_for_screenshots() {
   local -a INDEX=()
   local -a STALE=()
   local -a rev_index=()
-  local idx shot_path attempts max_to_process shots_remaining
+  local idx attempts max_to_process shots_remaining
 
   shots_remaining=$per_dataset_limit
 
@@ -222,22 +225,86 @@ process_dataset_for_screenshots() {
 
   readarray -t rev_index < <(printf '%s\n' "${INDEX[@]}" | sort -nr)
 
+  # the screenshots themselves are taken by RUN_SCREENSHOT_JOBS, for both datasets at once
+  screenshot_labels["$dataset_name"]="$dataset_label"
   attempts=0
   for idx in "${rev_index[@]}"; do
     if (( attempts >= max_to_process || shots_remaining <= 0 )); then break; fi
+    [[ -n "${dataset_ref["$idx":icao]}" ]] || continue
     attempts=$((attempts + 1))
     shots_remaining=$((shots_remaining - 1))
 
-    log_print DEBUG "${dataset_label}: attempting screenshot (${attempts}/${max_to_process}) for #$idx ${dataset_ref["$idx":icao]} (${dataset_ref["$idx":tail]})"
-    shot_path="$(GET_SCREENSHOT "$idx" "$dataset_name" "$dataset_label")"
+    log_print DEBUG "${dataset_label}: queueing screenshot (${attempts}/${max_to_process}) for #$idx ${dataset_ref["$idx":icao]} (${dataset_ref["$idx":tail]})"
+    screenshot_jobs["$dataset_name|$idx"]="${dataset_ref["$idx":icao]}"
+    if [[ -n "${dataset_ref["$idx":squawk:value]}" ]]; then
+      screenshot_squawks["${dataset_ref["$idx":icao]}"]="${dataset_ref["$idx":squawk:value]}"
+    fi
+  done
+}
+
+RUN_SCREENSHOT_JOBS() {
+  # Takes the screenshots of all records in screenshot_jobs with a single pflib.screenshots call. It keeps
+  # a persistent job queue, so an ICAO is only rendered once for both datasets (and not again within
+  # 10 minutes), renders SCREENSHOT_CONCURRENCY screenshots at the same time with emergency squawks
+  # first, and stores them by content in planepix/cache/screenshots. Records whose job is still queued
+  # aren't marked as checked, so they are asked for again on the next run.
+  # Falls back to getting the screenshots one by one with GET_SCREENSHOT if pflib.screenshots fails.
+  local key icao state file out errors line dataset_name idx shot_path
+  local -A state_for=() file_for=()
+
+  (( ${#screenshot_jobs[@]} > 0 )) || return 0
+
+  errors="$(mktemp)"
+  if out="$(for icao in $(printf '%s\n' "${screenshot_jobs[@]}" | sort -u); do
+              printf '%s\t%s\n' "$icao" "${screenshot_squawks["$icao"]}"
+            done | python3 -m pflib.screenshots run --url "${SCREENSHOTURL:-http://screenshot:5042}" \
+                     --timeout "$SCREENSHOT_TIMEOUT" --workers "${SCREENSHOT_CONCURRENCY:-2}" \
+                     --max-jobs "$(( 2 * MAXSCREENSHOTSPERRUN ))" 2>"$errors")"; then
+    while IFS= read -r line; do
+      log_print ERR "$line"
+    done < "$errors"
+    rm -f "$errors"
+    while IFS=$'\t' read -r icao state file; do
+      [[ -n "$icao" ]] || continue
+      state_for["$icao"]="$state"
+      file_for["$icao"]="$file"
+    done <<< "$out"
+    for key in "${!screenshot_jobs[@]}"; do
+      icao="${screenshot_jobs[$key]}"
+      dataset_name="${key%%|*}"
+      idx="${key#*|}"
+      case "${state_for["$icao"]}" in
+        done)
+          screenshot_file_map["$key"]="${file_for["$icao"]}"
+          screenshot_checked_map["$key"]="true"
+          log_print INFO "${screenshot_labels["$dataset_name"]}: screenshot successful for #$idx $icao -> ${file_for["$icao"]}"
+          ;;
+        failed)
+          screenshot_checked_map["$key"]="true"
+          log_print DEBUG "${screenshot_labels["$dataset_name"]}: screenshot failed for #$idx $icao"
+          ;;
+        *)
+          log_print DEBUG "${screenshot_labels["$dataset_name"]}: screenshot for #$idx $icao is still queued"
+          ;;
+      esac
+    done
+    return 0
+  fi
+
+  while IFS= read -r line; do
+    log_print ERR "$line"
+  done < "$errors"
+  rm -f "$errors"
+  log_print WARN "pflib.screenshots failed; getting ${#screenshot_jobs[@]} screenshots one by one"
+  for key in "${!screenshot_jobs[@]}"; do
+    dataset_name="${key%%|*}"
+    idx="${key#*|}"
+    shot_path="$(GET_SCREENSHOT "$idx" "$dataset_name" "${screenshot_labels["$dataset_name"]}")"
     if [[ -n "$shot_path" ]]; then
-      screenshot_file_map["$dataset_name|$idx"]="$shot_path"
-      log_print INFO "${dataset_label}: screenshot (${attempts}/${max_to_process}) successful for #$idx ${dataset_ref["$idx":icao]} (${dataset_ref["$idx":tail]}) -> $shot_path"
-    else
-      unset "screenshot_file_map[$dataset_name|$idx]"
-      log_print DEBUG "${dataset_label}: screenshot failed for #$idx"
+      screenshot_file_map["$key"]="$shot_path"
+      log_print INFO "${screenshot_labels["$dataset_name"]}: screenshot successful for #$idx ${screenshot_jobs[$key]} -> $shot_path"
     fi
-    screenshot_checked_map["$dataset_name|$idx"]="true"
+    screenshot_checked_map["$key"]="true"
   done
 }
 
@@ -356,6 +423,13 @@ READ_RECORDS ignore-lock
 any_candidates=0
 
 process_dataset_for_screenshots records "Planefence" "$MAXSCREENSHOTSPERRUN"
+if declare -p pa_records &>/dev/null; then
+  process_dataset_for_screenshots pa_records "Plane-Alert" "$MAXSCREENSHOTSPERRUN"
+else
+  log_print DEBUG "Plane-Alert dataset not found; skipping"
+fi
+RUN_SCREENSHOT_JOBS
+
 if dataset_has_pending_updates records; then
   log_print DEBUG "Planefence: saving records after screenshot attempts"
   LOCK_RECORDS
@@ -367,7 +441,6 @@ else
 fi
 
 if declare -p pa_records &>/dev/null; then
-  process_dataset_for_screenshots pa_records "Plane-Alert" "$MAXSCREENSHOTSPERRUN"
   if dataset_has_pending_updates pa_records; then
     log_print DEBUG "Plane-Alert: saving records after screenshot attempts"
     LOCK_RECORDS
@@ -377,8 +450,6 @@ if declare -p pa_records &>/dev/null; then
   else
     log_print DEBUG "Plane-Alert: no updates to persist"
   fi
-else
-  log_print DEBUG "Plane-Alert dataset not found; skipping"
 fi
 
 if (( any_candidates == 0 )); then
@@ -388,4 +459,5 @@ fi
 
 # Cleanup old screenshots
 find "$SCREENFILEDIR" -type f -name '*-screenshot-*.png' -mmin +180 -exec rm -f {} \;
+find "$SCREENFILEDIR/screenshots" -type f -name '*.png' -mmin +180 -delete 2>/dev/null || true
 log_print INFO "Screenshot run completed."
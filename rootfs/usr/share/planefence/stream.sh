@@ -10,9 +10,11 @@
 # -----------------------------------------------------------------------------------
 # This script streams planefence, plane-alert, or Plane-Alert candidates via CGI
 # Usage:
-#   stream.sh [mode=planefence|plane-alert|pa-candidates] [date=YYMMDD|all]
+#   stream.sh [mode=planefence|plane-alert|pa-candidates] [date=YYMMDD|all] [limit=N] [cursor=C]
 #   or via HTTP GET with query string parameters:
-#   http://<server>/cgi/stream.sh?mode=planefence|plane-alert|pa-candidates[&date=YYMMDD|all]
+#   http://<server>/cgi/stream.sh?mode=planefence|plane-alert|pa-candidates[&date=YYMMDD|all][&limit=N][&cursor=C]
+#   With date=all, limit=N returns the history in pages of N rows; cursor is the "page:next" global
+#   of the previous page.
 # -----------------------------------------------------------------------------------
 set -eo pipefail
 
@@ -346,6 +348,24 @@ build_plane_alert_all_json() {
   return 1
 }
 
+# The same history, read through the row index of each day (pflib.rowindex): only the rows that are
+# sent are parsed, and with PAGE_LIMIT only one page of them. The globals then carry "page:next", the
+# cursor of the next (older) page, or "" on the last page.
+build_history_page_json() {
+  local mode="${1:-plane-alert}" tmp
+  local -a args=(--mode "$mode" --hist-days "$(plane_alert_hist_days)" --runroot "$RUNROOT" --docroot "$DOCROOT")
+  [[ -n "$PAGE_LIMIT" ]] && args+=(--limit "$PAGE_LIMIT")
+  [[ -n "$PAGE_CURSOR" ]] && args+=(--cursor "$PAGE_CURSOR")
+
+  tmp="$(mktemp)" || return 1
+  if python3 -m pflib.rowindex all "${args[@]}" > "$tmp" 2>/dev/null; then
+    printf '%s' "$tmp"
+    return 0
+  fi
+  rm -f "$tmp"
+  return 1
+}
+
 printf 'Content-Type: application/x-ndjson\r\n'
 printf 'Cache-Control: no-store\r\n'
 printf 'Pragma: no-cache\r\n'
@@ -391,6 +411,8 @@ choose_json() {
 method="${REQUEST_METHOD:-GET}"
 FILTER_MODE="planefence"
 REQUESTED_DATE=""
+PAGE_LIMIT=""
+PAGE_CURSOR=""
 TMP_ALL_FILE=""
 
 # Build a unified list of query-like pairs
@@ -419,6 +441,12 @@ if [[ ${#pf_qs[@]} -gt 0 ]]; then
           REQUESTED_DATE="all"
         fi
         ;;
+      limit)
+        [[ "$val" =~ ^[0-9]{1,4}$ ]] && (( val > 0 )) && PAGE_LIMIT="$val"
+        ;;
+      cursor)
+        [[ "$val" =~ ^[0-9]{6}\.[0-9]+\.[0-9]+$ ]] && PAGE_CURSOR="$val"
+        ;;
     esac
   done
 elif [[ "$1" == "mode=plane-alert" ]]; then
@@ -431,7 +459,7 @@ if [[ "$FILTER_MODE" == "pa-candidates" ]]; then
 fi
 
 if [[ "$REQUESTED_DATE" == "all" ]]; then
-  TMP_ALL_FILE="$(build_plane_alert_all_json "$FILTER_MODE" || true)"
+  TMP_ALL_FILE="$(build_history_page_json "$FILTER_MODE" || build_plane_alert_all_json "$FILTER_MODE" || true)"
   JSONFILE="$TMP_ALL_FILE"
 else
   JSONFILE="$(choose_json "$FILTER_MODE" "$REQUESTED_DATE" || true)"
@@ -465,8 +493,8 @@ if [[ -z "${JSONFILE:-}" ]]; then
   exit 0
 fi
 
-# Stream schema then rows
-if ! jq -r --arg todays_version "${TODAYS_VERSION:-}" --argjson planealert_enabled "${PLANEALERT_ENABLED}" --argjson pa_candidates_enabled "${PA_CANDIDATES_ENABLED}" --argjson pa_candidates_autoadd "${PA_CANDIDATES_AUTOADD}" '
+# Stream schema then rows (unbuffered, so the UI can draw the first rows while the rest are coming)
+if ! jq -r --unbuffered --arg todays_version "${TODAYS_VERSION:-}" --argjson planealert_enabled "${PLANEALERT_ENABLED}" --argjson pa_candidates_enabled "${PA_CANDIDATES_ENABLED}" --argjson pa_candidates_autoadd "${PA_CANDIDATES_AUTOADD}" '
   def pri: [
     "index","icao","tail","callsign","type","owner","route","nominatim",
     "time:firstseen","time:time_at_mindist","time:lastseen","distance:value","distance:unit","complete",
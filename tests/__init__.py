@@ -0,0 +1,9 @@
+# Tests for the pflib package, run from the repository root with: python3 -m unittest discover -s tests -t .
+#
+# pflib lives in rootfs/ (it is copied into the image as it is), so put it on the path here.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rootfs", "usr", "lib",
+                                "python3", "dist-packages"))
@@ -0,0 +1,95 @@
+# Route lookups (pflib.routes) against the stand-in routeset API
+
+import os
+import tempfile
+import time
+import unittest
+
+from pflib import routes
+from pflib.bench import standins
+
+ROUTES = {"KLM1": ("AMS-JFK", True), "DAL2": ("ATL-LHR", False)}
+
+
+class RouteCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = routes.RouteCache(os.path.join(self.tmp.name, "routes.db"), ttl=100, negative_ttl=10)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_known_and_unknown_routes_expire_after_their_ttl(self):
+        self.cache.put_many({"KLM1": ("AMS-JFK", True), "N123": (routes.UNKNOWN, True)}, now=1000)
+        self.assertEqual(self.cache.get_many(["KLM1", "N123", "DAL2"], now=1005),
+                         {"KLM1": ("AMS-JFK", True), "N123": (routes.UNKNOWN, True)})
+        self.assertEqual(self.cache.get_many(["KLM1", "N123"], now=1050), {"KLM1": ("AMS-JFK", True)})
+        self.assertEqual(self.cache.get_many(["KLM1", "N123"], now=1200), {})
+
+    def test_lookups_larger_than_a_chunk(self):
+        self.cache.put_many({f"C{i}": ("AMS-JFK", i % 2 == 0) for i in range(1200)}, now=1000)
+        found = self.cache.get_many([f"C{i}" for i in range(1300)], now=1001)
+        self.assertEqual(len(found), 1200)
+        self.assertEqual(found["C3"], ("AMS-JFK", False))
+
+    def test_storing_prunes_expired_rows(self):
+        self.cache.put_many({"KLM1": ("AMS-JFK", True)}, now=1000)
+        self.cache.put_many({"DAL2": ("ATL-LHR", True)}, now=2000)
+        self.assertEqual([row[0] for row in self.cache.db.execute("SELECT callsign FROM routes")], ["DAL2"])
+
+
+class ResolveTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.url = standins.start_routes(ROUTES)
+        cls.slow_url = standins.start_routes(ROUTES, delay=0.5)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = routes.RouteCache(os.path.join(self.tmp.name, "routes.db"))
+        self.requests = []
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def fetch(self, planes, api_url, batch_size, **kwargs):
+        self.requests.append(sorted(planes))
+        return routes.fetch_routes(planes, api_url, batch_size, **kwargs)
+
+    def resolve(self, lines, url=None, **kwargs):
+        return dict(routes.resolve(lines, self.cache, url or self.url, fetch=self.fetch, **kwargs))
+
+    def test_routes_are_looked_up_once_per_callsign_and_cached(self):
+        lines = ["pf:1\tKLM1\t52.3\t4.8", "pa:4\tklm 1\t52.3\t4.8", "pf:2\tDAL2\t0\t0", "pf:3\tN123\t0\t0"]
+        self.assertEqual(self.resolve(lines),
+                         {"pf:1": "AMS-JFK", "pa:4": "AMS-JFK", "pf:2": "ATL-LHR (?)", "pf:3": routes.NOT_AVAILABLE})
+        self.assertEqual(self.requests, [["DAL2", "KLM1", "N123"]])
+        self.assertEqual(self.resolve(lines)["pf:3"], routes.NOT_AVAILABLE)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_callsigns_are_sent_in_batches(self):
+        lines = [f"pf:{i}\tC{i}\t0\t0" for i in range(25)]
+        answers = self.resolve(lines, batch_size=10)
+        self.assertEqual(len(answers), 25)
+        self.assertEqual(self.cache.db.execute("SELECT COUNT(*) FROM routes").fetchone()[0], 25)
+
+    def test_batches_that_miss_the_deadline_are_left_for_the_next_run(self):
+        lines = [f"pf:{i}\tC{i}\t0\t0" for i in range(30)]
+        started = time.monotonic()
+        answers = self.resolve(lines, url=self.slow_url, batch_size=10, deadline=0.8)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(0 < len(answers) < 30)
+        self.assertEqual(self.cache.db.execute("SELECT COUNT(*) FROM routes").fetchone()[0], len(answers))
+
+    def test_nothing_is_cached_when_the_api_is_down(self):
+        answers = self.resolve(["pf:1\tKLM1\t0\t0"], url=f"http://127.0.0.1:{standins.free_port()}/api/0/routeset")
+        self.assertEqual(answers, {})
+        self.assertEqual(self.cache.get_many(["KLM1"]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
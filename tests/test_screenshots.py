@@ -0,0 +1,78 @@
+# Screenshot queue (pflib.screenshots) against the stand-in screenshot container
+
+import os
+import tempfile
+import threading
+import unittest
+
+from pflib import screenshots
+from pflib.bench import standins
+
+
+class ScreenshotRunTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.url = standins.start_snapshots(fail={"BAD001"})
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = screenshots.JobQueue(os.path.join(self.tmp.name, "screenshots.db"),
+                                          os.path.join(self.tmp.name, "cache"))
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def fetch(self, icao, url, timeout):
+        with self.lock:
+            self.requests.append(icao)
+        return screenshots.snap(icao, url, timeout)
+
+    def run_jobs(self, lines, **kwargs):
+        return screenshots.run(lines, self.queue, self.url, fetch=self.fetch, **kwargs)
+
+    def test_an_icao_is_rendered_once_however_often_it_is_asked_for(self):
+        answers = self.run_jobs(["abc123\t1200", "ABC123\t", " abc123 \t7700", "DEF456\t1200"])
+        self.assertEqual(sorted(self.requests), ["ABC123", "DEF456"])
+        self.assertEqual(answers["ABC123"][0], screenshots.DONE)
+        self.assertTrue(os.path.isfile(answers["ABC123"][1]))
+        self.assertEqual(self.queue.status()[0][:3], ("ABC123", screenshots.PRIORITY_EMERGENCY, screenshots.DONE))
+
+    def test_emergencies_go_first_and_the_rest_in_order(self):
+        lines = ["AAA001\t1200", "AAA002\t1200", "EEE001\t7700", "AAA003\t", "EEE002\t7500"]
+        answers = self.run_jobs(lines, workers=1, max_jobs=3)
+        self.assertEqual(self.requests, ["EEE001", "EEE002", "AAA001"])
+        self.assertEqual(answers["AAA002"], (screenshots.QUEUED, ""))
+        self.run_jobs(lines, workers=1, max_jobs=3)
+        self.assertEqual(self.requests[3:], ["AAA002", "AAA003"])
+
+    def test_recent_screenshots_are_handed_out_again(self):
+        first = self.run_jobs(["ABC123\t1200"])
+        second = self.run_jobs(["ABC123\t1200"])
+        self.assertEqual(self.requests, ["ABC123"])
+        self.assertEqual(first, second)
+
+    def test_a_screenshot_is_taken_again_once_the_window_has_passed(self):
+        self.queue.window = 0
+        self.run_jobs(["ABC123\t1200"])
+        self.run_jobs(["ABC123\t1200"])
+        self.assertEqual(self.requests, ["ABC123", "ABC123"])
+
+    def test_the_cached_file_must_still_be_there(self):
+        answers = self.run_jobs(["ABC123\t1200"])
+        os.unlink(answers["ABC123"][1])
+        self.run_jobs(["ABC123\t1200"])
+        self.assertEqual(self.requests, ["ABC123", "ABC123"])
+
+    def test_failed_screenshots_wait_before_they_are_tried_again(self):
+        answers = self.run_jobs(["BAD001\t1200"])
+        self.assertEqual(answers["BAD001"], (screenshots.FAILED, ""))
+        self.run_jobs(["BAD001\t1200"])
+        self.assertEqual(self.requests, ["BAD001"])
+
+
+if __name__ == "__main__":
+    unittest.main()